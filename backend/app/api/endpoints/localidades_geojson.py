@@ -2,87 +2,50 @@
 Endpoints para servir localidades como GeoJSON
 Enfoque híbrido: Centros poblados desde BD, provincias/distritos desde archivos estáticos
 """
+import gzip
 from typing import Optional
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request, Response
+
+from app.services.centros_poblados_geojson_cache import get_centros_poblados_geojson_cache
 
 router = APIRouter()
 
+# Los centros poblados cambian poco; el navegador revalida con If-None-Match
+CACHE_CONTROL_CENTROS_POBLADOS = "public, max-age=60"
+
 
 @router.get("/centros-poblados/geojson")
 async def get_centros_poblados_geojson(
+    request: Request,
     provincia: Optional[str] = Query(None, description="Filtrar por provincia"),
     distrito: Optional[str] = Query(None, description="Filtrar por distrito"),
-    activos_solo: bool = Query(True, description="Solo centros poblados activos")
+    activos_solo: bool = Query(True, description="Solo centros poblados activos"),
+    cluster: Optional[int] = Query(None, ge=0, le=22, description="Zoom del mapa: agrupar los puntos cercanos en una grilla")
 ):
     """
     Devuelve centros poblados como GeoJSON Feature Collection
     Compatible con Leaflet y otros clientes GIS
+    
+    provincia y distrito se comparan con el nombre completo, sin distinguir
+    tildes ni mayúsculas. Con cluster=<zoom> las celdas con varios puntos
+    llegan como un punto con `cluster: true` y `cantidad`.
     """
     from app.dependencies.db import get_database
     
     db = await get_database()
-    localidades_collection = db.localidades
-    
-    # Construir filtro MongoDB
-    filtro = {"tipo": "CENTRO_POBLADO"}
-    
-    if activos_solo:
-        filtro["esta_activa"] = True
-    
-    if provincia:
-        filtro["provincia"] = {"$regex": provincia, "$options": "i"}
-    
-    if distrito:
-        filtro["distrito"] = {"$regex": distrito, "$options": "i"}
-    
-    # Consultar MongoDB
-    cursor = localidades_collection.find(filtro)
-    localidades = await cursor.to_list(length=None)
-    
-    # Convertir a GeoJSON
-    features = []
-    for loc in localidades:
-        # Solo incluir si tiene coordenadas
-        if loc.get('coordenadas') and 'latitud' in loc['coordenadas'] and 'longitud' in loc['coordenadas']:
-            feature = {
-                "type": "Feature",
-                "id": str(loc['_id']),
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [
-                        loc['coordenadas']['longitud'],  # GeoJSON usa [lng, lat]
-                        loc['coordenadas']['latitud']
-                    ]
-                },
-                "properties": {
-                    "id": str(loc['_id']),
-                    "nombre": loc.get('nombre'),
-                    "ubigeo": loc.get('ubigeo'),
-                    "departamento": loc.get('departamento'),
-                    "provincia": loc.provincia,
-                    "provincia": loc.get('provincia'),
-                    "distrito": loc.get('distrito'),
-                    "poblacion": loc.get('poblacion'),
-                    "tipo_area": loc.get('tipo_area'),
-                    "codigo_ccpp": loc.get('codigo_ccpp'),
-                    "altitud": loc.get('altitud'),
-                    "esta_activa": loc.get('esta_activa'),
-                    "fecha_creacion": loc.get('fecha_creacion').isoformat() if loc.get('fecha_creacion') else None,
-                    "fecha_actualizacion": loc.get('fecha_actualizacion').isoformat() if loc.get('fecha_actualizacion') else None
-                }
-            }
-            features.append(feature)
-    
-    return {
-        "type": "FeatureCollection",
-        "features": features,
-        "metadata": {
-            "total": len(features),
-            "provincia": provincia,
-            "distrito": distrito,
-            "activos_solo": activos_solo
-        }
-    }
+    cache = get_centros_poblados_geojson_cache()
+    await cache.asegurar_cargado(db)
+    respuesta = cache.coleccion(provincia, distrito, activos_solo, cluster)
+    
+    headers = {"ETag": respuesta["etag"], "Cache-Control": CACHE_CONTROL_CENTROS_POBLADOS, "Vary": "Accept-Encoding"}
+    if respuesta["etag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    
+    # Se guarda comprimida; solo se descomprime para clientes sin gzip
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=respuesta["gzip"], media_type="application/json", headers=headers)
+    return Response(content=gzip.decompress(respuesta["gzip"]), media_type="application/json", headers=headers)
 
 
 @router.get("/localidades/geojson")
@@ -105,7 +68,7 @@ async def get_localidades_geojson(
     filtro = {}
     
     if activos_solo:
-        filtro["esta_activa"] = True
+        filtro["estaActiva"] = True
     
     if tipo:
         filtro["tipo"] = tipo
@@ -144,7 +107,7 @@ async def get_localidades_geojson(
                     "provincia": loc.get('provincia'),
                     "distrito": loc.get('distrito'),
                     "poblacion": loc.get('poblacion'),
-                    "esta_activa": loc.get('esta_activa')
+                    "esta_activa": loc.get('estaActiva')
                 }
             }
             features.append(feature)
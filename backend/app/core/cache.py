@@ -1,10 +1,22 @@
 """
-Redis cache service for performance optimization
+Two-tier cache service for performance optimization
 Provides caching functionality with TTL and pattern-based invalidation
+
+- L1: bounded in-process LRU with TTL and size-based eviction (always on)
+- L2: Redis (optional, shared between workers)
+
+Reads check L1 first, then Redis; Redis hits are copied to L1. Without Redis
+the service keeps working with L1 only. Each worker has its own L1, so when
+Redis is enabled L1 entries live at most CACHE_L1_MAX_TTL seconds to bound
+how stale a worker can be after another worker invalidates a key.
 """
-import json
+import os
 import pickle
-from typing import Any, Optional, Callable
+import threading
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Optional, Callable, Tuple
 from functools import wraps
 import hashlib
 import redis
@@ -13,174 +25,335 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# L1 limits
+L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "5000"))
+L1_MAX_BYTES = int(os.getenv("CACHE_L1_MAX_BYTES", str(64 * 1024 * 1024)))
+L1_MAX_TTL = int(os.getenv("CACHE_L1_MAX_TTL", "60"))
+
+# Redis URL; set CACHE_REDIS_URL="" to run with the in-process tier only
+REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Seconds to skip Redis after a connection error
+REDIS_RETRY_SECONDS = 30
+
+
+class MemoryCache:
+    """Bounded in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = L1_MAX_ENTRIES, max_bytes: int = L1_MAX_BYTES):
+        """
+        Args:
+            max_entries: Maximum number of entries
+            max_bytes: Maximum total size of the stored (pickled) values
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Get stored bytes, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> bool:
+        """Store bytes; values larger than the whole tier are not cached"""
+        size = len(value)
+        if size > self.max_bytes or ttl <= 0:
+            return False
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (time.monotonic() + ttl, value)
+            self.bytes += size
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def _remove(self, key: str) -> bool:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= len(entry[1])
+        return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._remove(key)
+
+    def delete_pattern(self, pattern: str) -> int:
+        """Delete keys matching a Redis-style glob pattern"""
+        with self._lock:
+            keys = [key for key in self._data if fnmatchcase(key, pattern)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+
 class CacheService:
-    """Service for caching data with Redis"""
-    
-    def __init__(self, redis_client: Optional[Redis] = None):
+    """Service for caching data in memory (L1) and optionally Redis (L2)"""
+
+    def __init__(self, redis_client: Optional[Redis] = None, memory: Optional[MemoryCache] = None):
         """
         Initialize cache service
-        
+
         Args:
-            redis_client: Redis client instance. If None, creates a new one.
+            redis_client: Redis client instance. If None, connects to
+                CACHE_REDIS_URL (if set); without Redis only L1 is used.
+            memory: In-process tier. If None, creates a new one.
         """
-        if redis_client is None:
+        self.memory = memory if memory is not None else MemoryCache()
+        self.enabled = True
+        self._redis_retry_at = 0.0
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+        if redis_client is None and REDIS_URL:
             try:
-                self.redis = redis.Redis(
-                    host='localhost',
-                    port=6379,
-                    db=0,
+                redis_client = redis.Redis.from_url(
+                    REDIS_URL,
                     decode_responses=False,  # We'll handle encoding
-                    socket_connect_timeout=5,
-                    socket_timeout=5
+                    socket_connect_timeout=2,
+                    socket_timeout=2
                 )
                 # Test connection
-                self.redis.ping()
-                self.enabled = True
-                logger.info("Redis cache enabled")
+                redis_client.ping()
+                logger.info("Redis cache enabled (L2)")
             except (redis.ConnectionError, redis.TimeoutError) as e:
-                logger.warning(f"Redis not available, caching disabled: {e}")
-                self.redis = None
-                self.enabled = False
-        else:
-            self.redis = redis_client
-            self.enabled = True
-    
+                logger.warning(f"Redis not available, using in-process cache only: {e}")
+                redis_client = None
+        self.redis = redis_client
+
+    @property
+    def redis_enabled(self) -> bool:
+        return self.redis is not None
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._redis_retry_at
+
+    def _redis_failed(self, operation: str, error: Exception) -> None:
+        """Skip Redis for a while after an error so requests don't wait on timeouts"""
+        logger.error(f"Error {operation} Redis cache: {error}")
+        if isinstance(error, (redis.ConnectionError, redis.TimeoutError)):
+            self._redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+    def _l1_ttl(self, ttl: float) -> float:
+        return min(ttl, L1_MAX_TTL) if self.redis_enabled else ttl
+
+    @staticmethod
+    def _namespace(key: str) -> str:
+        return key.split(":", 1)[0]
+
+    def _count(self, key: str, counter: str) -> None:
+        namespace = self._namespace(key)
+        with self._stats_lock:
+            stats = self._stats.get(namespace)
+            if stats is None:
+                stats = self._stats[namespace] = {"hits_l1": 0, "hits_l2": 0, "misses": 0, "sets": 0, "invalidations": 0}
+            stats[counter] += 1
+
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """Generate cache key from prefix and arguments"""
         # Create a string representation of args and kwargs
         key_parts = [str(arg) for arg in args]
         key_parts.extend([f"{k}={v}" for k, v in sorted(kwargs.items())])
         key_string = ":".join(key_parts)
-        
+
         # Hash if too long
         if len(key_string) > 100:
             key_hash = hashlib.md5(key_string.encode()).hexdigest()
             return f"{prefix}:{key_hash}"
-        
+
         return f"{prefix}:{key_string}" if key_string else prefix
-    
+
     def get(self, key: str) -> Optional[Any]:
         """
         Get value from cache
-        
+
         Args:
             key: Cache key
-            
+
         Returns:
             Cached value or None if not found
         """
-        if not self.enabled:
-            return None
-        
         try:
-            value = self.redis.get(key)
+            value = self.memory.get(key)
             if value is not None:
+                self._count(key, "hits_l1")
                 return pickle.loads(value)
+
+            if self._redis_available():
+                try:
+                    value = self.redis.get(key)
+                except Exception as e:
+                    self._redis_failed("getting from", e)
+                    value = None
+                if value is not None:
+                    self._count(key, "hits_l2")
+                    self.memory.set(key, value, L1_MAX_TTL)
+                    return pickle.loads(value)
+
+            self._count(key, "misses")
             return None
         except Exception as e:
             logger.error(f"Error getting from cache: {e}")
             return None
-    
+
     def set(self, key: str, value: Any, ttl: int = 300) -> bool:
         """
         Set value in cache with TTL
-        
+
         Args:
             key: Cache key
             value: Value to cache
             ttl: Time to live in seconds (default: 5 minutes)
-            
+
         Returns:
             True if successful, False otherwise
         """
-        if not self.enabled:
-            return False
-        
         try:
             serialized = pickle.dumps(value)
-            self.redis.setex(key, ttl, serialized)
-            return True
         except Exception as e:
             logger.error(f"Error setting cache: {e}")
             return False
-    
+
+        self._count(key, "sets")
+        stored = self.memory.set(key, serialized, self._l1_ttl(ttl))
+        if self._redis_available():
+            try:
+                self.redis.setex(key, ttl, serialized)
+                stored = True
+            except Exception as e:
+                self._redis_failed("setting", e)
+        return stored
+
     def delete(self, key: str) -> bool:
         """
         Delete key from cache
-        
+
         Args:
             key: Cache key
-            
+
         Returns:
             True if successful, False otherwise
         """
-        if not self.enabled:
-            return False
-        
-        try:
-            self.redis.delete(key)
-            return True
-        except Exception as e:
-            logger.error(f"Error deleting from cache: {e}")
-            return False
-    
+        self.memory.delete(key)
+        if self._redis_available():
+            try:
+                self.redis.delete(key)
+            except Exception as e:
+                self._redis_failed("deleting from", e)
+                return False
+        return True
+
     def delete_pattern(self, pattern: str) -> int:
         """
-        Delete all keys matching pattern
-        
+        Delete all keys matching pattern in both tiers
+
         Args:
             pattern: Pattern to match (e.g., "documentos:*")
-            
+
         Returns:
-            Number of keys deleted
+            Number of keys deleted (the larger count of the two tiers)
         """
-        if not self.enabled:
-            return 0
-        
-        try:
-            keys = self.redis.keys(pattern)
-            if keys:
-                return self.redis.delete(*keys)
-            return 0
-        except Exception as e:
-            logger.error(f"Error deleting pattern from cache: {e}")
-            return 0
-    
+        self._count(pattern, "invalidations")
+        deleted = self.memory.delete_pattern(pattern)
+        if self._redis_available():
+            try:
+                # SCAN instead of KEYS so large keyspaces don't block Redis
+                keys = list(self.redis.scan_iter(match=pattern, count=500))
+                if keys:
+                    deleted = max(deleted, self.redis.delete(*keys))
+            except Exception as e:
+                self._redis_failed("deleting pattern from", e)
+        return deleted
+
     def clear(self) -> bool:
         """
         Clear all cache
-        
+
         Returns:
             True if successful, False otherwise
         """
-        if not self.enabled:
-            return False
-        
-        try:
-            self.redis.flushdb()
-            return True
-        except Exception as e:
-            logger.error(f"Error clearing cache: {e}")
-            return False
-    
+        self.memory.clear()
+        if self._redis_available():
+            try:
+                self.redis.flushdb()
+            except Exception as e:
+                self._redis_failed("clearing", e)
+                return False
+        return True
+
     def exists(self, key: str) -> bool:
         """
         Check if key exists in cache
-        
+
         Args:
             key: Cache key
-            
+
         Returns:
             True if exists, False otherwise
         """
-        if not self.enabled:
-            return False
-        
-        try:
-            return self.redis.exists(key) > 0
-        except Exception as e:
-            logger.error(f"Error checking cache existence: {e}")
-            return False
+        if self.memory.get(key) is not None:
+            return True
+        if self._redis_available():
+            try:
+                return self.redis.exists(key) > 0
+            except Exception as e:
+                self._redis_failed("checking existence in", e)
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Hit/miss counters per namespace (first segment of the key)
+
+        Returns:
+            Tier status and per-namespace counters with hit ratio
+        """
+        with self._stats_lock:
+            namespaces = {name: dict(stats) for name, stats in self._stats.items()}
+        for stats in namespaces.values():
+            lookups = stats["hits_l1"] + stats["hits_l2"] + stats["misses"]
+            stats["hit_ratio"] = round((stats["hits_l1"] + stats["hits_l2"]) / lookups, 4) if lookups else None
+
+        return {
+            "l1": {
+                "entries": len(self.memory),
+                "bytes": self.memory.bytes,
+                "max_entries": self.memory.max_entries,
+                "max_bytes": self.memory.max_bytes,
+                "evictions": self.memory.evictions
+            },
+            "l2": {
+                "enabled": self.redis_enabled,
+                "available": self._redis_available()
+            },
+            "namespaces": namespaces
+        }
+
+    def reset_stats(self) -> None:
+        """Reset the per-namespace counters"""
+        with self._stats_lock:
+            self._stats = {}
 
 
 # Global cache instance
@@ -0,0 +1,322 @@
+"""
+Registro central de índices de MongoDB
+
+Cada servicio declara, junto a las consultas que los usan, los índices que
+necesita (`registrar_indices`) y algunas consultas representativas
+(`registrar_consulta`). Los índices se sincronizan una vez:
+
+- al iniciar la aplicación (INDICES_SINCRONIZAR_AL_INICIAR, en segundo plano),
+- al desplegar, con `python scripts/sincronizar_indices.py`,
+- o bajo demanda con `asegurar_indices(db, coleccion)`, que hace la
+  sincronización de una colección una sola vez por proceso (para las
+  consultas que no funcionan sin índice, como `$near`).
+
+`reporte_indices` cruza lo declarado con lo que hay en la base: índices
+faltantes, en conflicto, sin declarar y sin uso (`$indexStats`), y el plan
+ganador (`explain`) de cada consulta representativa.
+
+Las sincronizaciones nunca borran ni reemplazan índices salvo que se pida
+explícitamente (`reemplazar_conflictos`, `eliminar_sobrantes`).
+"""
+import asyncio
+import importlib
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import IndexModel
+from pymongo.collation import Collation
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDICES_SINCRONIZAR_AL_INICIAR = os.getenv("INDICES_SINCRONIZAR_AL_INICIAR", "true").lower() in ("1", "true", "si", "yes")
+
+# Comparación sin distinguir mayúsculas (y con el orden del español); las
+# consultas deben pasar la misma collation para poder usar el índice
+COLLATION_SIN_MAYUSCULAS = Collation(locale="es", strength=2)
+
+# Módulos que declaran índices; se importan antes de sincronizar o reportar
+MODULOS_CON_INDICES = (
+    "app.core.job_runner",
+    "app.services.empresa_service",
+    "app.services.vehiculo_service",
+    "app.services.ruta_service",
+    "app.services.resolucion_service",
+    "app.services.localidad_service",
+    "app.services.localidad_alias_service",
+    "app.services.historial_vehicular_service",
+    "app.services.nivel_territorial_service",
+    "app.repositories.geometria_repository",
+    "app.utils.paginacion_cursor",
+    "app.services.mesa_partes.websocket_backplane",
+    "app.services.mesa_partes.webhook_cola",
+)
+
+# Opciones de índice que cuentan para decidir si dos índices son el mismo
+_OPCIONES_COMPARADAS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "weights", "2dsphereIndexVersion")
+
+
+@dataclass
+class ConsultaRepresentativa:
+    """Consulta típica de un servicio, para revisar su plan con explain"""
+    nombre: str
+    filtro: Dict[str, Any]
+    orden: Optional[List[Tuple[str, int]]] = None
+    collation: Optional[Collation] = None
+
+
+_indices: Dict[str, Dict[str, IndexModel]] = {}
+_consultas: Dict[str, List[ConsultaRepresentativa]] = {}
+
+# Colecciones ya sincronizadas en este proceso por asegurar_indices
+_sincronizadas: set = set()
+_lock = asyncio.Lock()
+
+
+def registrar_indices(coleccion: str, *indices: IndexModel) -> None:
+    """Declarar índices de una colección (un mismo nombre se declara una sola vez)"""
+    declarados = _indices.setdefault(coleccion, {})
+    for indice in indices:
+        declarados[indice.document["name"]] = indice
+
+
+def registrar_consulta(
+    coleccion: str,
+    nombre: str,
+    filtro: Dict[str, Any],
+    orden: Optional[List[Tuple[str, int]]] = None,
+    collation: Optional[Collation] = None
+) -> None:
+    """Declarar una consulta representativa de una colección"""
+    consultas = _consultas.setdefault(coleccion, [])
+    consultas[:] = [c for c in consultas if c.nombre != nombre]
+    consultas.append(ConsultaRepresentativa(nombre, filtro, orden, collation))
+
+
+def cargar_declaraciones() -> None:
+    """Importar los módulos que declaran índices"""
+    for modulo in MODULOS_CON_INDICES:
+        importlib.import_module(modulo)
+
+
+def indices_declarados() -> Dict[str, List[Dict[str, Any]]]:
+    """Especificación de los índices declarados, por colección"""
+    cargar_declaraciones()
+    return {
+        coleccion: [_especificacion(indice.document) for indice in indices.values()]
+        for coleccion, indices in sorted(_indices.items())
+    }
+
+
+def _especificacion(documento: Dict[str, Any]) -> Dict[str, Any]:
+    especificacion = {"name": documento["name"], "key": dict(documento["key"])}
+    for opcion in _OPCIONES_COMPARADAS + ("collation",):
+        if opcion in documento:
+            valor = documento[opcion]
+            especificacion[opcion] = valor.document if isinstance(valor, Collation) else valor
+    return especificacion
+
+
+def firma_indice(documento: Dict[str, Any]) -> Tuple:
+    """
+    Identidad de un índice a partir de su documento (declarado o de list_indexes)
+
+    Los índices de texto se guardan como `{_fts: "text", _ftsx: 1}`, así
+    que se identifican por sus pesos; de la collation solo cuentan el
+    idioma y la fuerza.
+    """
+    claves = tuple((campo, valor) for campo, valor in dict(documento["key"]).items() if campo not in ("_fts", "_ftsx"))
+    pesos = documento.get("weights")
+    if pesos or "_fts" in dict(documento["key"]) or "text" in dict(documento["key"]).values():
+        if not pesos:
+            pesos = {campo: 1 for campo, valor in claves if valor == "text"}
+        claves = tuple((campo, valor) for campo, valor in claves if valor != "text") + (("$text", tuple(sorted(pesos))),)
+
+    opciones = []
+    for opcion in ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds"):
+        valor = documento.get(opcion)
+        if valor:
+            opciones.append((opcion, repr(dict(valor)) if isinstance(valor, dict) else valor))
+    collation = documento.get("collation")
+    if collation:
+        collation = collation.document if isinstance(collation, Collation) else collation
+        if collation.get("locale") != "simple":
+            opciones.append(("collation", collation.get("locale"), collation.get("strength", 3)))
+    return claves, tuple(opciones)
+
+
+async def _indices_existentes(coleccion: Any) -> List[Dict[str, Any]]:
+    try:
+        return await coleccion.list_indexes().to_list(length=None)
+    except OperationFailure as e:
+        # La colección todavía no existe
+        if e.code == 26:
+            return []
+        raise
+
+
+async def sincronizar_coleccion(
+    db: Any,
+    nombre: str,
+    reemplazar_conflictos: bool = False,
+    eliminar_sobrantes: bool = False,
+    solo_verificar: bool = False
+) -> Dict[str, List[str]]:
+    """
+    Crear los índices declarados de una colección que falten
+
+    Un índice declarado "en conflicto" es uno cuyo nombre ya existe con otra
+    definición; solo se reemplaza con `reemplazar_conflictos`. Los índices
+    existentes que no están declarados se informan como sobrantes.
+    """
+    coleccion = db[nombre]
+    declarados = _indices.get(nombre, {})
+    existentes = await _indices_existentes(coleccion)
+    firmas_existentes = {firma_indice(doc): doc["name"] for doc in existentes}
+    nombres_existentes = {doc["name"]: firma_indice(doc) for doc in existentes}
+
+    resultado: Dict[str, List[str]] = {"existentes": [], "creados": [], "faltantes": [], "conflictos": [], "sobrantes": [], "errores": []}
+    firmas_declaradas = set()
+    for nombre_indice, indice in declarados.items():
+        firma = firma_indice(indice.document)
+        firmas_declaradas.add(firma)
+        if firma in firmas_existentes:
+            resultado["existentes"].append(firmas_existentes[firma])
+            continue
+
+        if nombre_indice in nombres_existentes:
+            resultado["conflictos"].append(nombre_indice)
+            if solo_verificar or not reemplazar_conflictos:
+                continue
+            await coleccion.drop_index(nombre_indice)
+
+        if solo_verificar:
+            resultado["faltantes"].append(nombre_indice)
+            continue
+        try:
+            await coleccion.create_indexes([indice])
+            resultado["creados"].append(nombre_indice)
+        except OperationFailure as e:
+            logger.warning(f"No se pudo crear el índice {nombre}.{nombre_indice}: {e}")
+            resultado["errores"].append(f"{nombre_indice}: {e}")
+
+    for firma, nombre_indice in firmas_existentes.items():
+        # Los nombres declarados con otra definición ya se informan como conflicto
+        if nombre_indice == "_id_" or firma in firmas_declaradas or nombre_indice in declarados:
+            continue
+        resultado["sobrantes"].append(nombre_indice)
+        if eliminar_sobrantes and not solo_verificar:
+            await coleccion.drop_index(nombre_indice)
+
+    return resultado
+
+
+async def sincronizar_indices(
+    db: Any,
+    colecciones: Optional[Iterable[str]] = None,
+    reemplazar_conflictos: bool = False,
+    eliminar_sobrantes: bool = False,
+    solo_verificar: bool = False
+) -> Dict[str, Dict[str, List[str]]]:
+    """Sincronizar los índices declarados de todas (o algunas) colecciones"""
+    cargar_declaraciones()
+    resultado = {}
+    for nombre in sorted(colecciones or _indices):
+        resultado[nombre] = await sincronizar_coleccion(
+            db, nombre, reemplazar_conflictos, eliminar_sobrantes, solo_verificar
+        )
+        if not solo_verificar:
+            _sincronizadas.add(nombre)
+    return resultado
+
+
+async def asegurar_indices(db: Any, coleccion: str) -> None:
+    """Crear (una vez por proceso) los índices declarados que falten en la colección"""
+    if coleccion in _sincronizadas:
+        return
+    async with _lock:
+        if coleccion in _sincronizadas:
+            return
+        await sincronizar_coleccion(db, coleccion)
+        _sincronizadas.add(coleccion)
+
+
+async def sincronizar_al_iniciar(db: Any) -> None:
+    """Sincronización de arranque: registra en el log lo creado y los problemas"""
+    try:
+        resultado = await sincronizar_indices(db)
+    except Exception as e:
+        logger.error(f"❌ Error sincronizando índices al iniciar: {e}")
+        return
+
+    creados = sum(len(r["creados"]) for r in resultado.values())
+    logger.info(f"✅ Índices verificados en {len(resultado)} colecciones ({creados} creados)")
+    for nombre, r in resultado.items():
+        if r["conflictos"] or r["errores"]:
+            logger.warning(f"⚠️ Índices de {nombre}: conflictos={r['conflictos']} errores={r['errores']}")
+
+
+def _resumen_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    etapas, indices = [], []
+    pendientes = [plan]
+    while pendientes:
+        etapa = pendientes.pop()
+        etapas.append(etapa.get("stage"))
+        if etapa.get("indexName"):
+            indices.append(etapa["indexName"])
+        if "inputStage" in etapa:
+            pendientes.append(etapa["inputStage"])
+        pendientes.extend(etapa.get("inputStages", []))
+    return {"etapas": etapas, "indices": indices, "recorre_coleccion": "COLLSCAN" in etapas}
+
+
+async def explicar_consulta(db: Any, coleccion: str, consulta: ConsultaRepresentativa) -> Dict[str, Any]:
+    """Plan ganador de una consulta representativa"""
+    find: Dict[str, Any] = {"find": coleccion, "filter": consulta.filtro}
+    if consulta.orden:
+        find["sort"] = dict(consulta.orden)
+    if consulta.collation:
+        find["collation"] = consulta.collation.document
+    try:
+        explicacion = await db.command({"explain": find, "verbosity": "queryPlanner"})
+    except OperationFailure as e:
+        return {"consulta": consulta.nombre, "error": str(e)}
+    plan = explicacion.get("queryPlanner", {}).get("winningPlan", {})
+    # Con el motor de ejecución SBE el plan viene anidado en queryPlan
+    return {"consulta": consulta.nombre, **_resumen_plan(plan.get("queryPlan", plan))}
+
+
+async def reporte_indices(db: Any, colecciones: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Índices faltantes, en conflicto, sobrantes y sin uso, y planes de las
+    consultas representativas
+
+    El contador de `$indexStats` se reinicia con cada reinicio del servidor
+    de MongoDB (`desde`), así que un índice "sin uso" solo lo es desde ahí.
+    """
+    cargar_declaraciones()
+    reporte = {}
+    for nombre in sorted(colecciones or set(_indices) | set(_consultas)):
+        estado = await sincronizar_coleccion(db, nombre, solo_verificar=True)
+
+        uso = {}
+        try:
+            async for estadistica in db[nombre].aggregate([{"$indexStats": {}}]):
+                accesos = estadistica.get("accesses", {})
+                uso[estadistica["name"]] = {"operaciones": accesos.get("ops", 0), "desde": accesos.get("since")}
+        except OperationFailure as e:
+            logger.warning(f"$indexStats no disponible para {nombre}: {e}")
+
+        planes = [await explicar_consulta(db, nombre, consulta) for consulta in _consultas.get(nombre, [])]
+        reporte[nombre] = {
+            "faltantes": estado["faltantes"],
+            "conflictos": estado["conflictos"],
+            "sobrantes": estado["sobrantes"],
+            "sin_uso": sorted(indice for indice, datos in uso.items() if indice != "_id_" and not datos["operaciones"]),
+            "uso": uso,
+            "consultas": planes,
+            "consultas_sin_indice": [p["consulta"] for p in planes if p.get("recorre_coleccion")]
+        }
+    return reporte
@@ -0,0 +1,377 @@
+"""
+In-process background job runner for long operations (bulk uploads)
+Runs jobs as asyncio tasks and persists their state in MongoDB, so it works
+without Celery/Redis and any worker can answer status queries.
+"""
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+
+from app.core.indices import asegurar_indices, registrar_indices
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "jobs"
+
+# Maximum number of partial errors stored per job
+MAX_ERRORES_JOB = 1000
+
+# Finished jobs are removed by a TTL index after this many seconds
+JOB_TTL_SECONDS = int(os.getenv("JOBS_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Concurrent jobs per type; the rest wait as PENDING. Override with
+# JOBS_CONCURRENCIA_<TIPO> (e.g. JOBS_CONCURRENCIA_CARGA_MASIVA_RUTAS=2)
+DEFAULT_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCIA_DEFAULT", "1"))
+
+# The worker owning a job refreshes its fechaActualizacion every
+# JOBS_HEARTBEAT_SECONDS; a PENDING/RUNNING job not refreshed for
+# JOBS_LEASE_SECONDS lost its worker (crash/restart) and is marked FAILED
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOBS_HEARTBEAT_SECONDS", "30"))
+JOB_LEASE_SECONDS = int(os.getenv("JOBS_LEASE_SECONDS", "300"))
+
+registrar_indices(
+    JOBS_COLLECTION,
+    IndexModel([("tipo", ASCENDING), ("status", ASCENDING), ("fechaCreacion", DESCENDING)]),
+    IndexModel([("fechaFin", ASCENDING)], expireAfterSeconds=JOB_TTL_SECONDS),
+    IndexModel([("status", ASCENDING), ("fechaActualizacion", ASCENDING)])
+)
+
+
+class JobStatus:
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
+
+    FINALES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobCancelled(asyncio.CancelledError):
+    """
+    Raised inside a job when cancellation was requested
+
+    Subclasses CancelledError so the generic `except Exception` blocks in
+    the Excel services do not swallow it.
+    """
+
+
+class JobContext:
+    """Handle given to a running job to report progress and partial errors"""
+
+    def __init__(self, runner: "JobRunner", job_id: str):
+        self.runner = runner
+        self.job_id = job_id
+
+    async def progreso(
+        self,
+        procesados: int,
+        total: Optional[int] = None,
+        mensaje: Optional[str] = None
+    ) -> None:
+        """
+        Report progress. Also a cancellation checkpoint: raises JobCancelled
+        if cancellation was requested (from this or any other worker).
+        """
+        progress = {"progress.procesados": procesados, "fechaActualizacion": datetime.utcnow()}
+        if total is not None:
+            progress["progress.total"] = total
+            progress["progress.porcentaje"] = round(procesados * 100 / total, 1) if total else 100.0
+        if mensaje is not None:
+            progress["progress.mensaje"] = mensaje
+
+        job = await self.runner.collection.find_one_and_update(
+            {"_id": self.job_id},
+            {"$set": progress},
+            projection={"cancelRequested": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if job and job.get("cancelRequested"):
+            raise JobCancelled()
+
+    async def agregar_errores(self, errores: List[Any]) -> None:
+        """Append partial errors (the job keeps the last MAX_ERRORES_JOB)"""
+        if not errores:
+            return
+        await self.runner.collection.update_one(
+            {"_id": self.job_id},
+            {
+                "$push": {"errors": {"$each": list(errores), "$slice": -MAX_ERRORES_JOB}},
+                "$inc": {"totalErrores": len(errores)}
+            }
+        )
+
+
+JobFunction = Callable[[JobContext], Awaitable[Any]]
+
+
+class JobRunner:
+    """Service for running background jobs with per-type concurrency limits"""
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        limites: Optional[Dict[str, int]] = None,
+        heartbeat: float = JOB_HEARTBEAT_SECONDS,
+        lease: float = JOB_LEASE_SECONDS
+    ):
+        """
+        Initialize job runner
+
+        Args:
+            db: Database where job state is stored
+            limites: Concurrent jobs per job type (default DEFAULT_CONCURRENCY)
+            heartbeat: Seconds between refreshes of this worker's jobs
+            lease: Seconds without refresh after which a job is orphaned
+        """
+        self.usar_db(db)
+        self.limites = limites or {}
+        self.heartbeat = heartbeat
+        self.lease = lease
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._semaforos: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._latido: Optional[asyncio.Task] = None
+
+    def usar_db(self, db: AsyncIOMotorDatabase) -> None:
+        """Point the runner to a (re)connected database, keeping running jobs"""
+        self.db = db
+        self.collection = db[JOBS_COLLECTION]
+
+    def _limite(self, tipo: str) -> int:
+        if tipo in self.limites:
+            return self.limites[tipo]
+        return int(os.getenv(f"JOBS_CONCURRENCIA_{tipo.upper()}", str(DEFAULT_CONCURRENCY)))
+
+    def _semaforo(self, tipo: str) -> asyncio.Semaphore:
+        if tipo not in self._semaforos:
+            self._semaforos[tipo] = asyncio.Semaphore(max(1, self._limite(tipo)))
+        return self._semaforos[tipo]
+
+    async def _asegurar_indices(self) -> None:
+        await asegurar_indices(self.db, JOBS_COLLECTION)
+
+    async def enqueue(
+        self,
+        tipo: str,
+        funcion: JobFunction,
+        descripcion: Optional[str] = None,
+        parametros: Optional[Dict[str, Any]] = None,
+        usuario_id: Optional[str] = None
+    ) -> str:
+        """
+        Register a job and start it in the background
+
+        Args:
+            tipo: Job type; concurrency is limited per type
+            funcion: Coroutine function receiving a JobContext; its return
+                value is stored as the job result
+            descripcion: Human readable description
+            parametros: Metadata stored with the job (file name, mode...)
+            usuario_id: User who requested the job
+
+        Returns:
+            Job ID
+        """
+        await self._asegurar_indices()
+
+        job_id = uuid.uuid4().hex
+        ahora = datetime.utcnow()
+        await self.collection.insert_one({
+            "_id": job_id,
+            "tipo": tipo,
+            "descripcion": descripcion,
+            "parametros": parametros or {},
+            "usuarioId": usuario_id,
+            "status": JobStatus.PENDING,
+            "progress": {"procesados": 0, "total": None, "porcentaje": 0.0, "mensaje": None},
+            "errors": [],
+            "totalErrores": 0,
+            "result": None,
+            "error": None,
+            "cancelRequested": False,
+            "worker": self.worker,
+            "fechaCreacion": ahora,
+            "fechaActualizacion": ahora,
+            "fechaInicio": None,
+            "fechaFin": None
+        })
+
+        task = asyncio.create_task(self._run(job_id, tipo, funcion))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        if self._latido is None or self._latido.done():
+            self._latido = asyncio.create_task(self._latir())
+        logger.info(f"Job enqueued: {tipo} (ID: {job_id})")
+        return job_id
+
+    async def _run(self, job_id: str, tipo: str, funcion: JobFunction) -> None:
+        contexto = JobContext(self, job_id)
+        try:
+            async with self._semaforo(tipo):
+                job = await self.collection.find_one_and_update(
+                    {"_id": job_id, "status": JobStatus.PENDING, "cancelRequested": False},
+                    {"$set": {"status": JobStatus.RUNNING, "fechaInicio": datetime.utcnow()}}
+                )
+                if job is None:
+                    raise JobCancelled()
+
+                resultado = funcion(contexto)
+                if inspect.isawaitable(resultado):
+                    resultado = await resultado
+
+            await self._finalizar(job_id, JobStatus.COMPLETED, result=resultado)
+            logger.info(f"Job completed: {tipo} (ID: {job_id})")
+        except asyncio.CancelledError:
+            await self._finalizar(job_id, JobStatus.CANCELLED)
+            logger.info(f"Job cancelled: {tipo} (ID: {job_id})")
+        except Exception as e:
+            logger.exception(f"Job failed: {tipo} (ID: {job_id})")
+            await self._finalizar(job_id, JobStatus.FAILED, error=str(e))
+
+    async def _latir(self) -> None:
+        """Keep the lease of this worker's jobs while it has any"""
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            if not self._tasks:
+                return
+            try:
+                await self.collection.update_many(
+                    {"_id": {"$in": list(self._tasks)}, "status": {"$nin": list(JobStatus.FINALES)}},
+                    {"$set": {"fechaActualizacion": datetime.utcnow()}}
+                )
+            except Exception as e:
+                logger.error(f"Error refreshing job heartbeat: {e}")
+
+    async def reclamar_huerfanos(self) -> int:
+        """
+        Mark as FAILED the PENDING/RUNNING jobs whose worker stopped
+        refreshing them, so clients stop polling and the TTL removes them
+
+        Returns:
+            Number of jobs marked
+        """
+        ahora = datetime.utcnow()
+        resultado = await self.collection.update_many(
+            {
+                "_id": {"$nin": list(self._tasks)},
+                "status": {"$in": [JobStatus.PENDING, JobStatus.RUNNING]},
+                "fechaActualizacion": {"$lt": ahora - timedelta(seconds=self.lease)}
+            },
+            {"$set": {
+                "status": JobStatus.FAILED,
+                "error": "El proceso que ejecutaba el trabajo se detuvo",
+                "fechaFin": ahora,
+                "fechaActualizacion": ahora
+            }}
+        )
+        if resultado.modified_count:
+            logger.warning(f"{resultado.modified_count} orphaned jobs marked as FAILED")
+        return resultado.modified_count
+
+    async def vigilar_huerfanos(self) -> None:
+        """Reclaim orphaned jobs at startup and then every lease period"""
+        while True:
+            try:
+                await self.reclamar_huerfanos()
+            except Exception as e:
+                logger.error(f"Error reclaiming orphaned jobs: {e}")
+            await asyncio.sleep(self.lease)
+
+    async def _finalizar(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        ahora = datetime.utcnow()
+        cambios = {"status": status, "fechaFin": ahora, "fechaActualizacion": ahora}
+        if result is not None:
+            cambios["result"] = result
+        if error is not None:
+            cambios["error"] = error
+        try:
+            await self.collection.update_one({"_id": job_id}, {"$set": cambios})
+        except Exception as e:
+            # e.g. result too large for a document: keep the final status at least
+            logger.error(f"Error saving job {job_id} result: {e}")
+            cambios.pop("result", None)
+            cambios["error"] = error or f"No se pudo guardar el resultado: {e}"
+            await self.collection.update_one({"_id": job_id}, {"$set": cambios})
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get job state (status, progress, partial errors and result)"""
+        job = await self.collection.find_one({"_id": job_id})
+        if job:
+            job["id"] = job.pop("_id")
+        return job
+
+    async def list_jobs(
+        self,
+        tipo: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """List recent jobs without their result and error details"""
+        query: Dict[str, Any] = {}
+        if tipo:
+            query["tipo"] = tipo
+        if status:
+            query["status"] = status
+
+        cursor = self.collection.find(query, {"result": 0, "errors": 0}).sort("fechaCreacion", DESCENDING).limit(limit)
+        jobs = []
+        async for job in cursor:
+            job["id"] = job.pop("_id")
+            jobs.append(job)
+        return jobs
+
+    async def cancel(self, job_id: str) -> bool:
+        """
+        Request cancellation of a job
+
+        Pending jobs never start. Running jobs stop at their next progress
+        checkpoint; if the job runs in this worker its task is also cancelled.
+
+        Returns:
+            True if the job existed and was not finished
+        """
+        resultado = await self.collection.update_one(
+            {"_id": job_id, "status": {"$nin": list(JobStatus.FINALES)}},
+            {"$set": {"cancelRequested": True, "fechaActualizacion": datetime.utcnow()}}
+        )
+        if resultado.matched_count == 0:
+            return False
+
+        task = self._tasks.get(job_id)
+        if task and not task.done():
+            task.cancel()
+        logger.info(f"Job cancellation requested: {job_id}")
+        return True
+
+
+def job_encolado(job_id: str) -> Dict[str, Any]:
+    """Response body for endpoints that start a background job"""
+    from app.config.settings import settings
+    return {
+        "job_id": job_id,
+        "status": JobStatus.PENDING,
+        "url": f"{settings.API_V1_STR}/jobs/{job_id}",
+        "mensaje": "Procesamiento iniciado en segundo plano"
+    }
+
+
+# Global job runner instance
+_job_runner_instance: Optional[JobRunner] = None
+
+def get_job_runner(db: AsyncIOMotorDatabase) -> JobRunner:
+    """Get global job runner instance"""
+    global _job_runner_instance
+    if _job_runner_instance is None:
+        _job_runner_instance = JobRunner(db)
+    elif _job_runner_instance.db is not db:
+        _job_runner_instance.usar_db(db)
+    return _job_runner_instance
@@ -1,15 +1,25 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from typing import Optional
+from typing import Any, Dict, Optional
 from datetime import datetime, timedelta
+import hashlib
+import os
+import time
+import uuid
 from app.config.settings import settings
+from app.core.cache import get_cache
 from app.models.usuario import UsuarioInDB
 from app.dependencies.db import get_database
-from app.services.usuario_service import UsuarioService
+from app.services.usuario_service import UsuarioService, usuario_auth_cache_key
 
 security = HTTPBearer()
 
+# Segundos que se reutiliza el usuario de un token sin volver a MongoDB
+USUARIO_AUTH_CACHE_TTL = int(os.getenv("USUARIO_AUTH_CACHE_TTL", "30"))
+
+_metricas_auth = {"hits": 0, "misses": 0, "hits_ms": 0.0, "misses_ms": 0.0}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Crear token de acceso JWT"""
     to_encode = data.copy()
@@ -17,7 +27,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -39,13 +49,43 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
+    # Tokens emitidos antes de incluir jti se identifican por su firma
+    jti = payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()[:32]
+    cache_key = usuario_auth_cache_key(usuario_id, jti)
+    cache = get_cache()
+    
+    inicio = time.perf_counter()
+    usuario = cache.get(cache_key)
+    if usuario is not None:
+        _registrar_metrica("hits", inicio)
+        return usuario
+    
     db = await get_database()
     usuario_service = UsuarioService(db)
     usuario = await usuario_service.get_usuario_by_id(usuario_id)
+    _registrar_metrica("misses", inicio)
     if usuario is None:
         raise credentials_exception
+    cache.set(cache_key, usuario, ttl=USUARIO_AUTH_CACHE_TTL)
     return usuario
 
+def _registrar_metrica(resultado: str, inicio: float) -> None:
+    _metricas_auth[resultado] += 1
+    _metricas_auth[f"{resultado}_ms"] += (time.perf_counter() - inicio) * 1000
+
+def get_metricas_autenticacion() -> Dict[str, Any]:
+    """Aciertos y latencia promedio de la caché de usuarios autenticados"""
+    hits, misses = _metricas_auth["hits"], _metricas_auth["misses"]
+    total = hits + misses
+    return {
+        "ttl_segundos": USUARIO_AUTH_CACHE_TTL,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+        "latencia_promedio_hit_ms": round(_metricas_auth["hits_ms"] / hits, 3) if hits else None,
+        "latencia_promedio_miss_ms": round(_metricas_auth["misses_ms"] / misses, 3) if misses else None
+    }
+
 async def get_current_active_user(
     current_user: UsuarioInDB = Depends(get_current_user)
 ) -> UsuarioInDB:
@@ -16,6 +16,10 @@ class Database:
     sync_client: Optional[MongoClient] = None
     is_connected: bool = False
     reconnect_task: Optional[asyncio.Task] = None
+    indices_task: Optional[asyncio.Task] = None
+    busqueda_task: Optional[asyncio.Task] = None
+    jobs_task: Optional[asyncio.Task] = None
+    resumen_task: Optional[asyncio.Task] = None
 
 db = Database()
 
@@ -144,9 +148,59 @@ async def lifespan(app):
         logger.warning(f"⚠️ No se pudo conectar a MongoDB al inicio: {e}")
         logger.info("🔄 La aplicación continuará ejecutándose. MongoDB se reconectará automáticamente cuando esté disponible.")
     
+    # Verificar y crear los índices declarados sin retrasar el arranque
+    from app.core.indices import INDICES_SINCRONIZAR_AL_INICIAR, sincronizar_al_iniciar
+    if db.is_connected and INDICES_SINCRONIZAR_AL_INICIAR:
+        db.indices_task = asyncio.create_task(sincronizar_al_iniciar(db.client[settings.DATABASE_NAME]))
+    
+    # Completar los campos de búsqueda normalizados que falten
+    from app.utils.busqueda_normalizada import BUSQUEDA_SINCRONIZAR_AL_INICIAR, sincronizar_busqueda_al_iniciar
+    if db.is_connected and BUSQUEDA_SINCRONIZAR_AL_INICIAR:
+        db.busqueda_task = asyncio.create_task(sincronizar_busqueda_al_iniciar(db.client[settings.DATABASE_NAME]))
+    
+    # Marcar como fallidos los trabajos en segundo plano de workers caídos
+    from app.core.job_runner import get_job_runner
+    if db.is_connected:
+        db.jobs_task = asyncio.create_task(get_job_runner(db.client[settings.DATABASE_NAME]).vigilar_huerfanos())
+    
+    # Backplane de notificaciones WebSocket entre workers
+    from app.services.mesa_partes.websocket_backplane import crear_backplane
+    from app.services.mesa_partes.websocket_service import manager as ws_manager
+    try:
+        await ws_manager.iniciar_backplane(crear_backplane(db.client[settings.DATABASE_NAME] if db.is_connected else None))
+    except Exception as e:
+        logger.error(f"❌ No se pudo iniciar el backplane WebSocket: {e}")
+    
+    # Cola de salida de webhooks (en memoria si MongoDB no está disponible)
+    from app.services.mesa_partes.webhook_cola import get_cola_webhooks
+    cola_webhooks = get_cola_webhooks(db.client[settings.DATABASE_NAME] if db.is_connected else None)
+    try:
+        from app.services.mesa_partes.webhook_service import actualizar_estado_conexion
+        cola_webhooks.al_finalizar = actualizar_estado_conexion
+    except Exception as e:
+        logger.warning(f"⚠️ El estado de las integraciones no se actualizará con las entregas de webhooks: {e}")
+    cola_webhooks.iniciar()
+    
+    # Reconciliación nocturna del resumen de estadísticas de Mesa de Partes
+    try:
+        from app.services.mesa_partes.resumen_service import start_reconciliador_resumen, stop_reconciliador_resumen
+        db.resumen_task = asyncio.create_task(start_reconciliador_resumen())
+    except Exception as e:
+        stop_reconciliador_resumen = None
+        logger.warning(f"⚠️ No se programó la reconciliación del resumen de Mesa de Partes: {e}")
+    
     yield
     
     # Shutdown
+    if stop_reconciliador_resumen:
+        await stop_reconciliador_resumen()
+    from app.services.mesa_partes.auditoria_buffer import detener_escritor_auditoria
+    await detener_escritor_auditoria()
+    await cola_webhooks.detener()
+    await ws_manager.detener_backplane()
+    for tarea in (db.indices_task, db.busqueda_task, db.jobs_task, db.resumen_task):
+        if tarea and not tarea.done():
+            tarea.cancel()
     await close_mongo_connection()
 
 async def health_check_mongo() -> dict:
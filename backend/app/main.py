@@ -20,6 +20,9 @@ from app.routers.importar_geojson import router as importar_geojson_router
 from app.routers.localidades_import_geojson import router as localidades_import_geojson_router
 from app.api.endpoints.localidades_geojson import router as localidades_geojson_router
 from app.routers.geometrias import router as geometrias_router
+from app.routers.jobs_router import router as jobs_router
+from app.routers.cache_router import router as cache_router
+from app.routers.indices_router import router as indices_router
 from app.dependencies.db import lifespan
 
 # Configuración de logging
@@ -70,6 +73,10 @@ app.add_middleware(
     allowed_hosts=["*"]
 )
 
+# Middleware de compresión (brotli/gzip) de respuestas grandes
+from app.middleware.compression_middleware import CompressionMiddleware
+app.add_middleware(CompressionMiddleware)
+
 # Middleware de manejo de errores de base de datos
 from app.middleware.database_middleware import add_database_error_handler
 add_database_error_handler(app)
@@ -117,6 +124,9 @@ app.include_router(geometrias_router, prefix=settings.API_V1_STR)
 app.include_router(nivel_territorial_router, prefix=settings.API_V1_STR)
 app.include_router(additional_router, prefix=settings.API_V1_STR)
 app.include_router(data_manager_router, prefix=settings.API_V1_STR)
+app.include_router(jobs_router, prefix=settings.API_V1_STR)
+app.include_router(cache_router, prefix=settings.API_V1_STR)
+app.include_router(indices_router, prefix=settings.API_V1_STR)
 
 # Endpoint de salud
 @app.get("/health")
@@ -0,0 +1,453 @@
+"""
+Middleware de compresión de respuestas (brotli o gzip)
+
+- Se elige la codificación según Accept-Encoding (con sus q) entre los
+  compresores registrados; brotli solo si el paquete está instalado.
+- Solo se comprimen tipos de texto (JSON, GeoJSON, texto, XML, SVG) de al
+  menos COMPRESION_MINIMO_BYTES; las respuestas ya codificadas, las
+  descargas binarias y los 204/304 pasan sin cambios.
+- Las respuestas por streaming se comprimen por bloques una vez que superan
+  el mínimo.
+- Por ruta: el decorador `compresion` desactiva la compresión de un endpoint
+  o cambia su mínimo; con COMPRESION_POR_DEFECTO=false solo se comprimen los
+  endpoints marcados con `@compresion()`. COMPRESION_EXCLUIR lista prefijos de
+  ruta que nunca se comprimen.
+
+Para payloads casi estáticos (geometrías), `respuesta_precomprimida` guarda
+el cuerpo ya comprimido por ETag y codificación, así no se serializa ni se
+comprime en cada petición.
+"""
+import gzip
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESION_MINIMO_BYTES = int(os.getenv("COMPRESION_MINIMO_BYTES", "1024"))
+COMPRESION_POR_DEFECTO = os.getenv("COMPRESION_POR_DEFECTO", "true").lower() == "true"
+COMPRESION_EXCLUIR = [p.strip() for p in os.getenv("COMPRESION_EXCLUIR", "").split(",") if p.strip()]
+GZIP_NIVEL = int(os.getenv("COMPRESION_GZIP_NIVEL", "6"))
+BROTLI_CALIDAD = int(os.getenv("COMPRESION_BROTLI_CALIDAD", "4"))
+
+# Bytes máximos de respuestas precomprimidas en memoria
+PRECOMPRIMIDAS_MAX_BYTES = int(os.getenv("COMPRESION_PRECOMPRIMIDAS_MAX_BYTES", str(32 * 1024 * 1024)))
+
+TIPOS_COMPRIMIBLES = (
+    "text/",
+    "application/json",
+    "application/geo+json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml"
+)
+
+ATRIBUTO_RUTA = "__compresion__"
+
+
+# ----------------------------------------------------------------------
+# Compresores
+# ----------------------------------------------------------------------
+
+class CompresorGzip:
+    nombre = "gzip"
+
+    def __init__(self, nivel: int = GZIP_NIVEL):
+        self.nivel = nivel
+
+    def comprimir(self, datos: bytes) -> bytes:
+        return gzip.compress(datos, compresslevel=self.nivel, mtime=0)
+
+    def flujo(self) -> Any:
+        """Objeto con compress(bytes) y flush() para respuestas por streaming"""
+        return zlib.compressobj(self.nivel, zlib.DEFLATED, 31)
+
+
+class CompresorBrotli:
+    nombre = "br"
+
+    def __init__(self, calidad: int = BROTLI_CALIDAD):
+        self.calidad = calidad
+
+    def comprimir(self, datos: bytes) -> bytes:
+        return brotli.compress(datos, quality=self.calidad)
+
+    def flujo(self) -> Any:
+        compresor = brotli.Compressor(quality=self.calidad)
+        return _FlujoBrotli(compresor)
+
+
+class _FlujoBrotli:
+    def __init__(self, compresor: Any):
+        self.compresor = compresor
+
+    def compress(self, datos: bytes) -> bytes:
+        return self.compresor.process(datos)
+
+    def flush(self) -> bytes:
+        return self.compresor.finish()
+
+
+# Por orden de preferencia ante q iguales
+COMPRESORES: "OrderedDict[str, Any]" = OrderedDict()
+
+
+def registrar_compresor(compresor: Any, preferido: bool = False) -> None:
+    """Agregar (o reemplazar) un compresor con `nombre`, `comprimir` y `flujo`"""
+    COMPRESORES[compresor.nombre] = compresor
+    if preferido:
+        COMPRESORES.move_to_end(compresor.nombre, last=False)
+
+
+if brotli is not None:
+    registrar_compresor(CompresorBrotli())
+registrar_compresor(CompresorGzip())
+
+
+def elegir_codificacion(accept_encoding: str) -> Optional[str]:
+    """Codificación registrada con mayor q en Accept-Encoding (None si ninguna)"""
+    aceptadas: Dict[str, float] = {}
+    for parte in accept_encoding.lower().split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        if parametros.strip().startswith("q="):
+            try:
+                q = float(parametros.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if nombre:
+            aceptadas[nombre.strip()] = q
+
+    mejor, mejor_q = None, 0.0
+    for nombre in COMPRESORES:
+        q = aceptadas.get(nombre, aceptadas.get("*", 0.0))
+        if q > mejor_q:
+            mejor, mejor_q = nombre, q
+    return mejor
+
+
+# ----------------------------------------------------------------------
+# Métricas
+# ----------------------------------------------------------------------
+
+_metricas_lock = threading.Lock()
+_metricas: Dict[str, Any] = {}
+
+
+def reiniciar_metricas_compresion() -> None:
+    with _metricas_lock:
+        _metricas.clear()
+        _metricas.update({
+            "comprimidas": 0,
+            "sin_comprimir": 0,
+            "precomprimidas_hits": 0,
+            "precomprimidas_misses": 0,
+            "bytes_originales": 0,
+            "bytes_enviados": 0,
+            "bytes_sin_comprimir": 0,
+            "tiempo_ms": 0.0,
+            "por_codificacion": {}
+        })
+
+
+reiniciar_metricas_compresion()
+
+
+def _registrar(codificacion: Optional[str], originales: int, enviados: int, tiempo_ms: float = 0.0) -> None:
+    with _metricas_lock:
+        if codificacion is None:
+            _metricas["sin_comprimir"] += 1
+            _metricas["bytes_sin_comprimir"] += originales
+            return
+        _metricas["comprimidas"] += 1
+        _metricas["bytes_originales"] += originales
+        _metricas["bytes_enviados"] += enviados
+        _metricas["tiempo_ms"] += tiempo_ms
+        por = _metricas["por_codificacion"].setdefault(
+            codificacion, {"respuestas": 0, "bytes_originales": 0, "bytes_enviados": 0, "tiempo_ms": 0.0}
+        )
+        por["respuestas"] += 1
+        por["bytes_originales"] += originales
+        por["bytes_enviados"] += enviados
+        por["tiempo_ms"] += tiempo_ms
+
+
+def get_metricas_compresion() -> Dict[str, Any]:
+    """Bytes antes y después de comprimir, tiempo de compresión y uso de precomprimidas"""
+    with _metricas_lock:
+        metricas = {**_metricas, "por_codificacion": {k: dict(v) for k, v in _metricas["por_codificacion"].items()}}
+    metricas["ratio"] = (
+        round(metricas["bytes_enviados"] / metricas["bytes_originales"], 4) if metricas["bytes_originales"] else None
+    )
+    metricas["tiempo_promedio_ms"] = (
+        round(metricas["tiempo_ms"] / metricas["comprimidas"], 3) if metricas["comprimidas"] else None
+    )
+    metricas["codificaciones"] = list(COMPRESORES)
+    metricas["minimo_bytes"] = COMPRESION_MINIMO_BYTES
+    metricas["precomprimidas_bytes"] = _precomprimidas.bytes
+    return metricas
+
+
+# ----------------------------------------------------------------------
+# Configuración por ruta
+# ----------------------------------------------------------------------
+
+def compresion(activa: bool = True, minimo: Optional[int] = None) -> Callable:
+    """
+    Decorador de endpoint para activar/desactivar la compresión o cambiar el mínimo
+
+        @router.get("/exportar")
+        @compresion(activa=False)
+        async def exportar(): ...
+    """
+    def decorador(funcion: Callable) -> Callable:
+        setattr(funcion, ATRIBUTO_RUTA, {"activa": activa, "minimo": minimo})
+        return funcion
+    return decorador
+
+
+def _configuracion_ruta(scope: Scope) -> Optional[Dict[str, Any]]:
+    # El router de Starlette deja la ruta resuelta en el scope compartido
+    ruta = scope.get("route")
+    endpoint = getattr(ruta, "endpoint", None) or scope.get("endpoint")
+    return getattr(endpoint, ATRIBUTO_RUTA, None)
+
+
+# ----------------------------------------------------------------------
+# Middleware
+# ----------------------------------------------------------------------
+
+class CompressionMiddleware:
+    """Middleware ASGI que comprime las respuestas de texto grandes"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimo: int = COMPRESION_MINIMO_BYTES,
+        por_defecto: bool = COMPRESION_POR_DEFECTO,
+        excluir: Optional[List[str]] = None
+    ):
+        """
+        Args:
+            minimo: Tamaño mínimo del cuerpo para comprimir
+            por_defecto: Comprimir las rutas sin decorador `compresion`
+            excluir: Prefijos de ruta que nunca se comprimen
+        """
+        self.app = app
+        self.minimo = minimo
+        self.por_defecto = por_defecto
+        self.excluir = COMPRESION_EXCLUIR if excluir is None else excluir
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or any(scope["path"].startswith(p) for p in self.excluir):
+            await self.app(scope, receive, send)
+            return
+        codificacion = elegir_codificacion(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _RespuestaComprimible(self, scope, send, codificacion).send)
+
+
+class _RespuestaComprimible:
+    """Estado de una respuesta: decide al primer bloque si se comprime o no"""
+
+    def __init__(self, middleware: CompressionMiddleware, scope: Scope, send: Send, codificacion: str):
+        self.middleware = middleware
+        self.scope = scope
+        self.enviar = send
+        self.compresor = COMPRESORES[codificacion]
+        self.inicio: Optional[Message] = None
+        self.minimo = middleware.minimo
+        self.modo = "esperando"  # esperando | directo | acumulando | flujo
+        self.buffer: List[bytes] = []
+        self.tamano = 0
+        self.enviados = 0
+        self.tiempo = 0.0
+        self.flujo: Any = None
+
+    def _comprimible(self, mensaje: Message) -> bool:
+        headers = Headers(raw=mensaje.get("headers", []))
+        if mensaje["status"] in (204, 304) or mensaje["status"] < 200 or "content-encoding" in headers:
+            return False
+        tipo = headers.get("content-type", "").lower()
+        if not tipo.startswith(TIPOS_COMPRIMIBLES):
+            return False
+
+        configuracion = _configuracion_ruta(self.scope)
+        if configuracion is None:
+            return self.middleware.por_defecto
+        if configuracion["minimo"] is not None:
+            self.minimo = configuracion["minimo"]
+        return configuracion["activa"]
+
+    def _cabeceras(self, longitud: Optional[int]) -> None:
+        headers = MutableHeaders(raw=self.inicio["headers"])
+        headers["Content-Encoding"] = self.compresor.nombre
+        headers.add_vary_header("Accept-Encoding")
+        if longitud is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(longitud)
+        # El cuerpo cambia de bytes: un ETag fuerte ya no lo identifica
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+    async def _sin_comprimir(self, mas: bool) -> None:
+        await self.enviar(self.inicio)
+        await self.enviar({"type": "http.response.body", "body": b"".join(self.buffer), "more_body": mas})
+        if not mas:
+            _registrar(None, self.tamano, self.tamano)
+
+    async def send(self, mensaje: Message) -> None:
+        if self.modo == "directo":
+            await self.enviar(mensaje)
+            return
+
+        if mensaje["type"] == "http.response.start":
+            self.inicio = mensaje
+            self.modo = "acumulando" if self._comprimible(mensaje) else "directo"
+            if self.modo == "directo":
+                await self.enviar(mensaje)
+            return
+
+        if mensaje["type"] != "http.response.body":
+            await self.enviar(mensaje)
+            return
+
+        cuerpo = mensaje.get("body", b"")
+        mas = mensaje.get("more_body", False)
+
+        if self.modo == "flujo":
+            inicio = time.perf_counter()
+            datos = self.flujo.compress(cuerpo) + (b"" if mas else self.flujo.flush())
+            self.tiempo += time.perf_counter() - inicio
+            self.tamano += len(cuerpo)
+            self.enviados += len(datos)
+            await self.enviar({"type": "http.response.body", "body": datos, "more_body": mas})
+            if not mas:
+                _registrar(self.compresor.nombre, self.tamano, self.enviados, self.tiempo * 1000)
+            return
+
+        self.buffer.append(cuerpo)
+        self.tamano += len(cuerpo)
+        if self.tamano < self.minimo:
+            if not mas:
+                self.modo = "directo"
+                await self._sin_comprimir(False)
+            return
+
+        datos = b"".join(self.buffer)
+        self.buffer = []
+        inicio = time.perf_counter()
+        if not mas:
+            comprimido = self.compresor.comprimir(datos)
+            self.tiempo = time.perf_counter() - inicio
+            self._cabeceras(len(comprimido))
+            self.modo = "directo"
+            await self.enviar(self.inicio)
+            await self.enviar({"type": "http.response.body", "body": comprimido, "more_body": False})
+            _registrar(self.compresor.nombre, self.tamano, len(comprimido), self.tiempo * 1000)
+            return
+
+        # Respuesta por streaming que ya superó el mínimo
+        self.flujo = self.compresor.flujo()
+        comprimido = self.flujo.compress(datos)
+        self.tiempo = time.perf_counter() - inicio
+        self.enviados = len(comprimido)
+        self._cabeceras(None)
+        self.modo = "flujo"
+        await self.enviar(self.inicio)
+        await self.enviar({"type": "http.response.body", "body": comprimido, "more_body": True})
+
+
+# ----------------------------------------------------------------------
+# Respuestas precomprimidas
+# ----------------------------------------------------------------------
+
+class CachePrecomprimida:
+    """LRU de cuerpos comprimidos por (clave, codificación), limitado en bytes"""
+
+    def __init__(self, max_bytes: int = PRECOMPRIMIDAS_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._datos: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave: str, codificacion: str) -> Optional[bytes]:
+        with self._lock:
+            datos = self._datos.get((clave, codificacion))
+            if datos is not None:
+                self._datos.move_to_end((clave, codificacion))
+            return datos
+
+    def set(self, clave: str, codificacion: str, datos: bytes) -> None:
+        if len(datos) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._datos.pop((clave, codificacion), None)
+            if anterior is not None:
+                self.bytes -= len(anterior)
+            self._datos[(clave, codificacion)] = datos
+            self.bytes += len(datos)
+            while self.bytes > self.max_bytes:
+                _, eliminado = self._datos.popitem(last=False)
+                self.bytes -= len(eliminado)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+            self.bytes = 0
+
+
+_precomprimidas = CachePrecomprimida()
+
+
+def respuesta_precomprimida(
+    request: Request,
+    clave: str,
+    generar: Callable[[], bytes],
+    media_type: str = "application/json",
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Respuesta cuyo cuerpo comprimido se guarda por `clave` (p. ej. el ETag)
+
+    `generar` solo se llama si falta la versión comprimida (o el cliente no
+    acepta compresión). La clave debe cambiar cuando cambia el contenido.
+    """
+    headers = dict(headers or {})
+    codificacion = elegir_codificacion(request.headers.get("accept-encoding", ""))
+    if codificacion is None:
+        return Response(content=generar(), media_type=media_type, headers=headers)
+
+    comprimido = _precomprimidas.get(clave, codificacion)
+    if comprimido is None:
+        with _metricas_lock:
+            _metricas["precomprimidas_misses"] += 1
+        contenido = generar()
+        inicio = time.perf_counter()
+        comprimido = COMPRESORES[codificacion].comprimir(contenido)
+        _registrar(codificacion, len(contenido), len(comprimido), (time.perf_counter() - inicio) * 1000)
+        _precomprimidas.set(clave, codificacion, comprimido)
+    else:
+        with _metricas_lock:
+            _metricas["precomprimidas_hits"] += 1
+
+    headers.update({"Content-Encoding": codificacion, "Vary": "Accept-Encoding"})
+    return Response(content=comprimido, media_type=media_type, headers=headers)
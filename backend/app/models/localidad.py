@@ -126,11 +126,27 @@ class Localidad(LocalidadBase):
 class LocalidadResponse(Localidad):
     pass
 
+class LocalidadCercana(LocalidadResponse):
+    """Localidad devuelta por una búsqueda por proximidad"""
+    distancia_km: float = Field(..., description="Distancia al punto consultado en km")
+
+class SolicitudDistancias(BaseModel):
+    """Localidades para una matriz de distancias o un itinerario (en orden)"""
+    ids: List[str] = Field(..., min_length=1, max_length=1000, description="IDs de localidades")
+
+class LocalidadContenedora(BaseModel):
+    """Polígono territorial que contiene un punto y su localidad"""
+    geometria_id: str = Field(..., description="ID de la geometría")
+    tipo: str = Field(..., description="Tipo de geometría (PROVINCIA, DISTRITO, ...)")
+    ubigeo: Optional[str] = Field(None, description="UBIGEO de la geometría")
+    localidad: Optional[LocalidadResponse] = Field(None, description="Localidad vinculada a la geometría")
+
 class LocalidadesPaginadas(BaseModel):
     localidades: List[LocalidadResponse]
     total: int
     pagina: int
     totalPaginas: int
+    siguienteCursor: Optional[str] = None
 
 class FiltroLocalidades(BaseModel):
     nombre: Optional[str] = None
@@ -157,6 +173,12 @@ class LocalidadEnRuta(BaseModel):
     tipo: TipoLocalidad = Field(..., description="Tipo de localidad")
     nivel_territorial: str = Field(..., description="Nivel territorial")
     coordenadas: Optional[Coordenadas] = Field(None, description="Coordenadas geográficas")
+    ubigeo: Optional[str] = Field(None, description="UBIGEO de la localidad")
+    departamento: Optional[str] = Field(None, description="Departamento")
+    provincia: Optional[str] = Field(None, description="Provincia")
+    distrito: Optional[str] = Field(None, description="Distrito")
+    municipalidad_centro_poblado: Optional[str] = Field(None, description="Municipalidad del centro poblado")
+    orden: Optional[int] = Field(None, description="Orden en la ruta (0 = origen)")
 
 # Mantener compatibilidad con modelos existentes
 NivelTerritorial = TipoLocalidad  # Alias para compatibilidad
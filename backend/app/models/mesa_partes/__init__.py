@@ -6,6 +6,7 @@ from .derivacion import Derivacion
 from .integracion import Integracion, LogSincronizacion
 from .notificacion import Notificacion, Alerta
 from .archivo import Archivo
+from .resumen import ResumenDiarioDocumentos, ResumenDiarioAtenciones
 
 __all__ = [
     "Base",
@@ -21,5 +22,7 @@ __all__ = [
     "LogSincronizacion",
     "Notificacion",
     "Alerta",
-    "Archivo"
+    "Archivo",
+    "ResumenDiarioDocumentos",
+    "ResumenDiarioAtenciones"
 ]
\ No newline at end of file
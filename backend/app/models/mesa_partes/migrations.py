@@ -7,6 +7,7 @@ from .documento import Documento, TipoDocumento, ArchivoAdjunto
 from .derivacion import Derivacion
 from .integracion import Integracion, LogSincronizacion
 from .notificacion import Notificacion, Alerta
+from .resumen import ResumenDiarioDocumentos, ResumenDiarioAtenciones
 import logging
 
 logger = logging.getLogger(__name__)
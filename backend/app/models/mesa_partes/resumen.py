@@ -0,0 +1,71 @@
+"""
+Tablas de resumen diario para las estadísticas de Mesa de Partes
+
+Se mantienen solas: al hacer flush de una sesión se comparan los valores
+anteriores (leídos antes del flush) y los nuevos de cada Documento y
+Derivacion modificados, y el cambio neto se aplica a las filas de resumen
+en la misma transacción. Los cálculos están en
+app.services.mesa_partes.resumen_estadisticas, los listeners del flush en
+app.services.mesa_partes.resumen_sincronizacion y la reconciliación
+nocturna en app.services.mesa_partes.resumen_service.
+"""
+from sqlalchemy import Column, Date, Float, Index, Integer, String
+from sqlalchemy.orm import Session
+
+from .base import BaseModel
+from .derivacion import Derivacion
+from .documento import Documento
+from app.services.mesa_partes.resumen_estadisticas import aporte_atencion, aporte_documento
+from app.services.mesa_partes.resumen_sincronizacion import seguir_cambios
+
+
+class ResumenDiarioDocumentos(BaseModel):
+    """Documentos por día de recepción, área actual, estado, prioridad y día límite"""
+    __tablename__ = "resumen_diario_documentos"
+
+    fecha = Column(Date, nullable=False)
+    area_id = Column(String(255), nullable=False, default="")
+    estado = Column(String(20), nullable=False)
+    prioridad = Column(String(20), nullable=False)
+    fecha_limite = Column(Date, nullable=True)
+    cantidad = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_resumen_documentos_fecha_area', 'fecha', 'area_id'),
+    )
+
+
+class ResumenDiarioAtenciones(BaseModel):
+    """Derivaciones atendidas por día de atención y área destino"""
+    __tablename__ = "resumen_diario_atenciones"
+
+    fecha = Column(Date, nullable=False)
+    area_id = Column(String(255), nullable=False, default="")
+    atendidas = Column(Integer, nullable=False, default=0)
+    horas_atencion = Column(Float, nullable=False, default=0.0)
+    con_limite = Column(Integer, nullable=False, default=0)
+    a_tiempo = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_resumen_atenciones_fecha_area', 'fecha', 'area_id'),
+    )
+
+
+# Modelo seguido -> (campos que forman su aporte, función de aporte, tabla, columnas de la clave)
+SEGUIMIENTO = {
+    Documento: (
+        ("fecha_recepcion", "area_actual_id", "estado", "prioridad", "fecha_limite"),
+        aporte_documento,
+        ResumenDiarioDocumentos.__table__,
+        ("fecha", "area_id", "estado", "prioridad", "fecha_limite")
+    ),
+    Derivacion: (
+        ("estado", "fecha_derivacion", "fecha_atencion", "fecha_limite_atencion", "area_destino_id"),
+        aporte_atencion,
+        ResumenDiarioAtenciones.__table__,
+        ("fecha", "area_id")
+    ),
+}
+
+
+seguir_cambios(Session, SEGUIMIENTO)
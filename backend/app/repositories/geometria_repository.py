@@ -1,25 +1,31 @@
 from typing import List, Optional
+from pymongo import ASCENDING, GEOSPHERE, IndexModel
 from pymongo.database import Database
 from bson import ObjectId
 from datetime import datetime
 from app.models.geometria import (
     Geometria, GeometriaCreate, TipoGeometria, FiltroGeometrias
 )
+from app.services.geometria_tiles_index import get_geometria_tiles_index
+from app.core.indices import registrar_consulta, registrar_indices
+
+# Antes se creaban en el constructor, es decir, en cada request
+registrar_indices(
+    "geometrias",
+    IndexModel([("geometry", GEOSPHERE)]),
+    IndexModel([("tipo", ASCENDING)]),
+    IndexModel([("ubigeo", ASCENDING)]),
+    IndexModel([("departamento", ASCENDING)]),
+    IndexModel([("provincia", ASCENDING)]),
+    IndexModel([("distrito", ASCENDING)]),
+    IndexModel([("tipo", ASCENDING), ("departamento", ASCENDING)]),
+    IndexModel([("tipo", ASCENDING), ("provincia", ASCENDING)])
+)
+registrar_consulta("geometrias", "por_tipo_provincia", {"tipo": "DISTRITO", "provincia": "PUNO"})
 
 class GeometriaRepository:
     def __init__(self, db: Database):
         self.collection = db["geometrias"]
-        self._crear_indices()
-    
-    def _crear_indices(self):
-        """Crear índices para optimizar consultas"""
-        self.collection.create_index("tipo")
-        self.collection.create_index("ubigeo")
-        self.collection.create_index("departamento")
-        self.collection.create_index("provincia")
-        self.collection.create_index("distrito")
-        self.collection.create_index([("tipo", 1), ("departamento", 1)])
-        self.collection.create_index([("tipo", 1), ("provincia", 1)])
     
     async def crear(self, geometria: GeometriaCreate) -> Geometria:
         """Crear una nueva geometría"""
@@ -28,6 +34,7 @@ class GeometriaRepository:
         geometria_dict["fechaActualizacion"] = datetime.utcnow()
         
         result = await self.collection.insert_one(geometria_dict)
+        get_geometria_tiles_index().invalidar()
         geometria_dict["id"] = str(result.inserted_id)
         geometria_dict["_id"] = result.inserted_id
         
@@ -82,6 +89,7 @@ class GeometriaRepository:
         """Eliminar geometría"""
         try:
             result = await self.collection.delete_one({"_id": ObjectId(geometria_id)})
+            get_geometria_tiles_index().invalidar()
             return result.deleted_count > 0
         except Exception:
             return False
@@ -89,6 +97,7 @@ class GeometriaRepository:
     async def eliminar_por_tipo(self, tipo: TipoGeometria) -> int:
         """Eliminar todas las geometrías de un tipo"""
         result = await self.collection.delete_many({"tipo": tipo})
+        get_geometria_tiles_index().invalidar()
         return result.deleted_count
     
     async def contar(self, filtros: Optional[FiltroGeometrias] = None) -> int:
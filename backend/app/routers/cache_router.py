@@ -0,0 +1,39 @@
+from fastapi import APIRouter
+from app.core.cache import get_cache
+from app.dependencies.auth import get_metricas_autenticacion
+from app.middleware.compression_middleware import get_metricas_compresion, reiniciar_metricas_compresion
+
+router = APIRouter(prefix="/cache", tags=["cache"])
+
+@router.get("/estadisticas")
+async def obtener_estadisticas_cache():
+    """Aciertos y fallos de caché por namespace, y estado de los niveles L1 (memoria) y L2 (Redis)"""
+    return get_cache().get_stats()
+
+@router.get("/estadisticas/autenticacion")
+async def obtener_estadisticas_autenticacion():
+    """Aciertos y latencia de la caché de usuarios en get_current_user"""
+    return get_metricas_autenticacion()
+
+@router.get("/estadisticas/compresion")
+async def obtener_estadisticas_compresion():
+    """Bytes originales y enviados, tiempo de compresión y aciertos de respuestas precomprimidas"""
+    return get_metricas_compresion()
+
+@router.delete("/estadisticas/compresion")
+async def reiniciar_estadisticas_compresion():
+    """Reiniciar los contadores de compresión"""
+    reiniciar_metricas_compresion()
+    return {"mensaje": "Estadísticas de compresión reiniciadas"}
+
+@router.delete("/estadisticas")
+async def reiniciar_estadisticas_cache():
+    """Reiniciar los contadores de aciertos y fallos"""
+    get_cache().reset_stats()
+    return {"mensaje": "Estadísticas de caché reiniciadas"}
+
+@router.delete("")
+async def invalidar_cache(patron: str = "*"):
+    """Invalidar las entradas que coinciden con el patrón (p. ej. documentos:*) en ambos niveles"""
+    eliminadas = get_cache().delete_pattern(patron)
+    return {"patron": patron, "eliminadas": eliminadas}
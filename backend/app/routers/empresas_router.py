@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Body, Response
 from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from bson import ObjectId
@@ -8,6 +8,9 @@ from app.dependencies.auth import get_current_active_user
 from app.dependencies.db import get_database
 from app.services.empresa_service import EmpresaService
 from app.services.empresa_excel_service import EmpresaExcelService
+from app.core.job_runner import get_job_runner, job_encolado
+from app.utils.respuesta_rapida import RespuestaJSONRapida, listar_documentos
+from app.utils.paginacion_cursor import CursorInvalido, cabeceras_paginacion, paginar
 from app.repositories.empresa_repository import EmpresaRepository
 from app.models.empresa import EmpresaCreate, EmpresaUpdate, EmpresaInDB, EmpresaResponse, EmpresaEstadisticas, EmpresaCambioEstado, CambioEstadoEmpresa, EmpresaCambioRepresentante, CambioRepresentanteLegal
 from app.utils.exceptions import (
@@ -304,9 +307,12 @@ async def get_historial_estados_empresa(
 
 @router.get("/", response_model=List[EmpresaResponse])
 async def get_empresas(
-    skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Número de registros a omitir (preferir cursor)"),
     limit: int = Query(10000, ge=1, le=10000, description="Número máximo de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Siguiente-Cursor)"),
     estado: str = Query(None, description="Filtrar por estado"),
+    ligero: bool = Query(False, description="Solo los campos de la vista de lista, serializados sin Pydantic (más rápido)"),
     empresa_service: EmpresaService = Depends(get_empresa_service)
 ) -> List[EmpresaResponse]:
     """Obtener lista de empresas con filtros opcionales"""
@@ -318,18 +324,26 @@ async def get_empresas(
         else:
             query = {"estaActivo": True}
         
-        cursor = empresa_service.collection.find(query).skip(skip).limit(limit)
-        docs = await cursor.to_list(length=limit)
+        if ligero:
+            pagina = await listar_documentos(empresa_service.collection, query, "empresas", skip, limit, cursor)
+            respuesta = RespuestaJSONRapida(pagina.documentos)
+            cabeceras_paginacion(respuesta, pagina)
+            return respuesta
+        
+        pagina = await paginar(empresa_service.collection, query, limit, cursor=cursor, skip=skip)
+        cabeceras_paginacion(response, pagina)
         
         # Convertir documentos a respuestas
         respuestas = []
-        for doc in docs:
+        for doc in pagina.documentos:
             # Convertir _id a id
             if "_id" in doc:
                 doc["id"] = str(doc.pop("_id"))
             respuestas.append(create_empresa_response(doc))
         
         return respuestas
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error en get_empresas: {str(e)}")
         import traceback
@@ -819,8 +833,11 @@ async def validar_archivo_empresas(
 
 @router.post("/carga-masiva/procesar")
 async def procesar_carga_masiva_empresas(
+    response: Response,
     archivo: UploadFile = File(..., description="Archivo Excel con empresas"),
-    solo_validar: bool = Query(False, description="Solo validar sin crear empresas")
+    solo_validar: bool = Query(False, description="Solo validar sin crear empresas"),
+    en_segundo_plano: bool = Query(False, description="Procesar como job y consultar el avance en /jobs/{id}"),
+    db = Depends(get_database)
 ):
     """Procesar carga masiva de empresas desde Excel"""
     
@@ -842,6 +859,23 @@ async def procesar_carga_masiva_empresas(
         if solo_validar:
             resultado = await excel_service.validar_archivo_excel(archivo_buffer)
             mensaje = f"Validación completada: {resultado['validos']} válidos, {resultado['invalidos']} inválidos"
+        elif en_segundo_plano:
+            async def trabajo(contexto):
+                async def on_progreso(procesadas, total):
+                    await contexto.progreso(procesadas, total, f"Empresa {procesadas} de {total}")
+                
+                resultado = await excel_service.procesar_carga_masiva(archivo_buffer, on_progreso=on_progreso)
+                await contexto.agregar_errores(resultado.get('errores', []) + resultado.get('errores_creacion', []))
+                resultado.pop('empresas_validas', None)
+                return resultado
+            
+            job_id = await get_job_runner(db).enqueue(
+                "carga_masiva_empresas", trabajo,
+                descripcion="Carga masiva de empresas",
+                parametros={"archivo": archivo.filename}
+            )
+            response.status_code = 202
+            return job_encolado(job_id)
         else:
             resultado = await excel_service.procesar_carga_masiva(archivo_buffer)
             mensaje = f"Procesamiento completado: {resultado.get('total_creadas', 0)} empresas creadas"
@@ -1,18 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from typing import Any, Dict, List, Optional
 from app.models.geometria import (
     Geometria, GeometriaResponse, GeometriaGeoJSON, 
     TipoGeometria, FiltroGeometrias
 )
 from app.repositories.geometria_repository import GeometriaRepository
+from app.core.job_runner import get_job_runner, job_encolado
+from app.middleware.compression_middleware import respuesta_precomprimida
+from app.services.geojson_import_service import GeojsonImportService, DESTINO_GEOMETRIAS, MODOS
+from app.services.geometria_tiles_index import get_geometria_tiles_index, limites_tesela, ZOOM_MAXIMO
 from app.database import get_database
 from pymongo.database import Database
 
 router = APIRouter(prefix="/geometrias", tags=["geometrias"])
 
+# Las teselas cambian solo al importar geometrías; el navegador revalida con If-None-Match
+CACHE_CONTROL_TESELAS = "public, max-age=300"
+
 def get_geometria_repository(db: Database = Depends(get_database)) -> GeometriaRepository:
     return GeometriaRepository(db)
 
+def _respuesta_geojson(request: Request, features: List[Dict[str, Any]], etag: str) -> Response:
+    """
+    FeatureCollection compacta con ETag, o 304 si el cliente ya la tiene
+    
+    El cuerpo comprimido se guarda por ETag: mientras el índice no cambie,
+    la misma tesela no se vuelve a serializar ni a comprimir.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL_TESELAS}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    
+    def generar() -> bytes:
+        return json.dumps(
+            {"type": "FeatureCollection", "features": features},
+            separators=(",", ":"), ensure_ascii=False, default=str
+        ).encode("utf-8")
+    
+    return respuesta_precomprimida(request, f"geometrias:{etag}", generar, headers=headers)
+
 @router.get("/", response_model=List[GeometriaResponse])
 async def listar_geometrias(
     tipo: Optional[TipoGeometria] = Query(None, description="Filtrar por tipo"),
@@ -34,12 +61,47 @@ async def listar_geometrias(
     )
     return await repo.listar(filtros)
 
+@router.get("/tiles/{z}/{x}/{y}", response_model=GeometriaGeoJSON)
+async def obtener_tesela_geometrias(
+    request: Request,
+    z: int,
+    x: int,
+    y: int,
+    tipo: TipoGeometria = Query(TipoGeometria.DISTRITO, description="Tipo de polígono (PROVINCIA, DISTRITO, ...)"),
+    departamento: Optional[str] = Query(None, description="Filtrar por departamento"),
+    provincia: Optional[str] = Query(None, description="Filtrar por provincia"),
+    distrito: Optional[str] = Query(None, description="Filtrar por distrito"),
+    db: Database = Depends(get_database)
+):
+    """
+    Tesela XYZ en GeoJSON con los polígonos que la tocan, simplificados para el zoom
+    
+    Pensado para una capa de teselas GeoJSON de Leaflet: cada polígono se envía
+    completo (sin recortar) con la precisión que se distingue en ese zoom, y
+    se identifica por `properties.id` para no dibujarlo dos veces. Responde con
+    ETag y 304 si la tesela no cambió.
+    """
+    if not 0 <= z <= ZOOM_MAXIMO or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail=f"Tesela fuera de rango: {z}/{x}/{y}")
+    
+    indice = get_geometria_tiles_index()
+    await indice.asegurar_cargado(db)
+    
+    features = indice.features(
+        tipo.value, zoom=z, caja=limites_tesela(z, x, y),
+        departamento=departamento, provincia=provincia, distrito=distrito
+    )
+    etag = indice.etag("tesela", tipo.value, z, departamento, provincia, distrito, features=features)
+    return _respuesta_geojson(request, features, etag)
+
 @router.get("/geojson", response_model=GeometriaGeoJSON)
 async def obtener_geometrias_geojson(
+    request: Request,
     tipo: Optional[str] = Query(None, description="Filtrar por tipo (PROVINCIA, DISTRITO, PROVINCIA_POINT, DISTRITO_POINT, CENTRO_POBLADO)"),
     departamento: Optional[str] = Query(None, description="Filtrar por departamento"),
     provincia: Optional[str] = Query(None, description="Filtrar por provincia"),
     distrito: Optional[str] = Query(None, description="Filtrar por distrito"),
+    zoom: Optional[int] = Query(None, ge=0, le=ZOOM_MAXIMO, description="Simplificar los polígonos para este zoom"),
     db: Database = Depends(get_database)
 ):
     """
@@ -51,10 +113,10 @@ async def obtener_geometrias_geojson(
     - PROVINCIA_POINT: Puntos de referencia de provincias
     - DISTRITO_POINT: Puntos de referencia de distritos
     - CENTRO_POBLADO: Puntos de centros poblados
-    """
-    from bson import ObjectId
     
-    geometrias_collection = db.geometrias
+    Los polígonos salen del índice en memoria con las propiedades de la
+    localidad ya unidas; con `zoom` se simplifican como en /tiles.
+    """
     localidades_collection = db.localidades
     
     # Tipos que son puntos de localidades (no geometrías)
@@ -116,55 +178,20 @@ async def obtener_geometrias_geojson(
         return GeometriaGeoJSON(features=features)
     
     else:
-        # Obtener polígonos desde geometrías (código original)
-        filtro = {}
-        if tipo:
-            filtro["tipo"] = tipo
+        # Polígonos desde el índice de geometrías
+        indice = get_geometria_tiles_index()
+        await indice.asegurar_cargado(db)
         
-        # Obtener geometrías
-        geometrias = await geometrias_collection.find(filtro).to_list(length=1000)
-        
-        # Convertir a formato GeoJSON con datos de localidades
+        tipos = [tipo] if tipo else indice.tipos
         features = []
-        for geom in geometrias:
-            try:
-                # Obtener datos de la localidad
-                localidad = await localidades_collection.find_one({"_id": ObjectId(geom["localidad_id"])})
-                
-                if not localidad:
-                    continue
-                
-                # Aplicar filtros de localidad
-                if departamento and localidad.get("departamento") != departamento:
-                    continue
-                if provincia and localidad.get("provincia") != provincia:
-                    continue
-                if distrito and localidad.get("distrito") != distrito:
-                    continue
-                
-                feature = {
-                    "type": "Feature",
-                    "geometry": geom["geometry"],
-                    "properties": {
-                        "id": str(geom["_id"]),
-                        "localidad_id": geom["localidad_id"],
-                        "nombre": localidad.get("nombre"),
-                        "tipo": geom["tipo"],
-                        "ubigeo": geom["ubigeo"],
-                        "departamento": localidad.get("departamento"),
-                        "provincia": localidad.get("provincia"),
-                        "distrito": localidad.get("distrito"),
-                        "poblacion": localidad.get("poblacion"),
-                        "estaActiva": localidad.get("estaActiva", True),
-                        **(geom.get("properties", {}))
-                    }
-                }
-                features.append(feature)
-            except Exception as e:
-                print(f"Error procesando geometría: {e}")
-                continue
+        for tipo_geometria in tipos:
+            features.extend(indice.features(
+                tipo_geometria, zoom=zoom,
+                departamento=departamento, provincia=provincia, distrito=distrito
+            ))
         
-        return GeometriaGeoJSON(features=features)
+        etag = indice.etag("geojson", tipo, zoom, departamento, provincia, distrito, features=features)
+        return _respuesta_geojson(request, features, etag)
 
 @router.get("/{geometria_id}", response_model=GeometriaResponse)
 async def obtener_geometria(
@@ -207,7 +234,9 @@ async def obtener_estadisticas(
 
 @router.post("/importar-desde-geojson")
 async def importar_geometrias_desde_geojson(
+    response: Response,
     modo: str = Query("ambos", description="crear, actualizar o ambos"),
+    en_segundo_plano: bool = Query(False, description="Procesar como job y consultar el avance en /jobs/{id}"),
     db: Database = Depends(get_database)
 ):
     """
@@ -217,136 +246,64 @@ async def importar_geometrias_desde_geojson(
     
     Las geometrías solo contienen el polígono y referencia a la localidad.
     Los datos (nombre, provincia, etc.) se obtienen de la colección localidades.
+    Cada archivo es una importación reanudable (ver
+    /localidades/importaciones-geojson).
     """
-    import json
     from pathlib import Path
-    from datetime import datetime
     
-    geometrias_collection = db.geometrias
-    localidades_collection = db.localidades
+    if modo not in MODOS:
+        raise HTTPException(status_code=400, detail=f"Modo inválido. Use: {', '.join(MODOS)}")
+    
+    servicio = GeojsonImportService(db)
     
     # Rutas a los archivos GeoJSON
     FRONTEND_PATH = Path(__file__).parent.parent.parent.parent / "frontend"
     GEOJSON_PATH = FRONTEND_PATH / "src" / "assets" / "geojson"
     
-    PROVINCIAS_GEOJSON = GEOJSON_PATH / "puno-provincias.geojson"
-    DISTRITOS_GEOJSON = GEOJSON_PATH / "puno-distritos.geojson"
+    archivos = [
+        ("provincias", GEOJSON_PATH / "puno-provincias.geojson", "PROVINCIA"),
+        ("distritos", GEOJSON_PATH / "puno-distritos.geojson", "DISTRITO")
+    ]
+    importaciones = []
+    for detalle, ruta, tipo in archivos:
+        if ruta.exists():
+            importacion_id = await servicio.crear_importacion(
+                DESTINO_GEOMETRIAS, ruta, ruta.name, modo=modo, tipo=tipo
+            )
+            importaciones.append((detalle, importacion_id))
     
-    resultado = {
-        "total_importados": 0,
-        "total_actualizados": 0,
-        "detalle": {
-            "provincias": {"importados": 0, "actualizados": 0, "errores": 0, "sin_localidad": 0},
-            "distritos": {"importados": 0, "actualizados": 0, "errores": 0, "sin_localidad": 0}
+    async def importar(contexto=None) -> Dict[str, Any]:
+        resultado = {
+            "total_importados": 0,
+            "total_actualizados": 0,
+            "detalle": {
+                detalle: {"importados": 0, "actualizados": 0, "errores": 0, "sin_localidad": 0}
+                for detalle, *_ in archivos
+            },
+            "importaciones": dict(importaciones)
         }
-    }
+        for detalle, importacion_id in importaciones:
+            resumen = await servicio.ejecutar(importacion_id, contexto)
+            resultado["detalle"][detalle] = {
+                "importados": resumen["creadas"],
+                "actualizados": resumen["actualizadas"],
+                "errores": resumen["errores"],
+                "sin_localidad": resumen["sin_localidad"]
+            }
+            resultado["total_importados"] += resumen["creadas"]
+            resultado["total_actualizados"] += resumen["actualizadas"]
+        return resultado
+    
+    if en_segundo_plano:
+        job_id = await get_job_runner(db).enqueue(
+            "importacion_geojson", importar,
+            descripcion=f"Importación de geometrías desde GeoJSON ({modo})",
+            parametros={"modo": modo, "importaciones": dict(importaciones)}
+        )
+        response.status_code = 202
+        return {**job_encolado(job_id), "importaciones": dict(importaciones)}
     
     try:
-        # 1. Importar PROVINCIAS (polígonos)
-        if PROVINCIAS_GEOJSON.exists():
-            with open(PROVINCIAS_GEOJSON, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            for feature in data['features']:
-                try:
-                    props = feature['properties']
-                    
-                    ubigeo = props.get('IDPROV', '').strip()
-                    
-                    if not ubigeo:
-                        continue
-                    
-                    # Buscar la localidad correspondiente
-                    localidad = await localidades_collection.find_one({
-                        "ubigeo": ubigeo,
-                        "tipo": "PROVINCIA"
-                    })
-                    
-                    if not localidad:
-                        resultado["detalle"]["provincias"]["sin_localidad"] += 1
-                        continue
-                    
-                    # Solo guardar geometría y referencia a localidad
-                    geometria_data = {
-                        "localidad_id": str(localidad["_id"]),
-                        "ubigeo": ubigeo,
-                        "tipo": "PROVINCIA",
-                        "geometry": feature['geometry'],
-                        "properties": props,  # Propiedades originales del GeoJSON
-                        "fechaActualizacion": datetime.utcnow()
-                    }
-                    
-                    existe = await geometrias_collection.find_one({"ubigeo": ubigeo, "tipo": "PROVINCIA"})
-                    
-                    if existe:
-                        if modo in ["actualizar", "ambos"]:
-                            await geometrias_collection.update_one({"_id": existe["_id"]}, {"$set": geometria_data})
-                            resultado["detalle"]["provincias"]["actualizados"] += 1
-                            resultado["total_actualizados"] += 1
-                    else:
-                        if modo in ["crear", "ambos"]:
-                            geometria_data["fechaCreacion"] = datetime.utcnow()
-                            await geometrias_collection.insert_one(geometria_data)
-                            resultado["detalle"]["provincias"]["importados"] += 1
-                            resultado["total_importados"] += 1
-                            
-                except Exception as e:
-                    print(f"Error importando provincia: {e}")
-                    resultado["detalle"]["provincias"]["errores"] += 1
-        
-        # 2. Importar DISTRITOS (polígonos)
-        if DISTRITOS_GEOJSON.exists():
-            with open(DISTRITOS_GEOJSON, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            for feature in data['features']:
-                try:
-                    props = feature['properties']
-                    
-                    ubigeo = props.get('UBIGEO', '').strip()
-                    
-                    if not ubigeo:
-                        continue
-                    
-                    # Buscar la localidad correspondiente
-                    localidad = await localidades_collection.find_one({
-                        "ubigeo": ubigeo,
-                        "tipo": {"$in": ["DISTRITO", "CIUDAD"]}
-                    })
-                    
-                    if not localidad:
-                        resultado["detalle"]["distritos"]["sin_localidad"] += 1
-                        continue
-                    
-                    # Solo guardar geometría y referencia a localidad
-                    geometria_data = {
-                        "localidad_id": str(localidad["_id"]),
-                        "ubigeo": ubigeo,
-                        "tipo": "DISTRITO",
-                        "geometry": feature['geometry'],
-                        "properties": props,  # Propiedades originales del GeoJSON
-                        "fechaActualizacion": datetime.utcnow()
-                    }
-                    
-                    existe = await geometrias_collection.find_one({"ubigeo": ubigeo, "tipo": "DISTRITO"})
-                    
-                    if existe:
-                        if modo in ["actualizar", "ambos"]:
-                            await geometrias_collection.update_one({"_id": existe["_id"]}, {"$set": geometria_data})
-                            resultado["detalle"]["distritos"]["actualizados"] += 1
-                            resultado["total_actualizados"] += 1
-                    else:
-                        if modo in ["crear", "ambos"]:
-                            geometria_data["fechaCreacion"] = datetime.utcnow()
-                            await geometrias_collection.insert_one(geometria_data)
-                            resultado["detalle"]["distritos"]["importados"] += 1
-                            resultado["total_importados"] += 1
-                            
-                except Exception as e:
-                    print(f"Error importando distrito: {e}")
-                    resultado["detalle"]["distritos"]["errores"] += 1
-        
-        return resultado
-        
+        return await importar()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en importación: {str(e)}")
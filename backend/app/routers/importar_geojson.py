@@ -2,34 +2,44 @@
 Endpoint para importar localidades desde archivos GeoJSON
 Maneja correctamente los ubigeos según el tipo de localidad
 """
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Body
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Body, Query, Response
 from app.dependencies.db import get_database
-from typing import Dict, Any
-import json
-from datetime import datetime
-from bson import ObjectId
+from app.core.job_runner import job_encolado
+from app.services.geojson_import_service import (
+    GeojsonImportService, DESTINO_LOCALIDADES, EstadoImportacion
+)
+from typing import Dict, Any, Optional
+from pathlib import Path
 
 router = APIRouter(prefix="/localidades", tags=["localidades-importacion"])
 
 @router.post("/importar-geojson-data")
 async def importar_localidades_geojson_data(
+    response: Response,
     geojson_data: Dict[str, Any] = Body(..., description="Datos GeoJSON"),
     tipo_localidad: str = "auto",
     sobrescribir: bool = False,
+    en_segundo_plano: bool = Query(False, description="Procesar como job y consultar el avance en /jobs/{id}"),
     db = Depends(get_database)
 ):
     """
     Importa localidades desde datos GeoJSON enviados directamente.
     Útil para importar desde el frontend sin subir archivo.
     """
-    return await procesar_geojson(geojson_data, tipo_localidad, sobrescribir, db, "datos-directos")
+    if geojson_data.get('type') != 'FeatureCollection':
+        raise HTTPException(status_code=400, detail="El archivo debe ser un FeatureCollection")
+    
+    ruta = await GeojsonImportService.guardar_datos(geojson_data)
+    return await procesar_geojson(ruta, tipo_localidad, sobrescribir, db, "datos-directos", en_segundo_plano, response)
 
 
 @router.post("/importar-geojson")
 async def importar_localidades_geojson(
+    response: Response,
     archivo: UploadFile = File(None, description="Archivo GeoJSON"),
     tipo_localidad: str = "auto",  # auto, provincia, distrito, centro_poblado
     sobrescribir: bool = False,
+    en_segundo_plano: bool = Query(False, description="Procesar como job y consultar el avance en /jobs/{id}"),
     db = Depends(get_database)
 ):
     """
@@ -44,6 +54,11 @@ async def importar_localidades_geojson(
     - archivo: Archivo GeoJSON a importar (opcional si se envía JSON en body)
     - tipo_localidad: Tipo de localidades en el archivo (auto detecta)
     - sobrescribir: Si es True, actualiza localidades existentes
+    - en_segundo_plano: Responde 202 con el id del job; si falla, se
+      reanuda con POST /localidades/importaciones-geojson/{id}/reanudar
+    
+    El archivo se lee en streaming y se escribe por lotes, así que no se
+    carga completo en memoria.
     """
     
     if not archivo:
@@ -52,157 +67,113 @@ async def importar_localidades_geojson(
     if not archivo.filename.endswith('.geojson') and not archivo.filename.endswith('.json'):
         raise HTTPException(status_code=400, detail="El archivo debe ser .geojson o .json")
     
-    try:
-        # Leer archivo
-        contenido = await archivo.read()
-        geojson_data = json.loads(contenido)
-        
-        return await procesar_geojson(geojson_data, tipo_localidad, sobrescribir, db, archivo.filename)
-        
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="El archivo no es un JSON válido")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al procesar archivo: {str(e)}")
+    ruta = await GeojsonImportService.guardar_archivo(archivo.file)
+    return await procesar_geojson(ruta, tipo_localidad, sobrescribir, db, archivo.filename, en_segundo_plano, response)
 
 
 async def procesar_geojson(
-    geojson_data: Dict[str, Any],
+    ruta: Path,
     tipo_localidad: str,
     sobrescribir: bool,
     db,
-    nombre_archivo: str = "geojson"
+    nombre_archivo: str = "geojson",
+    en_segundo_plano: bool = False,
+    response: Optional[Response] = None
 ):
     """
-    Función auxiliar para procesar datos GeoJSON
+    Función auxiliar para importar un archivo GeoJSON ya guardado
+    
+    sobrescribir=False solo crea las localidades nuevas; True además
+    actualiza las existentes.
     """
-    if geojson_data.get('type') != 'FeatureCollection':
-        raise HTTPException(status_code=400, detail="El archivo debe ser un FeatureCollection")
-        
-        features = geojson_data.get('features', [])
-        localidades_collection = db["localidades"]
-        
-        total_procesadas = 0
-        total_creadas = 0
-        total_actualizadas = 0
-        total_errores = 0
-        errores = []
-        
-        for feature in features:
-            try:
-                properties = feature.get('properties', {})
-                geometry = feature.get('geometry', {})
-                
-                # Extraer coordenadas
-                coordenadas = None
-                if geometry.get('type') == 'Point':
-                    coords = geometry.get('coordinates', [])
-                    if len(coords) >= 2:
-                        coordenadas = {
-                            'longitud': coords[0],
-                            'latitud': coords[1]
-                        }
-                elif geometry.get('type') in ['Polygon', 'MultiPolygon']:
-                    # Para polígonos, calcular centroide aproximado
-                    # Por ahora, usar el primer punto
-                    coords_array = geometry.get('coordinates', [])
-                    if coords_array:
-                        # Navegar hasta encontrar el primer par de coordenadas
-                        first_coord = coords_array
-                        while isinstance(first_coord[0], list):
-                            first_coord = first_coord[0]
-                        if len(first_coord) >= 2:
-                            coordenadas = {
-                                'longitud': first_coord[0],
-                                'latitud': first_coord[1]
-                            }
-                
-                # Determinar tipo y ubigeo correcto
-                tipo = None
-                ubigeo = None
-                
-                # Detectar tipo automáticamente
-                if 'IDPROV' in properties or 'NOMBPROV' in properties:
-                    tipo = 'PROVINCIA'
-                    ubigeo = properties.get('IDPROV')  # 4 dígitos
-                elif 'UBIGEO' in properties and len(str(properties.get('UBIGEO', ''))) == 6:
-                    tipo = 'DISTRITO'
-                    ubigeo = properties.get('UBIGEO')  # 6 dígitos
-                elif 'IDCCPP' in properties:
-                    tipo = 'CENTRO_POBLADO'
-                    ubigeo = properties.get('IDCCPP')  # 10 dígitos
-                
-                # Si no se detectó, usar el tipo especificado
-                if not tipo and tipo_localidad != 'auto':
-                    tipo = tipo_localidad.upper()
-                
-                if not tipo:
-                    errores.append(f"No se pudo determinar el tipo para: {properties.get('nombre', 'Sin nombre')}")
-                    total_errores += 1
-                    continue
-                
-                # Construir documento de localidad
-                localidad_doc = {
-                    'nombre': properties.get('NOMBPROV') or properties.get('DISTRITO') or properties.get('NOMB_CCPP') or properties.get('nombre', 'Sin nombre'),
-                    'tipo': tipo,
-                    'ubigeo': str(ubigeo) if ubigeo else None,
-                    'departamento': properties.get('NOMBDEP') or properties.get('DEPARTAMEN') or properties.get('NOMB_DEPAR', 'PUNO'),
-                    'provincia': properties.get('NOMBPROV') or properties.get('PROVINCIA') or properties.get('NOMB_PROVI'),
-                    'distrito': properties.get('DISTRITO') or properties.get('NOMB_DISTR'),
-                    'coordenadas': coordenadas,
-                    'poblacion': properties.get('POBTOTAL') or properties.get('POBTOTAL'),
-                    'codigo_ccpp': properties.get('COD_CCPP'),
-                    'tipo_area': properties.get('TIPO'),
-                    'altitud': properties.get('altitud'),
-                    'descripcion': f"{tipo} de {properties.get('NOMBPROV') or properties.get('DISTRITO') or properties.get('NOMB_CCPP', '')}",
-                    'estaActiva': True,
-                    'fechaCreacion': datetime.utcnow(),
-                    'fechaActualizacion': datetime.utcnow()
-                }
-                
-                # Limpiar valores None
-                localidad_doc = {k: v for k, v in localidad_doc.items() if v is not None}
-                
-                total_procesadas += 1
-                
-                # Verificar si existe
-                if ubigeo:
-                    existente = await localidades_collection.find_one({'ubigeo': str(ubigeo)})
-                else:
-                    existente = await localidades_collection.find_one({
-                        'nombre': localidad_doc['nombre'],
-                        'tipo': tipo
-                    })
-                
-                if existente:
-                    if sobrescribir:
-                        # Actualizar
-                        await localidades_collection.update_one(
-                            {'_id': existente['_id']},
-                            {'$set': localidad_doc}
-                        )
-                        total_actualizadas += 1
-                    # Si no sobrescribir, simplemente saltar
-                else:
-                    # Crear nueva
-                    localidad_doc['id'] = str(ObjectId())
-                    await localidades_collection.insert_one(localidad_doc)
-                    total_creadas += 1
-                    
-            except Exception as e:
-                total_errores += 1
-                errores.append(f"Error procesando feature: {str(e)}")
-        
-        return {
-            'mensaje': 'Importación completada',
-            'archivo': nombre_archivo,
-            'total_procesadas': total_procesadas,
-            'total_creadas': total_creadas,
-            'total_actualizadas': total_actualizadas,
-            'total_errores': total_errores,
-            'errores': errores[:20],  # Solo primeros 20 errores
-            'resumen_ubigeos': {
-                'provincias': '4 dígitos (IDPROV)',
-                'distritos': '6 dígitos (UBIGEO)',
-                'centros_poblados': '10 dígitos (IDCCPP)'
-            }
+    servicio = GeojsonImportService(db)
+    importacion_id = await servicio.crear_importacion(
+        DESTINO_LOCALIDADES, ruta, nombre_archivo,
+        modo="ambos" if sobrescribir else "crear",
+        tipo=tipo_localidad, temporal=True
+    )
+    
+    if en_segundo_plano:
+        job_id = await servicio.encolar(importacion_id)
+        if response is not None:
+            response.status_code = 202
+        return {**job_encolado(job_id), "importacion_id": importacion_id}
+    
+    try:
+        resumen = await servicio.ejecutar(importacion_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{e}. Importación {importacion_id}: corrija el archivo o reanúdela"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al procesar archivo: {str(e)}. Puede reanudar la importación {importacion_id}"
+        )
+    
+    return {
+        'mensaje': 'Importación completada',
+        'importacion_id': importacion_id,
+        'archivo': nombre_archivo,
+        'total_procesadas': resumen['procesadas'],
+        'total_creadas': resumen['creadas'],
+        'total_actualizadas': resumen['actualizadas'],
+        'total_duplicadas': resumen['duplicadas'],
+        'total_errores': resumen['errores'],
+        'errores': resumen['errores_detalle'],  # Solo primeros 20 errores
+        'resumen_ubigeos': {
+            'provincias': '4 dígitos (IDPROV)',
+            'distritos': '6 dígitos (UBIGEO)',
+            'centros_poblados': '10 dígitos (IDCCPP)'
         }
+    }
+
+
+@router.get("/importaciones-geojson")
+async def listar_importaciones_geojson(
+    estado: Optional[str] = Query(None, description="PENDIENTE, EN_PROCESO, COMPLETADA, FALLIDA o INTERRUMPIDA"),
+    limit: int = Query(50, ge=1, le=200),
+    db = Depends(get_database)
+):
+    """Listar las importaciones GeoJSON más recientes con su checkpoint"""
+    return await GeojsonImportService(db).listar_importaciones(estado=estado, limit=limit)
+
+
+@router.get("/importaciones-geojson/{importacion_id}")
+async def obtener_importacion_geojson(importacion_id: str, db = Depends(get_database)):
+    """Estado, contadores y últimos errores de una importación GeoJSON"""
+    importacion = await GeojsonImportService(db).obtener_importacion(importacion_id)
+    if not importacion:
+        raise HTTPException(status_code=404, detail=f"Importación {importacion_id} no encontrada")
+    return importacion
+
+
+@router.post("/importaciones-geojson/{importacion_id}/reanudar")
+async def reanudar_importacion_geojson(
+    importacion_id: str,
+    response: Response,
+    forzar: bool = Query(False, description="Reanudar aunque figure EN_PROCESO (worker detenido)"),
+    db = Depends(get_database)
+):
+    """
+    Reanudar en segundo plano una importación fallida o interrumpida
+    desde la última feature guardada
+    """
+    servicio = GeojsonImportService(db)
+    importacion = await servicio.obtener_importacion(importacion_id)
+    if not importacion:
+        raise HTTPException(status_code=404, detail=f"Importación {importacion_id} no encontrada")
+    if importacion["estado"] not in EstadoImportacion.REANUDABLES and not (
+        forzar and importacion["estado"] == EstadoImportacion.EN_PROCESO
+    ):
+        raise HTTPException(status_code=409, detail=f"La importación está {importacion['estado']}")
+    
+    if forzar:
+        await servicio.collection.update_one(
+            {"_id": importacion_id, "estado": EstadoImportacion.EN_PROCESO},
+            {"$set": {"estado": EstadoImportacion.INTERRUMPIDA}}
+        )
+    job_id = await servicio.encolar(importacion_id)
+    response.status_code = 202
+    return {**job_encolado(job_id), "importacion_id": importacion_id, "desde_feature": importacion["procesados"]}
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Query
+from typing import List, Optional
+from app.dependencies.db import get_database
+from app.core.indices import indices_declarados, reporte_indices, sincronizar_indices
+
+router = APIRouter(prefix="/indices", tags=["indices"])
+
+@router.get("/declarados")
+async def listar_indices_declarados():
+    """Índices que declaran los servicios, por colección"""
+    return indices_declarados()
+
+@router.get("/reporte")
+async def obtener_reporte_indices(
+    coleccion: Optional[List[str]] = Query(None, description="Solo estas colecciones"),
+    db = Depends(get_database)
+):
+    """Índices faltantes, en conflicto, sobrantes y sin uso ($indexStats), y planes de las consultas representativas"""
+    return await reporte_indices(db, coleccion)
+
+@router.post("/sincronizar")
+async def sincronizar(
+    coleccion: Optional[List[str]] = Query(None, description="Solo estas colecciones"),
+    reemplazar_conflictos: bool = Query(False, description="Recrear los índices cuyo nombre existe con otra definición"),
+    db = Depends(get_database)
+):
+    """Crear los índices declarados que falten (no borra los sobrantes)"""
+    return await sincronizar_indices(db, coleccion, reemplazar_conflictos=reemplazar_conflictos)
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from app.dependencies.db import get_database
+from app.core.job_runner import get_job_runner
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.get("")
+async def listar_jobs(
+    tipo: Optional[str] = Query(None, description="Tipo de job, p. ej. carga_masiva_rutas"),
+    status: Optional[str] = Query(None, description="PENDING, RUNNING, COMPLETED, FAILED o CANCELLED"),
+    limit: int = Query(50, ge=1, le=200),
+    db = Depends(get_database)
+):
+    """Listar los jobs más recientes (sin resultado ni errores)"""
+    return await get_job_runner(db).list_jobs(tipo=tipo, status=status, limit=limit)
+
+@router.get("/{job_id}")
+async def obtener_job(job_id: str, db = Depends(get_database)):
+    """Estado de un job: progreso, errores parciales y resultado al terminar"""
+    job = await get_job_runner(db).get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} no encontrado")
+    return job
+
+@router.post("/{job_id}/cancelar")
+async def cancelar_job(job_id: str, db = Depends(get_database)):
+    """Solicitar la cancelación de un job pendiente o en ejecución"""
+    runner = get_job_runner(db)
+    if not await runner.cancel(job_id):
+        job = await runner.get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} no encontrado")
+        raise HTTPException(status_code=409, detail=f"El job ya terminó con estado {job['status']}")
+    return {"job_id": job_id, "mensaje": "Cancelación solicitada"}
@@ -5,6 +5,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 from app.dependencies.db import get_database
 from app.services.localidad_alias_service import LocalidadAliasService
+from app.services.localidad_alias_index import get_localidad_alias_index
 from app.models.localidad_alias import (
     LocalidadAlias,
     LocalidadAliasCreate,
@@ -64,6 +65,18 @@ async def buscar_por_alias(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en búsqueda: {str(e)}")
 
+@router.post("/resolver")
+async def resolver_nombres(
+    nombres: List[str],
+    db = Depends(get_database)
+):
+    """Resolver en lote nombres de localidades (alias u oficiales); los no encontrados vienen en null"""
+    try:
+        service = LocalidadAliasService(db)
+        return await service.resolver_nombres(nombres)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en búsqueda: {str(e)}")
+
 @router.get("/estadisticas/mas-usados")
 async def get_alias_mas_usados(
     limit: int = Query(10, ge=1, le=50),
@@ -194,6 +207,8 @@ async def actualizar_ids_antiguos(db = Depends(get_database)):
                 eliminados += 1
                 detalles.append(f"Eliminado: Alias '{alias_doc.get('alias')}' (localidad '{localidad_nombre}' no existe)")
         
+        get_localidad_alias_index().invalidar()
+        
         return {
             "total_procesados": len(alias_docs),
             "actualizados": actualizados,
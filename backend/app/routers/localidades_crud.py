@@ -2,7 +2,7 @@
 Router CRUD para localidades
 Endpoints básicos de creación, lectura, actualización y eliminación
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
@@ -11,8 +11,12 @@ from app.services.localidad_service import LocalidadService
 from app.models.localidad import (
     LocalidadCreate, LocalidadUpdate, LocalidadResponse,
     FiltroLocalidades, LocalidadesPaginadas, TipoLocalidad,
-    ValidacionUbigeo, RespuestaValidacionUbigeo
+    ValidacionUbigeo, RespuestaValidacionUbigeo,
+    LocalidadCercana, LocalidadContenedora, SolicitudDistancias
 )
+from app.services.distancia_matriz_service import get_distancia_matriz_service
+from app.models.geometria import TipoGeometria
+from app.utils.paginacion_cursor import CursorInvalido, cabeceras_paginacion
 
 router = APIRouter(prefix="/localidades", tags=["localidades-crud"])
 
@@ -35,13 +39,15 @@ async def crear_localidad(
 
 @router.get("/", response_model=List[LocalidadResponse])
 async def obtener_localidades(
+    response: Response,
     nombre: Optional[str] = Query(None, description="Filtrar por nombre"),
     tipo: Optional[TipoLocalidad] = Query(None, description="Filtrar por tipo"),
     departamento: Optional[str] = Query(None, description="Filtrar por departamento"),
     provincia: Optional[str] = Query(None, description="Filtrar por provincia"),
     estaActiva: Optional[bool] = Query(None, description="Filtrar por estado"),
-    skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+    skip: int = Query(0, ge=0, description="Número de registros a omitir (preferir cursor)"),
     limit: int = Query(10000, ge=1, le=20000, description="Número máximo de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Siguiente-Cursor)"),
     service: LocalidadService = Depends(get_localidad_service)
 ) -> List[LocalidadResponse]:
     """Obtener localidades con filtros opcionales"""
@@ -53,8 +59,12 @@ async def obtener_localidades(
         estaActiva=estaActiva
     )
     
-    localidades = await service.get_localidades(filtros, skip, limit)
-    return [LocalidadResponse(**localidad.model_dump()) for localidad in localidades]
+    try:
+        pagina = await service.get_localidades_pagina(filtros, limit, cursor=cursor, skip=skip)
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cabeceras_paginacion(response, pagina)
+    return [LocalidadResponse(**localidad.model_dump()) for localidad in pagina.documentos]
 
 @router.get("/paginadas", response_model=LocalidadesPaginadas)
 async def obtener_localidades_paginadas(
@@ -65,6 +75,7 @@ async def obtener_localidades_paginadas(
     departamento: Optional[str] = Query(None, description="Filtrar por departamento"),
     provincia: Optional[str] = Query(None, description="Filtrar por provincia"),
     estaActiva: Optional[bool] = Query(None, description="Filtrar por estado"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (siguienteCursor de la respuesta anterior)"),
     service: LocalidadService = Depends(get_localidad_service)
 ) -> LocalidadesPaginadas:
     """Obtener localidades paginadas"""
@@ -76,7 +87,10 @@ async def obtener_localidades_paginadas(
         estaActiva=estaActiva
     )
     
-    return await service.get_localidades_paginadas(pagina, limite, filtros)
+    try:
+        return await service.get_localidades_paginadas(pagina, limite, filtros, cursor)
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/activas", response_model=List[LocalidadResponse])
 async def obtener_localidades_activas(
@@ -103,6 +117,39 @@ async def buscar_localidades(
     localidades = await service.buscar_localidades(q, limite)
     return [LocalidadResponse(**localidad.model_dump()) for localidad in localidades]
 
+@router.get("/cercanas", response_model=List[LocalidadCercana])
+async def obtener_localidades_cercanas(
+    lat: float = Query(..., ge=-90, le=90, description="Latitud del punto"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitud del punto"),
+    limite: int = Query(10, ge=1, le=100, description="Cantidad de localidades"),
+    tipo: Optional[TipoLocalidad] = Query(None, description="Filtrar por tipo"),
+    service: LocalidadService = Depends(get_localidad_service)
+) -> List[LocalidadCercana]:
+    """Las N localidades más cercanas a un punto, ordenadas por distancia"""
+    return await service.buscar_cercanas(lat, lon, limite=limite, tipo=tipo)
+
+@router.get("/en-radio", response_model=List[LocalidadCercana])
+async def obtener_localidades_en_radio(
+    lat: float = Query(..., ge=-90, le=90, description="Latitud del punto"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitud del punto"),
+    radio_km: float = Query(..., gt=0, le=1000, description="Radio de búsqueda en km"),
+    tipo: Optional[TipoLocalidad] = Query(None, description="Filtrar por tipo"),
+    limite: int = Query(500, ge=1, le=5000, description="Número máximo de localidades"),
+    service: LocalidadService = Depends(get_localidad_service)
+) -> List[LocalidadCercana]:
+    """Localidades dentro de un radio alrededor de un punto, ordenadas por distancia"""
+    return await service.buscar_cercanas(lat, lon, limite=limite, radio_km=radio_km, tipo=tipo)
+
+@router.get("/en-punto", response_model=List[LocalidadContenedora])
+async def obtener_localidades_en_punto(
+    lat: float = Query(..., ge=-90, le=90, description="Latitud del punto"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitud del punto"),
+    tipo: Optional[TipoGeometria] = Query(None, description="Solo polígonos de este tipo (PROVINCIA, DISTRITO, ...)"),
+    service: LocalidadService = Depends(get_localidad_service)
+) -> List[LocalidadContenedora]:
+    """Provincia, distrito y demás polígonos que contienen un punto"""
+    return await service.buscar_contenedoras(lat, lon, tipo.value if tipo else None)
+
 @router.get("/{localidad_id}", response_model=LocalidadResponse)
 async def obtener_localidad(
     localidad_id: str,
@@ -215,10 +262,49 @@ async def calcular_distancia(
     destino_id: str,
     service: LocalidadService = Depends(get_localidad_service)
 ) -> dict:
-    """Calcular distancia entre dos localidades"""
+    """Calcular distancia en línea recta entre dos localidades (null si falta alguna coordenada)"""
     distancia = await service.calcular_distancia(origen_id, destino_id)
     return {"distancia": distancia, "unidad": "km"}
 
+@router.post("/distancias/matriz")
+async def calcular_matriz_distancias(
+    solicitud: SolicitudDistancias,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+) -> dict:
+    """
+    Matriz NxN de distancias en línea recta (km) entre localidades
+    
+    `ids` indica el orden de filas y columnas; las localidades sin coordenadas
+    se omiten y se devuelven en `faltantes`.
+    """
+    service = get_distancia_matriz_service()
+    await service.asegurar_cargado(db)
+    resultado = await service.matriz_lista(solicitud.ids)
+    return {
+        "ids": resultado["ids"],
+        "faltantes": resultado["faltantes"],
+        "matriz_km": resultado["matriz_km"],
+        "unidad": "km"
+    }
+
+@router.post("/distancias/itinerario")
+async def calcular_distancias_itinerario(
+    solicitud: SolicitudDistancias,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+) -> dict:
+    """Distancias por tramo y acumuladas (km) de un recorrido dado en orden"""
+    service = get_distancia_matriz_service()
+    await service.asegurar_cargado(db)
+    resultado = service.itinerario(solicitud.ids)
+    return {
+        "ids": resultado["ids"],
+        "faltantes": resultado["faltantes"],
+        "tramos_km": resultado["tramos_km"].round(3).tolist(),
+        "acumulada_km": resultado["acumulada_km"].round(3).tolist(),
+        "total_km": round(resultado["total_km"], 3),
+        "unidad": "km"
+    }
+
 @router.post("/inicializar")
 async def inicializar_localidades_sistema(
     service: LocalidadService = Depends(get_localidad_service)
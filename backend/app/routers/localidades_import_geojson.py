@@ -1,227 +1,87 @@
 """
 Router para importación masiva de localidades desde archivos GeoJSON
 """
-from fastapi import APIRouter, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, HTTPException, Query, Response
 from typing import Dict, Any
-import json
 from pathlib import Path
 from datetime import datetime
 
 from app.database import get_database
+from app.core.job_runner import get_job_runner, job_encolado
 from app.models.localidad import TipoLocalidad
 from app.models.geometria import ImportarGeometriasPayload
+from app.services.geojson_import_service import GeojsonImportService, DESTINO_LOCALIDADES, MODOS
+from app.services.geometria_tiles_index import get_geometria_tiles_index
 
 router = APIRouter()
 
 
 @router.post("/importar-desde-geojson")
 async def importar_desde_geojson(
+    response: Response,
     modo: str = Query("ambos", description="crear, actualizar o ambos"),
     provincias: bool = Query(True, description="Importar provincias"),
     distritos: bool = Query(True, description="Importar distritos"),
-    centros_poblados: bool = Query(True, description="Importar centros poblados")
+    centros_poblados: bool = Query(True, description="Importar centros poblados"),
+    en_segundo_plano: bool = Query(False, description="Procesar como job y consultar el avance en /jobs/{id}")
 ) -> Dict[str, Any]:
     """
     Importa localidades desde archivos GeoJSON
+    
+    Cada archivo es una importación reanudable (ver
+    /localidades/importaciones-geojson): se lee en streaming y se escribe
+    con upserts por lotes.
     """
+    if modo not in MODOS:
+        raise HTTPException(status_code=400, detail=f"Modo inválido. Use: {', '.join(MODOS)}")
+    
     db = await get_database()
-    localidades_collection = db.localidades
+    servicio = GeojsonImportService(db)
     
-    resultado = {
-        "total_importados": 0,
-        "total_actualizados": 0,
-        "total_errores": 0,
-        "detalle": {
-            "provincias": 0,
-            "distritos": 0,
-            "centros_poblados": 0
+    # Rutas a los archivos GeoJSON
+    FRONTEND_PATH = Path(__file__).parent.parent.parent.parent / "frontend"
+    GEOJSON_PATH = FRONTEND_PATH / "src" / "assets" / "geojson"
+    
+    archivos = [
+        ("provincias", provincias, GEOJSON_PATH / "puno-provincias-point.geojson", TipoLocalidad.PROVINCIA),
+        ("distritos", distritos, GEOJSON_PATH / "puno-distritos-point.geojson", TipoLocalidad.DISTRITO),
+        ("centros_poblados", centros_poblados, GEOJSON_PATH / "puno-centrospoblados.geojson", TipoLocalidad.CENTRO_POBLADO)
+    ]
+    importaciones = []
+    for detalle, incluir, ruta, tipo in archivos:
+        if incluir and ruta.exists():
+            importacion_id = await servicio.crear_importacion(
+                DESTINO_LOCALIDADES, ruta, ruta.name, modo=modo, tipo=tipo.value
+            )
+            importaciones.append((detalle, importacion_id))
+    
+    async def importar(contexto=None) -> Dict[str, Any]:
+        resultado = {
+            "total_importados": 0,
+            "total_actualizados": 0,
+            "total_errores": 0,
+            "detalle": {detalle: 0 for detalle, *_ in archivos},
+            "importaciones": {detalle: importacion_id for detalle, importacion_id in importaciones}
         }
-    }
+        for detalle, importacion_id in importaciones:
+            resumen = await servicio.ejecutar(importacion_id, contexto)
+            resultado["total_importados"] += resumen["creadas"]
+            resultado["total_actualizados"] += resumen["actualizadas"]
+            resultado["total_errores"] += resumen["errores"]
+            resultado["detalle"][detalle] = resumen["creadas"] + resumen["actualizadas"] + resumen["existentes"]
+        return resultado
+    
+    if en_segundo_plano:
+        job_id = await get_job_runner(db).enqueue(
+            "importacion_geojson", importar,
+            descripcion=f"Importación de localidades desde GeoJSON ({modo})",
+            parametros={"modo": modo, "importaciones": dict(importaciones)}
+        )
+        response.status_code = 202
+        return {**job_encolado(job_id), "importaciones": dict(importaciones)}
     
     try:
-        # Rutas a los archivos GeoJSON
-        FRONTEND_PATH = Path(__file__).parent.parent.parent.parent / "frontend"
-        GEOJSON_PATH = FRONTEND_PATH / "src" / "assets" / "geojson"
-        
-        PROVINCIAS_POINT = GEOJSON_PATH / "puno-provincias-point.geojson"
-        DISTRITOS_POINT = GEOJSON_PATH / "puno-distritos-point.geojson"
-        CENTROS_POBLADOS = GEOJSON_PATH / "puno-centrospoblados.geojson"
-        
-        # 1. Importar PROVINCIAS
-        if provincias and PROVINCIAS_POINT.exists():
-            with open(PROVINCIAS_POINT, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            for feature in data['features']:
-                try:
-                    props = feature['properties']
-                    coords = feature['geometry']['coordinates']
-                    
-                    nombre = props.get('NOMBPROV', '').strip()
-                    ubigeo = props.get('IDPROV', '').strip()
-                    
-                    if not nombre or not ubigeo:
-                        continue
-                    
-                    localidad_data = {
-                        "nombre": nombre,
-                        "tipo": TipoLocalidad.PROVINCIA,
-                        "ubigeo": ubigeo,
-                        "departamento": "PUNO",
-                        "provincia": nombre,
-                        "distrito": nombre,
-                        "coordenadas": {
-                            "longitud": coords[0],
-                            "latitud": coords[1]
-                        },
-                        "estaActiva": True,
-                        "fechaActualizacion": datetime.utcnow()
-                    }
-                    
-                    existe = await localidades_collection.find_one({
-                        "ubigeo": ubigeo,
-                        "tipo": TipoLocalidad.PROVINCIA
-                    })
-                    
-                    if existe:
-                        if modo in ["actualizar", "ambos"]:
-                            await localidades_collection.update_one(
-                                {"_id": existe["_id"]},
-                                {"$set": localidad_data}
-                            )
-                            resultado["total_actualizados"] += 1
-                    else:
-                        if modo in ["crear", "ambos"]:
-                            localidad_data["fechaCreacion"] = datetime.utcnow()
-                            await localidades_collection.insert_one(localidad_data)
-                            resultado["total_importados"] += 1
-                    
-                    resultado["detalle"]["provincias"] += 1
-                    
-                except Exception as e:
-                    print(f"Error importando provincia: {e}")
-                    resultado["total_errores"] += 1
-        
-        # 2. Importar DISTRITOS
-        if distritos and DISTRITOS_POINT.exists():
-            with open(DISTRITOS_POINT, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            for feature in data['features']:
-                try:
-                    props = feature['properties']
-                    coords = feature['geometry']['coordinates']
-                    
-                    nombre = props.get('DISTRITO', '').strip()
-                    provincia = props.get('PROVINCIA', '').strip()
-                    ubigeo = props.get('UBIGEO', '').strip()
-                    
-                    if not nombre or not ubigeo:
-                        continue
-                    
-                    localidad_data = {
-                        "nombre": nombre,
-                        "tipo": TipoLocalidad.DISTRITO,
-                        "ubigeo": ubigeo,
-                        "departamento": "PUNO",
-                        "provincia": provincia,
-                        "distrito": nombre,
-                        "coordenadas": {
-                            "longitud": coords[0],
-                            "latitud": coords[1]
-                        },
-                        "estaActiva": True,
-                        "fechaActualizacion": datetime.utcnow()
-                    }
-                    
-                    existe = await localidades_collection.find_one({
-                        "ubigeo": ubigeo,
-                        "tipo": TipoLocalidad.DISTRITO
-                    })
-                    
-                    if existe:
-                        if modo in ["actualizar", "ambos"]:
-                            await localidades_collection.update_one(
-                                {"_id": existe["_id"]},
-                                {"$set": localidad_data}
-                            )
-                            resultado["total_actualizados"] += 1
-                    else:
-                        if modo in ["crear", "ambos"]:
-                            localidad_data["fechaCreacion"] = datetime.utcnow()
-                            await localidades_collection.insert_one(localidad_data)
-                            resultado["total_importados"] += 1
-                    
-                    resultado["detalle"]["distritos"] += 1
-                    
-                except Exception as e:
-                    print(f"Error importando distrito: {e}")
-                    resultado["total_errores"] += 1
-        
-        # 3. Importar CENTROS POBLADOS
-        if centros_poblados and CENTROS_POBLADOS.exists():
-            with open(CENTROS_POBLADOS, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            for feature in data['features']:
-                try:
-                    props = feature['properties']
-                    coords = feature['geometry']['coordinates']
-                    
-                    nombre = props.get('NOMB_CCPP', '').strip()
-                    provincia = props.get('NOMB_PROVI', 'PUNO').strip()
-                    distrito = props.get('NOMB_DISTR', '').strip()
-                    ubigeo = props.get('IDCCPP', '').strip()
-                    
-                    if not nombre:
-                        continue
-                    
-                    localidad_data = {
-                        "nombre": nombre,
-                        "tipo": TipoLocalidad.CENTRO_POBLADO,
-                        "ubigeo": ubigeo if ubigeo else None,
-                        "departamento": "PUNO",
-                        "provincia": provincia,
-                        "distrito": distrito if distrito else None,
-                        "coordenadas": {
-                            "longitud": coords[0],
-                            "latitud": coords[1]
-                        },
-                        "estaActiva": True,
-                        "fechaActualizacion": datetime.utcnow()
-                    }
-                    
-                    existe = await localidades_collection.find_one({
-                        "ubigeo": ubigeo,
-                        "tipo": TipoLocalidad.CENTRO_POBLADO
-                    }) if ubigeo else None
-                    
-                    if existe:
-                        if modo in ["actualizar", "ambos"]:
-                            await localidades_collection.update_one(
-                                {"_id": existe["_id"]},
-                                {"$set": localidad_data}
-                            )
-                            resultado["total_actualizados"] += 1
-                    else:
-                        if modo in ["crear", "ambos"]:
-                            localidad_data["fechaCreacion"] = datetime.utcnow()
-                            await localidades_collection.insert_one(localidad_data)
-                            resultado["total_importados"] += 1
-                    
-                    resultado["detalle"]["centros_poblados"] += 1
-                    
-                except Exception as e:
-                    print(f"Error importando centro poblado: {e}")
-                    resultado["total_errores"] += 1
-        
-        print(f"\n✅ Importación completada:")
-        print(f"  Importados: {resultado['total_importados']}")
-        print(f"  Actualizados: {resultado['total_actualizados']}")
-        print(f"  Errores: {resultado['total_errores']}\n")
-        
-        return resultado
-        
+        return await importar()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en importación: {str(e)}")
 
@@ -386,6 +246,7 @@ async def importar_geometrias(payload: ImportarGeometriasPayload) -> Dict[str, A
                 print(f"  ❌ {error_msg}")
         
         print(f"\n📊 Resumen: {resultado['total_vinculados']} vinculadas, {resultado['total_errores']} errores\n")
+        get_geometria_tiles_index().invalidar()
         return resultado
         
     except HTTPException:
@@ -494,6 +355,7 @@ async def eliminar_geometria(id: str) -> Dict[str, Any]:
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Geometría no encontrada")
         
+        get_geometria_tiles_index().invalidar()
         return {"mensaje": "Geometría eliminada correctamente"}
         
     except Exception as e:
@@ -510,6 +372,7 @@ async def limpiar_geometrias() -> Dict[str, Any]:
     
     try:
         result = await geometrias_collection.delete_many({})
+        get_geometria_tiles_index().invalidar()
         return {
             "mensaje": "Todas las geometrías han sido eliminadas",
             "eliminadas": result.deleted_count
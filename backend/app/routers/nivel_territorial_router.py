@@ -15,7 +15,9 @@ from ..models.localidad import (
     LocalidadConJerarquia,
     LocalidadEnRuta
 )
-from ..services.nivel_territorial_service import nivel_territorial_service
+from ..services.nivel_territorial_service import nivel_territorial_service, FILTRO_PENDIENTES
+from ..dependencies.db import get_database
+from ..core.job_runner import get_job_runner, job_encolado
 
 router = APIRouter(prefix="/nivel-territorial", tags=["Nivel Territorial"])
 
@@ -86,16 +88,7 @@ async def obtener_rutas_interdepartamentales():
     Obtiene todas las rutas que cruzan departamentos
     """
     try:
-        filtros = FiltroRutasPorNivel()
-        todas_rutas = await nivel_territorial_service.buscar_rutas_por_nivel(filtros)
-        
-        # Filtrar solo las interdepartamentales
-        interdepartamentales = [
-            ruta for ruta in todas_rutas 
-            if ruta.clasificacion_territorial == "INTERDEPARTAMENTAL"
-        ]
-        
-        return interdepartamentales
+        return await nivel_territorial_service.buscar_rutas_por_clasificacion("INTERDEPARTAMENTAL")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo rutas interdepartamentales: {str(e)}")
 
@@ -105,16 +98,7 @@ async def obtener_rutas_interprovinciales():
     Obtiene todas las rutas que cruzan provincias (pero no departamentos)
     """
     try:
-        filtros = FiltroRutasPorNivel()
-        todas_rutas = await nivel_territorial_service.buscar_rutas_por_nivel(filtros)
-        
-        # Filtrar solo las interprovinciales
-        interprovinciales = [
-            ruta for ruta in todas_rutas 
-            if ruta.clasificacion_territorial == "INTERPROVINCIAL"
-        ]
-        
-        return interprovinciales
+        return await nivel_territorial_service.buscar_rutas_por_clasificacion("INTERPROVINCIAL")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo rutas interprovinciales: {str(e)}")
 
@@ -124,16 +108,7 @@ async def obtener_rutas_locales():
     Obtiene todas las rutas locales (dentro del mismo distrito)
     """
     try:
-        filtros = FiltroRutasPorNivel()
-        todas_rutas = await nivel_territorial_service.buscar_rutas_por_nivel(filtros)
-        
-        # Filtrar solo las locales
-        locales = [
-            ruta for ruta in todas_rutas 
-            if ruta.clasificacion_territorial == "LOCAL"
-        ]
-        
-        return locales
+        return await nivel_territorial_service.buscar_rutas_por_clasificacion("LOCAL")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo rutas locales: {str(e)}")
 
@@ -147,37 +122,36 @@ async def obtener_rutas_por_departamento(
     Obtiene rutas que tienen origen o destino en un departamento específico
     """
     try:
-        filtros = FiltroRutasPorNivel()
-        
-        if como_origen and not como_destino:
-            filtros.departamento_origen = departamento.upper()
-        elif como_destino and not como_origen:
-            filtros.departamento_destino = departamento.upper()
-        elif como_origen and como_destino:
-            # Buscar rutas donde el departamento aparezca como origen O destino
-            filtros_origen = FiltroRutasPorNivel(departamento_origen=departamento.upper())
-            filtros_destino = FiltroRutasPorNivel(departamento_destino=departamento.upper())
-            
-            rutas_origen = await nivel_territorial_service.buscar_rutas_por_nivel(filtros_origen)
-            rutas_destino = await nivel_territorial_service.buscar_rutas_por_nivel(filtros_destino)
-            
-            # Combinar y eliminar duplicados
-            rutas_ids = set()
-            rutas_combinadas = []
-            
-            for ruta in rutas_origen + rutas_destino:
-                if ruta.ruta_id not in rutas_ids:
-                    rutas_ids.add(ruta.ruta_id)
-                    rutas_combinadas.append(ruta)
-            
-            return rutas_combinadas
-        
-        rutas = await nivel_territorial_service.buscar_rutas_por_nivel(filtros)
-        return rutas
+        return await nivel_territorial_service.buscar_rutas_por_departamento(
+            departamento.upper(), como_origen=como_origen, como_destino=como_destino
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo rutas por departamento: {str(e)}")
 
+@router.post("/recalcular", status_code=202)
+async def recalcular_niveles_territoriales(
+    solo_pendientes: bool = Query(False, description="Solo rutas activas sin nivel calculado"),
+    db = Depends(get_database)
+):
+    """
+    Recalcula en segundo plano el nivel territorial materializado en las rutas
+    (necesario tras cambiar la jerarquía de localidades); el avance se consulta en /jobs/{id}
+    """
+    async def trabajo(contexto):
+        async def on_progreso(procesadas, total):
+            await contexto.progreso(procesadas, total)
+        return await nivel_territorial_service.materializar_rutas(
+            FILTRO_PENDIENTES if solo_pendientes else None, on_progreso=on_progreso
+        )
+    
+    job_id = await get_job_runner(db).enqueue(
+        "nivel_territorial_rutas", trabajo,
+        descripcion="Recalcular nivel territorial de rutas",
+        parametros={"solo_pendientes": solo_pendientes}
+    )
+    return job_encolado(job_id)
+
 @router.get("/niveles-disponibles", response_model=List[str])
 async def obtener_niveles_territoriales():
     """
@@ -214,13 +188,13 @@ async def obtener_resumen_territorial_ruta(ruta_id: str):
             "clasificacion_territorial": analisis.clasificacion_territorial,
             "origen": {
                 "nombre": analisis.origen.nombre,
-                "nivel": analisis.origen.nivel_territorial.value,
+                "nivel": analisis.origen.nivel_territorial,
                 "departamento": analisis.origen.departamento,
                 "provincia": analisis.origen.provincia
             },
             "destino": {
                 "nombre": analisis.destino.nombre,
-                "nivel": analisis.destino.nivel_territorial.value,
+                "nivel": analisis.destino.nivel_territorial,
                 "departamento": analisis.destino.departamento,
                 "provincia": analisis.destino.provincia
             },
@@ -245,10 +219,10 @@ async def validar_nivel_territorial(localidad_id: str):
             raise HTTPException(status_code=404, detail="Localidad no encontrada")
         
         return {
-            "localidad_id": localidad.localidad_id,
+            "localidad_id": localidad.id,
             "nombre": localidad.nombre,
             "ubigeo": localidad.ubigeo,
-            "nivel_territorial": localidad.nivel_territorial.value,
+            "nivel_territorial": localidad.nivel_territorial,
             "departamento": localidad.departamento,
             "provincia": localidad.provincia,
             "distrito": localidad.distrito,
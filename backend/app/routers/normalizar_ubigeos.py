@@ -3,6 +3,7 @@ Endpoint para normalizar ubigeos de localidades según datos oficiales de GeoJSO
 """
 from fastapi import APIRouter, Depends, HTTPException
 from app.dependencies.db import get_database
+from app.utils.busqueda_normalizada import CAMPO_BUSQUEDA, campos_busqueda
 
 router = APIRouter(prefix="/localidades", tags=["localidades-normalizacion"])
 
@@ -98,7 +99,10 @@ async def normalizar_ubigeos_localidades(
             if necesita_correccion and ubigeo_correcto and not debe_eliminarse:
                 await localidades_collection.update_one(
                     {"_id": localidad["_id"]},
-                    {"$set": {"ubigeo": ubigeo_correcto}}
+                    {"$set": {
+                        "ubigeo": ubigeo_correcto,
+                        CAMPO_BUSQUEDA: campos_busqueda("localidades", {**localidad, "ubigeo": ubigeo_correcto})
+                    }}
                 )
                 total_corregidas += 1
                 print(f"✅ Corregido {tipo} {nombre}: '{ubigeo_actual}' → '{ubigeo_correcto}'")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Response
 from fastapi.responses import StreamingResponse
 from typing import List, Optional, Dict, Any
 from bson import ObjectId
@@ -9,6 +9,9 @@ from app.dependencies.db import get_database
 from app.services.resolucion_service import ResolucionService
 from app.services.resolucion_excel_service import ResolucionExcelService
 from app.services.resolucion_padres_service import ResolucionPadresService
+from app.core.job_runner import get_job_runner, job_encolado
+from app.utils.respuesta_rapida import RespuestaJSONRapida, listar_documentos
+from app.utils.paginacion_cursor import CursorInvalido, cabeceras_paginacion
 from app.models.resolucion import ResolucionCreate, ResolucionUpdate, ResolucionInDB, ResolucionResponse, ResolucionFiltros
 from app.utils.exceptions import (
     ResolucionNotFoundException, 
@@ -118,30 +121,40 @@ async def test_resoluciones():
 
 @router.get("", response_model=List[ResolucionResponse])
 async def get_resoluciones(
-    skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Número de registros a omitir (preferir cursor)"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Siguiente-Cursor)"),
     estado: str = Query(None, description="Filtrar por estado"),
     empresa_id: str = Query(None, description="Filtrar por empresa"),
     tipo_resolucion: str = Query(None, description="Filtrar por tipo de resolución"),
+    ligero: bool = Query(False, description="Solo los campos de la vista de lista, serializados sin Pydantic (más rápido)"),
     resolucion_service: ResolucionService = Depends(get_resolucion_service)
 ) -> List[ResolucionResponse]:
     """Obtener lista de resoluciones con filtros opcionales"""
     
+    # Los filtros y la paginación se aplican en MongoDB en lugar de sobre todas las resoluciones activas
+    query = {"estaActivo": True}
+    if estado:
+        query["estado"] = estado
+    if empresa_id:
+        query["empresaId"] = empresa_id
+    if tipo_resolucion:
+        query["tipoResolucion"] = tipo_resolucion
+    
+    if ligero:
+        try:
+            pagina = await listar_documentos(resolucion_service.collection, query, "resoluciones", skip, limit, cursor)
+        except CursorInvalido as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        respuesta = RespuestaJSONRapida(pagina.documentos)
+        cabeceras_paginacion(respuesta, pagina)
+        return respuesta
+    
     try:
-        # Obtener resoluciones del servicio
-        resoluciones = await resolucion_service.get_resoluciones_activas()
-        
-        # Aplicar filtros si se especifican
-        if estado:
-            resoluciones = [r for r in resoluciones if r.estado == estado]
-        if empresa_id:
-            resoluciones = [r for r in resoluciones if r.empresaId == empresa_id]
-        if tipo_resolucion:
-            resoluciones = [r for r in resoluciones if r.tipoResolucion == tipo_resolucion]
-        
-        # Aplicar paginación
-        total = len(resoluciones)
-        resoluciones_paginadas = resoluciones[skip:skip + limit]
+        pagina = await resolucion_service.get_resoluciones_pagina(query, limit, cursor=cursor, skip=skip)
+        cabeceras_paginacion(response, pagina)
+        resoluciones_paginadas = pagina.documentos
         
         # Convertir a ResolucionResponse
         return [
@@ -174,6 +187,8 @@ async def get_resoluciones(
             for r in resoluciones_paginadas
         ]
         
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
@@ -557,8 +572,11 @@ async def validar_archivo_resoluciones(
 
 @router.post("/carga-masiva/procesar")
 async def procesar_carga_masiva_resoluciones(
+    response: Response,
     archivo: UploadFile = File(..., description="Archivo Excel con resoluciones"),
-    solo_validar: bool = Query(False, description="Solo validar sin crear resoluciones")
+    solo_validar: bool = Query(False, description="Solo validar sin crear resoluciones"),
+    en_segundo_plano: bool = Query(False, description="Procesar como job y consultar el avance en /jobs/{id}"),
+    db = Depends(get_database)
 ):
     """Procesar carga masiva de resoluciones desde Excel"""
     
@@ -580,6 +598,23 @@ async def procesar_carga_masiva_resoluciones(
         if solo_validar:
             resultado = await excel_service.validar_archivo_excel(archivo_buffer)
             mensaje = f"Validación completada: {resultado['validos']} válidos, {resultado['invalidos']} inválidos"
+        elif en_segundo_plano:
+            async def trabajo(contexto):
+                async def on_progreso(procesadas, total):
+                    await contexto.progreso(procesadas, total, f"Resolución {procesadas} de {total}")
+                
+                resultado = await excel_service.procesar_carga_masiva(archivo_buffer, on_progreso=on_progreso)
+                await contexto.agregar_errores(resultado.get('errores', []) + resultado.get('errores_creacion', []))
+                resultado.pop('resoluciones_validas', None)
+                return resultado
+            
+            job_id = await get_job_runner(db).enqueue(
+                "carga_masiva_resoluciones", trabajo,
+                descripcion="Carga masiva de resoluciones",
+                parametros={"archivo": archivo.filename}
+            )
+            response.status_code = 202
+            return job_encolado(job_id)
         else:
             resultado = await excel_service.procesar_carga_masiva(archivo_buffer)
             mensaje = f"Procesamiento completado: {resultado.get('total_procesadas', 0)} resoluciones procesadas"
@@ -865,8 +900,10 @@ async def validar_archivo_resoluciones_padres(
 
 @router.post("/padres/procesar")
 async def procesar_carga_masiva_resoluciones_padres(
+    response: Response,
     archivo: UploadFile = File(..., description="Archivo Excel con resoluciones padres"),
     solo_validar: bool = Query(False, description="Solo validar sin crear resoluciones"),
+    en_segundo_plano: bool = Query(False, description="Procesar como job y consultar el avance en /jobs/{id}"),
     current_user = Depends(get_current_active_user)
 ):
     """Procesar carga masiva de resoluciones padres desde Excel"""
@@ -896,6 +933,26 @@ async def procesar_carga_masiva_resoluciones_padres(
             servicio = ResolucionPadresService(db)
             resultado = await servicio.validar_plantilla_padres_con_db(df)
             mensaje = f"Validación completada: {'Válido' if resultado['valido'] else 'Inválido'}"
+        elif en_segundo_plano:
+            db = await get_database()
+            servicio = ResolucionPadresService(db)
+            
+            async def trabajo(contexto):
+                async def on_progreso(procesadas, total):
+                    await contexto.progreso(procesadas, total, f"Fila {procesadas} de {total}")
+                
+                resultado = await servicio.procesar_plantilla_padres(df, current_user.id, on_progreso=on_progreso)
+                await contexto.agregar_errores(resultado.get('errores', []))
+                return resultado
+            
+            job_id = await get_job_runner(db).enqueue(
+                "carga_masiva_resoluciones_padres", trabajo,
+                descripcion="Carga masiva de resoluciones padres",
+                parametros={"archivo": archivo.filename},
+                usuario_id=current_user.id
+            )
+            response.status_code = 202
+            return job_encolado(job_id)
         else:
             # Procesar completamente con MongoDB
             db = await get_database()
@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Response
 from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime
 from io import BytesIO
+import re
 from app.dependencies.auth import get_current_active_user
 from app.dependencies.db import get_database
 from app.services.ruta_service import RutaService
 from app.services.ruta_excel_service import RutaExcelService
+from app.services.ruta_combinaciones_index import get_combinaciones_index
+from app.core.job_runner import get_job_runner, job_encolado
+from app.utils.respuesta_rapida import RespuestaJSONRapida, listar_documentos
+from app.utils.paginacion_cursor import CursorInvalido, cabeceras_paginacion
+from app.utils.busqueda_normalizada import con_campos_busqueda
+from app.services.localidad_alias_index import get_localidad_alias_index
+from app.services.nivel_territorial_service import calcular_nivel_territorial
+from app.services.distancia_matriz_service import get_distancia_matriz_service
 from app.models.ruta import RutaCreate, RutaUpdate, RutaInDB, Ruta
 from app.utils.exceptions import (
     RutaNotFoundException, 
@@ -51,6 +60,7 @@ async def create_ruta(
     ruta_dict["fechaActualizacion"] = datetime.utcnow()
     ruta_dict["estaActivo"] = True
     ruta_dict["estado"] = "ACTIVA"
+    con_campos_busqueda("rutas", ruta_dict)
     
     # Insertar en la base de datos
     result = await rutas_collection.insert_one(ruta_dict)
@@ -58,6 +68,7 @@ async def create_ruta(
     # Obtener la ruta creada
     ruta_creada = await rutas_collection.find_one({"_id": result.inserted_id})
     ruta_id = str(result.inserted_id)
+    get_combinaciones_index().registrar_ruta(ruta_creada)
     ruta_creada["id"] = ruta_id
     ruta_creada.pop("_id")
     
@@ -271,15 +282,31 @@ async def get_todas_resoluciones_primigenias(
 
 @router.get("/", response_model=List[Ruta])
 async def get_rutas(
-    skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Número de registros a omitir (preferir cursor)"),
     limit: int = Query(1000, ge=1, le=1000, description="Número máximo de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Siguiente-Cursor)"),
     estado: str = Query(None, description="Filtrar por estado"),
+    ligero: bool = Query(False, description="Solo los campos de la vista de lista, serializados sin Pydantic (más rápido)"),
     db = Depends(get_database)
 ) -> List[Ruta]:
     """Obtener lista de rutas con filtros opcionales"""
     ruta_service = RutaService(db)
-    rutas = await ruta_service.get_rutas(skip=skip, limit=limit, estado=estado)
-    return [build_ruta_response(r) for r in rutas]
+    try:
+        if ligero:
+            query = {"estaActivo": True}
+            if estado:
+                query["estado"] = estado
+            pagina = await listar_documentos(ruta_service.rutas_collection, query, "rutas", skip, limit, cursor)
+            respuesta = RespuestaJSONRapida(pagina.documentos)
+            cabeceras_paginacion(respuesta, pagina)
+            return respuesta
+        
+        pagina = await ruta_service.get_rutas_pagina(limit=limit, estado=estado, cursor=cursor, skip=skip)
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cabeceras_paginacion(response, pagina)
+    return [build_ruta_response(r) for r in pagina.documentos]
 
 @router.get("/filtros", response_model=List[Ruta])
 async def get_rutas_con_filtros(
@@ -348,135 +375,21 @@ async def filtro_avanzado_origen_destino(
     - /rutas/filtro-avanzado?destino=JULIACA_001 (todas las rutas hacia Juliaca)
     - /rutas/filtro-avanzado?origen=PUNO_001&destino=JULIACA_001 (ruta específica)
     """
-    try:
-        ruta_service = RutaService(db)
-        
-        # Construir filtros
-        filtros = {}
-        if origen:
-            filtros['origen'] = origen
-        if destino:
-            filtros['destino'] = destino
-        
-        # Obtener rutas filtradas
-        rutas = await ruta_service.get_rutas_filtro_avanzado(filtros)
-        
-        # Procesar resultados
-        resultado = {
-            "filtros_aplicados": {
-                "origen": origen,
-                "destino": destino
-            },
-            "total_rutas": len(rutas),
-            "rutas": []
-        }
-        
-        # Agrupar por empresa si se solicita
-        if incluir_empresas:
-            empresas_collection = db.empresas
-            empresas_info = {}
-            rutas_por_empresa = {}
-            
-            for ruta in rutas:
-                empresa_id = ruta.get('empresaId')
-                if empresa_id:
-                    # Obtener info de empresa si no la tenemos
-                    if empresa_id not in empresas_info:
-                        empresa = None
-                        if ObjectId.is_valid(empresa_id):
-                            empresa = await empresas_collection.find_one({"_id": ObjectId(empresa_id)})
-                        if not empresa:
-                            empresa = await empresas_collection.find_one({"id": empresa_id})
-                        
-                        if empresa:
-                            empresas_info[empresa_id] = {
-                                "id": str(empresa.get("_id", empresa.get("id", ""))),
-                                "ruc": empresa.get("ruc", ""),
-                                "razonSocial": empresa.get("razonSocial", {}).get("principal", "Sin razón social")
-                            }
-                        else:
-                            empresas_info[empresa_id] = {
-                                "id": empresa_id,
-                                "ruc": "No encontrado",
-                                "razonSocial": "Empresa no encontrada"
-                            }
-                    
-                    # Agrupar rutas por empresa
-                    if empresa_id not in rutas_por_empresa:
-                        rutas_por_empresa[empresa_id] = []
-                    
-                    rutas_por_empresa[empresa_id].append({
-                        "id": ruta.get('id', str(ruta.get('_id', ''))),
-                        "codigoRuta": ruta.get('codigoRuta', ''),
-                        "nombre": ruta.get('nombre', ''),
-                        "origen": ruta.get('origen', ruta.get('origenId', '')),
-                        "destino": ruta.get('destino', ruta.get('destinoId', '')),
-                        "estado": ruta.get('estado', ''),
-                        "resolucionId": ruta.get('resolucionId', '')
-                    })
-            
-            # Estructurar resultado por empresas
-            resultado["empresas"] = []
-            for empresa_id, rutas_empresa in rutas_por_empresa.items():
-                resultado["empresas"].append({
-                    "empresa": empresas_info.get(empresa_id, {}),
-                    "total_rutas": len(rutas_empresa),
-                    "rutas": rutas_empresa
-                })
-            
-            resultado["total_empresas"] = len(rutas_por_empresa)
-        
-        # Agregar estadísticas si se solicita
-        if incluir_estadisticas:
-            # Obtener orígenes y destinos únicos
-            origenes_unicos = set()
-            destinos_unicos = set()
-            estados_rutas = {}
-            
-            for ruta in rutas:
-                origen_ruta = ruta.get('origen', ruta.get('origenId', ''))
-                destino_ruta = ruta.get('destino', ruta.get('destinoId', ''))
-                estado_ruta = ruta.get('estado', 'DESCONOCIDO')
-                
-                if origen_ruta:
-                    origenes_unicos.add(origen_ruta)
-                if destino_ruta:
-                    destinos_unicos.add(destino_ruta)
-                
-                estados_rutas[estado_ruta] = estados_rutas.get(estado_ruta, 0) + 1
-            
-            resultado["estadisticas"] = {
-                "origenes_unicos": sorted(list(origenes_unicos)),
-                "destinos_unicos": sorted(list(destinos_unicos)),
-                "total_origenes": len(origenes_unicos),
-                "total_destinos": len(destinos_unicos),
-                "estados_rutas": estados_rutas,
-                "cobertura_geografica": f"{len(origenes_unicos)} orígenes → {len(destinos_unicos)} destinos"
-            }
-        
-        # Si no se agrupó por empresas, incluir lista simple de rutas
-        if not incluir_empresas:
-            resultado["rutas"] = [
-                {
-                    "id": ruta.get('id', str(ruta.get('_id', ''))),
-                    "codigoRuta": ruta.get('codigoRuta', ''),
-                    "nombre": ruta.get('nombre', ''),
-                    "origen": ruta.get('origen', ruta.get('origenId', '')),
-                    "destino": ruta.get('destino', ruta.get('destinoId', '')),
-                    "estado": ruta.get('estado', ''),
-                    "empresaId": ruta.get('empresaId', ''),
-                    "resolucionId": ruta.get('resolucionId', '')
-                }
-                for ruta in rutas
-            ]
-        
-        return resultado
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error en filtro avanzado: {str(e)}"
-        )
+    ruta_service = RutaService(db)
+    
+    # Construir filtros
+    filtros = {}
+    if origen:
+        filtros['origen'] = origen
+    if destino:
+        filtros['destino'] = destino
+    
+    # Agrupación por empresa y estadísticas en una sola agregación
+    return await ruta_service.get_reporte_origen_destino(
+        filtros,
+        incluir_empresas=incluir_empresas,
+        incluir_estadisticas=incluir_estadisticas
+    )
 
 @router.get("/origenes-destinos", response_model=dict)
 async def get_origenes_destinos_disponibles(
@@ -535,78 +448,20 @@ async def get_origenes_destinos_disponibles(
 @router.get("/combinaciones-rutas", response_model=dict)
 async def get_combinaciones_rutas(
     busqueda: Optional[str] = Query(None, description="Término de búsqueda para filtrar combinaciones"),
+    limite: Optional[int] = Query(None, ge=1, description="Máximo de combinaciones a devolver"),
     db = Depends(get_database)
 ):
     """
     Obtener combinaciones de rutas con búsqueda inteligente
     Si busco 'PUNO' devuelve: PUNO → JULIACA, PUNO → YUNGUYO, YUNGUYO → PUNO, etc.
+    
+    Se responde desde el índice en memoria de combinaciones; MongoDB solo se
+    consulta para la carga inicial o cuando el índice vence.
     """
     try:
-        ruta_service = RutaService(db)
-        rutas = await ruta_service.get_rutas()
-        
-        combinaciones_completas = []
-        
-        for ruta in rutas:
-            # Convertir a dict si es necesario
-            if hasattr(ruta, '__dict__'):
-                ruta_dict = ruta.__dict__
-            else:
-                ruta_dict = ruta
-            
-            origen = ruta_dict.get('origen', ruta_dict.get('origenId', ''))
-            destino = ruta_dict.get('destino', ruta_dict.get('destinoId', ''))
-            
-            if origen and destino:
-                combinacion = {
-                    "id": ruta_dict.get('id', str(ruta_dict.get('_id', ''))),
-                    "origen": origen,
-                    "destino": destino,
-                    "combinacion": f"{origen} → {destino}",
-                    "codigoRuta": ruta_dict.get('codigoRuta', ''),
-                    "empresaId": ruta_dict.get('empresaId', ''),
-                    "resolucionId": ruta_dict.get('resolucionId', ''),
-                    "estado": ruta_dict.get('estado', '')
-                }
-                combinaciones_completas.append(combinacion)
-        
-        # Filtrar por búsqueda si se proporciona
-        if busqueda:
-            busqueda_lower = busqueda.lower()
-            combinaciones_filtradas = []
-            
-            for comb in combinaciones_completas:
-                # Buscar en origen, destino o combinación completa
-                if (busqueda_lower in comb["origen"].lower() or 
-                    busqueda_lower in comb["destino"].lower() or
-                    busqueda_lower in comb["combinacion"].lower()):
-                    combinaciones_filtradas.append(comb)
-            
-            combinaciones_completas = combinaciones_filtradas
-        
-        # Agrupar por combinación única para evitar duplicados
-        combinaciones_unicas = {}
-        for comb in combinaciones_completas:
-            key = comb["combinacion"]
-            if key not in combinaciones_unicas:
-                combinaciones_unicas[key] = {
-                    "combinacion": comb["combinacion"],
-                    "origen": comb["origen"],
-                    "destino": comb["destino"],
-                    "rutas": []
-                }
-            
-            combinaciones_unicas[key]["rutas"].append({
-                "id": comb["id"],
-                "codigoRuta": comb["codigoRuta"],
-                "empresaId": comb["empresaId"],
-                "resolucionId": comb["resolucionId"],
-                "estado": comb["estado"]
-            })
-        
-        # Convertir a lista y ordenar
-        resultado = list(combinaciones_unicas.values())
-        resultado.sort(key=lambda x: x["combinacion"])
+        indice = get_combinaciones_index()
+        await indice.asegurar_cargado(db)
+        resultado = indice.buscar(busqueda, limite=limite)
         
         return {
             "combinaciones": resultado,
@@ -629,66 +484,51 @@ async def exportar_filtro_avanzado(
     db = Depends(get_database)
 ):
     """
-    Exportar resultados del filtro avanzado en diferentes formatos
-    Formatos soportados: excel, pdf, csv
+    Exportar resultados del filtro avanzado
+    Formatos soportados: excel, csv
+    
+    Las rutas se leen del cursor y se escriben a medida que llegan, sin
+    cargar todo el resultado ni el archivo completo en memoria.
     """
-    if formato not in ['excel', 'pdf', 'csv']:
+    if formato not in ['excel', 'csv']:
         raise HTTPException(
             status_code=400,
-            detail="Formato no soportado. Use: excel, pdf, csv"
+            detail="Formato no soportado. Use: excel, csv"
         )
     
-    try:
-        # Obtener datos del filtro avanzado
-        filtro_resultado = await filtro_avanzado_origen_destino(
-            origen=origen,
-            destino=destino,
-            incluir_empresas=True,
-            incluir_estadisticas=True,
-            db=db
-        )
-        
-        # Generar nombre del archivo
-        filtro_nombre = []
-        if origen:
-            filtro_nombre.append(f"origen-{origen}")
-        if destino:
-            filtro_nombre.append(f"destino-{destino}")
-        
-        nombre_base = "rutas-" + "-".join(filtro_nombre) if filtro_nombre else "todas-rutas"
-        fecha_actual = datetime.now().strftime("%Y%m%d_%H%M%S")
-        nombre_archivo = f"{nombre_base}_{fecha_actual}"
-        
-        if formato == 'excel':
-            # Simular generación de Excel
-            return {
-                "mensaje": f"Exportando a Excel: {nombre_archivo}.xlsx",
-                "datos": filtro_resultado,
-                "formato": "excel",
-                "archivo": f"{nombre_archivo}.xlsx"
-            }
-        elif formato == 'pdf':
-            # Simular generación de PDF
-            return {
-                "mensaje": f"Exportando a PDF: {nombre_archivo}.pdf",
-                "datos": filtro_resultado,
-                "formato": "pdf",
-                "archivo": f"{nombre_archivo}.pdf"
-            }
-        elif formato == 'csv':
-            # Simular generación de CSV
-            return {
-                "mensaje": f"Exportando a CSV: {nombre_archivo}.csv",
-                "datos": filtro_resultado,
-                "formato": "csv",
-                "archivo": f"{nombre_archivo}.csv"
-            }
-            
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error al exportar: {str(e)}"
+    filtros = {}
+    if origen:
+        filtros['origen'] = origen
+    if destino:
+        filtros['destino'] = destino
+    
+    # Generar nombre del archivo
+    filtro_nombre = []
+    if origen:
+        filtro_nombre.append(f"origen-{origen}")
+    if destino:
+        filtro_nombre.append(f"destino-{destino}")
+    
+    nombre_base = "rutas-" + "-".join(filtro_nombre) if filtro_nombre else "todas-rutas"
+    nombre_base = re.sub(r"[^A-Za-z0-9_-]+", "_", nombre_base)
+    fecha_actual = datetime.now().strftime("%Y%m%d_%H%M%S")
+    nombre_archivo = f"{nombre_base}_{fecha_actual}"
+    
+    cursor = RutaService(db).get_cursor_filtro_avanzado(filtros)
+    excel_service = RutaExcelService()
+    
+    if formato == 'excel':
+        return StreamingResponse(
+            excel_service.exportar_xlsx_stream(cursor),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": f"attachment; filename={nombre_archivo}.xlsx"}
         )
+    
+    return StreamingResponse(
+        excel_service.exportar_csv_stream(cursor),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename={nombre_archivo}.csv"}
+    )
 
 # ========================================
 # VERIFICACIÓN DE COORDENADAS
@@ -710,7 +550,8 @@ async def verificar_coordenadas_rutas(
     try:
         rutas_collection = db["rutas"]
         localidades_collection = db["localidades"]
-        alias_collection = db["localidades_alias"]  # ✅ NUEVA: Colección de alias
+        indice = get_localidad_alias_index()  # ✅ Nombres y alias en memoria
+        await indice.asegurar_cargado(db)
         
         # Obtener todas las rutas activas
         rutas = await rutas_collection.find({"estaActivo": True}).to_list(length=None)
@@ -722,49 +563,13 @@ async def verificar_coordenadas_rutas(
         
         # Función auxiliar para buscar localidad (con alias)
         async def buscar_localidad_con_alias(nombre):
-            """Buscar localidad por nombre o alias"""
-            import re
-            
-            # Normalizar nombre (remover C.P., CP, etc.)
-            nombre_normalizado = re.sub(r'^(C\.P\.|CP|C\.P)\s*', '', nombre, flags=re.IGNORECASE).strip()
-            
-            # 1. Buscar por nombre exacto
-            localidad = await localidades_collection.find_one({
-                "nombre": {"$regex": f"^{nombre}$", "$options": "i"},
-                "estaActiva": True
-            })
-            
+            """Buscar localidad por nombre o alias (sin tildes ni prefijo C.P.)"""
+            localidad = indice.buscar_localidad(nombre)
             if localidad:
                 return localidad
             
-            # 2. Buscar por nombre normalizado
-            if nombre != nombre_normalizado:
-                localidad = await localidades_collection.find_one({
-                    "nombre": {"$regex": f"^{nombre_normalizado}$", "$options": "i"},
-                    "estaActiva": True
-                })
-                
-                if localidad:
-                    return localidad
-            
-            # 3. ✅ NUEVO: Buscar en tabla de alias
-            alias_doc = await alias_collection.find_one({
-                "alias": {"$regex": f"^{nombre}$", "$options": "i"},
-                "estaActivo": True
-            })
-            
-            if alias_doc:
-                # Obtener la localidad oficial del alias
-                localidad_id = alias_doc.get("localidad_id")
-                if localidad_id:
-                    try:
-                        localidad = await localidades_collection.find_one({"_id": ObjectId(localidad_id)})
-                        if localidad:
-                            return localidad
-                    except:
-                        pass
-            
-            return None
+            encontrado = indice.buscar_alias(nombre)
+            return encontrado[1] if encontrado else None
         
         for ruta in rutas:
             ruta_id = str(ruta.get("_id"))
@@ -1058,6 +863,33 @@ async def get_ruta(
     
     return build_ruta_response(ruta)
 
+@router.get("/{ruta_id}/distancias")
+async def get_distancias_ruta(
+    ruta_id: str,
+    db = Depends(get_database)
+):
+    """Distancias en línea recta por tramo y acumuladas de origen → itinerario → destino"""
+    if not ObjectId.is_valid(ruta_id):
+        raise RutaNotFoundException(ruta_id)
+    ruta = await db.rutas.find_one(
+        {"_id": ObjectId(ruta_id)}, {"origen.id": 1, "destino.id": 1, "itinerario.id": 1, "itinerario.orden": 1}
+    )
+    if not ruta:
+        raise RutaNotFoundException(ruta_id)
+    
+    service = get_distancia_matriz_service()
+    await service.asegurar_cargado(db)
+    resultado = service.itinerario(service.ids_recorrido(ruta))
+    return {
+        "ruta_id": ruta_id,
+        "ids": resultado["ids"],
+        "faltantes": resultado["faltantes"],
+        "tramos_km": resultado["tramos_km"].round(3).tolist(),
+        "acumulada_km": resultado["acumulada_km"].round(3).tolist(),
+        "total_km": round(resultado["total_km"], 3),
+        "unidad": "km"
+    }
+
 @router.get("/codigo/{codigo}", response_model=Ruta)
 async def get_ruta_by_codigo(
     codigo: str,
@@ -1132,6 +964,7 @@ async def limpiar_todas_las_rutas(
         # Contar y eliminar
         total_rutas = await db.rutas.count_documents({})
         resultado = await db.rutas.delete_many({})
+        get_combinaciones_index().invalidar()
         
         # Limpiar referencias
         await db.empresas.update_many({}, {"$unset": {"rutasAutorizadasIds": ""}})
@@ -1172,6 +1005,7 @@ async def delete_all_rutas(
         
         # Eliminar todas las rutas
         resultado = await db.rutas.delete_many({})
+        get_combinaciones_index().invalidar()
         
         # Limpiar referencias en empresas
         await db.empresas.update_many(
@@ -1296,9 +1130,11 @@ async def validar_archivo_rutas(
 
 @router.post("/carga-masiva/procesar")
 async def procesar_carga_masiva_rutas(
+    response: Response,
     archivo: UploadFile = File(..., description="Archivo Excel con rutas"),
     solo_validar: bool = Query(False, description="Solo validar sin crear rutas"),
     modo: str = Query("crear", description="Modo de procesamiento: crear, actualizar, upsert"),
+    en_segundo_plano: bool = Query(False, description="Procesar como job y consultar el avance en /jobs/{id}"),
     db = Depends(get_database)
 ):
     """
@@ -1308,6 +1144,9 @@ async def procesar_carga_masiva_rutas(
     - crear: Solo crear rutas nuevas (error si existe)
     - actualizar: Solo actualizar rutas existentes (error si no existe)  
     - upsert: Crear si no existe, actualizar si existe (recomendado)
+    
+    Con en_segundo_plano=true responde 202 con el id del job en lugar de
+    esperar a que termine el procesamiento.
     """
     
     # Validar tipo de archivo
@@ -1335,15 +1174,33 @@ async def procesar_carga_masiva_rutas(
         if solo_validar:
             resultado = await excel_service.validar_archivo_excel(archivo_buffer)
             mensaje = f"Validación completada: {resultado['validos']} válidos, {resultado['invalidos']} inválidos"
+        elif en_segundo_plano:
+            async def trabajo(contexto):
+                async def on_progreso(avance):
+                    await contexto.progreso(
+                        avance['procesadas'], avance['total'],
+                        f"Lote {avance['lote']} de {avance['total_lotes']}"
+                    )
+                
+                resultado = await excel_service.procesar_carga_masiva_con_modo(
+                    archivo_buffer, modo, on_progreso=on_progreso
+                )
+                validacion = resultado.get('validacion') or {}
+                await contexto.agregar_errores(validacion.get('errores', []) + resultado.get('errores_procesamiento', []))
+                # Las rutas válidas ya están reflejadas en rutas_creadas/rutas_actualizadas
+                validacion.pop('rutas_validas', None)
+                return resultado
+            
+            job_id = await get_job_runner(db).enqueue(
+                "carga_masiva_rutas", trabajo,
+                descripcion=f"Carga masiva de rutas ({modo})",
+                parametros={"archivo": archivo.filename, "modo": modo}
+            )
+            response.status_code = 202
+            return job_encolado(job_id)
         else:
-            # Usar el nuevo método con modo
-            if modo == "upsert":
-                resultado = await excel_service.procesar_carga_masiva_con_modo(archivo_buffer, modo)
-                mensaje = f"Procesamiento completado: {resultado.get('creadas', 0)} creadas, {resultado.get('actualizadas', 0)} actualizadas"
-            else:
-                # Modo crear (comportamiento original)
-                resultado = await excel_service.procesar_carga_masiva(archivo_buffer)
-                mensaje = f"Procesamiento completado: {resultado.get('exitosas', 0)} rutas creadas"
+            resultado = await excel_service.procesar_carga_masiva_con_modo(archivo_buffer, modo)
+            mensaje = f"Procesamiento completado: {resultado.get('creadas', 0)} creadas, {resultado.get('actualizadas', 0)} actualizadas"
         
         return {
             "archivo": archivo.filename,
@@ -1527,10 +1384,27 @@ async def sincronizar_localidades_rutas(db = Depends(get_database)):
     Incluye búsqueda por ALIAS para localidades no encontradas por ID o nombre.
     """
     rutas_collection = db["rutas"]
-    localidades_collection = db["localidades"]
-    alias_collection = db["localidades_alias"]
     
-    async def obtener_localidad_completa(localidad_id: str, nombre_localidad: str = None):
+    # Localidades y alias se resuelven contra el índice en memoria
+    indice = get_localidad_alias_index()
+    await indice.asegurar_cargado(db)
+    
+    _sin_filtro = object()
+    
+    def mismo_nombre_y_lugar(localidad: dict, tipo: str, distrito=_sin_filtro):
+        """Localidad de otro tipo con el mismo nombre, departamento y provincia"""
+        for candidata in indice.localidades_con_nombre(localidad.get("nombre")):
+            if (
+                candidata.get("nombre") == localidad.get("nombre")
+                and candidata.get("tipo") == tipo
+                and candidata.get("departamento") == localidad.get("departamento")
+                and candidata.get("provincia") == localidad.get("provincia")
+                and (distrito is _sin_filtro or candidata.get("distrito") == distrito)
+            ):
+                return candidata
+        return None
+    
+    def obtener_localidad_completa(localidad_id: str, nombre_localidad: str = None):
         """
         Obtiene información completa de una localidad.
         Búsqueda: 1) Por ID, 2) Por NOMBRE, 3) Por ALIAS
@@ -1539,95 +1413,26 @@ async def sincronizar_localidades_rutas(db = Depends(get_database)):
         IMPORTANTE: Preserva el nombre original de la ruta, solo agrega información territorial.
         """
         try:
-            import re
-            
             # GUARDAR EL NOMBRE ORIGINAL para preservarlo
             nombre_original = nombre_localidad
             alias_doc = None  # Inicializar aquí para que esté disponible en todo el scope
             
             # Primero buscar por ID exacto
-            localidad = await localidades_collection.find_one({
-                "$or": [
-                    {"id": localidad_id},
-                    {"_id": ObjectId(localidad_id) if ObjectId.is_valid(localidad_id) else None}
-                ]
-            })
+            localidad = indice.por_id(localidad_id)
             
-            # Si no se encuentra por ID, buscar por nombre
+            # Si no se encuentra por ID, buscar por nombre (el índice ignora tildes y el prefijo C.P.)
             if not localidad and nombre_localidad:
                 print(f"  ⚠️ ID no encontrado, buscando por nombre: {nombre_localidad}")
-                
-                # Normalizar nombre (remover prefijos C.P., CP, etc.)
-                nombre_normalizado = re.sub(r'^(C\.P\.|CP|C\.P)\s*', '', nombre_localidad, flags=re.IGNORECASE).strip()
-                
-                # Buscar primero CENTRO_POBLADO con ese nombre
-                localidad = await localidades_collection.find_one({
-                    "nombre": {"$regex": f"^{nombre_localidad}$", "$options": "i"},
-                    "tipo": "CENTRO_POBLADO",
-                    "estaActiva": True
-                })
-                
-                # Si no hay centro poblado con nombre original, buscar con nombre normalizado
-                if not localidad and nombre_normalizado != nombre_localidad:
-                    localidad = await localidades_collection.find_one({
-                        "nombre": {"$regex": f"^{nombre_normalizado}$", "$options": "i"},
-                        "tipo": "CENTRO_POBLADO",
-                        "estaActiva": True
-                    })
-                
-                # Si no hay centro poblado, buscar DISTRITO
-                if not localidad:
-                    localidad = await localidades_collection.find_one({
-                        "nombre": {"$regex": f"^{nombre_localidad}$", "$options": "i"},
-                        "tipo": "DISTRITO",
-                        "estaActiva": True
-                    })
-                
-                # Si no hay distrito, buscar PROVINCIA
-                if not localidad:
-                    localidad = await localidades_collection.find_one({
-                        "nombre": {"$regex": f"^{nombre_localidad}$", "$options": "i"},
-                        "tipo": "PROVINCIA",
-                        "estaActiva": True
-                    })
-                
-                # Si no hay provincia, buscar cualquier tipo
-                if not localidad:
-                    localidad = await localidades_collection.find_one({
-                        "nombre": {"$regex": f"^{nombre_localidad}$", "$options": "i"},
-                        "estaActiva": True
-                    })
+                localidad = indice.buscar_localidad(nombre_localidad)
                 
                 # ✅ NUEVO: Si aún no se encuentra, buscar en ALIAS
                 if not localidad:
                     print(f"  🔍 Buscando en alias: {nombre_localidad}")
-                    
-                    # Buscar alias con nombre original
-                    alias_doc = await alias_collection.find_one({
-                        "alias": {"$regex": f"^{nombre_localidad}$", "$options": "i"},
-                        "estaActivo": True
-                    })
-                    
-                    # Si no se encuentra, buscar con nombre normalizado
-                    if not alias_doc and nombre_normalizado != nombre_localidad:
-                        alias_doc = await alias_collection.find_one({
-                            "alias": {"$regex": f"^{nombre_normalizado}$", "$options": "i"},
-                            "estaActivo": True
-                        })
-                    
-                    # Si se encontró un alias, obtener la localidad oficial
-                    if alias_doc:
-                        localidad_id_alias = alias_doc.get("localidad_id")
-                        if localidad_id_alias:
-                            try:
-                                localidad = await localidades_collection.find_one({
-                                    "_id": ObjectId(localidad_id_alias)
-                                })
-                                if localidad:
-                                    print(f"  ✅ Encontrada por ALIAS: '{nombre_localidad}' → '{localidad.get('nombre')}' ({localidad.get('tipo')})")
-                                    print(f"  📌 PRESERVANDO nombre original: '{nombre_original}'")
-                            except Exception as e:
-                                print(f"  ❌ Error obteniendo localidad desde alias: {e}")
+                    encontrado = indice.buscar_alias(nombre_localidad)
+                    if encontrado:
+                        alias_doc, localidad = encontrado
+                        print(f"  ✅ Encontrada por ALIAS: '{nombre_localidad}' → '{localidad.get('nombre')}' ({localidad.get('tipo')})")
+                        print(f"  📌 PRESERVANDO nombre original: '{nombre_original}'")
                 
                 if localidad:
                     print(f"  ✅ Encontrada por nombre: {localidad.get('nombre')} ({localidad.get('tipo')})")
@@ -1667,13 +1472,10 @@ async def sincronizar_localidades_rutas(db = Depends(get_database)):
             # Si es DISTRITO o PROVINCIA, buscar si existe un centro poblado con el mismo nombre
             if tipo in ["DISTRITO", "PROVINCIA"]:
                 # Buscar centro poblado con el mismo nombre en la misma ubicación
-                centro_poblado = await localidades_collection.find_one({
-                    "nombre": localidad.get("nombre"),
-                    "tipo": "CENTRO_POBLADO",
-                    "departamento": localidad.get("departamento"),
-                    "provincia": localidad.get("provincia"),
-                    "distrito": localidad.get("distrito") if tipo == "DISTRITO" else None
-                })
+                centro_poblado = mismo_nombre_y_lugar(
+                    localidad, "CENTRO_POBLADO",
+                    distrito=localidad.get("distrito") if tipo == "DISTRITO" else None
+                )
                 
                 if centro_poblado:
                     print(f"  🎯 Encontrado centro poblado para {nombre_a_usar} (era {tipo})")
@@ -1693,12 +1495,7 @@ async def sincronizar_localidades_rutas(db = Depends(get_database)):
                 
                 # Si no hay centro poblado pero es PROVINCIA, buscar DISTRITO
                 if tipo == "PROVINCIA":
-                    distrito = await localidades_collection.find_one({
-                        "nombre": localidad.get("nombre"),
-                        "tipo": "DISTRITO",
-                        "departamento": localidad.get("departamento"),
-                        "provincia": localidad.get("provincia")
-                    })
+                    distrito = mismo_nombre_y_lugar(localidad, "DISTRITO")
                     
                     if distrito:
                         print(f"  📍 Encontrado distrito para {nombre_a_usar} (era PROVINCIA)")
@@ -1752,7 +1549,7 @@ async def sincronizar_localidades_rutas(db = Depends(get_database)):
             # Sincronizar origen
             origen = ruta.get("origen")
             if origen and isinstance(origen, dict) and origen.get("id"):
-                origen_completo = await obtener_localidad_completa(
+                origen_completo = obtener_localidad_completa(
                     origen["id"], 
                     origen.get("nombre")
                 )
@@ -1762,7 +1559,7 @@ async def sincronizar_localidades_rutas(db = Depends(get_database)):
             # Sincronizar destino
             destino = ruta.get("destino")
             if destino and isinstance(destino, dict) and destino.get("id"):
-                destino_completo = await obtener_localidad_completa(
+                destino_completo = obtener_localidad_completa(
                     destino["id"],
                     destino.get("nombre")
                 )
@@ -1775,7 +1572,7 @@ async def sincronizar_localidades_rutas(db = Depends(get_database)):
                 itinerario_sincronizado = []
                 for parada in itinerario:
                     if isinstance(parada, dict) and parada.get("id"):
-                        localidad_completa = await obtener_localidad_completa(
+                        localidad_completa = obtener_localidad_completa(
                             parada["id"],
                             parada.get("nombre")
                         )
@@ -1792,6 +1589,7 @@ async def sincronizar_localidades_rutas(db = Depends(get_database)):
             
             # Actualizar ruta si hay cambios
             if update_data:
+                update_data["nivelTerritorial"] = calcular_nivel_territorial({**ruta, **update_data})
                 result = await rutas_collection.update_one(
                     {"_id": ruta["_id"]},
                     {"$set": update_data}
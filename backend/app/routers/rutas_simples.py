@@ -17,6 +17,7 @@ from ..models.ruta import (
 )
 from ..database import get_database
 from ..dependencies.auth import get_current_user
+from ..utils.busqueda_normalizada import con_campos_busqueda
 
 logger = logging.getLogger(__name__)
 
@@ -214,6 +215,7 @@ async def crear_ruta_simple(
         ruta_doc["fechaRegistro"] = datetime.utcnow()
         ruta_doc["estaActivo"] = True
         ruta_doc["estado"] = "ACTIVA"
+        con_campos_busqueda("rutas", ruta_doc)
         
         # Insertar en MongoDB
         resultado = await rutas_collection.insert_one(ruta_doc)
@@ -621,7 +623,7 @@ async def procesar_carga_masiva_rutas(
                 
                 if not solo_validar:
                     # Insertar en base de datos
-                    resultado = await rutas_collection.insert_one(ruta_nueva)
+                    resultado = await rutas_collection.insert_one(con_campos_busqueda("rutas", ruta_nueva))
                     if resultado.inserted_id:
                         rutas_creadas.append({
                             "fila": fila,
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, Response
 from fastapi.responses import FileResponse
 from typing import List, Optional
 from bson import ObjectId
@@ -7,6 +7,9 @@ import tempfile
 import os
 from app.dependencies.db import get_database
 from app.services.vehiculo_service import VehiculoService
+from app.core.job_runner import get_job_runner, job_encolado
+from app.utils.respuesta_rapida import RespuestaJSONRapida, listar_documentos
+from app.utils.paginacion_cursor import CursorInvalido, cabeceras_paginacion
 # Importación condicional para evitar errores al iniciar el servidor
 try:
     from app.services.vehiculo_excel_service import VehiculoExcelService
@@ -235,21 +238,36 @@ async def test_vehiculos():
 @router.get("/", response_model=List[VehiculoResponse])
 @router.get("", response_model=List[VehiculoResponse])
 async def get_vehiculos(
-    skip: int = Query(0, ge=0, description="Número de registros a omitir"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Número de registros a omitir (preferir cursor)"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Siguiente-Cursor)"),
     estado: str = Query(None, description="Filtrar por estado"),
     empresa_id: str = Query(None, description="Filtrar por empresa"),
+    ligero: bool = Query(False, description="Solo los campos de la vista de lista, serializados sin Pydantic (más rápido)"),
     vehiculo_service: VehiculoService = Depends(get_vehiculo_service)
 ) -> List[VehiculoResponse]:
     """Obtener lista de vehículos con filtros opcionales"""
+    if ligero:
+        query = vehiculo_service.filtro_vehiculos(empresa_id, estado)
+        try:
+            pagina = await listar_documentos(vehiculo_service.collection, query, "vehiculos", skip, limit, cursor)
+        except CursorInvalido as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        respuesta = RespuestaJSONRapida(pagina.documentos)
+        cabeceras_paginacion(respuesta, pagina)
+        return respuesta
+    
     try:
-        # Usar solo el método básico disponible en VehiculoService
-        vehiculos = await vehiculo_service.get_vehiculos(
-            skip=skip,
+        pagina = await vehiculo_service.get_vehiculos_pagina(
             limit=limit,
             empresa_id=empresa_id,
-            estado=estado
+            estado=estado,
+            cursor=cursor,
+            skip=skip
         )
+        cabeceras_paginacion(response, pagina)
+        vehiculos = pagina.documentos
         
         print(f"📊 Vehículos obtenidos del servicio: {len(vehiculos)}")
         
@@ -267,6 +285,8 @@ async def get_vehiculos(
         print(f"✅ Vehículos convertidos exitosamente: {len(result)}")
         return result
         
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ Error en get_vehiculos: {str(e)}")
         import traceback
@@ -430,7 +450,8 @@ async def descargar_plantilla_vehiculos():
 
 @router.post("/validar-excel", response_model=List[VehiculoValidacionExcel])
 async def validar_excel(
-    archivo: UploadFile = File(...)
+    archivo: UploadFile = File(...),
+    db = Depends(get_database)
 ):
     """Validar archivo Excel antes de la carga masiva"""
     
@@ -441,7 +462,7 @@ async def validar_excel(
     if not archivo.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="El archivo debe ser un Excel (.xlsx o .xls)")
     
-    excel_service = VehiculoExcelService()
+    excel_service = VehiculoExcelService(db)
     
     # Guardar archivo temporalmente
     with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as temp_file:
@@ -462,6 +483,67 @@ async def validar_excel(
         if os.path.exists(temp_file_path):
             os.unlink(temp_file_path)
 
+@router.post("/carga-masiva/procesar")
+async def procesar_carga_masiva_vehiculos(
+    response: Response,
+    archivo: UploadFile = File(..., description="Archivo Excel con vehículos"),
+    en_segundo_plano: bool = Query(False, description="Procesar como job y consultar el avance en /jobs/{id}"),
+    db = Depends(get_database)
+):
+    """
+    Procesar carga masiva de vehículos desde Excel (crea o actualiza por placa)
+    
+    Con en_segundo_plano=true responde 202 con el id del job en lugar de
+    esperar a que termine el procesamiento.
+    """
+    
+    if not EXCEL_SERVICE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Servicio de Excel no disponible. Instale las dependencias: pip install pandas openpyxl xlrd")
+    
+    if not archivo.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="El archivo debe ser un Excel (.xlsx o .xls)")
+    
+    excel_service = VehiculoExcelService(db)
+    
+    # Guardar archivo temporalmente
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as temp_file:
+        temp_file.write(await archivo.read())
+        temp_file_path = temp_file.name
+    
+    async def procesar(on_progreso=None) -> dict:
+        try:
+            resultado = await excel_service.procesar_excel(temp_file_path, on_progreso=on_progreso)
+            return resultado.model_dump()
+        finally:
+            if os.path.exists(temp_file_path):
+                os.unlink(temp_file_path)
+    
+    if not en_segundo_plano:
+        try:
+            return await procesar()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al procesar archivo: {str(e)}")
+    
+    async def trabajo(contexto):
+        async def on_progreso(procesadas, total):
+            await contexto.progreso(procesadas, total, f"Fila {procesadas} de {total}")
+        
+        resultado = await procesar(on_progreso)
+        await contexto.agregar_errores(resultado.get('errores_detalle', []))
+        return resultado
+    
+    try:
+        job_id = await get_job_runner(db).enqueue(
+            "carga_masiva_vehiculos", trabajo,
+            descripcion="Carga masiva de vehículos",
+            parametros={"archivo": archivo.filename}
+        )
+    except Exception:
+        os.unlink(temp_file_path)
+        raise
+    response.status_code = 202
+    return job_encolado(job_id)
+
 @router.post("/test-create-from-excel", status_code=201)
 async def test_create_from_excel(
     vehiculo_service: VehiculoService = Depends(get_vehiculo_service)
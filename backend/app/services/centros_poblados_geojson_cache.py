@@ -0,0 +1,277 @@
+"""
+FeatureCollection de centros poblados pre-serializada y agrupación en grilla
+
+Los centros poblados se cargan una vez y se agrupan por (provincia, distrito)
+normalizados; cada feature se serializa a JSON al construir el índice, así una
+respuesta solo concatena los fragmentos de los grupos pedidos. Las
+respuestas se guardan comprimidas con gzip en un LRU con su ETag.
+
+Con `zoom` los puntos se agrupan en una grilla de CELDAS_POR_TESELA x
+CELDAS_POR_TESELA celdas por tesela web mercator: cada celda con varios
+puntos se devuelve como un único punto (centroide) con la cantidad, para
+que el mapa no dibuje miles de marcadores.
+
+El índice se reconstruye cuando cambia la versión del índice de localidades
+(que se invalida en cada escritura de localidades).
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.services.localidad_alias_index import get_localidad_alias_index
+from app.services.ruta_combinaciones_index import normalizar_texto
+from app.utils.geo import punto_geojson
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LRU = 256
+
+# Celdas de la grilla por lado de una tesela de 256 px (celdas de 64 px)
+CELDAS_POR_TESELA = 4
+
+LATITUD_MAXIMA_MERCATOR = 85.0511287798
+
+PROYECCION_CENTRO_POBLADO = {
+    "nombre": 1,
+    "ubigeo": 1,
+    "departamento": 1,
+    "provincia": 1,
+    "distrito": 1,
+    "poblacion": 1,
+    "tipo_area": 1,
+    "codigo_ccpp": 1,
+    "altitud": 1,
+    "estaActiva": 1,
+    "coordenadas": 1,
+    "fechaCreacion": 1,
+    "fechaActualizacion": 1
+}
+
+_SEPARADORES = (",", ":")
+
+
+def _json(valor: Any) -> str:
+    return json.dumps(valor, separators=_SEPARADORES, ensure_ascii=False, default=str)
+
+
+def _fecha(valor: Any) -> Optional[str]:
+    return valor.isoformat() if hasattr(valor, "isoformat") else None
+
+
+def _numero(valor: Any) -> float:
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+    return numero if math.isfinite(numero) else 0.0
+
+
+def feature_centro_poblado(localidad: Dict[str, Any], punto: Dict[str, Any]) -> Dict[str, Any]:
+    """Feature GeoJSON de un centro poblado"""
+    localidad_id = str(localidad["_id"])
+    return {
+        "type": "Feature",
+        "id": localidad_id,
+        "geometry": punto,
+        "properties": {
+            "id": localidad_id,
+            "nombre": localidad.get("nombre"),
+            "ubigeo": localidad.get("ubigeo"),
+            "departamento": localidad.get("departamento"),
+            "provincia": localidad.get("provincia"),
+            "distrito": localidad.get("distrito"),
+            "poblacion": localidad.get("poblacion"),
+            "tipo_area": localidad.get("tipo_area"),
+            "codigo_ccpp": localidad.get("codigo_ccpp"),
+            "altitud": localidad.get("altitud"),
+            "esta_activa": localidad.get("estaActiva"),
+            "fecha_creacion": _fecha(localidad.get("fechaCreacion")),
+            "fecha_actualizacion": _fecha(localidad.get("fechaActualizacion"))
+        }
+    }
+
+
+def celdas_grilla(lon: np.ndarray, lat: np.ndarray, zoom: int, celdas_por_tesela: int = CELDAS_POR_TESELA) -> np.ndarray:
+    """Índice de celda (web mercator) de cada punto para un zoom"""
+    n = (2 ** zoom) * celdas_por_tesela
+    x = np.floor((np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * n)
+    fi = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -LATITUD_MAXIMA_MERCATOR, LATITUD_MAXIMA_MERCATOR))
+    y = np.floor((1.0 - np.log(np.tan(fi) + 1.0 / np.cos(fi)) / math.pi) / 2.0 * n)
+    x = np.clip(x, 0, n - 1).astype(np.int64)
+    y = np.clip(y, 0, n - 1).astype(np.int64)
+    return x * n + y
+
+
+class CentrosPobladosGeojsonCache:
+    """Centros poblados agrupados por provincia y distrito, listos para servir"""
+
+    def __init__(self, tamano_lru: int = TAMANO_LRU):
+        """
+        Args:
+            tamano_lru: Respuestas comprimidas (por filtros y zoom) que se recuerdan
+        """
+        self.tamano_lru = tamano_lru
+        self._grupos: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._version: Optional[int] = None
+        self._lru: "OrderedDict[Tuple[Any, ...], Dict[str, Any]]" = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    def reconstruir(self, localidades: Sequence[Dict[str, Any]], version: Optional[int] = None) -> None:
+        """Agrupar y serializar los centros poblados con coordenadas válidas"""
+        grupos: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for localidad in localidades:
+            punto = punto_geojson(localidad.get("coordenadas"))
+            if punto is None:
+                continue
+            clave = (normalizar_texto(localidad.get("provincia") or ""), normalizar_texto(localidad.get("distrito") or ""))
+            grupo = grupos.setdefault(clave, {"json": [], "activa": [], "lon": [], "lat": [], "poblacion": []})
+            grupo["json"].append(_json(feature_centro_poblado(localidad, punto)))
+            grupo["activa"].append(localidad.get("estaActiva") is not False)
+            grupo["lon"].append(punto["coordinates"][0])
+            grupo["lat"].append(punto["coordinates"][1])
+            grupo["poblacion"].append(_numero(localidad.get("poblacion")))
+
+        for grupo in grupos.values():
+            for campo in ("activa", "lon", "lat", "poblacion"):
+                grupo[campo] = np.array(grupo[campo], dtype=bool if campo == "activa" else np.float64)
+
+        self._grupos = grupos
+        self._version = version
+        self._lru.clear()
+
+    async def asegurar_cargado(self, db: AsyncIOMotorDatabase) -> None:
+        """Reconstruir si el índice de localidades se recargó desde la última vez"""
+        indice = get_localidad_alias_index()
+        await indice.asegurar_cargado(db)
+        if indice.version == self._version:
+            return
+
+        async with self._lock:
+            version = indice.version
+            if version == self._version:
+                return
+            inicio = time.perf_counter()
+            localidades = await db["localidades"].find(
+                {"tipo": "CENTRO_POBLADO"}, PROYECCION_CENTRO_POBLADO
+            ).to_list(length=None)
+            self.reconstruir(localidades, version)
+            logger.info(
+                f"GeoJSON de centros poblados reconstruido: {len(localidades)} centros poblados "
+                f"en {len(self._grupos)} distritos en {(time.perf_counter() - inicio) * 1000:.1f} ms"
+            )
+
+    def _seleccion(self, provincia: Optional[str], distrito: Optional[str]) -> List[Dict[str, Any]]:
+        provincia = normalizar_texto(provincia) if provincia else None
+        distrito = normalizar_texto(distrito) if distrito else None
+        return [
+            grupo for (grupo_provincia, grupo_distrito), grupo in sorted(self._grupos.items())
+            if (provincia is None or grupo_provincia == provincia) and (distrito is None or grupo_distrito == distrito)
+        ]
+
+    def coleccion(
+        self,
+        provincia: Optional[str] = None,
+        distrito: Optional[str] = None,
+        activos_solo: bool = True,
+        zoom: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        FeatureCollection comprimida para los filtros dados
+
+        provincia y distrito se comparan sin tildes ni mayúsculas con el
+        nombre completo. Con `zoom` los puntos se agrupan en la grilla.
+
+        Returns:
+            gzip (bytes comprimidos del JSON), etag, total (puntos) y
+            features (features devueltas: puntos sueltos y grupos)
+        """
+        clave = (provincia, distrito, activos_solo, zoom)
+        respuesta = self._lru.get(clave)
+        if respuesta is not None:
+            self._lru.move_to_end(clave)
+            return respuesta
+
+        grupos = self._seleccion(provincia, distrito)
+        if zoom is None:
+            fragmentos = [
+                fragmento for grupo in grupos
+                for fragmento, activa in zip(grupo["json"], grupo["activa"]) if activa or not activos_solo
+            ]
+            total = len(fragmentos)
+        else:
+            fragmentos, total = self._agrupar(grupos, activos_solo, zoom)
+
+        metadata = {"total": total, "provincia": provincia, "distrito": distrito, "activos_solo": activos_solo}
+        if zoom is not None:
+            metadata.update({"cluster": zoom, "features": len(fragmentos)})
+        contenido = (
+            '{"type":"FeatureCollection","features":[' + ",".join(fragmentos) + '],"metadata":' + _json(metadata) + "}"
+        ).encode("utf-8")
+
+        respuesta = {
+            "gzip": gzip.compress(contenido, compresslevel=6),
+            "etag": f'"{hashlib.md5(contenido).hexdigest()}"',
+            "total": total,
+            "features": len(fragmentos)
+        }
+        self._lru[clave] = respuesta
+        if len(self._lru) > self.tamano_lru:
+            self._lru.popitem(last=False)
+        return respuesta
+
+    @staticmethod
+    def _agrupar(grupos: List[Dict[str, Any]], activos_solo: bool, zoom: int) -> Tuple[List[str], int]:
+        """(fragmentos JSON de puntos sueltos y grupos, total de puntos)"""
+        if not grupos:
+            return [], 0
+        mascara = np.concatenate([grupo["activa"] if activos_solo else np.ones(len(grupo["json"]), dtype=bool) for grupo in grupos])
+        lon = np.concatenate([grupo["lon"] for grupo in grupos])[mascara]
+        lat = np.concatenate([grupo["lat"] for grupo in grupos])[mascara]
+        poblacion = np.concatenate([grupo["poblacion"] for grupo in grupos])[mascara]
+        fragmentos_puntos = [fragmento for grupo in grupos for fragmento in grupo["json"]]
+        indices = np.flatnonzero(mascara)
+        if len(lon) == 0:
+            return [], 0
+
+        celdas = celdas_grilla(lon, lat, zoom)
+        unicas, inverso, cantidades = np.unique(celdas, return_inverse=True, return_counts=True)
+        lon_centro = np.bincount(inverso, weights=lon) / cantidades
+        lat_centro = np.bincount(inverso, weights=lat) / cantidades
+        poblacion_celda = np.bincount(inverso, weights=poblacion)
+        # Primer punto de cada celda, para las celdas con un solo punto
+        primero = np.full(len(unicas), len(lon), dtype=np.int64)
+        np.minimum.at(primero, inverso, np.arange(len(lon)))
+
+        fragmentos = []
+        for posicion, celda in enumerate(unicas):
+            cantidad = int(cantidades[posicion])
+            if cantidad == 1:
+                fragmentos.append(fragmentos_puntos[indices[primero[posicion]]])
+                continue
+            fragmentos.append(_json({
+                "type": "Feature",
+                "id": f"cluster-{zoom}-{int(celda)}",
+                "geometry": {"type": "Point", "coordinates": [float(lon_centro[posicion]), float(lat_centro[posicion])]},
+                "properties": {"cluster": True, "cantidad": cantidad, "poblacion": int(poblacion_celda[posicion])}
+            }))
+        return fragmentos, int(len(lon))
+
+
+# Global cache instance
+_cache_instance: Optional[CentrosPobladosGeojsonCache] = None
+
+def get_centros_poblados_geojson_cache() -> CentrosPobladosGeojsonCache:
+    """Get global centros poblados GeoJSON cache instance"""
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = CentrosPobladosGeojsonCache()
+    return _cache_instance
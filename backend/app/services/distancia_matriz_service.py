@@ -0,0 +1,208 @@
+"""
+Matrices de distancias entre localidades calculadas con NumPy
+
+Las coordenadas de todas las localidades se guardan como dos vectores
+(latitud y longitud) construidos a partir del índice en memoria de
+localidades; una matriz NxN o las distancias de un itinerario se calculan
+con broadcasting sobre esos vectores, sin un bucle por par.
+
+Los resultados (matrices e itinerarios, como arreglos de solo lectura) se
+guardan en un LRU por lista de ids: las mismas rutas e itinerarios se piden
+una y otra vez. El LRU se acota por cantidad y por bytes, y no guarda los
+resultados mayores a DISTANCIAS_LRU_MAX_BYTES_RESULTADO (una matriz de 1000
+ids ocupa 8 MB). Vectores y LRU se reconstruyen cuando el índice de
+localidades se recarga.
+
+Las matrices de más de DISTANCIAS_MATRIZ_EN_HILO ids se calculan y pasan a
+listas en un hilo (`matriz_lista`) para no bloquear el event loop.
+"""
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.services.localidad_alias_index import get_localidad_alias_index
+from app.utils.geo import matriz_haversine_km, punto_geojson, tramos_haversine_km
+
+TAMANO_LRU = 256
+DISTANCIAS_LRU_MAX_BYTES = int(os.getenv("DISTANCIAS_LRU_MAX_BYTES", str(64 * 1024 * 1024)))
+DISTANCIAS_LRU_MAX_BYTES_RESULTADO = int(os.getenv("DISTANCIAS_LRU_MAX_BYTES_RESULTADO", str(2 * 1024 * 1024)))
+DISTANCIAS_MATRIZ_EN_HILO = int(os.getenv("DISTANCIAS_MATRIZ_EN_HILO", "100"))
+
+
+def _bytes_resultado(resultado: Dict[str, Any]) -> int:
+    return sum(valor.nbytes for valor in resultado.values() if isinstance(valor, np.ndarray))
+
+
+class DistanciaMatrizService:
+    """Distancias en línea recta (km) entre localidades por lotes"""
+
+    def __init__(
+        self,
+        tamano_lru: int = TAMANO_LRU,
+        max_bytes: int = DISTANCIAS_LRU_MAX_BYTES,
+        max_bytes_resultado: int = DISTANCIAS_LRU_MAX_BYTES_RESULTADO
+    ):
+        """
+        Args:
+            tamano_lru: Resultados (por lista de ids) que se recuerdan
+            max_bytes: Bytes de arreglos que puede ocupar el LRU
+            max_bytes_resultado: Los resultados mayores no se guardan
+        """
+        self.tamano_lru = tamano_lru
+        self.max_bytes = max_bytes
+        self.max_bytes_resultado = max_bytes_resultado
+        self._posicion: Dict[str, int] = {}
+        self._lat = np.empty(0)
+        self._lon = np.empty(0)
+        self._version: Optional[int] = None
+        self._lru: "OrderedDict[Tuple[str, Tuple[str, ...]], Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        # matriz_lista usa el LRU desde un hilo
+        self._lock_lru = threading.Lock()
+
+    def reconstruir(self, localidades: Sequence[Dict[str, Any]], version: Optional[int] = None) -> None:
+        """Construir los vectores de coordenadas (solo localidades con coordenadas válidas)"""
+        posicion: Dict[str, int] = {}
+        lat: List[float] = []
+        lon: List[float] = []
+        for localidad in localidades:
+            punto = punto_geojson(localidad.get("coordenadas"))
+            if punto is None:
+                continue
+            for clave in (localidad.get("_id"), localidad.get("id")):
+                if clave:
+                    posicion.setdefault(str(clave), len(lat))
+            lon.append(punto["coordinates"][0])
+            lat.append(punto["coordinates"][1])
+
+        self._posicion = posicion
+        self._lat = np.array(lat, dtype=np.float64)
+        self._lon = np.array(lon, dtype=np.float64)
+        self._version = version
+        with self._lock_lru:
+            self._lru.clear()
+            self._bytes = 0
+
+    async def asegurar_cargado(self, db: AsyncIOMotorDatabase) -> None:
+        """Reconstruir los vectores si el índice de localidades se recargó"""
+        indice = get_localidad_alias_index()
+        await indice.asegurar_cargado(db)
+        if indice.version != self._version:
+            self.reconstruir(indice.localidades(), indice.version)
+
+    def _posiciones(self, ids: Sequence[str]) -> Tuple[np.ndarray, List[str], List[str]]:
+        """(posiciones, ids con coordenadas, ids sin coordenadas) para una lista de ids"""
+        posiciones: List[int] = []
+        encontrados: List[str] = []
+        faltantes: List[str] = []
+        for localidad_id in ids:
+            posicion = self._posicion.get(localidad_id)
+            if posicion is None:
+                faltantes.append(localidad_id)
+            else:
+                posiciones.append(posicion)
+                encontrados.append(localidad_id)
+        return np.array(posiciones, dtype=np.intp), encontrados, faltantes
+
+    def _cacheado(self, tipo: str, ids: Sequence[str], calcular: Callable[[Tuple[str, ...]], Dict[str, Any]]) -> Dict[str, Any]:
+        clave = (tipo, tuple(str(localidad_id) for localidad_id in ids))
+        with self._lock_lru:
+            resultado = self._lru.get(clave)
+            if resultado is not None:
+                self._lru.move_to_end(clave)
+                return resultado
+
+        resultado = calcular(clave[1])
+        for valor in resultado.values():
+            if isinstance(valor, np.ndarray):
+                valor.setflags(write=False)
+
+        tamano = _bytes_resultado(resultado)
+        if tamano > self.max_bytes_resultado:
+            return resultado
+        with self._lock_lru:
+            anterior = self._lru.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= _bytes_resultado(anterior)
+            self._lru[clave] = resultado
+            self._bytes += tamano
+            while self._lru and (len(self._lru) > self.tamano_lru or self._bytes > self.max_bytes):
+                _, descartado = self._lru.popitem(last=False)
+                self._bytes -= _bytes_resultado(descartado)
+        return resultado
+
+    def matriz(self, ids: Sequence[str]) -> Dict[str, Any]:
+        """
+        Matriz NxN de distancias entre las localidades con coordenadas
+
+        Returns:
+            ids (filas/columnas de la matriz), faltantes (sin coordenadas o
+            inexistentes) y matriz_km (ndarray de solo lectura)
+        """
+        def calcular(claves: Tuple[str, ...]) -> Dict[str, Any]:
+            posiciones, encontrados, faltantes = self._posiciones(claves)
+            lat, lon = self._lat[posiciones], self._lon[posiciones]
+            return {"ids": encontrados, "faltantes": faltantes, "matriz_km": matriz_haversine_km(lat, lon)}
+
+        return self._cacheado("matriz", ids, calcular)
+
+    async def matriz_lista(self, ids: Sequence[str]) -> Dict[str, Any]:
+        """
+        `matriz` con matriz_km como listas redondeadas a metros, lista para JSON
+
+        Con más de DISTANCIAS_MATRIZ_EN_HILO ids el cálculo y la conversión
+        (un millón de celdas con 1000 ids) van en un hilo.
+        """
+        def armar() -> Dict[str, Any]:
+            resultado = self.matriz(ids)
+            return {**resultado, "matriz_km": resultado["matriz_km"].round(3).tolist()}
+
+        if len(ids) > DISTANCIAS_MATRIZ_EN_HILO:
+            return await asyncio.to_thread(armar)
+        return armar()
+
+    def itinerario(self, ids: Sequence[str]) -> Dict[str, Any]:
+        """
+        Distancias de un recorrido en orden (origen, paradas, destino)
+
+        Las localidades sin coordenadas se saltan: el tramo va de la anterior
+        con coordenadas a la siguiente.
+        """
+        def calcular(claves: Tuple[str, ...]) -> Dict[str, Any]:
+            posiciones, encontrados, faltantes = self._posiciones(claves)
+            lat, lon = self._lat[posiciones], self._lon[posiciones]
+            tramos = tramos_haversine_km(lat, lon) if len(posiciones) > 1 else np.empty(0)
+            acumulada = np.concatenate(([0.0], np.cumsum(tramos))) if len(posiciones) else np.empty(0)
+            return {
+                "ids": encontrados,
+                "faltantes": faltantes,
+                "tramos_km": tramos,
+                "acumulada_km": acumulada,
+                "total_km": float(acumulada[-1]) if len(acumulada) else 0.0
+            }
+
+        return self._cacheado("itinerario", ids, calcular)
+
+    @staticmethod
+    def ids_recorrido(ruta: Dict[str, Any]) -> List[str]:
+        """Ids de origen, itinerario (por orden) y destino de un documento de ruta"""
+        paradas = [p for p in (ruta.get("itinerario") or []) if isinstance(p, dict) and p.get("id")]
+        paradas.sort(key=lambda p: p.get("orden") or 0)
+        ids = [(ruta.get("origen") or {}).get("id")] + [p["id"] for p in paradas] + [(ruta.get("destino") or {}).get("id")]
+        return [str(localidad_id) for localidad_id in ids if localidad_id]
+
+
+# Global service instance
+_service_instance: Optional[DistanciaMatrizService] = None
+
+def get_distancia_matriz_service() -> DistanciaMatrizService:
+    """Get global distance matrix service instance"""
+    global _service_instance
+    if _service_instance is None:
+        _service_instance = DistanciaMatrizService()
+    return _service_instance
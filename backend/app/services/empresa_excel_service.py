@@ -4,7 +4,7 @@ Servicio para carga masiva de empresas desde archivos Excel - SIN DATOS MOCK
 import pandas as pd
 import re
 from datetime import datetime
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Callable, Awaitable
 from io import BytesIO
 from app.models.empresa import (
     EmpresaCreate, 
@@ -18,6 +18,9 @@ from app.services.empresa_service import EmpresaService
 from app.services.configuracion_service import ConfiguracionService
 from app.dependencies.db import get_database
 
+# Cada cuántas empresas se informa el avance en procesar_carga_masiva
+EMPRESAS_POR_AVANCE = 50
+
 class EmpresaExcelService:
     def __init__(self):
         self.empresa_service = None
@@ -1151,8 +1154,18 @@ class EmpresaExcelService:
         
         return EmpresaCreate(**empresa_data)
     
-    async def procesar_carga_masiva(self, archivo_excel: BytesIO) -> Dict[str, Any]:
-        """Procesar carga masiva de empresas desde Excel - CREAR O ACTUALIZAR EN BASE DE DATOS REAL"""
+    async def procesar_carga_masiva(
+        self,
+        archivo_excel: BytesIO,
+        on_progreso: Optional[Callable[[int, int], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Procesar carga masiva de empresas desde Excel - CREAR O ACTUALIZAR EN BASE DE DATOS REAL
+        
+        Args:
+            archivo_excel: Archivo Excel con las empresas
+            on_progreso: Callback async (procesadas, total) cada EMPRESAS_POR_AVANCE empresas
+        """
         
         # Primero validar el archivo
         resultado_validacion = await self.validar_archivo_excel(archivo_excel)
@@ -1167,7 +1180,11 @@ class EmpresaExcelService:
         
         empresa_service = await self._get_empresa_service()
         
-        for empresa_data in resultado_validacion['empresas_validas']:
+        empresas_validas = resultado_validacion['empresas_validas']
+        for indice, empresa_data in enumerate(empresas_validas):
+            if on_progreso and indice % EMPRESAS_POR_AVANCE == 0:
+                await on_progreso(indice, len(empresas_validas))
+            
             try:
                 # Verificar si la empresa ya existe
                 ruc = empresa_data['ruc']
@@ -2,6 +2,7 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 import httpx
 import uuid
 
@@ -30,6 +31,21 @@ from app.utils.exceptions import (
     SunatValidationError,
 )
 from app.utils.codigo_empresa_utils import CodigoEmpresaUtils
+from app.utils.paginacion_cursor import PaginaCursor, paginar
+from app.utils.busqueda_normalizada import CAMPO_BUSQUEDA, campos_busqueda, con_campos_busqueda, filtro_contiene, indices_busqueda
+from app.core.indices import registrar_consulta, registrar_indices
+
+# Las empresas se buscan por UUID `id` o por `_id` (get_empresa_by_id)
+registrar_indices(
+    "empresas",
+    IndexModel([("id", ASCENDING)], sparse=True),
+    IndexModel([("ruc", ASCENDING)]),
+    *indices_busqueda("razonSocial.principal")
+)
+registrar_consulta("empresas", "listado_activas", {"estaActivo": True}, [("_id", ASCENDING)])
+registrar_consulta("empresas", "por_ruc", {"ruc": "20000000001"})
+registrar_consulta("empresas", "buscar_razon_social", {"estaActivo": True, **filtro_contiene({"razonSocial.principal": "transportes"})})
+registrar_consulta("empresas", "por_id", {"$or": [{"id": "00000000-0000-0000-0000-000000000000"}, {"_id": ObjectId("000000000000000000000000")}]})
 
 
 class EmpresaService:
@@ -110,6 +126,7 @@ class EmpresaService:
             observaciones="Creación inicial de empresa",
         )
         empresa_dict["auditoria"].append(auditoria.model_dump())
+        con_campos_busqueda("empresas", empresa_dict)
         
         # Garantizar UUID en campo id
         if "id" not in empresa_dict or not empresa_dict["id"]:
@@ -161,14 +178,23 @@ class EmpresaService:
         return doc
 
     async def get_empresas_activas(self, skip: int = 0, limit: int = 100) -> List[EmpresaInDB]:
-        cursor = self.collection.find({"estaActivo": True}).skip(skip).limit(limit)
-        docs = await cursor.to_list(length=limit)
+        pagina = await self.get_empresas_activas_pagina(limit=limit, skip=skip)
+        return pagina.documentos
+
+    async def get_empresas_activas_pagina(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        skip: int = 0
+    ) -> PaginaCursor:
+        """Página de empresas activas por cursor `(_id)`; lanza CursorInvalido si el cursor no es válido"""
+        pagina = await paginar(self.collection, {"estaActivo": True}, limit, cursor=cursor, skip=skip)
         
         # Importar mapper aquí para evitar circular imports
         from app.services.empresa_mapper import EmpresaMapper
         
         empresas = []
-        for doc in docs:
+        for doc in pagina.documentos:
             try:
                 # Mapear documento antiguo al nuevo modelo
                 empresa = EmpresaMapper.map_empresa_antigua(doc)
@@ -177,7 +203,8 @@ class EmpresaService:
                 print(f"Error mapeando empresa {doc.get('ruc', 'desconocido')}: {e}")
                 continue
         
-        return empresas
+        pagina.documentos = empresas
+        return pagina
 
     async def get_empresas_por_estado(self, estado: EstadoEmpresa, skip: int = 0, limit: int = 100) -> List[EmpresaInDB]:
         cursor = self.collection.find({"estado": estado, "estaActivo": True}).skip(skip).limit(limit)
@@ -199,12 +226,7 @@ class EmpresaService:
 
     async def get_empresas_con_filtros(self, filtros: EmpresaFiltros) -> List[EmpresaInDB]:
         query: Dict[str, Any] = {"estaActivo": True}
-        
-        if filtros.ruc:
-            query["ruc"] = {"$regex": filtros.ruc, "$options": "i"}
-            
-        if filtros.razonSocial:
-            query["razonSocial.principal"] = {"$regex": filtros.razonSocial, "$options": "i"}
+        query.update(filtro_contiene({"ruc": filtros.ruc, "razonSocial.principal": filtros.razonSocial}))
             
         if filtros.estado:
             query["estado"] = filtros.estado.value if hasattr(filtros.estado, 'value') else filtros.estado
@@ -268,6 +290,7 @@ class EmpresaService:
         if not doc_raw:
             return None
             
+        update_data[CAMPO_BUSQUEDA] = campos_busqueda("empresas", {**doc_raw, **update_data})
         result = await self.collection.update_one({"_id": doc_raw["_id"]}, {"$set": update_data})
         
         if result.modified_count:
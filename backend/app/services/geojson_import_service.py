@@ -0,0 +1,597 @@
+"""
+Importación masiva de localidades y geometrías desde archivos GeoJSON
+
+Las features se leen en streaming (`iterar_features`), se deduplican contra
+las claves ya existentes en la colección (leídas una sola vez al inicio) y
+se escriben con `bulk_write` no ordenado en lotes de upserts.
+
+Cada importación tiene un documento en `importaciones_geojson` con el
+archivo, los parámetros y un checkpoint (features procesadas y contadores)
+que se actualiza tras cada lote: si la importación falla o se cancela,
+`ejecutar` la reanuda saltando las features ya escritas.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.job_runner import JobContext, get_job_runner
+from app.services.geometria_tiles_index import get_geometria_tiles_index
+from app.services.localidad_alias_index import get_localidad_alias_index
+from app.utils.busqueda_normalizada import con_campos_busqueda
+from app.utils.geo import punto_geojson
+from app.utils.geojson_stream import iterar_features
+
+logger = logging.getLogger(__name__)
+
+IMPORTACIONES_COLLECTION = "importaciones_geojson"
+
+TAMANO_LOTE_IMPORTACION = int(os.getenv("GEOJSON_IMPORT_TAMANO_LOTE", "500"))
+
+# Copia de los archivos subidos, para poder reanudar la importación
+DIRECTORIO_IMPORTACIONES = Path(
+    os.getenv("GEOJSON_IMPORT_DIR", os.path.join(tempfile.gettempdir(), "importaciones_geojson"))
+)
+
+# Errores guardados en el checkpoint (el job guarda los suyos aparte)
+MAX_ERRORES_IMPORTACION = 100
+
+MODOS = ("crear", "actualizar", "ambos")
+
+DESTINO_LOCALIDADES = "localidades"
+DESTINO_GEOMETRIAS = "geometrias"
+
+
+class EstadoImportacion:
+    PENDIENTE = "PENDIENTE"
+    EN_PROCESO = "EN_PROCESO"
+    COMPLETADA = "COMPLETADA"
+    FALLIDA = "FALLIDA"
+    INTERRUMPIDA = "INTERRUMPIDA"
+
+    REANUDABLES = (PENDIENTE, FALLIDA, INTERRUMPIDA)
+
+
+def _texto(valor: Any) -> Optional[str]:
+    if valor is None:
+        return None
+    texto = str(valor).strip()
+    return texto or None
+
+
+def coordenadas_feature(geometry: Optional[Dict[str, Any]]) -> Optional[Dict[str, float]]:
+    """Coordenadas de un punto o, para polígonos y líneas, de su primer vértice"""
+    coordenadas = (geometry or {}).get("coordinates")
+    while isinstance(coordenadas, list) and coordenadas and isinstance(coordenadas[0], list):
+        coordenadas = coordenadas[0]
+    if not isinstance(coordenadas, list) or len(coordenadas) < 2:
+        return None
+    return {"longitud": coordenadas[0], "latitud": coordenadas[1]}
+
+
+def tipo_feature(propiedades: Dict[str, Any], tipo_forzado: Optional[str] = None) -> Optional[str]:
+    """
+    Tipo de localidad de una feature
+
+    Con `tipo_forzado` (distinto de 'auto') se usa ese; si no, se detecta por
+    el código presente: IDPROV (provincia), UBIGEO de 6 dígitos (distrito) o
+    IDCCPP (centro poblado).
+    """
+    if tipo_forzado and tipo_forzado.lower() != "auto":
+        return tipo_forzado.upper()
+    if "IDPROV" in propiedades or "NOMBPROV" in propiedades:
+        return "PROVINCIA"
+    if len(str(propiedades.get("UBIGEO") or "").strip()) == 6:
+        return "DISTRITO"
+    if "IDCCPP" in propiedades:
+        return "CENTRO_POBLADO"
+    return None
+
+
+def localidad_desde_feature(feature: Dict[str, Any], tipo_forzado: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Documento de localidad (sin fechas) a partir de una feature
+
+    Returns:
+        None si la feature no tiene nombre (se omite)
+
+    Raises:
+        ValueError: Si no se puede determinar el tipo de localidad
+    """
+    p = feature.get("properties") or {}
+    tipo = tipo_feature(p, tipo_forzado)
+    if not tipo:
+        raise ValueError(f"No se pudo determinar el tipo para: {p.get('nombre') or p.get('NOMBRE') or 'Sin nombre'}")
+
+    if tipo == "PROVINCIA":
+        nombre = _texto(p.get("NOMBPROV")) or _texto(p.get("nombre"))
+        ubigeo = _texto(p.get("IDPROV"))
+        provincia = distrito = nombre
+    elif tipo == "DISTRITO":
+        nombre = _texto(p.get("DISTRITO")) or _texto(p.get("NOMB_DISTR")) or _texto(p.get("nombre"))
+        ubigeo = _texto(p.get("UBIGEO"))
+        provincia = _texto(p.get("PROVINCIA")) or _texto(p.get("NOMB_PROVI"))
+        distrito = nombre
+    else:
+        nombre = (
+            _texto(p.get("NOMB_CCPP")) or _texto(p.get("DISTRITO")) or _texto(p.get("NOMBPROV"))
+            or _texto(p.get("nombre"))
+        )
+        ubigeo = _texto(p.get("IDCCPP")) or _texto(p.get("UBIGEO")) or _texto(p.get("ubigeo"))
+        provincia = _texto(p.get("NOMB_PROVI")) or _texto(p.get("PROVINCIA")) or _texto(p.get("NOMBPROV"))
+        distrito = _texto(p.get("NOMB_DISTR")) or _texto(p.get("DISTRITO"))
+    if not nombre:
+        return None
+
+    coordenadas = coordenadas_feature(feature.get("geometry"))
+    documento = {
+        "nombre": nombre,
+        "tipo": tipo,
+        "ubigeo": ubigeo,
+        "departamento": _texto(p.get("NOMBDEP")) or _texto(p.get("DEPARTAMEN")) or _texto(p.get("NOMB_DEPAR")) or "PUNO",
+        "provincia": provincia,
+        "distrito": distrito,
+        "coordenadas": coordenadas,
+        "location": punto_geojson(coordenadas),
+        "poblacion": p.get("POBTOTAL"),
+        "codigo_ccpp": p.get("COD_CCPP"),
+        "tipo_area": p.get("TIPO"),
+        "altitud": p.get("altitud"),
+        "estaActiva": True
+    }
+    return {clave: valor for clave, valor in documento.items() if valor is not None}
+
+
+def filtro_localidad(documento: Dict[str, Any]) -> Dict[str, Any]:
+    """Filtro de upsert: ubigeo y tipo, o nombre y jerarquía si no hay ubigeo"""
+    if documento.get("ubigeo"):
+        return {"ubigeo": documento["ubigeo"], "tipo": documento["tipo"]}
+    return {
+        "nombre": documento["nombre"],
+        "tipo": documento["tipo"],
+        "provincia": documento.get("provincia"),
+        "distrito": documento.get("distrito")
+    }
+
+
+def clave_localidad(documento: Dict[str, Any]) -> Tuple[Hashable, ...]:
+    """Clave de deduplicación equivalente a `filtro_localidad`"""
+    if documento.get("ubigeo"):
+        return ("ubigeo", str(documento.get("tipo")), str(documento["ubigeo"]))
+    return (
+        "nombre", str(documento.get("tipo")), documento.get("nombre"),
+        documento.get("provincia"), documento.get("distrito")
+    )
+
+
+def geometria_desde_feature(feature: Dict[str, Any], tipo_forzado: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Documento de geometría (sin localidad_id ni fechas) a partir de una feature
+
+    Solo provincias (IDPROV) y distritos (UBIGEO); None si falta el código.
+    """
+    propiedades = feature.get("properties") or {}
+    tipo = tipo_feature(propiedades, tipo_forzado)
+    if tipo not in ("PROVINCIA", "DISTRITO"):
+        raise ValueError(f"Tipo de geometría no soportado: {tipo or 'desconocido'}")
+    ubigeo = _texto(propiedades.get("IDPROV" if tipo == "PROVINCIA" else "UBIGEO"))
+    if not ubigeo or not feature.get("geometry"):
+        return None
+    return {"ubigeo": ubigeo, "tipo": tipo, "geometry": feature["geometry"], "properties": propiedades}
+
+
+def contadores_vacios() -> Dict[str, Any]:
+    return {
+        "procesadas": 0,
+        "creadas": 0,
+        "actualizadas": 0,
+        "existentes": 0,
+        "omitidas": 0,
+        "duplicadas": 0,
+        "sin_localidad": 0,
+        "errores": 0,
+        "por_tipo": {}
+    }
+
+
+def _lotes(features: Iterator[Dict[str, Any]], tamano: int) -> Iterator[List[Dict[str, Any]]]:
+    while True:
+        lote = list(islice(features, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+class GeojsonImportService:
+    """Importaciones GeoJSON reanudables con escritura por lotes"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, tamano_lote: int = TAMANO_LOTE_IMPORTACION):
+        self.db = db
+        self.collection = db[IMPORTACIONES_COLLECTION]
+        self.tamano_lote = max(1, tamano_lote)
+
+    # ------------------------------------------------------------------
+    # Registro de importaciones
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    async def guardar_archivo(origen: BinaryIO) -> Path:
+        """Copiar un archivo subido al directorio de importaciones, por bloques"""
+        DIRECTORIO_IMPORTACIONES.mkdir(parents=True, exist_ok=True)
+        destino = DIRECTORIO_IMPORTACIONES / f"{uuid.uuid4().hex}.geojson"
+
+        def copiar() -> None:
+            origen.seek(0)
+            with open(destino, "wb") as archivo:
+                shutil.copyfileobj(origen, archivo, 1024 * 1024)
+
+        await asyncio.to_thread(copiar)
+        return destino
+
+    @staticmethod
+    async def guardar_datos(geojson_data: Dict[str, Any]) -> Path:
+        """Guardar un FeatureCollection recibido en el body como archivo de importación"""
+        DIRECTORIO_IMPORTACIONES.mkdir(parents=True, exist_ok=True)
+        destino = DIRECTORIO_IMPORTACIONES / f"{uuid.uuid4().hex}.geojson"
+
+        def escribir() -> None:
+            with open(destino, "w", encoding="utf-8") as archivo:
+                json.dump(geojson_data, archivo, ensure_ascii=False, default=str)
+
+        await asyncio.to_thread(escribir)
+        return destino
+
+    async def crear_importacion(
+        self,
+        destino: str,
+        ruta: Path,
+        nombre: str,
+        modo: str = "ambos",
+        tipo: Optional[str] = None,
+        temporal: bool = False
+    ) -> str:
+        """
+        Registrar una importación pendiente
+
+        Args:
+            destino: 'localidades' o 'geometrias'
+            ruta: Archivo GeoJSON a importar
+            nombre: Nombre mostrado (archivo original)
+            modo: crear, actualizar o ambos
+            tipo: Tipo de localidad forzado (None o 'auto' para detectarlo)
+            temporal: Eliminar el archivo cuando la importación termine
+
+        Returns:
+            ID de la importación
+        """
+        if destino not in (DESTINO_LOCALIDADES, DESTINO_GEOMETRIAS):
+            raise ValueError(f"Destino inválido: {destino}")
+        if modo not in MODOS:
+            raise ValueError(f"Modo inválido: {modo}. Use: {', '.join(MODOS)}")
+
+        importacion_id = uuid.uuid4().hex
+        ahora = datetime.utcnow()
+        await self.collection.insert_one({
+            "_id": importacion_id,
+            "destino": destino,
+            "ruta": str(ruta),
+            "nombre": nombre,
+            "temporal": temporal,
+            "parametros": {"modo": modo, "tipo": tipo},
+            "estado": EstadoImportacion.PENDIENTE,
+            "procesados": 0,
+            "contadores": contadores_vacios(),
+            "errores": [],
+            "error": None,
+            "jobId": None,
+            "fechaCreacion": ahora,
+            "fechaActualizacion": ahora,
+            "fechaFin": None
+        })
+        return importacion_id
+
+    async def obtener_importacion(self, importacion_id: str) -> Optional[Dict[str, Any]]:
+        importacion = await self.collection.find_one({"_id": importacion_id})
+        if importacion:
+            importacion["id"] = importacion.pop("_id")
+        return importacion
+
+    async def listar_importaciones(self, estado: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Importaciones más recientes, sin el detalle de errores"""
+        query = {"estado": estado} if estado else {}
+        cursor = self.collection.find(query, {"errores": 0}).sort("fechaCreacion", DESCENDING).limit(limit)
+        importaciones = []
+        async for importacion in cursor:
+            importacion["id"] = importacion.pop("_id")
+            importaciones.append(importacion)
+        return importaciones
+
+    async def encolar(self, importacion_id: str) -> str:
+        """Ejecutar (o reanudar) la importación como job; devuelve el ID del job"""
+        importacion = await self.obtener_importacion(importacion_id)
+        if not importacion:
+            raise ValueError(f"Importación {importacion_id} no encontrada")
+
+        async def trabajo(contexto: JobContext) -> Dict[str, Any]:
+            return await self.ejecutar(importacion_id, contexto)
+
+        job_id = await get_job_runner(self.db).enqueue(
+            "importacion_geojson", trabajo,
+            descripcion=f"Importación GeoJSON de {importacion['destino']} ({importacion['nombre']})",
+            parametros={"importacion_id": importacion_id, "archivo": importacion["nombre"], **importacion["parametros"]}
+        )
+        await self.collection.update_one({"_id": importacion_id}, {"$set": {"jobId": job_id}})
+        return job_id
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+
+    async def ejecutar(self, importacion_id: str, contexto: Optional[JobContext] = None) -> Dict[str, Any]:
+        """
+        Ejecutar o reanudar una importación desde su checkpoint
+
+        Args:
+            importacion_id: ID devuelto por crear_importacion
+            contexto: Contexto del job (progreso y cancelación), si corre como job
+
+        Returns:
+            Resumen con contadores y errores
+        """
+        importacion = await self.collection.find_one_and_update(
+            {"_id": importacion_id, "estado": {"$in": list(EstadoImportacion.REANUDABLES)}},
+            {"$set": {"estado": EstadoImportacion.EN_PROCESO, "error": None, "fechaActualizacion": datetime.utcnow()}}
+        )
+        if importacion is None:
+            actual = await self.collection.find_one({"_id": importacion_id}, {"estado": 1})
+            if not actual:
+                raise ValueError(f"Importación {importacion_id} no encontrada")
+            raise ValueError(f"La importación está {actual['estado']} y no se puede ejecutar")
+
+        try:
+            resumen = await self._procesar(importacion, contexto)
+        except asyncio.CancelledError:
+            await self._marcar(importacion_id, EstadoImportacion.INTERRUMPIDA)
+            raise
+        except Exception as e:
+            logger.exception(f"Importación GeoJSON {importacion_id} fallida")
+            await self._marcar(importacion_id, EstadoImportacion.FALLIDA, str(e))
+            raise
+
+        await self._marcar(importacion_id, EstadoImportacion.COMPLETADA)
+        if importacion.get("temporal"):
+            Path(importacion["ruta"]).unlink(missing_ok=True)
+        return resumen
+
+    async def _marcar(self, importacion_id: str, estado: str, error: Optional[str] = None) -> None:
+        ahora = datetime.utcnow()
+        cambios = {"estado": estado, "error": error, "fechaActualizacion": ahora}
+        if estado == EstadoImportacion.COMPLETADA:
+            cambios["fechaFin"] = ahora
+        await self.collection.update_one({"_id": importacion_id}, {"$set": cambios})
+
+    async def _procesar(self, importacion: Dict[str, Any], contexto: Optional[JobContext]) -> Dict[str, Any]:
+        importacion_id = importacion["_id"]
+        destino = importacion["destino"]
+        modo = importacion["parametros"]["modo"]
+        tipo = importacion["parametros"].get("tipo")
+        ruta = Path(importacion["ruta"])
+        if not ruta.exists():
+            raise FileNotFoundError(f"No existe el archivo de la importación: {ruta}")
+
+        contadores = importacion.get("contadores") or contadores_vacios()
+        errores: List[str] = list(importacion.get("errores") or [])
+        ya_procesados = importacion.get("procesados", 0)
+        procesados = 0
+
+        if destino == DESTINO_LOCALIDADES:
+            existentes = await self._claves_localidades()
+            vinculos: Dict[Tuple[str, str], str] = {}
+            coleccion = self.db.localidades
+        else:
+            existentes, vinculos = await self._claves_geometrias()
+            coleccion = self.db.geometrias
+        vistos: Set[Tuple[Hashable, ...]] = set()
+
+        tamano = ruta.stat().st_size
+        with open(ruta, "rb") as archivo:
+            features = _lotes(iterar_features(archivo), self.tamano_lote)
+            while True:
+                lote = await asyncio.to_thread(next, features, None)
+                if lote is None:
+                    break
+
+                operaciones: List[UpdateOne] = []
+                conteo: List[Tuple[str, str]] = []
+                errores_lote: List[str] = []
+                for feature in lote:
+                    procesados += 1
+                    reanudado = procesados <= ya_procesados
+                    try:
+                        if destino == DESTINO_LOCALIDADES:
+                            preparado = self._operacion_localidad(feature, tipo, modo, existentes, vistos)
+                        else:
+                            preparado = self._operacion_geometria(feature, tipo, modo, existentes, vistos, vinculos)
+                    except Exception as e:
+                        preparado = ("errores", None, None)
+                        if not reanudado:
+                            errores_lote.append(f"Feature {procesados}: {e}")
+                    if reanudado:
+                        # Ya escrita antes de la interrupción: solo se recuerda su clave
+                        continue
+
+                    resultado, tipo_feature_, operacion = preparado
+                    if operacion is not None:
+                        operaciones.append(operacion)
+                    conteo.append((resultado, tipo_feature_))
+
+                if procesados <= ya_procesados:
+                    continue
+
+                fallidas = await self._escribir_lote(coleccion, operaciones)
+                errores_lote.extend(fallidas)
+                for resultado, tipo_feature_ in conteo:
+                    contadores["procesadas"] += 1
+                    contadores[resultado] += 1
+                    if tipo_feature_ and resultado in ("creadas", "actualizadas", "existentes"):
+                        contadores["por_tipo"][tipo_feature_] = contadores["por_tipo"].get(tipo_feature_, 0) + 1
+                # Las operaciones rechazadas por MongoDB se contaron como escritas
+                contadores["errores"] += len(fallidas)
+                errores = (errores + errores_lote)[-MAX_ERRORES_IMPORTACION:]
+
+                await self.collection.update_one(
+                    {"_id": importacion_id},
+                    {"$set": {
+                        "procesados": procesados,
+                        "contadores": contadores,
+                        "errores": errores,
+                        "fechaActualizacion": datetime.utcnow()
+                    }}
+                )
+                if contexto:
+                    await contexto.agregar_errores(errores_lote)
+                    await contexto.progreso(
+                        procesados, None,
+                        f"{procesados} features ({archivo.tell() * 100 // max(tamano, 1)}% del archivo)"
+                    )
+
+        if procesados < ya_procesados:
+            raise ValueError(
+                f"El archivo tiene {procesados} features pero el checkpoint indica {ya_procesados}; ¿cambió el archivo?"
+            )
+
+        if destino == DESTINO_LOCALIDADES:
+            get_localidad_alias_index().invalidar()
+        get_geometria_tiles_index().invalidar()
+
+        return {
+            "importacion_id": importacion_id,
+            "destino": destino,
+            "archivo": importacion["nombre"],
+            "modo": modo,
+            **contadores,
+            "errores_detalle": errores[:20]
+        }
+
+    async def _escribir_lote(self, coleccion, operaciones: List[UpdateOne]) -> List[str]:
+        """bulk_write no ordenado; devuelve los mensajes de las operaciones rechazadas"""
+        if not operaciones:
+            return []
+        try:
+            await coleccion.bulk_write(operaciones, ordered=False)
+            return []
+        except BulkWriteError as e:
+            detalles = e.details or {}
+            return [
+                f"Error de escritura: {item.get('errmsg', 'desconocido')}"
+                for item in detalles.get("writeErrors", [])
+            ]
+
+    # ------------------------------------------------------------------
+    # Localidades
+    # ------------------------------------------------------------------
+
+    async def _claves_localidades(self) -> Set[Tuple[Hashable, ...]]:
+        proyeccion = {"ubigeo": 1, "tipo": 1, "nombre": 1, "provincia": 1, "distrito": 1}
+        claves: Set[Tuple[Hashable, ...]] = set()
+        async for localidad in self.db.localidades.find({}, proyeccion):
+            if localidad.get("nombre") or localidad.get("ubigeo"):
+                claves.add(clave_localidad(localidad))
+        return claves
+
+    def _operacion_localidad(
+        self,
+        feature: Dict[str, Any],
+        tipo: Optional[str],
+        modo: str,
+        existentes: Set[Tuple[Hashable, ...]],
+        vistos: Set[Tuple[Hashable, ...]]
+    ) -> Tuple[str, Optional[str], Optional[UpdateOne]]:
+        """(contador, tipo, operación) de una feature de localidad"""
+        documento = localidad_desde_feature(feature, tipo)
+        if documento is None:
+            return "omitidas", None, None
+
+        clave = clave_localidad(documento)
+        if clave in vistos:
+            return "duplicadas", documento["tipo"], None
+        vistos.add(clave)
+
+        ahora = datetime.utcnow()
+        documento["fechaActualizacion"] = ahora
+        con_campos_busqueda("localidades", documento)
+        filtro = filtro_localidad(documento)
+        if clave in existentes:
+            if modo == "crear":
+                return "existentes", documento["tipo"], None
+            return "actualizadas", documento["tipo"], UpdateOne(filtro, {"$set": documento})
+        if modo == "actualizar":
+            return "omitidas", documento["tipo"], None
+        return "creadas", documento["tipo"], UpdateOne(
+            filtro, {"$set": documento, "$setOnInsert": {"fechaCreacion": ahora}}, upsert=True
+        )
+
+    # ------------------------------------------------------------------
+    # Geometrías
+    # ------------------------------------------------------------------
+
+    async def _claves_geometrias(self) -> Tuple[Set[Tuple[Hashable, ...]], Dict[Tuple[str, str], str]]:
+        """(claves de geometrías existentes, {(tipo, ubigeo): id de localidad})"""
+        existentes: Set[Tuple[Hashable, ...]] = set()
+        async for geometria in self.db.geometrias.find({}, {"ubigeo": 1, "tipo": 1}):
+            if geometria.get("ubigeo"):
+                existentes.add((str(geometria.get("tipo")), str(geometria["ubigeo"])))
+
+        vinculos: Dict[Tuple[str, str], str] = {}
+        filtro = {"tipo": {"$in": ["PROVINCIA", "DISTRITO", "CIUDAD"]}, "ubigeo": {"$nin": [None, ""]}}
+        async for localidad in self.db.localidades.find(filtro, {"ubigeo": 1, "tipo": 1}):
+            tipo = "DISTRITO" if localidad["tipo"] == "CIUDAD" else localidad["tipo"]
+            vinculos.setdefault((tipo, str(localidad["ubigeo"])), str(localidad["_id"]))
+        return existentes, vinculos
+
+    def _operacion_geometria(
+        self,
+        feature: Dict[str, Any],
+        tipo: Optional[str],
+        modo: str,
+        existentes: Set[Tuple[Hashable, ...]],
+        vistos: Set[Tuple[Hashable, ...]],
+        vinculos: Dict[Tuple[str, str], str]
+    ) -> Tuple[str, Optional[str], Optional[UpdateOne]]:
+        """(contador, tipo, operación) de una feature de geometría"""
+        documento = geometria_desde_feature(feature, tipo)
+        if documento is None:
+            return "omitidas", None, None
+
+        clave = (documento["tipo"], documento["ubigeo"])
+        if clave in vistos:
+            return "duplicadas", documento["tipo"], None
+        vistos.add(clave)
+
+        localidad_id = vinculos.get(clave)
+        if localidad_id is None:
+            return "sin_localidad", documento["tipo"], None
+
+        ahora = datetime.utcnow()
+        documento.update({"localidad_id": localidad_id, "fechaActualizacion": ahora})
+        filtro = {"ubigeo": documento["ubigeo"], "tipo": documento["tipo"]}
+        if clave in existentes:
+            if modo == "crear":
+                return "existentes", documento["tipo"], None
+            return "actualizadas", documento["tipo"], UpdateOne(filtro, {"$set": documento})
+        if modo == "actualizar":
+            return "omitidas", documento["tipo"], None
+        return "creadas", documento["tipo"], UpdateOne(
+            filtro, {"$set": documento, "$setOnInsert": {"fechaCreacion": ahora}}, upsert=True
+        )
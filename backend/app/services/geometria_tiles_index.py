@@ -0,0 +1,378 @@
+"""
+Índice en memoria de geometrías simplificadas para servir teselas GeoJSON
+
+Carga los polígonos de la colección `geometrias` con las propiedades de su
+localidad ya unidas (una consulta por colección, sin `find_one` por
+geometría) y sirve teselas `/{z}/{x}/{y}` con geometrías simplificadas con
+Douglas-Peucker a la resolución del zoom:
+
+- la tolerancia es el tamaño de un píxel del zoom (en grados)
+- los zooms se agrupan en `NIVELES_ZOOM`; todos los niveles se simplifican
+  al cargar (en un hilo, sin bloquear el event loop) por `TipoGeometria` y
+  se reutilizan en todas las teselas
+- las coordenadas se redondean a los decimales que distingue ese nivel
+
+Una tesela contiene las features completas cuyo rectángulo envolvente la
+toca, sin recortarlas, para que Leaflet pueda dibujarlas como GeoJSON y
+descartar las repetidas por `properties.id`.
+
+El índice se carga la primera vez que se usa, se marca para recarga al
+importar o editar geometrías (`invalidar`) y, como cada worker tiene su
+propia copia, se recarga completo cuando supera `max_edad_segundos` (así
+se recogen también los cambios de nombre de las localidades).
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+# Zooms para los que se precalcula la simplificación; cada zoom usa el nivel inmediato inferior
+NIVELES_ZOOM = (4, 6, 8, 10, 12, 14)
+
+ZOOM_MAXIMO = 22
+
+TAMANO_TESELA_PX = 256
+
+PROYECCION_GEOMETRIA = {
+    "localidad_id": 1,
+    "tipo": 1,
+    "ubigeo": 1,
+    "nombre": 1,
+    "departamento": 1,
+    "provincia": 1,
+    "distrito": 1,
+    "geometry": 1,
+    "properties": 1,
+    "fechaActualizacion": 1
+}
+
+PROYECCION_LOCALIDAD = {
+    "nombre": 1,
+    "departamento": 1,
+    "provincia": 1,
+    "distrito": 1,
+    "poblacion": 1,
+    "estaActiva": 1
+}
+
+Caja = Tuple[float, float, float, float]  # (oeste, sur, este, norte)
+
+
+def limites_tesela(z: int, x: int, y: int) -> Caja:
+    """Rectángulo (oeste, sur, este, norte) en grados de una tesela XYZ"""
+    n = 2 ** z
+
+    def latitud(fila: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * fila / n))))
+
+    return x / n * 360.0 - 180.0, latitud(y + 1), (x + 1) / n * 360.0 - 180.0, latitud(y)
+
+
+def nivel_para_zoom(z: int) -> int:
+    """Nivel precalculado que corresponde a un zoom"""
+    nivel = NIVELES_ZOOM[0]
+    for candidato in NIVELES_ZOOM:
+        if candidato <= z:
+            nivel = candidato
+    return nivel
+
+
+def tolerancia_para_zoom(z: int) -> float:
+    """Tamaño en grados de un píxel en el ecuador para ese zoom"""
+    return 360.0 / (TAMANO_TESELA_PX * 2 ** z)
+
+
+def decimales_para_tolerancia(tolerancia: float) -> int:
+    """Decimales suficientes para no perder precisión por debajo de la tolerancia"""
+    return max(0, min(7, math.ceil(-math.log10(tolerancia)) + 1))
+
+
+def _distancia_a_segmento(punto: Sequence[float], a: Sequence[float], b: Sequence[float]) -> float:
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return math.hypot(punto[0] - a[0], punto[1] - a[1])
+    t = max(0.0, min(1.0, ((punto[0] - a[0]) * dx + (punto[1] - a[1]) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(punto[0] - (a[0] + t * dx), punto[1] - (a[1] + t * dy))
+
+
+def simplificar_linea(puntos: Sequence[Sequence[float]], tolerancia: float) -> List[Sequence[float]]:
+    """Douglas-Peucker iterativo: conserva los extremos y los vértices a más de `tolerancia`"""
+    if len(puntos) < 3:
+        return list(puntos)
+
+    conservar = [False] * len(puntos)
+    conservar[0] = conservar[-1] = True
+    pendientes = [(0, len(puntos) - 1)]
+    while pendientes:
+        inicio, fin = pendientes.pop()
+        maxima, indice = 0.0, None
+        for i in range(inicio + 1, fin):
+            distancia = _distancia_a_segmento(puntos[i], puntos[inicio], puntos[fin])
+            if distancia > maxima:
+                maxima, indice = distancia, i
+        if indice is not None and maxima > tolerancia:
+            conservar[indice] = True
+            pendientes.append((inicio, indice))
+            pendientes.append((indice, fin))
+
+    return [punto for punto, conservado in zip(puntos, conservar) if conservado]
+
+
+def _simplificar_anillo(anillo: Sequence[Sequence[float]], tolerancia: float, decimales: int) -> Optional[List[List[float]]]:
+    resultado = [[round(p[0], decimales), round(p[1], decimales)] for p in simplificar_linea(anillo, tolerancia)]
+    # Un anillo necesita al menos 3 vértices distintos más el de cierre
+    return resultado if len(resultado) >= 4 else None
+
+
+def simplificar_geometria(geometria: Dict[str, Any], tolerancia: float, decimales: int) -> Optional[Dict[str, Any]]:
+    """
+    Simplificar un Polygon o MultiPolygon GeoJSON
+
+    Los anillos que se reducen a menos de 4 vértices se descartan (son más
+    pequeños que un píxel); devuelve None si no queda ningún polígono. Los
+    demás tipos se devuelven sin cambios.
+    """
+    def poligono(anillos: Sequence[Sequence[Sequence[float]]]) -> Optional[List[List[List[float]]]]:
+        if not anillos:
+            return None
+        exterior = _simplificar_anillo(anillos[0], tolerancia, decimales)
+        if exterior is None:
+            return None
+        huecos = [_simplificar_anillo(hueco, tolerancia, decimales) for hueco in anillos[1:]]
+        return [exterior] + [hueco for hueco in huecos if hueco is not None]
+
+    tipo = geometria.get("type")
+    if tipo == "Polygon":
+        coordenadas = poligono(geometria.get("coordinates") or [])
+        return {"type": "Polygon", "coordinates": coordenadas} if coordenadas else None
+    if tipo == "MultiPolygon":
+        poligonos = [p for p in (poligono(anillos) for anillos in geometria.get("coordinates") or []) if p]
+        return {"type": "MultiPolygon", "coordinates": poligonos} if poligonos else None
+    return geometria
+
+
+def caja_geometria(geometria: Dict[str, Any]) -> Optional[Caja]:
+    """Rectángulo envolvente de cualquier geometría GeoJSON"""
+    xs: List[float] = []
+    ys: List[float] = []
+
+    def recorrer(coordenadas: Any) -> None:
+        if coordenadas and isinstance(coordenadas[0], (int, float)):
+            xs.append(coordenadas[0])
+            ys.append(coordenadas[1])
+        else:
+            for item in coordenadas or []:
+                recorrer(item)
+
+    if geometria.get("type") == "GeometryCollection":
+        for parte in geometria.get("geometries") or []:
+            recorrer(parte.get("coordinates"))
+    else:
+        recorrer(geometria.get("coordinates"))
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _cajas_se_tocan(a: Caja, b: Caja) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class GeometriaTilesIndex:
+    """Features GeoJSON con propiedades de localidad unidas, simplificadas por nivel de zoom"""
+
+    def __init__(self, max_edad_segundos: int = 300):
+        """
+        Args:
+            max_edad_segundos: Edad máxima antes de recargar desde MongoDB
+        """
+        self.max_edad_segundos = max_edad_segundos
+        self._features: Dict[str, List[Dict[str, Any]]] = {}
+        self._simplificadas: Dict[Tuple[str, int], Dict[str, Optional[Dict[str, Any]]]] = {}
+        self._version = ""
+        self._cargado_en: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def cargado(self) -> bool:
+        """True si el índice está cargado y no ha vencido"""
+        return (
+            self._cargado_en is not None
+            and time.monotonic() - self._cargado_en < self.max_edad_segundos
+        )
+
+    @property
+    def version(self) -> str:
+        """Huella del contenido cargado; igual en todos los workers si los datos no cambian"""
+        return self._version
+
+    @property
+    def tipos(self) -> List[str]:
+        """Tipos de geometría cargados"""
+        return list(self._features)
+
+    def invalidar(self) -> None:
+        """Forzar recarga completa en el próximo uso (importación o edición de geometrías)"""
+        self._cargado_en = None
+
+    @staticmethod
+    def _propiedades(geometria: Dict[str, Any], localidad: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        localidad = localidad or {}
+        return {
+            "id": str(geometria["_id"]),
+            "localidad_id": geometria.get("localidad_id"),
+            "nombre": localidad.get("nombre") or geometria.get("nombre"),
+            "tipo": geometria.get("tipo"),
+            "ubigeo": geometria.get("ubigeo"),
+            "departamento": localidad.get("departamento") or geometria.get("departamento"),
+            "provincia": localidad.get("provincia") or geometria.get("provincia"),
+            "distrito": localidad.get("distrito") or geometria.get("distrito"),
+            "poblacion": localidad.get("poblacion"),
+            "estaActiva": localidad.get("estaActiva", True),
+            **(geometria.get("properties") or {})
+        }
+
+    def reconstruir(self, geometrias: List[Dict[str, Any]], localidades: List[Dict[str, Any]]) -> None:
+        """
+        Reconstruir el índice
+
+        Args:
+            geometrias: Documentos de la colección `geometrias`
+            localidades: Localidades referenciadas por `localidad_id`; las
+                geometrías cuya localidad no exista se omiten, como en /geojson
+        """
+        self._aplicar(self._construir(geometrias, localidades))
+
+    def _construir(
+        self,
+        geometrias: List[Dict[str, Any]],
+        localidades: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[Tuple[str, int], Dict[str, Optional[Dict[str, Any]]]], str]:
+        """Features, simplificaciones de todos los niveles y versión (no toca el estado; apto para un hilo)"""
+        por_id = {str(localidad["_id"]): localidad for localidad in localidades}
+        features: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        huella = hashlib.md5()
+
+        for geometria in sorted(geometrias, key=lambda g: str(g["_id"])):
+            localidad = por_id.get(str(geometria.get("localidad_id")))
+            if localidad is None or not geometria.get("geometry"):
+                continue
+            caja = caja_geometria(geometria["geometry"])
+            if caja is None:
+                continue
+            propiedades = self._propiedades(geometria, localidad)
+            features[geometria.get("tipo")].append({
+                "id": str(geometria["_id"]),
+                "caja": caja,
+                "geometry": geometria["geometry"],
+                "properties": propiedades
+            })
+            huella.update(repr((propiedades, geometria.get("fechaActualizacion"))).encode("utf-8"))
+
+        simplificadas = {}
+        for tipo, del_tipo in features.items():
+            for nivel in NIVELES_ZOOM:
+                tolerancia = tolerancia_para_zoom(nivel)
+                decimales = decimales_para_tolerancia(tolerancia)
+                simplificadas[(tipo, nivel)] = {
+                    feature["id"]: simplificar_geometria(feature["geometry"], tolerancia, decimales)
+                    for feature in del_tipo
+                }
+        return dict(features), simplificadas, huella.hexdigest()[:16]
+
+    def _aplicar(self, construido: Tuple[Dict, Dict, str]) -> None:
+        # Todo junto y desde el event loop: una petición nunca ve features de
+        # una carga con simplificaciones de otra
+        self._features, self._simplificadas, self._version = construido
+        self._cargado_en = time.monotonic()
+
+    async def asegurar_cargado(self, db: AsyncIOMotorDatabase) -> None:
+        """Cargar el índice desde MongoDB si no está cargado o venció"""
+        if self.cargado:
+            return
+
+        async with self._lock:
+            if self.cargado:
+                return
+            inicio = time.perf_counter()
+            geometrias = await db["geometrias"].find({}, PROYECCION_GEOMETRIA).to_list(length=None)
+            ids = set()
+            for geometria in geometrias:
+                if ObjectId.is_valid(str(geometria.get("localidad_id"))):
+                    ids.add(ObjectId(str(geometria["localidad_id"])))
+            localidades = await db["localidades"].find(
+                {"_id": {"$in": list(ids)}}, PROYECCION_LOCALIDAD
+            ).to_list(length=None)
+            # Douglas-Peucker sobre todas las geometrías: en un hilo para no bloquear a las demás peticiones
+            self._aplicar(await asyncio.to_thread(self._construir, geometrias, localidades))
+            logger.info(
+                f"Índice de teselas de geometrías cargado: {len(geometrias)} geometrías "
+                f"en {(time.perf_counter() - inicio) * 1000:.1f} ms"
+            )
+
+    def _geometrias_nivel(self, tipo: str, nivel: int) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Geometrías de un tipo simplificadas para un nivel (precalculadas al cargar)"""
+        return self._simplificadas.get((tipo, nivel), {})
+
+    def _filtrar(self, tipo: str, filtros: Dict[str, Optional[str]]) -> List[Dict[str, Any]]:
+        activos = {campo: valor for campo, valor in filtros.items() if valor}
+        return [
+            feature for feature in self._features.get(tipo, [])
+            if all(feature["properties"].get(campo) == valor for campo, valor in activos.items())
+        ]
+
+    def features(
+        self,
+        tipo: str,
+        zoom: Optional[int] = None,
+        caja: Optional[Caja] = None,
+        **filtros: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Features GeoJSON de un tipo
+
+        Args:
+            tipo: Valor de `TipoGeometria`
+            zoom: Si se indica, geometrías simplificadas para ese zoom; si no, originales
+            caja: Solo features cuyo rectángulo envolvente toca esta caja
+            **filtros: Igualdad sobre propiedades (departamento, provincia, distrito)
+        """
+        candidatas = self._filtrar(tipo, filtros)
+        if caja is not None:
+            candidatas = [f for f in candidatas if _cajas_se_tocan(f["caja"], caja)]
+
+        simplificadas = self._geometrias_nivel(tipo, nivel_para_zoom(zoom)) if zoom is not None else None
+        resultado = []
+        for feature in candidatas:
+            geometria = simplificadas[feature["id"]] if simplificadas is not None else feature["geometry"]
+            if geometria is None:
+                continue
+            resultado.append({"type": "Feature", "geometry": geometria, "properties": feature["properties"]})
+        return resultado
+
+    def etag(self, *partes: Any, features: Sequence[Dict[str, Any]] = ()) -> str:
+        """ETag de una respuesta: versión del índice, parámetros y features incluidas"""
+        huella = hashlib.md5(self._version.encode("utf-8"))
+        huella.update(repr(partes).encode("utf-8"))
+        for feature in features:
+            huella.update(feature["properties"]["id"].encode("utf-8"))
+        return f'"{huella.hexdigest()}"'
+
+
+# Global index instance
+_index_instance: Optional[GeometriaTilesIndex] = None
+
+def get_geometria_tiles_index() -> GeometriaTilesIndex:
+    """Get global geometria tiles index instance"""
+    global _index_instance
+    if _index_instance is None:
+        _index_instance = GeometriaTilesIndex()
+    return _index_instance
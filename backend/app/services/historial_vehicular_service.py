@@ -6,6 +6,7 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
 import math
 
 from app.models.historial_vehicular import (
@@ -25,6 +26,16 @@ from app.utils.exceptions import (
     ValidationErrorException,
     NotFoundError
 )
+from app.core.indices import registrar_consulta, registrar_indices
+
+registrar_indices(
+    "historial_vehicular",
+    IndexModel([("vehiculoId", ASCENDING), ("fechaEvento", ASCENDING)]),
+    IndexModel([("empresaId", ASCENDING), ("fechaEvento", DESCENDING)]),
+    IndexModel([("fechaEvento", DESCENDING)])
+)
+registrar_consulta("historial_vehicular", "por_vehiculo", {"vehiculoId": "x"}, [("fechaEvento", ASCENDING)])
+registrar_consulta("historial_vehicular", "recientes", {}, [("fechaEvento", DESCENDING)])
 
 
 class HistorialVehicularService:
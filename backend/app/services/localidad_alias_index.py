@@ -0,0 +1,170 @@
+"""
+Índice en memoria para resolver nombres de localidades (nombre oficial o alias)
+
+Reemplaza las búsquedas por `$regex` anclado sin distinguir mayúsculas, que
+no pueden usar índices. Los nombres y alias se guardan normalizados:
+
+- sin tildes y en mayúsculas
+- sin el prefijo "C.P." / "CP" de centro poblado
+- espacios repetidos colapsados
+
+El índice se carga la primera vez que se usa, se marca para recarga cuando
+cambian alias o localidades (`invalidar`) y, como cada worker tiene su propia
+copia, se recarga completo cuando supera `max_edad_segundos`.
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.services.ruta_combinaciones_index import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+PREFIJO_CENTRO_POBLADO = re.compile(r"^C\.?\s*P\b\.?\s*")
+
+# Ante varias localidades con el mismo nombre se prefiere la más específica
+PRIORIDAD_TIPO = {"CENTRO_POBLADO": 0, "DISTRITO": 1, "PROVINCIA": 2}
+
+PROYECCION_LOCALIDAD = {
+    "id": 1,
+    "nombre": 1,
+    "tipo": 1,
+    "ubigeo": 1,
+    "departamento": 1,
+    "provincia": 1,
+    "distrito": 1,
+    "coordenadas": 1,
+    "estaActiva": 1
+}
+
+PROYECCION_ALIAS = {"alias": 1, "localidad_id": 1}
+
+
+def normalizar_nombre(nombre: str) -> str:
+    """Clave de búsqueda: sin tildes, mayúsculas y sin prefijo C.P."""
+    texto = normalizar_texto(nombre)
+    return PREFIJO_CENTRO_POBLADO.sub("", texto).strip() or texto
+
+
+class LocalidadAliasIndex:
+    """Diccionarios nombre normalizado → localidad y alias normalizado → alias"""
+
+    def __init__(self, max_edad_segundos: int = 300):
+        """
+        Args:
+            max_edad_segundos: Edad máxima antes de recargar desde MongoDB
+        """
+        self.max_edad_segundos = max_edad_segundos
+        self._localidades: Dict[str, Dict[str, Any]] = {}
+        self._por_nombre: Dict[str, List[Dict[str, Any]]] = {}
+        self._por_alias: Dict[str, Dict[str, Any]] = {}
+        self._cargado_en: Optional[float] = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def cargado(self) -> bool:
+        """True si el índice está cargado y no ha vencido"""
+        return (
+            self._cargado_en is not None
+            and time.monotonic() - self._cargado_en < self.max_edad_segundos
+        )
+
+    @property
+    def version(self) -> int:
+        """Aumenta en cada recarga; sirve para invalidar datos derivados del índice"""
+        return self._version
+
+    def invalidar(self) -> None:
+        """Forzar recarga completa en el próximo uso (escrituras de alias o localidades)"""
+        self._cargado_en = None
+
+    @staticmethod
+    def _orden(localidad: Dict[str, Any]) -> Tuple[int, str]:
+        return PRIORIDAD_TIPO.get(localidad.get("tipo"), len(PRIORIDAD_TIPO)), str(localidad["_id"])
+
+    def reconstruir(self, localidades: List[Dict[str, Any]], aliases: List[Dict[str, Any]]) -> None:
+        """Reconstruir el índice a partir de documentos de localidades y alias activos"""
+        por_id: Dict[str, Dict[str, Any]] = {}
+        por_nombre: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for localidad in localidades:
+            por_id[str(localidad["_id"])] = localidad
+            if localidad.get("id"):
+                por_id.setdefault(str(localidad["id"]), localidad)
+            if localidad.get("nombre"):
+                por_nombre[normalizar_nombre(localidad["nombre"])].append(localidad)
+        for candidatas in por_nombre.values():
+            candidatas.sort(key=self._orden)
+
+        por_alias: Dict[str, Dict[str, Any]] = {}
+        for alias in aliases:
+            if alias.get("alias"):
+                por_alias.setdefault(normalizar_nombre(alias["alias"]), alias)
+
+        self._localidades = por_id
+        self._por_nombre = dict(por_nombre)
+        self._por_alias = por_alias
+        self._cargado_en = time.monotonic()
+        self._version += 1
+
+    async def asegurar_cargado(self, db: AsyncIOMotorDatabase) -> None:
+        """Cargar el índice desde MongoDB si no está cargado o venció"""
+        if self.cargado:
+            return
+
+        async with self._lock:
+            if self.cargado:
+                return
+            inicio = time.perf_counter()
+            localidades = await db["localidades"].find({}, PROYECCION_LOCALIDAD).to_list(length=None)
+            aliases = await db["localidades_alias"].find(
+                {"estaActivo": True}, PROYECCION_ALIAS
+            ).sort("fechaCreacion", 1).to_list(length=None)
+            self.reconstruir(localidades, aliases)
+            logger.info(
+                f"Índice de alias de localidades cargado: {len(localidades)} localidades, "
+                f"{len(self._por_alias)} alias en {(time.perf_counter() - inicio) * 1000:.1f} ms"
+            )
+
+    def por_id(self, localidad_id: Any) -> Optional[Dict[str, Any]]:
+        """Localidad por `_id` o por su campo `id`"""
+        return self._localidades.get(str(localidad_id)) if localidad_id else None
+
+    def localidades(self) -> List[Dict[str, Any]]:
+        """Todas las localidades cargadas, una vez cada una"""
+        return list({id(localidad): localidad for localidad in self._localidades.values()}.values())
+
+    def localidades_con_nombre(self, nombre: str) -> List[Dict[str, Any]]:
+        """Todas las localidades (activas o no) con ese nombre normalizado, por prioridad de tipo"""
+        return self._por_nombre.get(normalizar_nombre(nombre or ""), [])
+
+    def buscar_localidad(self, nombre: str, tipo: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Localidad activa con ese nombre (la más específica si hay varias)"""
+        for localidad in self.localidades_con_nombre(nombre):
+            if localidad.get("estaActiva", True) and (tipo is None or localidad.get("tipo") == tipo):
+                return localidad
+        return None
+
+    def buscar_alias(self, nombre: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(alias, localidad oficial) si el nombre es un alias activo"""
+        alias = self._por_alias.get(normalizar_nombre(nombre or ""))
+        if alias is None:
+            return None
+        localidad = self.por_id(alias.get("localidad_id"))
+        return (alias, localidad) if localidad else None
+
+
+# Global index instance
+_index_instance: Optional[LocalidadAliasIndex] = None
+
+def get_localidad_alias_index() -> LocalidadAliasIndex:
+    """Get global localidad alias index instance"""
+    global _index_instance
+    if _index_instance is None:
+        _index_instance = LocalidadAliasIndex()
+    return _index_instance
@@ -5,6 +5,7 @@ from typing import List, Optional, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from datetime import datetime
+from pymongo import ASCENDING, IndexModel
 
 from app.models.localidad_alias import (
     LocalidadAlias,
@@ -12,6 +13,16 @@ from app.models.localidad_alias import (
     LocalidadAliasUpdate,
     BusquedaLocalidadResult
 )
+from app.services.localidad_alias_index import get_localidad_alias_index
+from app.core.indices import COLLATION_SIN_MAYUSCULAS, registrar_consulta, registrar_indices
+
+registrar_indices(
+    "localidades_alias",
+    IndexModel([("localidad_id", ASCENDING), ("estaActivo", ASCENDING)]),
+    IndexModel([("alias", ASCENDING)], name="alias_ci", collation=COLLATION_SIN_MAYUSCULAS)
+)
+registrar_consulta("localidades_alias", "por_localidad", {"localidad_id": "x", "estaActivo": True})
+registrar_consulta("localidades_alias", "por_alias", {"alias": "juliaca", "estaActivo": True}, collation=COLLATION_SIN_MAYUSCULAS)
 
 class LocalidadAliasService:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -39,11 +50,11 @@ class LocalidadAliasService:
             if not localidad:
                 raise ValueError(f"Localidad con ID {alias_data.localidad_id} no encontrada")
         
-        # Verificar que el alias no existe ya
-        existing = await self.collection.find_one({
-            "alias": {"$regex": f"^{alias_data.alias}$", "$options": "i"},
-            "estaActivo": True
-        })
+        # Verificar que el alias no existe ya (sin distinguir mayúsculas, con el índice alias_ci)
+        existing = await self.collection.find_one(
+            {"alias": alias_data.alias, "estaActivo": True},
+            collation=COLLATION_SIN_MAYUSCULAS
+        )
         
         if existing:
             raise ValueError(f"Ya existe un alias '{alias_data.alias}'")
@@ -62,6 +73,7 @@ class LocalidadAliasService:
         })
         
         result = await self.collection.insert_one(alias_dict)
+        get_localidad_alias_index().invalidar()
         created_alias = await self.collection.find_one({"_id": result.inserted_id})
         
         return self._document_to_alias(created_alias)
@@ -109,53 +121,47 @@ class LocalidadAliasService:
         Buscar localidad por nombre o alias
         Retorna la localidad oficial si encuentra un alias
         """
-        # Normalizar nombre (remover C.P., CP, etc.)
-        import re
-        nombre_normalizado = re.sub(r'^(C\.P\.|CP|C\.P)\s*', '', nombre, flags=re.IGNORECASE).strip()
+        return (await self.resolver_nombres([nombre])).get(nombre)
+    
+    async def resolver_nombres(self, nombres: List[str]) -> Dict[str, Optional[BusquedaLocalidadResult]]:
+        """
+        Resolver en lote nombres de localidades (alias primero, luego nombre oficial)
         
-        # Buscar alias exacto
-        alias_doc = await self.collection.find_one({
-            "alias": {"$regex": f"^{nombre}$", "$options": "i"},
-            "estaActivo": True
-        })
+        La comparación ignora mayúsculas, tildes y el prefijo C.P. y se hace
+        contra el índice en memoria, sin consultas por nombre a MongoDB.
         
-        if alias_doc:
-            # Obtener localidad oficial
-            localidad = await self.localidades_collection.find_one({
-                "_id": ObjectId(alias_doc["localidad_id"])
-            })
+        Returns:
+            Diccionario {nombre recibido: resultado o None}
+        """
+        indice = get_localidad_alias_index()
+        await indice.asegurar_cargado(self.db)
+        
+        resultados: Dict[str, Optional[BusquedaLocalidadResult]] = {}
+        for nombre in nombres:
+            if nombre in resultados:
+                continue
             
-            if localidad:
-                return BusquedaLocalidadResult(
+            encontrado = indice.buscar_alias(nombre)
+            if encontrado:
+                alias_doc, localidad = encontrado
+                resultados[nombre] = BusquedaLocalidadResult(
                     localidad_id=str(localidad["_id"]),
                     localidad_nombre=localidad.get("nombre"),
                     es_alias=True,
                     alias_usado=alias_doc["alias"],
                     coordenadas=localidad.get("coordenadas")
                 )
-        
-        # Si no es alias, buscar localidad directa
-        localidad = await self.localidades_collection.find_one({
-            "nombre": {"$regex": f"^{nombre}$", "$options": "i"},
-            "estaActiva": True
-        })
-        
-        if not localidad and nombre != nombre_normalizado:
-            # Buscar con nombre normalizado
-            localidad = await self.localidades_collection.find_one({
-                "nombre": {"$regex": f"^{nombre_normalizado}$", "$options": "i"},
-                "estaActiva": True
-            })
-        
-        if localidad:
-            return BusquedaLocalidadResult(
+                continue
+            
+            localidad = indice.buscar_localidad(nombre)
+            resultados[nombre] = BusquedaLocalidadResult(
                 localidad_id=str(localidad["_id"]),
                 localidad_nombre=localidad.get("nombre"),
                 es_alias=False,
                 coordenadas=localidad.get("coordenadas")
-            )
+            ) if localidad else None
         
-        return None
+        return resultados
     
     async def update_alias(
         self,
@@ -184,6 +190,7 @@ class LocalidadAliasService:
                 {"_id": ObjectId(alias_id)},
                 {"$set": update_data}
             )
+            get_localidad_alias_index().invalidar()
             
             updated_doc = await self.collection.find_one({"_id": ObjectId(alias_id)})
             return self._document_to_alias(updated_doc)
@@ -200,6 +207,7 @@ class LocalidadAliasService:
                     "fechaActualizacion": datetime.utcnow()
                 }}
             )
+            get_localidad_alias_index().invalidar()
             return result.modified_count > 0
         except:
             return False
@@ -217,8 +225,9 @@ class LocalidadAliasService:
             return
         
         await self.collection.update_one(
-            {"alias": {"$regex": f"^{alias}$", "$options": "i"}},
-            {"$inc": {campo: 1}}
+            {"alias": alias},
+            {"$inc": {campo: 1}},
+            collation=COLLATION_SIN_MAYUSCULAS
         )
     
     async def get_alias_sin_usar(self) -> List[LocalidadAlias]:
@@ -2,19 +2,86 @@ from typing import List, Optional, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from datetime import datetime
+import logging
 import math
 
+from pymongo import ASCENDING, GEOSPHERE, IndexModel
+
 from app.models.localidad import (
     Localidad, LocalidadCreate, LocalidadUpdate, 
     FiltroLocalidades, LocalidadesPaginadas,
-    TipoLocalidad, Coordenadas
+    TipoLocalidad, Coordenadas, LocalidadResponse,
+    LocalidadCercana, LocalidadContenedora
+)
+from app.services.localidad_alias_index import get_localidad_alias_index
+from app.services.ruta_combinaciones_index import normalizar_texto
+from app.utils.geo import punto_geojson, haversine_km
+from app.utils.paginacion_cursor import PaginaCursor, paginar
+from app.utils.busqueda_normalizada import (
+    CAMPO_BUSQUEDA, campo_normalizado, campos_busqueda, con_campos_busqueda, filtro_contiene, indices_busqueda
 )
+from app.core.indices import COLLATION_SIN_MAYUSCULAS, asegurar_indices, registrar_consulta, registrar_indices
+
+logger = logging.getLogger(__name__)
+
+# Coordenadas válidas, para derivar `location` en el servidor
+FILTRO_COORDENADAS_VALIDAS = {
+    "coordenadas.latitud": {"$type": "number", "$gte": -90, "$lte": 90},
+    "coordenadas.longitud": {"$type": "number", "$gte": -180, "$lte": 180}
+}
+
+registrar_indices(
+    "localidades",
+    IndexModel([("location", GEOSPHERE)]),
+    IndexModel([("ubigeo", ASCENDING)]),
+    IndexModel([("departamento", ASCENDING), ("provincia", ASCENDING), ("distrito", ASCENDING)]),
+    IndexModel([("nombre", ASCENDING)], name="nombre_ci", collation=COLLATION_SIN_MAYUSCULAS),
+    *indices_busqueda("nombre")
+)
+registrar_consulta("localidades", "listado_por_nombre", {"estaActiva": True}, [("nombre", ASCENDING), ("_id", ASCENDING)])
+registrar_consulta("localidades", "por_ubigeo", {"ubigeo": "210101"})
+registrar_consulta("localidades", "buscar_nombre", {**filtro_contiene({"nombre": "juliaca"}), "estaActiva": True})
 
 class LocalidadService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
         self.collection = db.localidades
 
+    async def asegurar_indices_geo(self) -> None:
+        """
+        Asegurar los índices 2dsphere de `localidades.location` y `geometrias.geometry`
+
+        Si alguna geometría guardada no es un polígono válido para MongoDB el
+        índice de geometrías no se crea (se registra el error); `$geoIntersects`
+        sigue funcionando sin índice, solo más lento.
+        """
+        await asegurar_indices(self.db, "localidades")
+        await asegurar_indices(self.db, "geometrias")
+
+    async def sincronizar_ubicaciones(self, filtro: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+        """
+        Derivar `location` de `coordenadas` en el servidor (dos update_many)
+
+        Las localidades con coordenadas válidas reciben el punto GeoJSON; a las
+        demás se les quita. Lo usan la migración y las importaciones masivas.
+        """
+        filtro = filtro or {}
+        con_coordenadas = await self.collection.update_many(
+            {**filtro, **FILTRO_COORDENADAS_VALIDAS},
+            [{"$set": {"location": {
+                "type": "Point",
+                "coordinates": ["$coordenadas.longitud", "$coordenadas.latitud"]
+            }}}]
+        )
+        sin_coordenadas = await self.collection.update_many(
+            {**filtro, "location": {"$exists": True}, "$nor": [FILTRO_COORDENADAS_VALIDAS]},
+            {"$unset": {"location": ""}}
+        )
+        return {
+            "con_ubicacion": con_coordenadas.matched_count,
+            "sin_ubicacion": sin_coordenadas.modified_count
+        }
+
     async def create_localidad(self, localidad_data: LocalidadCreate) -> Localidad:
         """Crear una nueva localidad - Solo nombre es obligatorio"""
         # Verificar que el UBIGEO sea único si se proporciona
@@ -30,58 +97,54 @@ class LocalidadService:
         nivel_territorial = localidad_data.get_nivel_territorial()
         localidad_dict["nivel_territorial"] = nivel_territorial
         
+        location = punto_geojson(localidad_dict.get("coordenadas"))
+        if location:
+            localidad_dict["location"] = location
+        
         localidad_dict.update({
             "_id": ObjectId(),
             "estaActiva": True,
             "fechaCreacion": datetime.utcnow(),
             "fechaActualizacion": datetime.utcnow()
         })
+        con_campos_busqueda("localidades", localidad_dict)
 
         # Insertar en la base de datos
         result = await self.collection.insert_one(localidad_dict)
+        get_localidad_alias_index().invalidar()
         
         # Obtener el documento creado
         created_localidad = await self.collection.find_one({"_id": result.inserted_id})
         return self._document_to_localidad(created_localidad)
 
-    async def get_localidades(
-        self, 
-        filtros: Optional[FiltroLocalidades] = None,
-        skip: int = 0,
-        limit: int = 100
-    ) -> List[Localidad]:
-        """Obtener localidades con filtros opcionales"""
+    def _filtro_localidades(self, filtros: Optional[FiltroLocalidades]) -> Dict[str, Any]:
         query = {}
-        
         if filtros:
-            if filtros.nombre:
-                query["nombre"] = {"$regex": filtros.nombre, "$options": "i"}
+            query.update(filtro_contiene({
+                "nombre": filtros.nombre,
+                "departamento": filtros.departamento,
+                "provincia": filtros.provincia
+            }))
             if filtros.tipo:
                 query["tipo"] = filtros.tipo
-            if filtros.departamento:
-                query["departamento"] = {"$regex": filtros.departamento, "$options": "i"}
-            if filtros.provincia:
-                query["provincia"] = {"$regex": filtros.provincia, "$options": "i"}
             if filtros.estaActiva is not None:
                 query["estaActiva"] = filtros.estaActiva
-
-        cursor = self.collection.find(query).skip(skip).limit(limit).sort("nombre", 1)
-        localidades = []
-        
-        # Obtener colección de alias
-        alias_collection = self.db["localidades_alias"]
-        
-        async for doc in cursor:
-            # Buscar TODOS los alias para esta localidad
-            alias_cursor = alias_collection.find({
-                "localidad_id": str(doc["_id"]),
+        return query
+
+    async def _con_aliases(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Agregar a `metadata` los alias activos de cada documento (una sola consulta)"""
+        aliases_por_localidad: Dict[str, List[str]] = {}
+        if docs:
+            alias_cursor = self.db["localidades_alias"].find({
+                "localidad_id": {"$in": [str(doc["_id"]) for doc in docs]},
                 "estaActivo": True
             })
-            
-            aliases = []
             async for alias_doc in alias_cursor:
                 if alias_doc.get("alias"):
-                    aliases.append(alias_doc.get("alias"))
+                    aliases_por_localidad.setdefault(alias_doc.get("localidad_id"), []).append(alias_doc.get("alias"))
+        
+        for doc in docs:
+            aliases = aliases_por_localidad.get(str(doc["_id"]))
             
             # Si existen alias, agregarlos a metadata
             if aliases:
@@ -90,47 +153,64 @@ class LocalidadService:
                 doc["metadata"]["aliases"] = aliases  # Lista de todos los alias
                 doc["metadata"]["alias"] = aliases[0]  # Primer alias por compatibilidad
                 doc["metadata"]["nombre_oficial"] = doc.get("nombre")
-            
-            localidades.append(self._document_to_localidad(doc))
-            
-        return localidades
+        return docs
+
+    async def get_localidades(
+        self, 
+        filtros: Optional[FiltroLocalidades] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Localidad]:
+        """Obtener localidades con filtros opcionales"""
+        pagina = await self.get_localidades_pagina(filtros, limit, skip=skip)
+        return pagina.documentos
+
+    async def get_localidades_pagina(
+        self,
+        filtros: Optional[FiltroLocalidades] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        contar: bool = False
+    ) -> PaginaCursor:
+        """
+        Página de localidades ordenadas por `(nombre, _id)`
+
+        Lanza CursorInvalido si el cursor no es válido.
+        """
+        query = self._filtro_localidades(filtros)
+        pagina = await paginar(
+            self.collection, query, limit, cursor=cursor, campo_orden="nombre", skip=skip, contar=contar
+        )
+        docs = await self._con_aliases(pagina.documentos)
+        pagina.documentos = [self._document_to_localidad(doc) for doc in docs]
+        return pagina
 
     async def get_localidades_paginadas(
         self,
         pagina: int = 1,
         limite: int = 10,
-        filtros: Optional[FiltroLocalidades] = None
+        filtros: Optional[FiltroLocalidades] = None,
+        cursor: Optional[str] = None
     ) -> LocalidadesPaginadas:
-        """Obtener localidades paginadas"""
-        skip = (pagina - 1) * limite
-        
-        # Construir query
-        query = {}
-        if filtros:
-            if filtros.nombre:
-                query["nombre"] = {"$regex": filtros.nombre, "$options": "i"}
-            if filtros.tipo:
-                query["tipo"] = filtros.tipo
-            if filtros.departamento:
-                query["departamento"] = {"$regex": filtros.departamento, "$options": "i"}
-            if filtros.provincia:
-                query["provincia"] = {"$regex": filtros.provincia, "$options": "i"}
-            if filtros.estaActiva is not None:
-                query["estaActiva"] = filtros.estaActiva
+        """
+        Obtener localidades paginadas
 
-        # Contar total
-        total = await self.collection.count_documents(query)
-        
-        # Obtener localidades
-        localidades = await self.get_localidades(filtros, skip, limite)
+        Con `cursor` la página se pide por keyset y `pagina` solo se devuelve
+        tal cual; el total es el conteo estimado (se reutiliza entre páginas).
+        """
+        skip = 0 if cursor else (pagina - 1) * limite
+        resultado = await self.get_localidades_pagina(filtros, limite, cursor=cursor, skip=skip, contar=True)
         
+        total = resultado.total or 0
         total_paginas = math.ceil(total / limite) if total > 0 else 1
         
         return LocalidadesPaginadas(
-            localidades=localidades,
+            localidades=resultado.documentos,
             total=total,
             pagina=pagina,
-            totalPaginas=total_paginas
+            totalPaginas=total_paginas,
+            siguienteCursor=resultado.siguiente_cursor
         )
 
     async def get_localidad_by_id(self, localidad_id: str) -> Optional[Localidad]:
@@ -193,12 +273,23 @@ class LocalidadService:
 
             # Actualizar fecha de modificación
             update_data["fechaActualizacion"] = datetime.utcnow()
+            update_data[CAMPO_BUSQUEDA] = campos_busqueda("localidades", {**existing, **update_data})
+
+            # Mantener el punto GeoJSON en sincronía con las coordenadas
+            operacion: Dict[str, Any] = {"$set": update_data}
+            if "coordenadas" in update_data:
+                location = punto_geojson(update_data["coordenadas"])
+                if location:
+                    update_data["location"] = location
+                else:
+                    operacion["$unset"] = {"location": ""}
 
             # Actualizar documento
             await self.collection.update_one(
                 {"_id": ObjectId(localidad_id)},
-                {"$set": update_data}
+                operacion
             )
+            get_localidad_alias_index().invalidar()
 
             # Obtener documento actualizado
             updated_doc = await self.collection.find_one({"_id": ObjectId(localidad_id)})
@@ -284,6 +375,7 @@ class LocalidadService:
                 {"_id": ObjectId(localidad_id)},
                 {"$set": {"estaActiva": False, "fechaActualizacion": datetime.utcnow()}}
             )
+            get_localidad_alias_index().invalidar()
             return result.modified_count > 0
         except ValueError as e:
             # Re-lanzar errores de validación
@@ -396,6 +488,7 @@ class LocalidadService:
                 {"_id": ObjectId(localidad_id)},
                 {"$set": {"estaActiva": nuevo_estado, "fechaActualizacion": datetime.utcnow()}}
             )
+            get_localidad_alias_index().invalidar()
 
             return await self.get_localidad_by_id(localidad_id)
         except:
@@ -440,32 +533,32 @@ class LocalidadService:
         3. Nombre que contiene el término
         4. Jerarquía: Departamento > Provincia > Distrito > Centro Poblado
         """
-        termino_normalizado = termino.strip()
+        texto = normalizar_texto(termino)
         
-        # Pipeline de agregación para búsqueda inteligente con scoring
+        def contiene(campo: str) -> Dict[str, Any]:
+            return {"$gte": [{"$indexOfCP": [f"${campo_normalizado(campo)}", texto]}, 0]}
+        
+        # Pipeline de agregación para búsqueda inteligente con scoring; el
+        # $match usa los trigramas de `_busqueda` (ver busqueda_normalizada)
         pipeline = [
             {
                 "$match": {
                     "$or": [
-                        {"nombre": {"$regex": termino_normalizado, "$options": "i"}},
-                        {"codigo": {"$regex": termino_normalizado, "$options": "i"}},
-                        {"ubigeo": {"$regex": termino_normalizado, "$options": "i"}},
-                        {"departamento": {"$regex": termino_normalizado, "$options": "i"}},
-                        {"provincia": {"$regex": termino_normalizado, "$options": "i"}},
-                        {"distrito": {"$regex": termino_normalizado, "$options": "i"}}
+                        filtro_contiene({campo: termino})
+                        for campo in ("nombre", "ubigeo", "departamento", "provincia", "distrito")
                     ],
                     "estaActiva": True
                 }
             },
             {
                 "$addFields": {
-                    # Calcular score de relevancia
+                    # Calcular score de relevancia (sobre los campos normalizados)
                     "score": {
                         "$add": [
-                            # +100 si coincide exactamente con el nombre (case insensitive)
+                            # +100 si coincide exactamente con el nombre
                             {
                                 "$cond": [
-                                    {"$eq": [{"$toLower": "$nombre"}, termino_normalizado.lower()]},
+                                    {"$eq": [f"${campo_normalizado('nombre')}", texto]},
                                     100,
                                     0
                                 ]
@@ -473,7 +566,7 @@ class LocalidadService:
                             # +50 si el nombre empieza con el término
                             {
                                 "$cond": [
-                                    {"$regexMatch": {"input": "$nombre", "regex": f"^{termino_normalizado}", "options": "i"}},
+                                    {"$eq": [{"$indexOfCP": [f"${campo_normalizado('nombre')}", texto]}, 0]},
                                     50,
                                     0
                                 ]
@@ -481,7 +574,7 @@ class LocalidadService:
                             # +20 si contiene el término en el nombre
                             {
                                 "$cond": [
-                                    {"$regexMatch": {"input": "$nombre", "regex": termino_normalizado, "options": "i"}},
+                                    contiene("nombre"),
                                     20,
                                     0
                                 ]
@@ -502,7 +595,7 @@ class LocalidadService:
                             # +10 si coincide en departamento
                             {
                                 "$cond": [
-                                    {"$regexMatch": {"input": {"$ifNull": ["$departamento", ""]}, "regex": termino_normalizado, "options": "i"}},
+                                    contiene("departamento"),
                                     10,
                                     0
                                 ]
@@ -510,7 +603,7 @@ class LocalidadService:
                             # +8 si coincide en provincia
                             {
                                 "$cond": [
-                                    {"$regexMatch": {"input": {"$ifNull": ["$provincia", ""]}, "regex": termino_normalizado, "options": "i"}},
+                                    contiene("provincia"),
                                     8,
                                     0
                                 ]
@@ -518,7 +611,7 @@ class LocalidadService:
                             # +5 si coincide en distrito
                             {
                                 "$cond": [
-                                    {"$regexMatch": {"input": {"$ifNull": ["$distrito", ""]}, "regex": termino_normalizado, "options": "i"}},
+                                    contiene("distrito"),
                                     5,
                                     0
                                 ]
@@ -573,32 +666,10 @@ class LocalidadService:
             }
         ]
         
-        localidades = []
-        cursor = self.collection.aggregate(pipeline)
+        docs = await self.collection.aggregate(pipeline).to_list(length=limite)
         
-        # Obtener colección de alias
-        alias_collection = self.db["localidades_alias"]
-        
-        async for doc in cursor:
-            # Buscar TODOS los alias para esta localidad
-            alias_cursor = alias_collection.find({
-                "localidad_id": str(doc["_id"]),
-                "estaActivo": True
-            })
-            
-            aliases = []
-            async for alias_doc in alias_cursor:
-                if alias_doc.get("alias"):
-                    aliases.append(alias_doc.get("alias"))
-            
-            # Si existen alias, agregarlos a metadata
-            if aliases:
-                if "metadata" not in doc:
-                    doc["metadata"] = {}
-                doc["metadata"]["aliases"] = aliases  # Lista de todos los alias
-                doc["metadata"]["alias"] = aliases[0]  # Primer alias por compatibilidad
-                doc["metadata"]["nombre_oficial"] = doc.get("nombre")
-            
+        localidades = []
+        for doc in await self._con_aliases(docs):
             # Agregar la ruta jerárquica al documento antes de convertir
             localidad = self._document_to_localidad(doc)
             # Agregar metadata de búsqueda (opcional, para debugging)
@@ -609,55 +680,116 @@ class LocalidadService:
             
         return localidades
 
-    async def calcular_distancia(self, origen_id: str, destino_id: str) -> float:
-        """Calcular distancia entre dos localidades"""
-        origen = await self.get_localidad_by_id(origen_id)
-        destino = await self.get_localidad_by_id(destino_id)
-        
+    async def calcular_distancia(self, origen_id: str, destino_id: str) -> Optional[float]:
+        """
+        Distancia en línea recta (km) entre dos localidades
+
+        Devuelve None si alguna no existe o no tiene coordenadas.
+        """
+        ids = []
+        for localidad_id in {origen_id, destino_id}:
+            if not ObjectId.is_valid(localidad_id):
+                return None
+            ids.append(ObjectId(localidad_id))
+
+        docs = await self.collection.find(
+            {"_id": {"$in": ids}}, {"location": 1, "coordenadas": 1}
+        ).to_list(length=2)
+        # `coordenadas` cubre las localidades aún no migradas a `location`
+        puntos = {str(doc["_id"]): doc.get("location") or punto_geojson(doc.get("coordenadas")) for doc in docs}
+        origen, destino = puntos.get(origen_id), puntos.get(destino_id)
         if not origen or not destino:
-            return 0.0
-
-        # Si ambas tienen coordenadas, calcular distancia real
-        if origen.coordenadas and destino.coordenadas:
-            return self._calcular_distancia_haversine(
-                origen.coordenadas.latitud,
-                origen.coordenadas.longitud,
-                destino.coordenadas.latitud,
-                destino.coordenadas.longitud
-            )
+            return None
+
+        (lon1, lat1), (lon2, lat2) = origen["coordinates"], destino["coordinates"]
+        return haversine_km(lat1, lon1, lat2, lon2)
 
-        # Distancias aproximadas por defecto
-        distancias_aproximadas = {
-            f"{origen.codigo}-{destino.codigo}": self._obtener_distancia_aproximada(origen.codigo, destino.codigo),
-            f"{destino.codigo}-{origen.codigo}": self._obtener_distancia_aproximada(destino.codigo, origen.codigo)
+    async def buscar_cercanas(
+        self,
+        latitud: float,
+        longitud: float,
+        limite: int = 10,
+        radio_km: Optional[float] = None,
+        tipo: Optional[TipoLocalidad] = None,
+        solo_activas: bool = True
+    ) -> List[LocalidadCercana]:
+        """
+        Localidades más cercanas a un punto, de la más próxima a la más lejana
+
+        Una sola agregación `$geoNear` sobre el índice 2dsphere de `location`;
+        con `radio_km` solo devuelve las que están dentro de ese radio.
+        """
+        await self.asegurar_indices_geo()
+
+        query: Dict[str, Any] = {}
+        if tipo:
+            query["tipo"] = tipo.value
+        if solo_activas:
+            query["estaActiva"] = {"$ne": False}
+
+        geo_near: Dict[str, Any] = {
+            "near": {"type": "Point", "coordinates": [longitud, latitud]},
+            "key": "location",
+            "distanceField": "distancia_m",
+            "spherical": True,
+            "query": query
         }
-        
-        clave1 = f"{origen.codigo}-{destino.codigo}"
-        clave2 = f"{destino.codigo}-{origen.codigo}"
-        
-        return distancias_aproximadas.get(clave1, distancias_aproximadas.get(clave2, 100.0))
+        if radio_km is not None:
+            geo_near["maxDistance"] = radio_km * 1000
+
+        docs = await self.collection.aggregate([
+            {"$geoNear": geo_near},
+            {"$limit": limite},
+            {"$project": {"location": 0}}
+        ]).to_list(length=limite)
+
+        cercanas = []
+        for doc in docs:
+            distancia_km = round(doc.pop("distancia_m") / 1000, 3)
+            localidad = self._document_to_localidad(doc)
+            cercanas.append(LocalidadCercana(**localidad.model_dump(), distancia_km=distancia_km))
+        return cercanas
 
-    def _calcular_distancia_haversine(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calcular distancia usando fórmula de Haversine"""
-        R = 6371  # Radio de la Tierra en km
-        
-        lat1_rad = math.radians(lat1)
-        lon1_rad = math.radians(lon1)
-        lat2_rad = math.radians(lat2)
-        lon2_rad = math.radians(lon2)
-        
-        dlat = lat2_rad - lat1_rad
-        dlon = lon2_rad - lon1_rad
-        
-        a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        
-        return R * c
+    async def buscar_contenedoras(
+        self,
+        latitud: float,
+        longitud: float,
+        tipo: Optional[str] = None
+    ) -> List[LocalidadContenedora]:
+        """
+        Polígonos de `geometrias` que contienen un punto (`$geoIntersects`), con su localidad
 
-    def _obtener_distancia_aproximada(self, codigo_origen: str, codigo_destino: str) -> float:
-        """Obtener distancia aproximada entre localidades - calculada dinámicamente"""
-        # Sin datos hardcodeados - se calcula usando coordenadas reales
-        return 100.0  # Distancia por defecto en km
+        Ordenados del más general al más específico (PROVINCIA antes que DISTRITO).
+        """
+        await self.asegurar_indices_geo()
+
+        query: Dict[str, Any] = {"geometry": {"$geoIntersects": {
+            "$geometry": {"type": "Point", "coordinates": [longitud, latitud]}
+        }}}
+        if tipo:
+            query["tipo"] = tipo
+
+        geometrias = await self.db.geometrias.find(
+            query, {"tipo": 1, "ubigeo": 1, "localidad_id": 1}
+        ).to_list(length=None)
+
+        ids = [ObjectId(g["localidad_id"]) for g in geometrias if ObjectId.is_valid(str(g.get("localidad_id")))]
+        localidades = {
+            str(doc["_id"]): LocalidadResponse(**self._document_to_localidad(doc).model_dump())
+            for doc in await self.collection.find({"_id": {"$in": ids}}, {"location": 0}).to_list(length=None)
+        }
+
+        orden = {"DEPARTAMENTO": 0, "PROVINCIA": 1, "DISTRITO": 2, "CENTRO_POBLADO": 3}
+        geometrias.sort(key=lambda g: orden.get(g.get("tipo"), len(orden)))
+        return [
+            LocalidadContenedora(
+                geometria_id=str(g["_id"]),
+                tipo=str(g.get("tipo")),
+                ubigeo=g.get("ubigeo"),
+                localidad=localidades.get(str(g.get("localidad_id")))
+            )
+            for g in geometrias
+        ]
 
     def _document_to_localidad(self, doc: Dict[str, Any]) -> Localidad:
         """Convertir documento de MongoDB a modelo Localidad"""
@@ -817,11 +949,11 @@ class LocalidadService:
         for localidad_data in localidades_basicas:
             try:
                 # Crear el documento de localidad
-                localidad_doc = {
+                localidad_doc = con_campos_busqueda("localidades", {
                     **localidad_data,
                     "fechaCreacion": datetime.utcnow(),
                     "fechaActualizacion": datetime.utcnow()
-                }
+                })
                 
                 # Insertar en la base de datos
                 resultado = await self.collection.insert_one(localidad_doc)
@@ -837,5 +969,6 @@ class LocalidadService:
                 print(f"❌ Error creando localidad {localidad_data['nombre']}: {e}")
                 continue
 
+        get_localidad_alias_index().invalidar()
         print(f"🎉 Inicialización completada: {len(localidades_creadas)} localidades creadas")
         return localidades_creadas
\ No newline at end of file
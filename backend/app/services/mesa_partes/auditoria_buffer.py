@@ -0,0 +1,270 @@
+"""
+Escritura de auditoría por lotes en segundo plano
+
+`EscritorAuditoria.registrar` solo pone el evento en una cola acotada y
+vuelve; una tarea lo junta con los siguientes y los escribe en un solo
+insert masivo cuando el lote llega a AUDITORIA_LOTE eventos o pasan
+AUDITORIA_INTERVALO_SEGUNDOS desde el primero. Los lotes ya escritos pasan
+a una segunda tarea que evalúa los patrones de alerta, así ni la escritura
+ni las alertas suman latencia al request.
+
+Si la cola se llena (la base de datos no da abasto) el evento se descarta
+y se cuenta en las métricas en lugar de bloquear al request. Si un lote
+falla se reintenta evento por evento, así un evento inválido solo se
+pierde a sí mismo. Al apagar, `detener` escribe lo que quede.
+
+El módulo no conoce el modelo: quien crea el escritor le pasa `escribir`
+(recibe el lote y devuelve los eventos efectivamente guardados) y
+`al_escribir` (recibe esos eventos para las alertas).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+AUDITORIA_COLA_MAXIMA = int(os.getenv("AUDITORIA_COLA_MAXIMA", "10000"))
+AUDITORIA_LOTE = int(os.getenv("AUDITORIA_LOTE", "200"))
+AUDITORIA_INTERVALO_SEGUNDOS = float(os.getenv("AUDITORIA_INTERVALO_SEGUNDOS", "1"))
+AUDITORIA_CONFIG_TTL_SEGUNDOS = int(os.getenv("AUDITORIA_CONFIG_TTL_SEGUNDOS", "300"))
+
+Evento = Dict[str, Any]
+Escribir = Callable[[List[Evento]], Awaitable[List[Evento]]]
+AlEscribir = Callable[[List[Evento]], Awaitable[None]]
+
+T = TypeVar("T")
+
+
+def json_seguro(valor: Any) -> Any:
+    """Copia de `valor` que una columna JSON puede guardar (fechas, UUID, etc. como texto)"""
+    if valor is None:
+        return None
+    try:
+        return json.loads(json.dumps(valor, default=str))
+    except (TypeError, ValueError):
+        # Claves no serializables o referencias circulares
+        return str(valor)
+
+
+class CacheConfiguracion:
+    """Configuración compartida por todas las instancias del servicio, con vencimiento"""
+
+    def __init__(self, ttl: float = AUDITORIA_CONFIG_TTL_SEGUNDOS):
+        self.ttl = ttl
+        self._valor: Any = None
+        self._vence = 0.0
+
+    def obtener(self, cargar: Callable[[], T]) -> T:
+        if self._valor is None or time.monotonic() >= self._vence:
+            self._valor = cargar()
+            self._vence = time.monotonic() + self.ttl
+        return self._valor
+
+    def invalidar(self) -> None:
+        self._valor = None
+
+
+@dataclass
+class MetricasAuditoria:
+    """Contadores acumulados del escritor (por proceso)"""
+    registrados: int = 0
+    escritos: int = 0
+    filtrados: int = 0
+    lotes: int = 0
+    descartados: int = 0
+    errores_escritura: int = 0
+    errores_alertas: int = 0
+
+    def resumen(self, en_cola: int) -> Dict[str, Any]:
+        return {
+            "en_cola": en_cola,
+            "registrados": self.registrados,
+            "escritos": self.escritos,
+            "filtrados": self.filtrados,
+            "lotes": self.lotes,
+            "eventos_por_lote": round(self.escritos / self.lotes, 1) if self.lotes else 0.0,
+            "descartados": self.descartados,
+            "errores_escritura": self.errores_escritura,
+            "errores_alertas": self.errores_alertas
+        }
+
+
+class EscritorAuditoria:
+    """Cola acotada de eventos que se escriben por lotes"""
+
+    def __init__(
+        self,
+        escribir: Escribir,
+        al_escribir: Optional[AlEscribir] = None,
+        maximo: int = AUDITORIA_COLA_MAXIMA,
+        lote: int = AUDITORIA_LOTE,
+        intervalo: float = AUDITORIA_INTERVALO_SEGUNDOS
+    ):
+        """
+        Args:
+            escribir: Guarda un lote y devuelve los eventos guardados
+            al_escribir: Evalúa alertas sobre los eventos guardados
+        """
+        self.escribir = escribir
+        self.al_escribir = al_escribir
+        self.lote = lote
+        self.intervalo = intervalo
+        self.metricas = MetricasAuditoria()
+        self.cola: asyncio.Queue[Evento] = asyncio.Queue(maxsize=maximo)
+        self.alertas: asyncio.Queue[List[Evento]] = asyncio.Queue(maxsize=max(1, maximo // max(1, lote)))
+        self._tareas: List[asyncio.Task] = []
+        # Activo mientras alguien espera en vaciar(): no esperar a completar el lote
+        self._apurar = asyncio.Event()
+
+    def registrar(self, evento: Evento) -> bool:
+        """Encolar un evento sin esperar; False si la cola está llena"""
+        self.iniciar()
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.metricas.descartados += 1
+            if self.metricas.descartados % 1000 == 1:
+                logger.warning(f"⚠️ Cola de auditoría llena: {self.metricas.descartados} eventos descartados")
+            return False
+        self.metricas.registrados += 1
+        return True
+
+    def iniciar(self) -> None:
+        """Arrancar las tareas de escritura y alertas (idempotente)"""
+        if not self._tareas or any(t.done() for t in self._tareas):
+            for tarea in self._tareas:
+                tarea.cancel()
+            self._tareas = [asyncio.create_task(self._consumir())]
+            if self.al_escribir:
+                self._tareas.append(asyncio.create_task(self._consumir_alertas()))
+
+    async def vaciar(self) -> None:
+        """Escribir ya lo encolado y esperar a que se evalúen sus alertas"""
+        self._apurar.set()
+        try:
+            await self.cola.join()
+            await self.alertas.join()
+        finally:
+            self._apurar.clear()
+
+    async def detener(self, espera: float = 10) -> None:
+        """Escribir lo pendiente (hasta `espera` segundos) y detener las tareas"""
+        if self._tareas:
+            try:
+                await asyncio.wait_for(self.vaciar(), espera)
+            except asyncio.TimeoutError:
+                logger.error(f"❌ Auditoría: {self.cola.qsize()} eventos sin escribir al apagar")
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+
+    async def _siguiente_lote(self) -> List[Evento]:
+        lote = [await self.cola.get()]
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.lote:
+            try:
+                lote.append(self.cola.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            restante = limite - time.monotonic()
+            if restante <= 0 or self._apurar.is_set():
+                break
+            # asyncio.wait y no wait_for: este puede perder un evento ya sacado de la cola
+            siguiente = asyncio.ensure_future(self.cola.get())
+            apurar = asyncio.ensure_future(self._apurar.wait())
+            try:
+                await asyncio.wait({siguiente, apurar}, timeout=restante, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                apurar.cancel()
+                sin_evento = siguiente.cancel()
+            if sin_evento:
+                break
+            lote.append(siguiente.result())
+        return lote
+
+    async def _escribir_uno_por_uno(self, lote: List[Evento]) -> Tuple[List[Evento], int]:
+        """
+        Tras fallar un lote: escribir cada evento por separado y perder solo los inválidos
+
+        Returns:
+            (eventos guardados, eventos descartados por error)
+        """
+        escritos: List[Evento] = []
+        fallidos = 0
+        for evento in lote:
+            try:
+                escritos.extend(await self.escribir([evento]))
+            except Exception as e:
+                fallidos += 1
+                logger.error(f"❌ Evento de auditoría {evento.get('tipo_evento')} descartado: {e}")
+        return escritos, fallidos
+
+    async def _consumir(self) -> None:
+        while True:
+            lote = await self._siguiente_lote()
+            try:
+                fallidos = 0
+                try:
+                    escritos = await self.escribir(lote)
+                except Exception as e:
+                    if len(lote) == 1:
+                        raise
+                    logger.warning(f"⚠️ Falló un lote de {len(lote)} eventos de auditoría, se escriben uno por uno: {e}")
+                    escritos, fallidos = await self._escribir_uno_por_uno(lote)
+                self.metricas.lotes += 1
+                self.metricas.escritos += len(escritos)
+                self.metricas.errores_escritura += fallidos
+                self.metricas.filtrados += len(lote) - len(escritos) - fallidos
+                if escritos and self.al_escribir:
+                    try:
+                        self.alertas.put_nowait(escritos)
+                    except asyncio.QueueFull:
+                        self.metricas.errores_alertas += 1
+            except Exception as e:
+                self.metricas.errores_escritura += len(lote)
+                logger.error(f"❌ Error escribiendo {len(lote)} eventos de auditoría: {e}")
+            finally:
+                for _ in lote:
+                    self.cola.task_done()
+
+    async def _consumir_alertas(self) -> None:
+        while True:
+            escritos = await self.alertas.get()
+            try:
+                await self.al_escribir(escritos)
+            except Exception as e:
+                self.metricas.errores_alertas += 1
+                logger.error(f"❌ Error evaluando alertas de auditoría: {e}")
+            finally:
+                self.alertas.task_done()
+
+    def get_estadisticas(self) -> Dict[str, Any]:
+        return self.metricas.resumen(self.cola.qsize())
+
+
+# Global audit writer instance
+_escritor_auditoria: Optional[EscritorAuditoria] = None
+
+def get_escritor_auditoria(
+    escribir: Optional[Escribir] = None,
+    al_escribir: Optional[AlEscribir] = None
+) -> EscritorAuditoria:
+    """Escritor global; la primera llamada debe indicar `escribir`"""
+    global _escritor_auditoria
+    if _escritor_auditoria is None:
+        if escribir is None:
+            raise RuntimeError("El escritor de auditoría aún no está configurado")
+        _escritor_auditoria = EscritorAuditoria(escribir, al_escribir)
+    return _escritor_auditoria
+
+
+async def detener_escritor_auditoria() -> None:
+    """Escribir lo pendiente al apagar (si el escritor llegó a usarse)"""
+    if _escritor_auditoria is not None:
+        await _escritor_auditoria.detener()
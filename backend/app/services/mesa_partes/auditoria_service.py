@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, desc, func, text
 import json
+import uuid
 import asyncio
 from contextlib import asynccontextmanager
 import logging
@@ -18,6 +19,7 @@ from ...schemas.mesa_partes.auditoria import (
     LogAuditoriaCreate, LogAuditoriaResponse, FiltrosAuditoria,
     ConfiguracionAuditoriaCreate, AlertaAuditoriaResponse
 )
+from .auditoria_buffer import CacheConfiguracion, get_escritor_auditoria, json_seguro
 
 logger = logging.getLogger(__name__)
 
@@ -27,8 +29,6 @@ class AuditoriaService:
     
     def __init__(self, db: Session):
         self.db = db
-        self._config_cache = None
-        self._cache_timestamp = None
     
     # Métodos para logging de eventos
     async def log_evento(
@@ -53,54 +53,48 @@ class AuditoriaService:
         duracion_ms: Optional[int] = None,
         session_id: Optional[str] = None,
         es_exitoso: bool = True
-    ) -> LogAuditoria:
-        """Registrar un evento de auditoría"""
-        
-        # Verificar si el evento debe ser registrado
-        config = await self._get_configuracion()
-        if not await self._debe_registrar_evento(tipo_evento, severidad, config):
-            return None
-        
-        # Crear el log de auditoría
-        log_entry = LogAuditoria(
-            tipo_evento=tipo_evento.value if isinstance(tipo_evento, TipoEventoEnum) else tipo_evento,
-            severidad=severidad.value if isinstance(severidad, SeveridadEnum) else severidad,
-            descripcion=descripcion,
-            usuario_id=usuario_id,
-            usuario_email=usuario_email,
-            usuario_nombre=usuario_nombre,
-            session_id=session_id,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            recurso_tipo=recurso_tipo,
-            recurso_id=recurso_id,
-            recurso_nombre=recurso_nombre,
-            datos_anteriores=datos_anteriores,
-            datos_nuevos=datos_nuevos,
-            metadatos=metadatos or {},
-            endpoint=endpoint,
-            metodo_http=metodo_http,
-            codigo_respuesta=codigo_respuesta,
-            duracion_ms=duracion_ms,
-            es_exitoso=es_exitoso,
-            contexto_aplicacion="mesa_partes",
-            version_aplicacion="1.0.0"  # TODO: Obtener de configuración
-        )
-        
-        try:
-            self.db.add(log_entry)
-            self.db.commit()
-            self.db.refresh(log_entry)
-            
-            # Verificar si se debe generar una alerta
-            await self._verificar_alertas(log_entry)
-            
-            return log_entry
-            
-        except Exception as e:
-            logger.error(f"Error al registrar evento de auditoría: {str(e)}")
-            self.db.rollback()
+    ) -> Optional[str]:
+        """
+        Registrar un evento de auditoría
+
+        El evento se encola y se escribe por lotes en segundo plano (ver
+        auditoria_buffer); el filtro por configuración y las alertas se
+        aplican al escribirlo.
+
+        Returns:
+            ID que tendrá el log, o None si la cola de auditoría está llena
+        """
+        evento = {
+            "id": uuid.uuid4(),
+            "timestamp": datetime.utcnow(),
+            "tipo_evento": tipo_evento.value if isinstance(tipo_evento, TipoEventoEnum) else tipo_evento,
+            "severidad": severidad.value if isinstance(severidad, SeveridadEnum) else severidad,
+            "descripcion": descripcion,
+            "usuario_id": usuario_id,
+            "usuario_email": usuario_email,
+            "usuario_nombre": usuario_nombre,
+            "session_id": session_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "recurso_tipo": recurso_tipo,
+            "recurso_id": recurso_id,
+            "recurso_nombre": recurso_nombre,
+            # Columnas JSON: fechas, UUID, enums... como texto
+            "datos_anteriores": json_seguro(datos_anteriores),
+            "datos_nuevos": json_seguro(datos_nuevos),
+            "metadatos": json_seguro(metadatos or {}),
+            "endpoint": endpoint,
+            "metodo_http": metodo_http,
+            "codigo_respuesta": codigo_respuesta,
+            "duracion_ms": duracion_ms,
+            "es_exitoso": es_exitoso,
+            "contexto_aplicacion": "mesa_partes",
+            "version_aplicacion": "1.0.0"  # TODO: Obtener de configuración
+        }
+
+        if not get_escritor_auditoria(_escribir_lote, _evaluar_alertas_lote).registrar(evento):
             return None
+        return str(evento["id"])
     
     # Métodos específicos para eventos comunes
     async def log_documento_creado(
@@ -350,110 +344,8 @@ class AuditoriaService:
     
     # Métodos de configuración
     async def _get_configuracion(self) -> ConfiguracionAuditoria:
-        """Obtener configuración de auditoría (con caché)"""
-        now = datetime.utcnow()
-        
-        # Verificar caché (válido por 5 minutos)
-        if (self._config_cache and self._cache_timestamp and 
-            (now - self._cache_timestamp).seconds < 300):
-            return self._config_cache
-        
-        # Obtener configuración de la base de datos
-        config = self.db.query(ConfiguracionAuditoria).filter(
-            ConfiguracionAuditoria.activa == True
-        ).first()
-        
-        if not config:
-            # Crear configuración por defecto
-            config = ConfiguracionAuditoria(
-                eventos_habilitados=[e.value for e in TipoEventoEnum],
-                severidades_habilitadas=[s.value for s in SeveridadEnum]
-            )
-            self.db.add(config)
-            self.db.commit()
-            self.db.refresh(config)
-        
-        # Actualizar caché
-        self._config_cache = config
-        self._cache_timestamp = now
-        
-        return config
-    
-    async def _debe_registrar_evento(
-        self,
-        tipo_evento: str,
-        severidad: str,
-        config: ConfiguracionAuditoria
-    ) -> bool:
-        """Verificar si un evento debe ser registrado"""
-        eventos_habilitados = config.eventos_habilitados or []
-        severidades_habilitadas = config.severidades_habilitadas or []
-        
-        return (
-            (not eventos_habilitados or tipo_evento in eventos_habilitados) and
-            (not severidades_habilitadas or severidad in severidades_habilitadas)
-        )
-    
-    # Métodos de alertas
-    async def _verificar_alertas(self, log_entry: LogAuditoria):
-        """Verificar si se debe generar una alerta basada en el log"""
-        
-        # Patrones de alerta predefinidos
-        patrones_alerta = [
-            {
-                "nombre": "multiples_accesos_fallidos",
-                "condicion": lambda log: log.tipo_evento == TipoEventoEnum.LOGIN_FALLIDO.value,
-                "umbral": 5,
-                "ventana_minutos": 15,
-                "severidad": SeveridadEnum.WARNING
-            },
-            {
-                "nombre": "intentos_acceso_no_autorizado",
-                "condicion": lambda log: log.tipo_evento == TipoEventoEnum.INTENTO_ACCESO_NO_AUTORIZADO.value,
-                "umbral": 3,
-                "ventana_minutos": 10,
-                "severidad": SeveridadEnum.ERROR
-            },
-            {
-                "nombre": "errores_criticos",
-                "condicion": lambda log: log.severidad == SeveridadEnum.CRITICAL.value,
-                "umbral": 1,
-                "ventana_minutos": 1,
-                "severidad": SeveridadEnum.CRITICAL
-            }
-        ]
-        
-        for patron in patrones_alerta:
-            if patron["condicion"](log_entry):
-                await self._evaluar_patron_alerta(log_entry, patron)
-    
-    async def _evaluar_patron_alerta(self, log_entry: LogAuditoria, patron: Dict[str, Any]):
-        """Evaluar si un patrón de alerta se cumple"""
-        ventana_inicio = log_entry.timestamp - timedelta(minutes=patron["ventana_minutos"])
-        
-        # Contar ocurrencias en la ventana de tiempo
-        count = self.db.query(func.count(LogAuditoria.id)).filter(
-            and_(
-                LogAuditoria.timestamp >= ventana_inicio,
-                LogAuditoria.timestamp <= log_entry.timestamp,
-                LogAuditoria.tipo_evento == log_entry.tipo_evento
-            )
-        ).scalar()
-        
-        if count >= patron["umbral"]:
-            # Generar alerta
-            alerta = AlertaAuditoria(
-                titulo=f"Patrón detectado: {patron['nombre']}",
-                descripcion=f"Se detectaron {count} ocurrencias de {log_entry.tipo_evento} en {patron['ventana_minutos']} minutos",
-                severidad=patron["severidad"].value,
-                log_auditoria_id=log_entry.id,
-                patron_detectado=patron["nombre"],
-                numero_ocurrencias=count,
-                ventana_tiempo_minutos=patron["ventana_minutos"]
-            )
-            
-            self.db.add(alerta)
-            self.db.commit()
+        """Obtener configuración de auditoría (caché compartida por proceso)"""
+        return _cache_configuracion.obtener(lambda: _cargar_configuracion(self.db))
     
     # Métodos de mantenimiento
     async def limpiar_logs_antiguos(self, dias_retencion: Optional[int] = None):
@@ -516,4 +408,131 @@ class AuditoriaService:
         self.db.commit()
         self.db.refresh(estadisticas)
         
-        return estadisticas
\ No newline at end of file
+        return estadisticas
+
+
+# Escritura por lotes (fuera del request)
+_cache_configuracion = CacheConfiguracion()
+
+# Patrones de alerta: se evalúan una vez por lote, contra la base de datos
+PATRONES_ALERTA = [
+    {
+        "nombre": "multiples_accesos_fallidos",
+        "condicion": lambda evento: evento["tipo_evento"] == TipoEventoEnum.LOGIN_FALLIDO.value,
+        "umbral": 5,
+        "ventana_minutos": 15,
+        "severidad": SeveridadEnum.WARNING
+    },
+    {
+        "nombre": "intentos_acceso_no_autorizado",
+        "condicion": lambda evento: evento["tipo_evento"] == TipoEventoEnum.INTENTO_ACCESO_NO_AUTORIZADO.value,
+        "umbral": 3,
+        "ventana_minutos": 10,
+        "severidad": SeveridadEnum.ERROR
+    },
+    {
+        "nombre": "errores_criticos",
+        "condicion": lambda evento: evento["severidad"] == SeveridadEnum.CRITICAL.value,
+        "umbral": 1,
+        "ventana_minutos": 1,
+        "severidad": SeveridadEnum.CRITICAL
+    }
+]
+
+
+def _crear_sesion() -> Session:
+    from ...models.mesa_partes.database import SessionLocal
+    return SessionLocal()
+
+
+def _cargar_configuracion(db: Session) -> ConfiguracionAuditoria:
+    config = db.query(ConfiguracionAuditoria).filter(
+        ConfiguracionAuditoria.activa == True
+    ).first()
+    
+    if not config:
+        # Crear configuración por defecto
+        config = ConfiguracionAuditoria(
+            eventos_habilitados=[e.value for e in TipoEventoEnum],
+            severidades_habilitadas=[s.value for s in SeveridadEnum]
+        )
+        db.add(config)
+        db.commit()
+        db.refresh(config)
+    
+    # Se usa fuera de esta sesión
+    db.expunge(config)
+    return config
+
+
+def _debe_registrar_evento(evento: Dict[str, Any], config: ConfiguracionAuditoria) -> bool:
+    """Verificar si un evento debe ser registrado"""
+    eventos_habilitados = config.eventos_habilitados or []
+    severidades_habilitadas = config.severidades_habilitadas or []
+    
+    return (
+        (not eventos_habilitados or evento["tipo_evento"] in eventos_habilitados) and
+        (not severidades_habilitadas or evento["severidad"] in severidades_habilitadas)
+    )
+
+
+def _escribir_logs(eventos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    db = _crear_sesion()
+    try:
+        config = _cache_configuracion.obtener(lambda: _cargar_configuracion(db))
+        registrables = [e for e in eventos if _debe_registrar_evento(e, config)]
+        if registrables:
+            db.bulk_insert_mappings(LogAuditoria, registrables)
+            db.commit()
+        return registrables
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _evaluar_alertas(eventos: List[Dict[str, Any]]) -> None:
+    db = _crear_sesion()
+    try:
+        for patron in PATRONES_ALERTA:
+            coincidencias = [e for e in eventos if patron["condicion"](e)]
+            if not coincidencias:
+                continue
+            ultimo = coincidencias[-1]
+            ventana_inicio = ultimo["timestamp"] - timedelta(minutes=patron["ventana_minutos"])
+            
+            # Contar ocurrencias en la ventana de tiempo (una consulta por lote y patrón)
+            count = db.query(func.count(LogAuditoria.id)).filter(
+                and_(
+                    LogAuditoria.timestamp >= ventana_inicio,
+                    LogAuditoria.timestamp <= ultimo["timestamp"],
+                    LogAuditoria.tipo_evento == ultimo["tipo_evento"]
+                )
+            ).scalar()
+            
+            if count >= patron["umbral"]:
+                db.add(AlertaAuditoria(
+                    titulo=f"Patrón detectado: {patron['nombre']}",
+                    descripcion=f"Se detectaron {count} ocurrencias de {ultimo['tipo_evento']} en {patron['ventana_minutos']} minutos",
+                    severidad=patron["severidad"].value,
+                    log_auditoria_id=ultimo["id"],
+                    patron_detectado=patron["nombre"],
+                    numero_ocurrencias=count,
+                    ventana_tiempo_minutos=patron["ventana_minutos"]
+                ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def _escribir_lote(eventos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # La sesión de SQLAlchemy es síncrona: el insert masivo va en un hilo
+    return await asyncio.to_thread(_escribir_logs, eventos)
+
+
+async def _evaluar_alertas_lote(eventos: List[Dict[str, Any]]) -> None:
+    await asyncio.to_thread(_evaluar_alertas, eventos)
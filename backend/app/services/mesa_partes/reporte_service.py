@@ -5,7 +5,7 @@ Handles business logic for reports and statistics in Mesa de Partes
 from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, text, extract, desc
+from sqlalchemy import and_, or_, func, text, extract
 import pandas as pd
 import io
 from reportlab.lib.pagesizes import letter, A4
@@ -18,8 +18,10 @@ from app.models.mesa_partes.documento import Documento, EstadoDocumentoEnum, Pri
 from app.models.mesa_partes.derivacion import Derivacion, EstadoDerivacionEnum
 from app.models.mesa_partes.integracion import Integracion
 from app.schemas.mesa_partes.documento import FiltrosDocumento
-from app.core.cache import get_cache, cached, invalidate_cache
+from app.core.cache import get_cache
 from app.core.task_queue import get_task_queue
+from app.services.mesa_partes.resumen_estadisticas import estadisticas_documentos, metricas_atenciones
+from app.services.mesa_partes.resumen_service import ResumenService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,6 +32,7 @@ class ReporteService:
         self.db = db
         self.cache = get_cache()
         self.task_queue = get_task_queue()
+        self.resumen = ResumenService(db)
 
     async def obtener_estadisticas(
         self,
@@ -38,112 +41,26 @@ class ReporteService:
         area_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        Obtiene estadísticas generales del sistema (with caching)
+        Obtiene estadísticas generales del sistema
+
+        Se leen del resumen diario (ver resumen_estadisticas), por días
+        completos; el costo no depende de la cantidad de documentos.
         """
-        # Check cache first
-        cache_key = self.cache._generate_key("reportes:estadisticas", fecha_inicio, fecha_fin, area_id)
-        cached_stats = self.cache.get(cache_key)
-        if cached_stats is not None:
-            logger.debug(f"Cache hit for estadisticas")
-            return cached_stats
-        
         # Establecer fechas por defecto (último mes)
         if not fecha_fin:
             fecha_fin = datetime.utcnow()
         if not fecha_inicio:
             fecha_inicio = fecha_fin - timedelta(days=30)
 
-        # Query base
-        query = self.db.query(Documento).filter(
-            Documento.fecha_recepcion.between(fecha_inicio, fecha_fin)
-        )
-        
-        if area_id:
-            query = query.filter(Documento.area_actual_id == area_id)
-
-        # Estadísticas básicas
-        total_documentos = query.count()
-        
-        documentos_por_estado = (
-            query.with_entities(
-                Documento.estado,
-                func.count(Documento.id).label('cantidad')
-            )
-            .group_by(Documento.estado)
-            .all()
-        )
-
-        documentos_por_prioridad = (
-            query.with_entities(
-                Documento.prioridad,
-                func.count(Documento.id).label('cantidad')
-            )
-            .group_by(Documento.prioridad)
-            .all()
-        )
-
-        # Documentos vencidos
-        documentos_vencidos = (
-            query.filter(
-                and_(
-                    Documento.fecha_limite < datetime.utcnow(),
-                    Documento.estado != EstadoDocumentoEnum.ATENDIDO,
-                    Documento.estado != EstadoDocumentoEnum.ARCHIVADO
-                )
-            ).count()
-        )
-
-        # Documentos próximos a vencer (próximos 3 días)
-        fecha_limite_proxima = datetime.utcnow() + timedelta(days=3)
-        documentos_proximos_vencer = (
-            query.filter(
-                and_(
-                    Documento.fecha_limite.between(datetime.utcnow(), fecha_limite_proxima),
-                    Documento.estado != EstadoDocumentoEnum.ATENDIDO,
-                    Documento.estado != EstadoDocumentoEnum.ARCHIVADO
-                )
-            ).count()
-        )
+        filas = self.resumen.leer_documentos(fecha_inicio.date(), fecha_fin.date(), area_id)
 
-        # Tendencia por días
-        tendencia_diaria = (
-            query.with_entities(
-                func.date(Documento.fecha_recepcion).label('fecha'),
-                func.count(Documento.id).label('cantidad')
-            )
-            .group_by(func.date(Documento.fecha_recepcion))
-            .order_by(func.date(Documento.fecha_recepcion))
-            .all()
-        )
-
-        result = {
+        return {
             "periodo": {
                 "fecha_inicio": fecha_inicio.isoformat(),
                 "fecha_fin": fecha_fin.isoformat()
             },
-            "resumen": {
-                "total_documentos": total_documentos,
-                "documentos_vencidos": documentos_vencidos,
-                "documentos_proximos_vencer": documentos_proximos_vencer
-            },
-            "distribucion_estado": [
-                {"estado": estado.value, "cantidad": cantidad}
-                for estado, cantidad in documentos_por_estado
-            ],
-            "distribucion_prioridad": [
-                {"prioridad": prioridad.value, "cantidad": cantidad}
-                for prioridad, cantidad in documentos_por_prioridad
-            ],
-            "tendencia_diaria": [
-                {"fecha": fecha.isoformat(), "cantidad": cantidad}
-                for fecha, cantidad in tendencia_diaria
-            ]
+            **estadisticas_documentos(filas, datetime.utcnow().date())
         }
-        
-        # Cache result for 5 minutes
-        self.cache.set(cache_key, result, ttl=300)
-        
-        return result
 
     async def generar_reporte(
         self,
@@ -569,116 +486,39 @@ class ReporteService:
         fecha_fin: Optional[datetime] = None
     ) -> Dict[str, Any]:
         """
-        Calcula métricas clave del sistema (with caching)
+        Calcula métricas clave del sistema desde el resumen diario
+
+        El tiempo de atención y el cumplimiento se toman de las derivaciones
+        atendidas en el período (a tiempo: antes de su fecha límite de atención).
         """
-        # Check cache first
-        cache_key = self.cache._generate_key("reportes:metricas", fecha_inicio, fecha_fin)
-        cached_metricas = self.cache.get(cache_key)
-        if cached_metricas is not None:
-            logger.debug(f"Cache hit for metricas")
-            return cached_metricas
-        
         if not fecha_fin:
             fecha_fin = datetime.utcnow()
         if not fecha_inicio:
             fecha_inicio = fecha_fin - timedelta(days=30)
 
-        # Tiempo promedio de atención general
-        tiempo_promedio = (
-            self.db.query(
-                func.avg(
-                    func.extract('epoch', Derivacion.fecha_atencion - Derivacion.fecha_derivacion) / 3600
-                )
-            )
-            .filter(
-                and_(
-                    Derivacion.fecha_atencion.isnot(None),
-                    Derivacion.fecha_derivacion.between(fecha_inicio, fecha_fin)
-                )
-            )
-            .scalar()
-        )
-
-        # Tasa de documentos atendidos a tiempo
-        total_con_limite = (
-            self.db.query(Documento)
-            .filter(
-                and_(
-                    Documento.fecha_limite.isnot(None),
-                    Documento.fecha_recepcion.between(fecha_inicio, fecha_fin)
-                )
-            )
-            .count()
-        )
-
-        atendidos_a_tiempo = (
-            self.db.query(Documento)
-            .join(Derivacion)
-            .filter(
-                and_(
-                    Documento.fecha_limite.isnot(None),
-                    Documento.fecha_recepcion.between(fecha_inicio, fecha_fin),
-                    Derivacion.fecha_atencion <= Documento.fecha_limite,
-                    Derivacion.estado == EstadoDerivacionEnum.ATENDIDO
-                )
-            )
-            .count()
-        )
-
-        tasa_cumplimiento = (atendidos_a_tiempo / total_con_limite * 100) if total_con_limite > 0 else 0
-
         # Documentos por día (promedio)
         dias_periodo = (fecha_fin - fecha_inicio).days
-        total_documentos = (
-            self.db.query(Documento)
-            .filter(Documento.fecha_recepcion.between(fecha_inicio, fecha_fin))
-            .count()
-        )
+        total_documentos = self.resumen.total_documentos(fecha_inicio.date(), fecha_fin.date())
         promedio_diario = total_documentos / dias_periodo if dias_periodo > 0 else 0
 
-        # Área más productiva
-        area_productiva = (
-            self.db.query(Derivacion)
-            .filter(
-                and_(
-                    Derivacion.fecha_atencion.between(fecha_inicio, fecha_fin),
-                    Derivacion.estado == EstadoDerivacionEnum.ATENDIDO
-                )
-            )
-            .join(Derivacion.area_destino)
-            .with_entities(
-                Derivacion.area_destino.has().nombre.label('area'),
-                func.count(Derivacion.id).label('atendidos')
-            )
-            .group_by(Derivacion.area_destino_id)
-            .order_by(desc('atendidos'))
-            .first()
-        )
+        atenciones = metricas_atenciones(self.resumen.leer_atenciones(fecha_inicio.date(), fecha_fin.date()))
 
-        result = {
+        return {
             "periodo": {
                 "fecha_inicio": fecha_inicio.isoformat(),
                 "fecha_fin": fecha_fin.isoformat(),
                 "dias": dias_periodo
             },
             "metricas": {
-                "tiempo_promedio_atencion_horas": round(float(tiempo_promedio or 0), 2),
-                "tasa_cumplimiento_porcentaje": round(tasa_cumplimiento, 2),
+                "tiempo_promedio_atencion_horas": atenciones["tiempo_promedio_atencion_horas"],
+                "tasa_cumplimiento_porcentaje": atenciones["tasa_cumplimiento_porcentaje"],
                 "promedio_documentos_diario": round(promedio_diario, 2),
                 "total_documentos_periodo": total_documentos,
-                "area_mas_productiva": {
-                    "nombre": area_productiva[0] if area_productiva else None,
-                    "documentos_atendidos": area_productiva[1] if area_productiva else 0
-                }
+                "area_mas_productiva": atenciones["area_mas_productiva"]
             }
         }
-        
-        # Cache result for 10 minutes
-        self.cache.set(cache_key, result, ttl=600)
-        
-        return result
-    d
-ef generar_reporte_excel_sync(self, filtros: dict) -> str:
+
+    def generar_reporte_excel_sync(self, filtros: dict) -> str:
         """
         Synchronous version for task queue
         """
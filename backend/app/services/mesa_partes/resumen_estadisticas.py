@@ -0,0 +1,175 @@
+"""
+Agregados diarios de Mesa de Partes (cálculos sin base de datos)
+
+Las estadísticas de los tableros se leen de dos tablas de resumen
+(app.models.mesa_partes.resumen) en lugar de contar documentos:
+
+- resumen_diario_documentos: documentos por (día de recepción, área actual,
+  estado, prioridad, día límite) -> cantidad
+- resumen_diario_atenciones: derivaciones atendidas por (día de atención,
+  área destino) -> atendidas, horas de atención, con límite, a tiempo
+
+Cada cambio de un documento o una derivación resta su aporte anterior y
+suma el nuevo (`Deltas`), así las filas se mantienen al día en la misma
+transacción; la reconciliación nocturna recalcula los últimos días por si
+algo se escribió por fuera del ORM. Aquí están las claves, los aportes y
+el armado de las respuestas a partir de las filas del resumen; el tamaño
+de esas filas depende de días × áreas, no del volumen de documentos.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+ESTADOS_CERRADOS = ("ATENDIDO", "ARCHIVADO")
+ESTADO_DERIVACION_ATENDIDA = "ATENDIDO"
+# Área de los documentos que aún no tienen área asignada
+SIN_AREA = ""
+DIAS_PROXIMOS_VENCER = 3
+
+# (fecha, area_id, estado, prioridad, fecha_limite)
+ClaveDocumento = Tuple[date, str, str, str, Optional[date]]
+# (fecha, area_id)
+ClaveAtencion = Tuple[date, str]
+
+
+def _valor(enum_o_texto: Any) -> Optional[str]:
+    return getattr(enum_o_texto, "value", enum_o_texto)
+
+
+def _dia(fecha: Any) -> Optional[date]:
+    return fecha.date() if isinstance(fecha, datetime) else fecha
+
+
+def aporte_documento(
+    fecha_recepcion: Optional[datetime],
+    area_id: Optional[str],
+    estado: Any,
+    prioridad: Any,
+    fecha_limite: Optional[datetime]
+) -> Optional[Tuple[ClaveDocumento, Dict[str, int]]]:
+    """Fila del resumen a la que suma un documento (None si aún no tiene fecha)"""
+    if fecha_recepcion is None:
+        return None
+    clave = (_dia(fecha_recepcion), area_id or SIN_AREA, _valor(estado), _valor(prioridad), _dia(fecha_limite))
+    return clave, {"cantidad": 1}
+
+
+def aporte_atencion(
+    estado: Any,
+    fecha_derivacion: Optional[datetime],
+    fecha_atencion: Optional[datetime],
+    fecha_limite_atencion: Optional[datetime],
+    area_destino_id: Optional[str]
+) -> Optional[Tuple[ClaveAtencion, Dict[str, float]]]:
+    """Fila del resumen a la que suma una derivación atendida (None si no lo está)"""
+    if _valor(estado) != ESTADO_DERIVACION_ATENDIDA or fecha_atencion is None:
+        return None
+    horas = (fecha_atencion - fecha_derivacion).total_seconds() / 3600 if fecha_derivacion else 0.0
+    con_limite = fecha_limite_atencion is not None
+    return (_dia(fecha_atencion), area_destino_id or SIN_AREA), {
+        "atendidas": 1,
+        "horas_atencion": horas,
+        "con_limite": int(con_limite),
+        "a_tiempo": int(con_limite and fecha_atencion <= fecha_limite_atencion)
+    }
+
+
+class Deltas:
+    """Cambios netos por fila de resumen acumulados durante un flush"""
+
+    def __init__(self):
+        self._cambios: Dict[Tuple, Dict[str, float]] = {}
+
+    def mover(self, anterior: Optional[Tuple[Tuple, Dict]], nuevo: Optional[Tuple[Tuple, Dict]]) -> None:
+        """Restar el aporte anterior de un registro y sumar el nuevo"""
+        for aporte, signo in ((anterior, -1), (nuevo, 1)):
+            if aporte is None:
+                continue
+            clave, contadores = aporte
+            fila = self._cambios.setdefault(clave, {})
+            for nombre, valor in contadores.items():
+                fila[nombre] = fila.get(nombre, 0) + signo * valor
+
+    def __iter__(self) -> Iterator[Tuple[Tuple, Dict[str, float]]]:
+        for clave, contadores in self._cambios.items():
+            if any(contadores.values()):
+                yield clave, contadores
+
+    def __bool__(self) -> bool:
+        return any(True for _ in self)
+
+
+def estadisticas_documentos(
+    filas: Iterable[Tuple[date, str, str, Optional[date], int]],
+    hoy: date,
+    dias_proximos: int = DIAS_PROXIMOS_VENCER
+) -> Dict[str, Any]:
+    """
+    Resumen, distribuciones y tendencia a partir de filas
+    (fecha, estado, prioridad, fecha_limite, cantidad) del resumen de documentos
+
+    Vencidos y próximos a vencer se cuentan por día: vencido es un documento
+    abierto con límite antes de hoy; próximo, con límite entre hoy y
+    `dias_proximos` días.
+    """
+    total = vencidos = proximos = 0
+    por_estado: Dict[str, int] = {}
+    por_prioridad: Dict[str, int] = {}
+    por_dia: Dict[date, int] = {}
+    limite_proximos = hoy + timedelta(days=dias_proximos)
+
+    for fecha, estado, prioridad, fecha_limite, cantidad in filas:
+        if not cantidad:
+            continue
+        total += cantidad
+        por_estado[estado] = por_estado.get(estado, 0) + cantidad
+        por_prioridad[prioridad] = por_prioridad.get(prioridad, 0) + cantidad
+        por_dia[fecha] = por_dia.get(fecha, 0) + cantidad
+        if fecha_limite is not None and estado not in ESTADOS_CERRADOS:
+            if fecha_limite < hoy:
+                vencidos += cantidad
+            elif fecha_limite <= limite_proximos:
+                proximos += cantidad
+
+    return {
+        "resumen": {
+            "total_documentos": total,
+            "documentos_vencidos": vencidos,
+            "documentos_proximos_vencer": proximos
+        },
+        "distribucion_estado": [
+            {"estado": estado, "cantidad": cantidad} for estado, cantidad in sorted(por_estado.items())
+        ],
+        "distribucion_prioridad": [
+            {"prioridad": prioridad, "cantidad": cantidad} for prioridad, cantidad in sorted(por_prioridad.items())
+        ],
+        "tendencia_diaria": [
+            {"fecha": fecha.isoformat(), "cantidad": cantidad} for fecha, cantidad in sorted(por_dia.items())
+        ]
+    }
+
+
+def metricas_atenciones(filas: Iterable[Tuple[str, int, float, int, int]]) -> Dict[str, Any]:
+    """
+    Tiempo promedio, cumplimiento y área más productiva a partir de filas
+    (area_id, atendidas, horas_atencion, con_limite, a_tiempo) del resumen de atenciones
+    """
+    atendidas = con_limite = a_tiempo = 0
+    horas = 0.0
+    por_area: Dict[str, int] = {}
+    for area_id, n, h, limite, tiempo in filas:
+        atendidas += n
+        horas += h
+        con_limite += limite
+        a_tiempo += tiempo
+        por_area[area_id] = por_area.get(area_id, 0) + n
+
+    area, atendidas_area = max(por_area.items(), key=lambda item: item[1], default=(None, 0))
+    return {
+        "tiempo_promedio_atencion_horas": round(horas / atendidas, 2) if atendidas else 0.0,
+        "tasa_cumplimiento_porcentaje": round(a_tiempo / con_limite * 100, 2) if con_limite else 0.0,
+        "area_mas_productiva": {
+            "nombre": area if atendidas_area else None,
+            "documentos_atendidos": atendidas_area
+        }
+    }
+
@@ -0,0 +1,212 @@
+"""
+Service layer for the daily statistics rollups of Mesa de Partes
+Reads the resumen_diario_* tables and rebuilds them from documents and derivations
+"""
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models.mesa_partes.derivacion import Derivacion, EstadoDerivacionEnum
+from app.models.mesa_partes.documento import Documento
+from app.models.mesa_partes.resumen import ResumenDiarioAtenciones, ResumenDiarioDocumentos
+from app.services.mesa_partes.resumen_estadisticas import SIN_AREA
+
+logger = logging.getLogger(__name__)
+
+# Días hacia atrás que recalcula la reconciliación nocturna
+RESUMEN_DIAS_RECONCILIACION = int(os.getenv("RESUMEN_DIAS_RECONCILIACION", "45"))
+# Hora (UTC) de la reconciliación nocturna
+RESUMEN_HORA_RECONCILIACION = int(os.getenv("RESUMEN_HORA_RECONCILIACION", "3"))
+
+
+class ResumenService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def leer_documentos(
+        self,
+        desde: date,
+        hasta: date,
+        area_id: Optional[str] = None
+    ) -> List[Tuple[date, str, str, Optional[date], int]]:
+        """
+        Filas (fecha, estado, prioridad, fecha_limite, cantidad) del período,
+        sumadas entre áreas salvo que se indique una
+        """
+        resumen = ResumenDiarioDocumentos
+        query = select(
+            resumen.fecha, resumen.estado, resumen.prioridad, resumen.fecha_limite,
+            func.sum(resumen.cantidad)
+        ).where(resumen.fecha.between(desde, hasta))
+        if area_id:
+            query = query.where(resumen.area_id == area_id)
+        query = query.group_by(resumen.fecha, resumen.estado, resumen.prioridad, resumen.fecha_limite)
+        return [tuple(fila) for fila in self.db.execute(query)]
+
+    def total_documentos(self, desde: date, hasta: date) -> int:
+        """Documentos recibidos en el período"""
+        return self.db.execute(
+            select(func.coalesce(func.sum(ResumenDiarioDocumentos.cantidad), 0))
+            .where(ResumenDiarioDocumentos.fecha.between(desde, hasta))
+        ).scalar()
+
+    def leer_atenciones(self, desde: date, hasta: date) -> List[Tuple[str, int, float, int, int]]:
+        """Filas (area_id, atendidas, horas_atencion, con_limite, a_tiempo) del período por área"""
+        resumen = ResumenDiarioAtenciones
+        query = (
+            select(
+                resumen.area_id,
+                func.sum(resumen.atendidas),
+                func.sum(resumen.horas_atencion),
+                func.sum(resumen.con_limite),
+                func.sum(resumen.a_tiempo)
+            )
+            .where(resumen.fecha.between(desde, hasta))
+            .group_by(resumen.area_id)
+        )
+        return [tuple(fila) for fila in self.db.execute(query)]
+
+    def reconciliar(self, desde: date, hasta: date) -> Dict[str, int]:
+        """
+        Recalcular las filas de resumen de los días indicados desde los
+        documentos y derivaciones (en una sola transacción)
+
+        Returns:
+            Filas escritas por tabla
+        """
+        inicio = datetime.combine(desde, datetime.min.time())
+        fin = datetime.combine(hasta + timedelta(days=1), datetime.min.time())
+
+        dia_recepcion = func.date(Documento.fecha_recepcion)
+        documentos = self.db.execute(
+            select(
+                dia_recepcion,
+                func.coalesce(Documento.area_actual_id, SIN_AREA),
+                Documento.estado,
+                Documento.prioridad,
+                func.date(Documento.fecha_limite),
+                func.count(Documento.id)
+            )
+            .where(and_(Documento.fecha_recepcion >= inicio, Documento.fecha_recepcion < fin))
+            .group_by(
+                dia_recepcion, func.coalesce(Documento.area_actual_id, SIN_AREA),
+                Documento.estado, Documento.prioridad, func.date(Documento.fecha_limite)
+            )
+        ).all()
+
+        dia_atencion = func.date(Derivacion.fecha_atencion)
+        a_tiempo = and_(
+            Derivacion.fecha_limite_atencion.isnot(None),
+            Derivacion.fecha_atencion <= Derivacion.fecha_limite_atencion
+        )
+        atenciones = self.db.execute(
+            select(
+                dia_atencion,
+                Derivacion.area_destino_id,
+                func.count(Derivacion.id),
+                func.coalesce(func.sum(
+                    func.extract('epoch', Derivacion.fecha_atencion - Derivacion.fecha_derivacion) / 3600
+                ), 0),
+                func.count(Derivacion.fecha_limite_atencion),
+                func.count(Derivacion.id).filter(a_tiempo)
+            )
+            .where(and_(
+                Derivacion.estado == EstadoDerivacionEnum.ATENDIDO,
+                Derivacion.fecha_atencion >= inicio,
+                Derivacion.fecha_atencion < fin
+            ))
+            .group_by(dia_atencion, Derivacion.area_destino_id)
+        ).all()
+
+        try:
+            for tabla in (ResumenDiarioDocumentos, ResumenDiarioAtenciones):
+                self.db.execute(delete(tabla).where(tabla.fecha.between(desde, hasta)))
+            if documentos:
+                self.db.execute(insert(ResumenDiarioDocumentos), [
+                    {
+                        "fecha": fecha, "area_id": area_id, "estado": estado.value,
+                        "prioridad": prioridad.value, "fecha_limite": fecha_limite, "cantidad": cantidad
+                    }
+                    for fecha, area_id, estado, prioridad, fecha_limite, cantidad in documentos
+                ])
+            if atenciones:
+                self.db.execute(insert(ResumenDiarioAtenciones), [
+                    {
+                        "fecha": fecha, "area_id": area_id, "atendidas": atendidas,
+                        "horas_atencion": float(horas), "con_limite": con_limite, "a_tiempo": tiempo
+                    }
+                    for fecha, area_id, atendidas, horas, con_limite, tiempo in atenciones
+                ])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        return {"resumen_diario_documentos": len(documentos), "resumen_diario_atenciones": len(atenciones)}
+
+
+class ReconciliadorResumen:
+    """Reconciliación nocturna de las tablas de resumen"""
+
+    def __init__(self, dias: int = RESUMEN_DIAS_RECONCILIACION, hora: int = RESUMEN_HORA_RECONCILIACION):
+        self.running = False
+        self.dias = dias
+        self.hora = hora
+
+    def _segundos_hasta_la_hora(self) -> float:
+        ahora = datetime.utcnow()
+        siguiente = ahora.replace(hour=self.hora, minute=0, second=0, microsecond=0)
+        if siguiente <= ahora:
+            siguiente += timedelta(days=1)
+        return (siguiente - ahora).total_seconds()
+
+    def reconciliar(self) -> Dict[str, int]:
+        """Recalcular los últimos `dias` días (síncrono)"""
+        from app.models.mesa_partes.database import SessionLocal
+        hasta = datetime.utcnow().date()
+        db = SessionLocal()
+        try:
+            return ResumenService(db).reconciliar(hasta - timedelta(days=self.dias), hasta)
+        finally:
+            db.close()
+
+    async def start(self):
+        """Start the nightly reconciliation loop"""
+        if self.running:
+            logger.warning("Resumen reconciliation is already running")
+            return
+
+        self.running = True
+        logger.info("Resumen reconciliation scheduled")
+
+        while self.running:
+            await asyncio.sleep(self._segundos_hasta_la_hora())
+            try:
+                resultado = await asyncio.to_thread(self.reconciliar)
+                logger.info(f"Resumen de estadísticas reconciliado: {resultado}")
+            except Exception as e:
+                logger.error(f"Error reconciliando resumen de estadísticas: {str(e)}")
+
+    async def stop(self):
+        """Stop the reconciliation loop"""
+        self.running = False
+        logger.info("Resumen reconciliation stopped")
+
+
+# Global instance
+reconciliador_resumen = ReconciliadorResumen()
+
+
+async def start_reconciliador_resumen():
+    """Start the nightly reconciliation as a background task"""
+    await reconciliador_resumen.start()
+
+
+async def stop_reconciliador_resumen():
+    """Stop the nightly reconciliation"""
+    await reconciliador_resumen.stop()
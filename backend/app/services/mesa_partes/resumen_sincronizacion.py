@@ -0,0 +1,101 @@
+"""
+Mantenimiento de las tablas de resumen al hacer flush de una sesión
+
+Antes del flush se leen de la base los valores anteriores de cada registro
+seguido que se modifica o borra; después del flush se comparan con los
+nuevos y el cambio neto (`Deltas`) se aplica a las filas de resumen en la
+misma transacción. Los modelos seguidos se indican con un diccionario
+
+    modelo -> (campos del aporte, función de aporte, tabla, columnas de la clave)
+
+que arma app.models.mesa_partes.resumen para Documento y Derivacion.
+"""
+from itertools import chain
+import logging
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+from sqlalchemy import Table, and_, event, insert, inspect, select, update
+
+from app.services.mesa_partes.resumen_estadisticas import Deltas
+
+logger = logging.getLogger(__name__)
+
+Seguimiento = Dict[type, Tuple[Sequence[str], Callable[..., Any], Table, Sequence[str]]]
+
+
+def aplicar_deltas(conexion, tabla, columnas_clave, deltas: Deltas) -> None:
+    """Sumar los cambios netos a una fila por clave (la crea si no existe)"""
+    for clave, contadores in deltas:
+        filtro = and_(*[
+            tabla.c[columna].is_(None) if valor is None else tabla.c[columna] == valor
+            for columna, valor in zip(columnas_clave, clave)
+        ])
+        # Una sola fila aunque una inserción concurrente haya duplicado la clave
+        fila_id = select(tabla.c.id).where(filtro).limit(1).scalar_subquery()
+        resultado = conexion.execute(
+            update(tabla)
+            .where(tabla.c.id == fila_id)
+            .values({nombre: tabla.c[nombre] + valor for nombre, valor in contadores.items()})
+        )
+        if resultado.rowcount == 0:
+            conexion.execute(insert(tabla).values(**dict(zip(columnas_clave, clave)), **contadores))
+
+
+def guardar_aportes_anteriores(session, seguimiento: Seguimiento) -> None:
+    """
+    Leer de la base los valores previos de los registros modificados o
+    borrados (antes del flush aún son los anteriores)
+    """
+    anteriores = {}
+    for modelo, (campos, aporte, _, _) in seguimiento.items():
+        ids = [
+            inspect(obj).identity[0]
+            for obj in chain(session.dirty, session.deleted)
+            if type(obj) is modelo and inspect(obj).identity and (obj in session.deleted or session.is_modified(obj))
+        ]
+        if not ids:
+            continue
+        columnas = [getattr(modelo, campo) for campo in campos]
+        for fila in session.connection().execute(select(modelo.id, *columnas).where(modelo.id.in_(ids))):
+            anteriores[(modelo, fila[0])] = aporte(*fila[1:])
+    session.info["resumen_anteriores"] = anteriores
+
+
+def actualizar_resumen(session, seguimiento: Seguimiento) -> None:
+    """Aplicar a las tablas de resumen el cambio neto de este flush"""
+    anteriores = session.info.pop("resumen_anteriores", {})
+    deltas = {modelo: Deltas() for modelo in seguimiento}
+
+    for obj in chain(session.new, session.dirty, session.deleted):
+        modelo = type(obj)
+        if modelo not in seguimiento:
+            continue
+        campos, aporte, _, _ = seguimiento[modelo]
+        if obj in session.new:
+            anterior = None
+        elif (modelo, obj.id) in anteriores:
+            anterior = anteriores[(modelo, obj.id)]
+        else:
+            continue  # sin cambios
+        nuevo = None if obj in session.deleted else aporte(*(getattr(obj, campo) for campo in campos))
+        deltas[modelo].mover(anterior, nuevo)
+
+    if not any(deltas.values()):
+        return
+    conexion = session.connection()
+    try:
+        # Savepoint: un error en el resumen no debe tumbar la escritura del documento
+        with conexion.begin_nested():
+            for modelo, (_, _, tabla, columnas_clave) in seguimiento.items():
+                aplicar_deltas(conexion, tabla, columnas_clave, deltas[modelo])
+    except Exception as e:
+        logger.error(f"Error actualizando resumen de estadísticas (se corrige al reconciliar): {e}")
+
+
+def seguir_cambios(destino: Any, seguimiento: Seguimiento) -> None:
+    """Mantener el resumen en cada flush de `destino` (Session, una subclase o un sessionmaker)"""
+    event.listen(
+        destino, "before_flush",
+        lambda session, flush_context, instances: guardar_aportes_anteriores(session, seguimiento)
+    )
+    event.listen(destino, "after_flush", lambda session, flush_context: actualizar_resumen(session, seguimiento))
@@ -0,0 +1,591 @@
+"""
+Cola de salida de webhooks con reintentos en segundo plano
+
+Quien produce un evento solo encola la entrega (`ColaWebhooks.encolar`) y
+sigue; un despachador en segundo plano reclama las entregas vencidas y las
+envía con un cliente HTTP compartido (pool de conexiones):
+
+- Reintentos con espera exponencial y jitter completo:
+  uniforme(0, min(WEBHOOK_ESPERA_MAXIMA_SEGUNDOS, base * 2^intento))
+- Concurrencia por integración (WEBHOOK_CONCURRENCIA_POR_INTEGRACION) y
+  total (WEBHOOK_TRABAJADORES), así un destino caído no ocupa todo el pool
+- Circuito por integración: tras WEBHOOK_CIRCUITO_FALLOS fallos seguidos
+  sus entregas esperan WEBHOOK_CIRCUITO_ABIERTO_SEGUNDOS; luego pasa una
+  sola de prueba (semiabierto) y, si sale bien, se cierra
+- Las entregas que agotan WEBHOOK_MAX_INTENTOS o reciben un 4xx definitivo
+  quedan como `fallido` (dead letter) y pueden reintentarse a mano
+
+Las entregas se guardan en un almacén: `AlmacenMongo` (colección
+`webhook_entregas`, sobrevive a reinicios y la comparten los workers) o
+`AlmacenMemoria` (sin base de datos y en pruebas). El cuerpo se serializa
+y firma una sola vez al encolar, así todos los intentos envían los mismos
+bytes con el mismo X-Webhook-Id para que el receptor descarte duplicados.
+
+El módulo no conoce las integraciones: `al_finalizar(integracion_id, exito)`
+recibe el resultado final de las entregas (entregada o al dead letter)
+para reflejarlo en su estado: cuando cambia, o cada
+WEBHOOK_ESTADO_INTERVALO_SEGUNDOS si no (otro worker o una prueba pudo
+cambiarlo mientras tanto).
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+
+from app.core.indices import registrar_indices
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_ENTREGAS_COLLECTION = "webhook_entregas"
+
+WEBHOOK_TRABAJADORES = int(os.getenv("WEBHOOK_TRABAJADORES", "8"))
+WEBHOOK_CONCURRENCIA_POR_INTEGRACION = int(os.getenv("WEBHOOK_CONCURRENCIA_POR_INTEGRACION", "2"))
+WEBHOOK_MAX_INTENTOS = int(os.getenv("WEBHOOK_MAX_INTENTOS", "6"))
+WEBHOOK_ESPERA_BASE_SEGUNDOS = float(os.getenv("WEBHOOK_ESPERA_BASE_SEGUNDOS", "2"))
+WEBHOOK_ESPERA_MAXIMA_SEGUNDOS = float(os.getenv("WEBHOOK_ESPERA_MAXIMA_SEGUNDOS", "300"))
+WEBHOOK_TIMEOUT_SEGUNDOS = float(os.getenv("WEBHOOK_TIMEOUT_SEGUNDOS", "10"))
+WEBHOOK_CIRCUITO_FALLOS = int(os.getenv("WEBHOOK_CIRCUITO_FALLOS", "5"))
+WEBHOOK_CIRCUITO_ABIERTO_SEGUNDOS = float(os.getenv("WEBHOOK_CIRCUITO_ABIERTO_SEGUNDOS", "60"))
+WEBHOOK_MAX_CONEXIONES = int(os.getenv("WEBHOOK_MAX_CONEXIONES", "20"))
+# Cada cuánto se buscan reintentos vencidos o entregas encoladas por otro worker
+WEBHOOK_SONDEO_SEGUNDOS = float(os.getenv("WEBHOOK_SONDEO_SEGUNDOS", "2"))
+# Un resultado igual al último informado se vuelve a informar tras estos segundos
+WEBHOOK_ESTADO_INTERVALO_SEGUNDOS = float(os.getenv("WEBHOOK_ESTADO_INTERVALO_SEGUNDOS", "60"))
+# Las entregas exitosas se borran con TTL; las fallidas se conservan
+WEBHOOK_TTL_ENTREGADOS = int(os.getenv("WEBHOOK_TTL_ENTREGADOS", str(7 * 24 * 3600)))
+
+registrar_indices(
+    WEBHOOK_ENTREGAS_COLLECTION,
+    IndexModel([("estado", ASCENDING), ("proximoIntento", ASCENDING)]),
+    IndexModel([("estado", ASCENDING), ("bloqueoHasta", ASCENDING)]),
+    IndexModel([("integracionId", ASCENDING), ("estado", ASCENDING)]),
+    IndexModel(
+        [("fechaFin", ASCENDING)],
+        expireAfterSeconds=WEBHOOK_TTL_ENTREGADOS,
+        partialFilterExpression={"estado": "entregado"}
+    )
+)
+
+
+class EstadoEntrega:
+    PENDIENTE = "pendiente"
+    ENVIANDO = "enviando"
+    ENTREGADO = "entregado"
+    FALLIDO = "fallido"
+
+
+def calcular_espera(intento: int, base: float = WEBHOOK_ESPERA_BASE_SEGUNDOS,
+                    maximo: float = WEBHOOK_ESPERA_MAXIMA_SEGUNDOS) -> float:
+    """Segundos antes del reintento `intento` (1, 2, ...): backoff exponencial con jitter completo"""
+    return random.uniform(0, min(maximo, base * 2 ** intento))
+
+
+def generar_firma(cuerpo: str, secreto: str) -> str:
+    """Firma HMAC SHA256 del cuerpo tal como se envía"""
+    return hmac.new(secreto.encode("utf-8"), cuerpo.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def es_reintentable(codigo: int) -> bool:
+    """Un 4xx (salvo 408 y 429) no mejora reintentando"""
+    return codigo in (408, 429) or codigo >= 500
+
+
+def preparar_entrega(
+    integracion_id: str,
+    evento: str,
+    url: str,
+    payload: Dict[str, Any],
+    secreto: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """Documento de una entrega con el cuerpo ya serializado y firmado"""
+    entrega_id = uuid.uuid4().hex
+    cuerpo = json.dumps(payload, sort_keys=True, default=str)
+    cabeceras = {
+        **(headers or {}),
+        "Content-Type": "application/json",
+        "X-Webhook-Event": evento,
+        "X-Webhook-Id": entrega_id
+    }
+    if payload.get("timestamp"):
+        cabeceras["X-Webhook-Timestamp"] = str(payload["timestamp"])
+    if secreto:
+        cabeceras["X-Webhook-Signature"] = f"sha256={generar_firma(cuerpo, secreto)}"
+
+    ahora = datetime.utcnow()
+    return {
+        "_id": entrega_id,
+        "integracionId": str(integracion_id),
+        "evento": evento,
+        "url": url,
+        "cuerpo": cuerpo,
+        "headers": cabeceras,
+        "estado": EstadoEntrega.PENDIENTE,
+        "intentos": 0,
+        "proximoIntento": ahora,
+        "bloqueoHasta": None,
+        "ultimoCodigo": None,
+        "ultimoError": None,
+        "fechaCreacion": ahora,
+        "fechaFin": None
+    }
+
+
+# Cliente HTTP compartido por todas las entregas
+_cliente_http: Optional[httpx.AsyncClient] = None
+
+def get_cliente_http() -> httpx.AsyncClient:
+    """Cliente httpx con pool de conexiones para los webhooks"""
+    global _cliente_http
+    if _cliente_http is None or _cliente_http.is_closed:
+        _cliente_http = httpx.AsyncClient(
+            timeout=WEBHOOK_TIMEOUT_SEGUNDOS,
+            limits=httpx.Limits(max_connections=WEBHOOK_MAX_CONEXIONES,
+                                max_keepalive_connections=WEBHOOK_MAX_CONEXIONES)
+        )
+    return _cliente_http
+
+
+@dataclass
+class Circuito:
+    """Circuito de una integración: cerrado, abierto o semiabierto"""
+    fallos: int = 0
+    abierto_hasta: float = 0.0
+
+    def estado(self, umbral: int) -> str:
+        if self.fallos < umbral:
+            return "cerrado"
+        return "abierto" if time.monotonic() < self.abierto_hasta else "semiabierto"
+
+    def registrar_exito(self) -> None:
+        self.fallos = 0
+
+    def registrar_fallo(self, umbral: int, segundos: float) -> bool:
+        """True si este fallo abre (o reabre) el circuito"""
+        self.fallos += 1
+        if self.fallos >= umbral:
+            self.abierto_hasta = time.monotonic() + segundos
+            return True
+        return False
+
+
+@dataclass
+class MetricasWebhooks:
+    """Contadores acumulados de la cola (por proceso)"""
+    encolados: int = 0
+    entregados: int = 0
+    reintentos: int = 0
+    fallidos: int = 0
+    errores_envio: int = 0
+    circuitos_abiertos: int = 0
+    latencia_total: float = 0.0
+    latencia_maxima: float = 0.0
+    por_integracion: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    def registrar_intento(self, integracion_id: str, exito: bool, segundos: float) -> None:
+        contadores = self.por_integracion.setdefault(integracion_id, {"entregados": 0, "errores": 0})
+        if exito:
+            self.entregados += 1
+            contadores["entregados"] += 1
+        else:
+            self.errores_envio += 1
+            contadores["errores"] += 1
+        self.latencia_total += segundos
+        self.latencia_maxima = max(self.latencia_maxima, segundos)
+
+    def resumen(self) -> Dict[str, Any]:
+        intentos = self.entregados + self.errores_envio
+        return {
+            "encolados": self.encolados,
+            "entregados": self.entregados,
+            "reintentos": self.reintentos,
+            "fallidos": self.fallidos,
+            "errores_envio": self.errores_envio,
+            "circuitos_abiertos": self.circuitos_abiertos,
+            "latencia_media_ms": round(self.latencia_total / intentos * 1000, 2) if intentos else 0.0,
+            "latencia_maxima_ms": round(self.latencia_maxima * 1000, 2),
+            "por_integracion": self.por_integracion
+        }
+
+
+class AlmacenMemoria:
+    """Entregas en memoria del proceso (se pierden al reiniciar)"""
+
+    def __init__(self):
+        self.entregas: Dict[str, Dict[str, Any]] = {}
+
+    async def guardar(self, entrega: Dict[str, Any]) -> None:
+        self.entregas[entrega["_id"]] = dict(entrega)
+
+    async def reclamar(self, ahora: datetime, excluir: Set[str], bloqueo_hasta: datetime) -> Optional[Dict[str, Any]]:
+        vencidas = [
+            e for e in self.entregas.values()
+            if e["integracionId"] not in excluir and (
+                (e["estado"] == EstadoEntrega.PENDIENTE and e["proximoIntento"] <= ahora)
+                or (e["estado"] == EstadoEntrega.ENVIANDO and e["bloqueoHasta"] <= ahora)
+            )
+        ]
+        if not vencidas:
+            return None
+        entrega = min(vencidas, key=lambda e: e["proximoIntento"])
+        entrega.update(estado=EstadoEntrega.ENVIANDO, bloqueoHasta=bloqueo_hasta)
+        return dict(entrega)
+
+    async def actualizar(self, entrega_id: str, cambios: Dict[str, Any], estado: Optional[str] = None) -> bool:
+        entrega = self.entregas.get(entrega_id)
+        if entrega is None or (estado and entrega["estado"] != estado):
+            return False
+        entrega.update(cambios)
+        return True
+
+    async def obtener(self, entrega_id: str) -> Optional[Dict[str, Any]]:
+        entrega = self.entregas.get(entrega_id)
+        return dict(entrega) if entrega else None
+
+    async def contar(self) -> Dict[str, int]:
+        conteo: Dict[str, int] = {}
+        for entrega in self.entregas.values():
+            conteo[entrega["estado"]] = conteo.get(entrega["estado"], 0) + 1
+        return conteo
+
+    async def listar(self, estado: str, integracion_id: Optional[str] = None, limite: int = 50) -> List[Dict[str, Any]]:
+        entregas = [
+            dict(e) for e in self.entregas.values()
+            if e["estado"] == estado and integracion_id in (None, e["integracionId"])
+        ]
+        return sorted(entregas, key=lambda e: e["fechaCreacion"], reverse=True)[:limite]
+
+
+class AlmacenMongo:
+    """Entregas en la colección `webhook_entregas`, compartida por los workers"""
+
+    def __init__(self, db: Any):
+        self.usar_db(db)
+
+    def usar_db(self, db: Any) -> None:
+        self.db = db
+        self.coleccion = db[WEBHOOK_ENTREGAS_COLLECTION]
+
+    async def guardar(self, entrega: Dict[str, Any]) -> None:
+        await self.coleccion.insert_one(entrega)
+
+    async def reclamar(self, ahora: datetime, excluir: Set[str], bloqueo_hasta: datetime) -> Optional[Dict[str, Any]]:
+        # Las que quedaron `enviando` en un worker caído se recuperan al vencer su bloqueo
+        filtro: Dict[str, Any] = {"$or": [
+            {"estado": EstadoEntrega.PENDIENTE, "proximoIntento": {"$lte": ahora}},
+            {"estado": EstadoEntrega.ENVIANDO, "bloqueoHasta": {"$lte": ahora}}
+        ]}
+        if excluir:
+            filtro["integracionId"] = {"$nin": list(excluir)}
+        return await self.coleccion.find_one_and_update(
+            filtro,
+            {"$set": {"estado": EstadoEntrega.ENVIANDO, "bloqueoHasta": bloqueo_hasta}},
+            sort=[("proximoIntento", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def actualizar(self, entrega_id: str, cambios: Dict[str, Any], estado: Optional[str] = None) -> bool:
+        filtro: Dict[str, Any] = {"_id": entrega_id}
+        if estado:
+            filtro["estado"] = estado
+        resultado = await self.coleccion.update_one(filtro, {"$set": cambios})
+        return resultado.matched_count > 0
+
+    async def obtener(self, entrega_id: str) -> Optional[Dict[str, Any]]:
+        return await self.coleccion.find_one({"_id": entrega_id})
+
+    async def contar(self) -> Dict[str, int]:
+        conteo = {}
+        async for grupo in self.coleccion.aggregate([{"$group": {"_id": "$estado", "total": {"$sum": 1}}}]):
+            conteo[grupo["_id"]] = grupo["total"]
+        return conteo
+
+    async def listar(self, estado: str, integracion_id: Optional[str] = None, limite: int = 50) -> List[Dict[str, Any]]:
+        filtro: Dict[str, Any] = {"estado": estado}
+        if integracion_id:
+            filtro["integracionId"] = integracion_id
+        cursor = self.coleccion.find(filtro, {"cuerpo": 0}).sort("fechaCreacion", -1).limit(limite)
+        return [entrega async for entrega in cursor]
+
+
+class ColaWebhooks:
+    """Cola de entregas de webhooks con despachador en segundo plano"""
+
+    def __init__(
+        self,
+        almacen: Any,
+        cliente: Optional[httpx.AsyncClient] = None,
+        trabajadores: int = WEBHOOK_TRABAJADORES,
+        concurrencia_por_integracion: int = WEBHOOK_CONCURRENCIA_POR_INTEGRACION,
+        max_intentos: int = WEBHOOK_MAX_INTENTOS,
+        espera_base: float = WEBHOOK_ESPERA_BASE_SEGUNDOS,
+        circuito_fallos: int = WEBHOOK_CIRCUITO_FALLOS,
+        circuito_segundos: float = WEBHOOK_CIRCUITO_ABIERTO_SEGUNDOS,
+        timeout: float = WEBHOOK_TIMEOUT_SEGUNDOS,
+        al_finalizar: Optional[Callable[[str, bool], Awaitable[None]]] = None
+    ):
+        """
+        Args:
+            almacen: AlmacenMongo o AlmacenMemoria
+            cliente: Cliente HTTP (por defecto el compartido de get_cliente_http)
+            al_finalizar: Recibe (integracion_id, exito) con el resultado
+                final de las entregas de una integración
+        """
+        self.almacen = almacen
+        self.al_finalizar = al_finalizar
+        self._cliente = cliente
+        self.trabajadores = trabajadores
+        self.concurrencia_por_integracion = concurrencia_por_integracion
+        self.max_intentos = max_intentos
+        self.espera_base = espera_base
+        self.circuito_fallos = circuito_fallos
+        self.circuito_segundos = circuito_segundos
+        self.timeout = timeout
+        self.metricas = MetricasWebhooks()
+        self.circuitos: Dict[str, Circuito] = {}
+        # Último resultado final informado por integración: (exito, cuándo)
+        self._ultimo_resultado: Dict[str, Tuple[bool, float]] = {}
+        self._en_curso: Dict[str, int] = {}
+        self._tareas: Set[asyncio.Task] = set()
+        self._despertar = asyncio.Event()
+        self._despachador: Optional[asyncio.Task] = None
+
+    @property
+    def cliente(self) -> httpx.AsyncClient:
+        return self._cliente or get_cliente_http()
+
+    def usar_db(self, db: Any) -> None:
+        """Pasar a (o reconectar) el almacén en MongoDB"""
+        if isinstance(self.almacen, AlmacenMongo):
+            self.almacen.usar_db(db)
+        else:
+            self.almacen = AlmacenMongo(db)
+
+    async def encolar(
+        self,
+        integracion_id: str,
+        evento: str,
+        url: str,
+        payload: Dict[str, Any],
+        secreto: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> str:
+        """
+        Registrar una entrega; el despachador la envía en segundo plano
+
+        Returns:
+            ID de la entrega (también va en el header X-Webhook-Id)
+        """
+        entrega = preparar_entrega(integracion_id, evento, url, payload, secreto, headers)
+        await self.almacen.guardar(entrega)
+        self.metricas.encolados += 1
+        self._despertar.set()
+        return entrega["_id"]
+
+    async def enviar(self, entrega: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Un solo intento de envío, sin reintentos ni circuito
+
+        Returns:
+            {"exito", "codigo", "error", "reintentable"}
+        """
+        inicio = time.perf_counter()
+        try:
+            headers = {**entrega["headers"], "X-Webhook-Intento": str(entrega.get("intentos", 0) + 1)}
+            respuesta = await self.cliente.post(entrega["url"], content=entrega["cuerpo"].encode("utf-8"),
+                                                headers=headers, timeout=self.timeout)
+        except httpx.HTTPError as e:
+            resultado = {"exito": False, "codigo": None, "error": str(e) or type(e).__name__, "reintentable": True}
+        except Exception as e:
+            # URL o headers mal formados (httpx.InvalidURL, UnicodeEncodeError...): reintentar no lo arregla
+            resultado = {"exito": False, "codigo": None, "error": f"{type(e).__name__}: {e}", "reintentable": False}
+        else:
+            exito = 200 <= respuesta.status_code < 300
+            resultado = {
+                "exito": exito,
+                "codigo": respuesta.status_code,
+                "error": None if exito else f"HTTP {respuesta.status_code}: {respuesta.text[:500]}",
+                "reintentable": not exito and es_reintentable(respuesta.status_code)
+            }
+        self.metricas.registrar_intento(entrega["integracionId"], resultado["exito"], time.perf_counter() - inicio)
+        return resultado
+
+    def iniciar(self) -> None:
+        """Arrancar el despachador (una vez por proceso)"""
+        if self._despachador is None or self._despachador.done():
+            self._despachador = asyncio.create_task(self._despachar())
+
+    async def detener(self, espera: float = 5) -> None:
+        """Detener el despachador; los envíos en curso tienen `espera` segundos para terminar"""
+        if self._despachador:
+            self._despachador.cancel()
+            try:
+                await self._despachador
+            except asyncio.CancelledError:
+                pass
+            self._despachador = None
+        if self._tareas:
+            # Las que no terminen quedan `enviando` y se reclaman al vencer su bloqueo
+            await asyncio.wait(set(self._tareas), timeout=espera)
+        if self._cliente is None and _cliente_http is not None:
+            await _cliente_http.aclose()
+
+    async def vaciar(self) -> None:
+        """Procesar hasta que no queden entregas vencidas ni en curso (sin despachador)"""
+        while await self._lanzar_vencidas() or self._tareas:
+            if self._tareas:
+                await asyncio.wait(set(self._tareas), return_when=asyncio.FIRST_COMPLETED)
+
+    def _integraciones_bloqueadas(self) -> Set[str]:
+        bloqueadas = set()
+        for integracion_id, en_curso in self._en_curso.items():
+            if en_curso >= self.concurrencia_por_integracion:
+                bloqueadas.add(integracion_id)
+        for integracion_id, circuito in self.circuitos.items():
+            estado = circuito.estado(self.circuito_fallos)
+            # Semiabierto: una sola entrega de prueba a la vez
+            if estado == "abierto" or (estado == "semiabierto" and self._en_curso.get(integracion_id)):
+                bloqueadas.add(integracion_id)
+        return bloqueadas
+
+    async def _lanzar_vencidas(self) -> int:
+        """Reclamar y lanzar entregas vencidas mientras haya cupo"""
+        lanzadas = 0
+        while len(self._tareas) < self.trabajadores:
+            ahora = datetime.utcnow()
+            entrega = await self.almacen.reclamar(
+                ahora, self._integraciones_bloqueadas(), ahora + timedelta(seconds=self.timeout * 3)
+            )
+            if entrega is None:
+                break
+            integracion_id = entrega["integracionId"]
+            self._en_curso[integracion_id] = self._en_curso.get(integracion_id, 0) + 1
+            tarea = asyncio.create_task(self._entregar(entrega))
+            self._tareas.add(tarea)
+            tarea.add_done_callback(self._tareas.discard)
+            lanzadas += 1
+        return lanzadas
+
+    async def _despachar(self) -> None:
+        while True:
+            self._despertar.clear()
+            try:
+                await self._lanzar_vencidas()
+            except Exception as e:
+                logger.error(f"❌ Error reclamando webhooks pendientes: {e}")
+            espera = asyncio.ensure_future(self._despertar.wait())
+            try:
+                await asyncio.wait({espera}, timeout=WEBHOOK_SONDEO_SEGUNDOS)
+            finally:
+                espera.cancel()
+
+    async def _entregar(self, entrega: Dict[str, Any]) -> None:
+        integracion_id = entrega["integracionId"]
+        try:
+            resultado = await self.enviar(entrega)
+            intentos = entrega["intentos"] + 1
+            ahora = datetime.utcnow()
+            cambios = {"intentos": intentos, "ultimoCodigo": resultado["codigo"], "ultimoError": resultado["error"]}
+            circuito = self.circuitos.setdefault(integracion_id, Circuito())
+
+            if resultado["exito"]:
+                circuito.registrar_exito()
+                cambios.update(estado=EstadoEntrega.ENTREGADO, fechaFin=ahora)
+            else:
+                # Un 4xx definitivo no dice nada de la salud del destino
+                if resultado["reintentable"] and circuito.registrar_fallo(self.circuito_fallos, self.circuito_segundos):
+                    self.metricas.circuitos_abiertos += 1
+                    logger.warning(f"⚠️ Circuito de webhooks abierto para la integración {integracion_id}")
+                if resultado["reintentable"] and intentos < self.max_intentos:
+                    self.metricas.reintentos += 1
+                    espera = calcular_espera(intentos, self.espera_base)
+                    cambios.update(estado=EstadoEntrega.PENDIENTE, proximoIntento=ahora + timedelta(seconds=espera))
+                else:
+                    self.metricas.fallidos += 1
+                    cambios.update(estado=EstadoEntrega.FALLIDO, fechaFin=ahora)
+                    logger.error(f"❌ Webhook {entrega['evento']} a {entrega['url']} descartado tras "
+                                 f"{intentos} intento(s): {resultado['error']}")
+
+            await self.almacen.actualizar(entrega["_id"], cambios, estado=EstadoEntrega.ENVIANDO)
+            if cambios["estado"] != EstadoEntrega.PENDIENTE:
+                await self._informar_resultado(integracion_id, resultado["exito"])
+        except Exception as e:
+            # La entrega queda `enviando` y se vuelve a reclamar al vencer su bloqueo
+            logger.error(f"❌ Error procesando webhook {entrega['_id']}: {e}")
+        finally:
+            self._en_curso[integracion_id] -= 1
+            if not self._en_curso[integracion_id]:
+                del self._en_curso[integracion_id]
+            self._despertar.set()
+
+    async def _informar_resultado(self, integracion_id: str, exito: bool) -> None:
+        if self.al_finalizar is None:
+            return
+        anterior, informado = self._ultimo_resultado.get(integracion_id, (None, 0.0))
+        if anterior == exito and time.monotonic() - informado < WEBHOOK_ESTADO_INTERVALO_SEGUNDOS:
+            return
+        try:
+            await self.al_finalizar(integracion_id, exito)
+            self._ultimo_resultado[integracion_id] = (exito, time.monotonic())
+        except Exception as e:
+            logger.error(f"❌ Error actualizando el estado de la integración {integracion_id}: {e}")
+
+    async def reintentar_fallida(self, entrega_id: str) -> bool:
+        """Devolver una entrega del dead letter a la cola, con los intentos a cero"""
+        reencolada = await self.almacen.actualizar(
+            entrega_id,
+            {"estado": EstadoEntrega.PENDIENTE, "intentos": 0, "proximoIntento": datetime.utcnow(), "fechaFin": None},
+            estado=EstadoEntrega.FALLIDO
+        )
+        if reencolada:
+            self._despertar.set()
+        return reencolada
+
+    async def listar_fallidas(self, integracion_id: Optional[str] = None, limite: int = 50) -> List[Dict[str, Any]]:
+        """Entregas del dead letter, las más recientes primero"""
+        return await self.almacen.listar(EstadoEntrega.FALLIDO, integracion_id, limite)
+
+    def estado_circuitos(self) -> Dict[str, str]:
+        return {
+            integracion_id: circuito.estado(self.circuito_fallos)
+            for integracion_id, circuito in self.circuitos.items()
+            if circuito.estado(self.circuito_fallos) != "cerrado"
+        }
+
+    async def get_estadisticas(self) -> Dict[str, Any]:
+        """Métricas de este proceso, entregas por estado y circuitos no cerrados"""
+        try:
+            por_estado = await self.almacen.contar()
+        except Exception as e:
+            logger.error(f"❌ Error contando entregas de webhooks: {e}")
+            por_estado = {}
+        return {
+            **self.metricas.resumen(),
+            "en_curso": len(self._tareas),
+            "por_estado": por_estado,
+            "circuitos": self.estado_circuitos()
+        }
+
+
+# Global webhook queue instance
+_cola_webhooks: Optional[ColaWebhooks] = None
+
+def get_cola_webhooks(db: Any = None) -> ColaWebhooks:
+    """Cola global; con `db` guarda las entregas en MongoDB, si no en memoria"""
+    global _cola_webhooks
+    if _cola_webhooks is None:
+        _cola_webhooks = ColaWebhooks(AlmacenMongo(db) if db is not None else AlmacenMemoria())
+    elif db is not None and getattr(_cola_webhooks.almacen, "db", None) is not db:
+        _cola_webhooks.usar_db(db)
+    return _cola_webhooks
@@ -3,17 +3,16 @@ Service layer for Webhook operations
 Handles webhook sending, validation, and processing for Mesa de Partes integrations
 """
 from typing import Optional, Dict, Any, List
+import asyncio
 import json
 import hmac
-import hashlib
-import asyncio
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-import httpx
 import logging
 
 from app.models.mesa_partes.integracion import Integracion, EstadoConexionEnum
 from app.models.mesa_partes.documento import Documento
+from app.services.mesa_partes.webhook_cola import generar_firma, get_cola_webhooks, preparar_entrega
 
 logger = logging.getLogger(__name__)
 
@@ -21,103 +20,78 @@ logger = logging.getLogger(__name__)
 class WebhookService:
     def __init__(self, db: Session):
         self.db = db
-        self.max_reintentos = 3
-        self.timeout_segundos = 30
+
+    def _destino_webhook(self, integracion_id: str, evento: Optional[str]) -> Optional[Integracion]:
+        """
+        Integración a la que corresponde enviar el evento, o None si no aplica
+        (sin evento no se filtra por los eventos configurados)
+        """
+        integracion = self.db.query(Integracion).filter(
+            Integracion.id == integracion_id
+        ).first()
+
+        if not integracion or not integracion.activa:
+            logger.warning(f"Integración {integracion_id} no encontrada o inactiva")
+            return None
+
+        if not integracion.webhook_url:
+            logger.warning(f"Webhook no configurado para integración {integracion_id}")
+            return None
+
+        # Verificar si el evento está en la lista de eventos configurados
+        eventos_configurados = integracion.webhook_eventos or []
+        if evento and eventos_configurados and evento not in eventos_configurados:
+            logger.info(f"Evento {evento} no configurado para webhook {integracion_id}")
+            return None
+
+        return integracion
+
+    def _payload(self, integracion_id: str, evento: str, datos: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "evento": evento,
+            "timestamp": datetime.utcnow().isoformat(),
+            "integracion_id": integracion_id,
+            "datos": datos
+        }
 
     async def enviar_webhook(
         self,
         integracion_id: str,
         evento: str,
-        datos: Dict[str, Any],
-        reintentos: int = 0
+        datos: Dict[str, Any]
     ) -> bool:
         """
-        Envía un webhook a una integración específica
+        Encola un webhook para una integración específica
+
+        El envío, los reintentos con backoff y el dead letter los maneja la
+        cola de webhooks en segundo plano; esta llamada no espera al destino.
+
+        Returns:
+            True si se encoló o el evento no aplica a la integración
         """
         try:
-            # Obtener configuración de la integración
-            integracion = self.db.query(Integracion).filter(
-                Integracion.id == integracion_id
-            ).first()
-            
-            if not integracion or not integracion.activa:
-                logger.warning(f"Integración {integracion_id} no encontrada o inactiva")
-                return False
-
-            webhook_config = integracion.configuracion_webhook
-            if not webhook_config or not webhook_config.get("url"):
-                logger.warning(f"Webhook no configurado para integración {integracion_id}")
-                return False
-
-            # Verificar si el evento está en la lista de eventos configurados
-            eventos_configurados = webhook_config.get("eventos", [])
-            if eventos_configurados and evento not in eventos_configurados:
-                logger.info(f"Evento {evento} no configurado para webhook {integracion_id}")
+            integracion = self._destino_webhook(integracion_id, evento)
+            if integracion is None:
                 return True  # No es error, simplemente no se envía
 
-            # Preparar payload
-            payload = {
-                "evento": evento,
-                "timestamp": datetime.utcnow().isoformat(),
-                "integracion_id": integracion_id,
-                "datos": datos
-            }
-
-            # Generar firma HMAC si hay secreto configurado
-            headers = {
-                "Content-Type": "application/json",
-                "X-Webhook-Event": evento,
-                "X-Webhook-Timestamp": payload["timestamp"]
-            }
-
-            secreto = webhook_config.get("secreto")
-            if secreto:
-                firma = self._generar_firma(json.dumps(payload, sort_keys=True), secreto)
-                headers["X-Webhook-Signature"] = f"sha256={firma}"
-
-            # Enviar webhook
-            url = webhook_config["url"]
-            async with httpx.AsyncClient(timeout=self.timeout_segundos) as client:
-                response = await client.post(
-                    url,
-                    json=payload,
-                    headers=headers
-                )
-                
-                if response.status_code in [200, 201, 202]:
-                    logger.info(f"Webhook enviado exitosamente a {url} para evento {evento}")
-                    await self._actualizar_estado_integracion(integracion_id, EstadoConexionEnum.CONECTADO)
-                    return True
-                else:
-                    logger.error(f"Error en webhook {url}: {response.status_code} - {response.text}")
-                    raise httpx.HTTPStatusError(
-                        f"HTTP {response.status_code}",
-                        request=response.request,
-                        response=response
-                    )
+            await get_cola_webhooks().encolar(
+                integracion_id,
+                evento,
+                integracion.webhook_url,
+                self._payload(integracion_id, evento, datos),
+                secreto=integracion.webhook_secreto
+            )
+            return True
 
         except Exception as e:
-            logger.error(f"Error enviando webhook: {str(e)}")
-            
-            # Sistema de reintentos
-            if reintentos < self.max_reintentos:
-                logger.info(f"Reintentando webhook en 30 segundos (intento {reintentos + 1}/{self.max_reintentos})")
-                await asyncio.sleep(30)
-                return await self.enviar_webhook(integracion_id, evento, datos, reintentos + 1)
-            else:
-                logger.error(f"Webhook falló después de {self.max_reintentos} reintentos")
-                await self._actualizar_estado_integracion(integracion_id, EstadoConexionEnum.ERROR)
-                return False
+            logger.error(f"Error encolando webhook: {str(e)}")
+            return False
 
     def _generar_firma(self, payload: str, secreto: str) -> str:
         """
         Genera firma HMAC SHA256 para validar la autenticidad del webhook
         """
-        return hmac.new(
-            secreto.encode('utf-8'),
-            payload.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        return generar_firma(payload, secreto)
 
     def validar_firma(
         self,
@@ -419,6 +393,9 @@ class WebhookService:
     ) -> Dict[str, Any]:
         """
         Envía un webhook de prueba para verificar la conectividad
+
+        Es un solo intento directo (sin cola ni reintentos) para informar
+        el resultado en la misma respuesta.
         """
         datos_prueba = {
             "mensaje": "Webhook de prueba",
@@ -427,15 +404,29 @@ class WebhookService:
         }
 
         try:
-            resultado = await self.enviar_webhook(
+            integracion = self._destino_webhook(integracion_id, None)
+            if integracion is None:
+                return {
+                    "success": False,
+                    "message": "Integración inactiva o sin webhook configurado"
+                }
+
+            entrega = preparar_entrega(
                 integracion_id,
                 "test.conexion",
-                datos_prueba
+                integracion.webhook_url,
+                self._payload(integracion_id, "test.conexion", datos_prueba),
+                secreto=integracion.webhook_secreto
             )
-            
+            resultado = await get_cola_webhooks().enviar(entrega)
+            await self._actualizar_estado_integracion(
+                integracion_id,
+                EstadoConexionEnum.CONECTADO if resultado["exito"] else EstadoConexionEnum.ERROR
+            )
+
             return {
-                "success": resultado,
-                "message": "Webhook de prueba enviado exitosamente" if resultado else "Error enviando webhook de prueba"
+                "success": resultado["exito"],
+                "message": "Webhook de prueba enviado exitosamente" if resultado["exito"] else f"Error enviando webhook de prueba: {resultado['error']}"
             }
             
         except Exception as e:
@@ -484,4 +475,25 @@ class WebhookService:
                 "webhook_configurado": bool(integracion.configuracion_webhook and integracion.configuracion_webhook.get("url"))
             })
 
-        return estadisticas
\ No newline at end of file
+        return estadisticas
+
+
+def _guardar_estado_conexion(integracion_id: str, exito: bool) -> None:
+    from app.models.mesa_partes.database import SessionLocal
+    db = SessionLocal()
+    try:
+        integracion = db.query(Integracion).filter(Integracion.id == integracion_id).first()
+        if integracion:
+            integracion.estado_conexion = EstadoConexionEnum.CONECTADO if exito else EstadoConexionEnum.ERROR
+            integracion.ultima_sincronizacion = datetime.utcnow()
+            db.commit()
+    finally:
+        db.close()
+
+
+async def actualizar_estado_conexion(integracion_id: str, exito: bool) -> None:
+    """
+    Hook `al_finalizar` de la cola de webhooks: el estado de conexión de la
+    integración refleja el resultado de sus entregas
+    """
+    await asyncio.to_thread(_guardar_estado_conexion, integracion_id, exito)
@@ -0,0 +1,272 @@
+"""
+Backplane pub/sub para entregar notificaciones WebSocket entre workers
+
+Cada worker de uvicorn tiene sus propias conexiones. Para que una
+notificación llegue a un usuario conectado a otro worker, ConnectionManager
+entrega primero a sus conexiones locales y publica un sobre en el
+backplane; los demás workers lo reciben y lo entregan a las suyas (cada
+worker ignora sus propios sobres):
+
+    {"origen": "<worker>", "destino": {"tipo": "usuario"|"area"|"todos", "id": ...}, "mensaje": {...}}
+
+El backplane también guarda la presencia de cada worker (usuarios, áreas
+y conexiones) con vencimiento, así un worker caído desaparece solo. Se
+elige con WS_BACKPLANE:
+
+- memoria (por defecto): un solo proceso; también sirve para pruebas,
+  varias instancias comparten un `BusMemoria`
+- redis: canal pub/sub WS_BACKPLANE_CANAL y claves `<canal>:presencia:<worker>`
+  (redis.asyncio, WS_BACKPLANE_REDIS_URL)
+- mongo: change stream sobre `ws_mensajes` (requiere replica set) y
+  presencia en `ws_presencia`; ambas colecciones se limpian con TTL
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, IndexModel
+
+from app.core.indices import registrar_indices
+from app.utils.respuesta_rapida import serializar_json
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+WS_BACKPLANE = os.getenv("WS_BACKPLANE", "memoria").lower()
+WS_BACKPLANE_CANAL = os.getenv("WS_BACKPLANE_CANAL", "sirret:ws")
+WS_BACKPLANE_REDIS_URL = os.getenv("WS_BACKPLANE_REDIS_URL", os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+# Cada cuánto se reescribe la presencia del worker; vence a las 3 vueltas
+WS_PRESENCIA_INTERVALO = int(os.getenv("WS_PRESENCIA_INTERVALO", "10"))
+# Espera antes de reintentar la suscripción tras un error
+WS_BACKPLANE_REINTENTO_SEGUNDOS = 5
+
+# Identificador de este proceso en los sobres y la presencia
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+AlRecibir = Callable[[Dict[str, Any]], Awaitable[None]]
+
+registrar_indices(
+    "ws_mensajes",
+    IndexModel([("fecha", ASCENDING)], expireAfterSeconds=60)
+)
+registrar_indices(
+    "ws_presencia",
+    IndexModel([("expira", ASCENDING)], expireAfterSeconds=0)
+)
+
+
+class Backplane(ABC):
+    """Interfaz común de los backplanes"""
+
+    nombre = "base"
+
+    @abstractmethod
+    async def iniciar(self, al_recibir: AlRecibir) -> None:
+        """Suscribirse; `al_recibir` se llama con cada sobre publicado (incluidos los propios)"""
+
+    @abstractmethod
+    async def detener(self) -> None:
+        """Cancelar la suscripción y liberar conexiones"""
+
+    @abstractmethod
+    async def publicar(self, sobre: Dict[str, Any]) -> None:
+        """Enviar un sobre a todos los workers"""
+
+    @abstractmethod
+    async def guardar_presencia(self, worker_id: str, presencia: Dict[str, Any], ttl: int) -> None:
+        """Registrar la presencia de este worker por `ttl` segundos"""
+
+    @abstractmethod
+    async def borrar_presencia(self, worker_id: str) -> None:
+        """Quitar la presencia de este worker al apagar"""
+
+    @abstractmethod
+    async def leer_presencias(self) -> Dict[str, Dict[str, Any]]:
+        """{worker: presencia} de los workers vigentes"""
+
+
+class BusMemoria:
+    """Canal y registro de presencia compartidos por los BackplaneMemoria de un proceso"""
+
+    def __init__(self):
+        self.suscriptores: List[AlRecibir] = []
+        self.presencias: Dict[str, Dict[str, Any]] = {}
+
+
+class BackplaneMemoria(Backplane):
+    """Backplane en memoria: un solo proceso, o varios managers en pruebas"""
+
+    nombre = "memoria"
+
+    def __init__(self, bus: Optional[BusMemoria] = None):
+        self.bus = bus or BusMemoria()
+        self._al_recibir: Optional[AlRecibir] = None
+
+    async def iniciar(self, al_recibir: AlRecibir) -> None:
+        self._al_recibir = al_recibir
+        self.bus.suscriptores.append(al_recibir)
+
+    async def detener(self) -> None:
+        if self._al_recibir in self.bus.suscriptores:
+            self.bus.suscriptores.remove(self._al_recibir)
+
+    async def publicar(self, sobre: Dict[str, Any]) -> None:
+        # Ida y vuelta por JSON, como en los backplanes reales
+        sobre = json.loads(serializar_json(sobre))
+        for al_recibir in list(self.bus.suscriptores):
+            await al_recibir(sobre)
+
+    async def guardar_presencia(self, worker_id: str, presencia: Dict[str, Any], ttl: int) -> None:
+        self.bus.presencias[worker_id] = {**presencia, "_vence": time.monotonic() + ttl}
+
+    async def borrar_presencia(self, worker_id: str) -> None:
+        self.bus.presencias.pop(worker_id, None)
+
+    async def leer_presencias(self) -> Dict[str, Dict[str, Any]]:
+        ahora = time.monotonic()
+        return {
+            worker: {k: v for k, v in presencia.items() if k != "_vence"}
+            for worker, presencia in self.bus.presencias.items()
+            if presencia["_vence"] > ahora
+        }
+
+
+class BackplaneRedis(Backplane):
+    """Pub/sub de Redis; la presencia son claves con vencimiento"""
+
+    nombre = "redis"
+
+    def __init__(self, url: str = WS_BACKPLANE_REDIS_URL, canal: str = WS_BACKPLANE_CANAL):
+        if redis_asyncio is None:
+            raise RuntimeError("El backplane redis requiere el paquete `redis`")
+        self.cliente = redis_asyncio.from_url(url)
+        self.canal = canal
+        self._tarea: Optional[asyncio.Task] = None
+
+    def _clave_presencia(self, worker_id: str) -> str:
+        return f"{self.canal}:presencia:{worker_id}"
+
+    async def iniciar(self, al_recibir: AlRecibir) -> None:
+        self._tarea = asyncio.create_task(self._escuchar(al_recibir))
+
+    async def _escuchar(self, al_recibir: AlRecibir) -> None:
+        while True:
+            pubsub = self.cliente.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.canal)
+                async for mensaje in pubsub.listen():
+                    try:
+                        await al_recibir(json.loads(mensaje["data"]))
+                    except Exception as e:
+                        logger.error(f"❌ Error entregando mensaje del backplane: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Suscripción Redis del backplane interrumpida: {e}")
+                await asyncio.sleep(WS_BACKPLANE_REINTENTO_SEGUNDOS)
+            finally:
+                await pubsub.aclose()
+
+    async def detener(self) -> None:
+        if self._tarea:
+            self._tarea.cancel()
+        await self.cliente.aclose()
+
+    async def publicar(self, sobre: Dict[str, Any]) -> None:
+        await self.cliente.publish(self.canal, serializar_json(sobre))
+
+    async def guardar_presencia(self, worker_id: str, presencia: Dict[str, Any], ttl: int) -> None:
+        await self.cliente.set(self._clave_presencia(worker_id), serializar_json(presencia), ex=ttl)
+
+    async def borrar_presencia(self, worker_id: str) -> None:
+        await self.cliente.delete(self._clave_presencia(worker_id))
+
+    async def leer_presencias(self) -> Dict[str, Dict[str, Any]]:
+        prefijo = self._clave_presencia("")
+        claves = [clave async for clave in self.cliente.scan_iter(match=f"{prefijo}*")]
+        if not claves:
+            return {}
+        valores = await self.cliente.mget(claves)
+        return {
+            clave.decode()[len(prefijo):]: json.loads(valor)
+            for clave, valor in zip(claves, valores) if valor is not None
+        }
+
+
+class BackplaneMongo(Backplane):
+    """Change stream sobre `ws_mensajes` (MongoDB en replica set)"""
+
+    nombre = "mongo"
+
+    def __init__(self, db: Any):
+        self.mensajes = db["ws_mensajes"]
+        self.presencia = db["ws_presencia"]
+        self._tarea: Optional[asyncio.Task] = None
+
+    async def iniciar(self, al_recibir: AlRecibir) -> None:
+        self._tarea = asyncio.create_task(self._escuchar(al_recibir))
+
+    async def _escuchar(self, al_recibir: AlRecibir) -> None:
+        while True:
+            try:
+                async with self.mensajes.watch([{"$match": {"operationType": "insert"}}]) as cambios:
+                    async for cambio in cambios:
+                        documento = cambio["fullDocument"]
+                        try:
+                            await al_recibir(documento["sobre"])
+                        except Exception as e:
+                            logger.error(f"❌ Error entregando mensaje del backplane: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Change stream del backplane interrumpido: {e}")
+                await asyncio.sleep(WS_BACKPLANE_REINTENTO_SEGUNDOS)
+
+    async def detener(self) -> None:
+        if self._tarea:
+            self._tarea.cancel()
+
+    async def publicar(self, sobre: Dict[str, Any]) -> None:
+        await self.mensajes.insert_one({"sobre": sobre, "fecha": datetime.utcnow()})
+
+    async def guardar_presencia(self, worker_id: str, presencia: Dict[str, Any], ttl: int) -> None:
+        await self.presencia.replace_one(
+            {"_id": worker_id},
+            {**presencia, "expira": datetime.utcnow() + timedelta(seconds=ttl)},
+            upsert=True
+        )
+
+    async def borrar_presencia(self, worker_id: str) -> None:
+        await self.presencia.delete_one({"_id": worker_id})
+
+    async def leer_presencias(self) -> Dict[str, Dict[str, Any]]:
+        # El monitor TTL corre cada minuto: filtrar también los vencidos
+        presencias = {}
+        async for documento in self.presencia.find({"expira": {"$gt": datetime.utcnow()}}):
+            worker = documento.pop("_id")
+            documento.pop("expira", None)
+            presencias[worker] = documento
+        return presencias
+
+
+def crear_backplane(db: Any = None, tipo: str = WS_BACKPLANE) -> Backplane:
+    """Backplane configurado en WS_BACKPLANE (mongo requiere `db`)"""
+    if tipo == "redis":
+        return BackplaneRedis()
+    if tipo == "mongo":
+        if db is None:
+            raise ValueError("El backplane mongo requiere la base de datos")
+        return BackplaneMongo(db)
+    if tipo != "memoria":
+        logger.warning(f"⚠️ WS_BACKPLANE desconocido '{tipo}', se usa memoria")
+    return BackplaneMemoria()
@@ -0,0 +1,183 @@
+"""
+Envío concurrente de mensajes WebSocket
+
+Cada conexión tiene una cola de salida acotada (`ColaSalida`) que vacía su
+propia tarea, así un cliente lento no retrasa a los demás: difundir un
+mensaje solo lo serializa una vez y lo encola en cada conexión.
+
+Cuando la cola de una conexión se llena se aplica WS_POLITICA_COLA_LLENA:
+
+- descartar_antiguo: se descarta el mensaje más viejo de la cola (por defecto)
+- descartar_nuevo: se descarta el mensaje que llega
+- desconectar: se cierra la conexión (código 1013, "intente más tarde")
+
+Un envío que tarda más de WS_TIMEOUT_ENVIO_SEGUNDOS o falla cierra la
+conexión. `MetricasFanout` acumula enviados, descartes, desconexiones y la
+latencia desde que el mensaje se encola hasta que sale.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from fastapi import WebSocket
+
+from app.utils.respuesta_rapida import serializar_json
+
+logger = logging.getLogger(__name__)
+
+WS_COLA_MAXIMA = int(os.getenv("WS_COLA_MAXIMA", "100"))
+WS_TIMEOUT_ENVIO_SEGUNDOS = float(os.getenv("WS_TIMEOUT_ENVIO_SEGUNDOS", "10"))
+
+# Código de cierre WebSocket "Try Again Later"
+CODIGO_CIERRE_CONSUMIDOR_LENTO = 1013
+
+
+class PoliticaColaLlena(str, Enum):
+    DESCARTAR_ANTIGUO = "descartar_antiguo"
+    DESCARTAR_NUEVO = "descartar_nuevo"
+    DESCONECTAR = "desconectar"
+
+
+WS_POLITICA_COLA_LLENA = PoliticaColaLlena(os.getenv("WS_POLITICA_COLA_LLENA", PoliticaColaLlena.DESCARTAR_ANTIGUO.value))
+
+
+def serializar_mensaje(message: dict) -> str:
+    """JSON del mensaje, una sola vez para todas las conexiones"""
+    return serializar_json(message).decode("utf-8")
+
+
+@dataclass
+class MetricasFanout:
+    """Contadores acumulados del envío (por proceso)"""
+    enviados: int = 0
+    descartados: int = 0
+    desconectados_lentos: int = 0
+    errores_envio: int = 0
+    latencia_total: float = 0.0
+    latencia_maxima: float = 0.0
+
+    def registrar_envio(self, segundos: float) -> None:
+        self.enviados += 1
+        self.latencia_total += segundos
+        self.latencia_maxima = max(self.latencia_maxima, segundos)
+
+    def resumen(self, profundidades: Iterable[int]) -> Dict[str, Any]:
+        profundidades = list(profundidades)
+        return {
+            "conexiones": len(profundidades),
+            "mensajes_en_cola": sum(profundidades),
+            "cola_mas_larga": max(profundidades, default=0),
+            "enviados": self.enviados,
+            "descartados": self.descartados,
+            "desconectados_lentos": self.desconectados_lentos,
+            "errores_envio": self.errores_envio,
+            "latencia_media_ms": round(self.latencia_total / self.enviados * 1000, 2) if self.enviados else 0.0,
+            "latencia_maxima_ms": round(self.latencia_maxima * 1000, 2)
+        }
+
+
+class ColaSalida:
+    """Cola de salida acotada de una conexión, vaciada por su propia tarea"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        al_cerrar: Callable[[WebSocket], None],
+        metricas: MetricasFanout,
+        maximo: int = WS_COLA_MAXIMA,
+        politica: PoliticaColaLlena = WS_POLITICA_COLA_LLENA,
+        timeout: float = WS_TIMEOUT_ENVIO_SEGUNDOS
+    ):
+        """
+        Args:
+            websocket: Conexión ya aceptada
+            al_cerrar: Se llama (una vez) cuando la conexión debe darse de baja
+            metricas: Contadores compartidos por todas las colas
+        """
+        self.websocket = websocket
+        self.al_cerrar = al_cerrar
+        self.metricas = metricas
+        self.politica = politica
+        self.timeout = timeout
+        self.cola: asyncio.Queue[Tuple[str, float]] = asyncio.Queue(maxsize=maximo)
+        self.cerrada = False
+        self.tarea = asyncio.create_task(self._vaciar())
+
+    @property
+    def profundidad(self) -> int:
+        return self.cola.qsize()
+
+    def encolar(self, texto: str) -> bool:
+        """Encolar un mensaje ya serializado; False si se descartó o la conexión se cerró"""
+        if self.cerrada:
+            return False
+        try:
+            self.cola.put_nowait((texto, time.perf_counter()))
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.politica == PoliticaColaLlena.DESCONECTAR:
+            self.metricas.desconectados_lentos += 1
+            logger.warning("Conexión WebSocket cerrada por consumidor lento")
+            self._dar_de_baja(cerrar_socket=True)
+            return False
+
+        self.metricas.descartados += 1
+        if self.politica == PoliticaColaLlena.DESCARTAR_NUEVO:
+            return False
+        self.cola.get_nowait()
+        self.cola.task_done()
+        self.cola.put_nowait((texto, time.perf_counter()))
+        return True
+
+    async def vaciar(self) -> None:
+        """Esperar a que salga todo lo encolado (o a que la conexión se cierre)"""
+        if not self.cerrada:
+            await self.cola.join()
+
+    def cerrar(self) -> None:
+        """Detener la tarea de envío (la conexión ya se dio de baja)"""
+        if self.cerrada:
+            return
+        self.cerrada = True
+        self.tarea.cancel()
+        # Liberar a quien espere en vaciar()
+        while not self.cola.empty():
+            self.cola.get_nowait()
+            self.cola.task_done()
+
+    def _dar_de_baja(self, cerrar_socket: bool = False) -> None:
+        if self.cerrada:
+            return
+        self.al_cerrar(self.websocket)
+        self.cerrar()
+        if cerrar_socket:
+            asyncio.create_task(self._cerrar_socket())
+
+    async def _cerrar_socket(self) -> None:
+        try:
+            await self.websocket.close(code=CODIGO_CIERRE_CONSUMIDOR_LENTO)
+        except Exception:
+            pass
+
+    async def _vaciar(self) -> None:
+        while not self.cerrada:
+            texto, encolado = await self.cola.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(texto), self.timeout)
+            except asyncio.CancelledError:
+                self.cola.task_done()
+                raise
+            except Exception as e:
+                self.metricas.errores_envio += 1
+                logger.error(f"Error enviando mensaje WebSocket: {str(e) or type(e).__name__}")
+                self.cola.task_done()
+                self._dar_de_baja(cerrar_socket=isinstance(e, asyncio.TimeoutError))
+                return
+            self.metricas.registrar_envio(time.perf_counter() - encolado)
+            self.cola.task_done()
@@ -1,20 +1,32 @@
 """
 WebSocket Service para notificaciones en tiempo real
 """
-from typing import Dict, Set, List
+from typing import Any, Dict, Iterable, Optional, Set, List
 from fastapi import WebSocket, WebSocketDisconnect
 import json
 import logging
 from datetime import datetime
 import asyncio
 
+from app.services.mesa_partes.websocket_backplane import Backplane, WORKER_ID, WS_PRESENCIA_INTERVALO
+from app.services.mesa_partes.websocket_fanout import ColaSalida, MetricasFanout, serializar_mensaje
+
 logger = logging.getLogger(__name__)
 
 
 class ConnectionManager:
-    """Gestor de conexiones WebSocket"""
+    """
+    Gestor de conexiones WebSocket
+
+    Los envíos no esperan a los clientes: cada mensaje se serializa una vez
+    y se encola en la cola de salida de cada conexión (ver websocket_fanout).
+
+    Con un backplane (`iniciar_backplane`) los envíos a usuario, área o
+    todos se publican también para los demás workers, y la presencia de
+    todo el cluster respalda get_active_users y los conteos.
+    """
     
-    def __init__(self):
+    def __init__(self, worker_id: str = WORKER_ID):
         # Conexiones activas por usuario
         self.active_connections: Dict[str, Set[WebSocket]] = {}
         # Conexiones por área
@@ -23,10 +35,20 @@ class ConnectionManager:
         self.websocket_to_user: Dict[WebSocket, str] = {}
         # Mapeo de websocket a área
         self.websocket_to_area: Dict[WebSocket, str] = {}
+        # Cola de salida de cada websocket
+        self.salidas: Dict[WebSocket, ColaSalida] = {}
+        self.metricas = MetricasFanout()
+        # Backplane entre workers y presencia de cada worker ({worker: presencia})
+        self.worker_id = worker_id
+        self.backplane: Optional[Backplane] = None
+        self.presencia_cluster: Dict[str, Dict[str, Any]] = {}
+        self._presencia_cambio = asyncio.Event()
+        self._tarea_presencia: Optional[asyncio.Task] = None
         
     async def connect(self, websocket: WebSocket, usuario_id: str, area_id: str = None):
         """Conectar un nuevo cliente WebSocket"""
         await websocket.accept()
+        self.salidas[websocket] = ColaSalida(websocket, self.disconnect, self.metricas)
         
         # Agregar a conexiones de usuario
         if usuario_id not in self.active_connections:
@@ -40,6 +62,7 @@ class ConnectionManager:
                 self.area_connections[area_id] = set()
             self.area_connections[area_id].add(websocket)
             self.websocket_to_area[websocket] = area_id
+        self._presencia_cambio.set()
         
         logger.info(f"Usuario {usuario_id} conectado via WebSocket (área: {area_id})")
         
@@ -59,6 +82,11 @@ class ConnectionManager:
         usuario_id = self.websocket_to_user.get(websocket)
         area_id = self.websocket_to_area.get(websocket)
         
+        # Detener su cola de salida
+        salida = self.salidas.pop(websocket, None)
+        if salida:
+            salida.cerrar()
+        
         # Remover de conexiones de usuario
         if usuario_id and usuario_id in self.active_connections:
             self.active_connections[usuario_id].discard(websocket)
@@ -74,64 +102,158 @@ class ConnectionManager:
         # Limpiar mapeos
         self.websocket_to_user.pop(websocket, None)
         self.websocket_to_area.pop(websocket, None)
+        self._presencia_cambio.set()
         
         logger.info(f"Usuario {usuario_id} desconectado (área: {area_id})")
     
+    def _difundir(self, message: dict, connections: Iterable[WebSocket]) -> int:
+        """Serializar una vez y encolar en cada conexión; devuelve cuántas lo aceptaron"""
+        # Copia: una política de desconexión modifica los conjuntos al encolar
+        connections = list(connections)
+        if not connections:
+            return 0
+        texto = serializar_mensaje(message)
+        encolados = 0
+        for connection in connections:
+            salida = self.salidas.get(connection)
+            if salida and salida.encolar(texto):
+                encolados += 1
+        return encolados
+    
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """Enviar mensaje a una conexión específica"""
+        self._difundir(message, [websocket])
+    
+    def _entregar_local(self, tipo: str, destino_id: Optional[str], message: dict) -> int:
+        """Entregar a las conexiones de este worker ("usuario", "area" o "todos")"""
+        if tipo == "usuario":
+            return self._difundir(message, self.active_connections.get(destino_id, ()))
+        if tipo == "area":
+            return self._difundir(message, self.area_connections.get(destino_id, ()))
+        return self._difundir(message, self.salidas.keys())
+    
+    async def _publicar(self, tipo: str, destino_id: Optional[str], message: dict):
+        """Publicar para los demás workers; un fallo no afecta la entrega local"""
+        if self.backplane is None:
+            return
         try:
-            await websocket.send_json(message)
+            await self.backplane.publicar({
+                "origen": self.worker_id,
+                "destino": {"tipo": tipo, "id": destino_id},
+                "mensaje": message
+            })
         except Exception as e:
-            logger.error(f"Error enviando mensaje personal: {str(e)}")
-            self.disconnect(websocket)
+            logger.error(f"Error publicando en el backplane ({self.backplane.nombre}): {str(e)}")
+    
+    async def _recibir_sobre(self, sobre: Dict[str, Any]):
+        """Mensaje publicado por otro worker (los propios ya se entregaron)"""
+        if sobre.get("origen") == self.worker_id:
+            return
+        destino = sobre.get("destino") or {}
+        self._entregar_local(destino.get("tipo"), destino.get("id"), sobre.get("mensaje") or {})
     
     async def send_to_user(self, message: dict, usuario_id: str):
         """Enviar mensaje a todas las conexiones de un usuario"""
-        if usuario_id in self.active_connections:
-            disconnected = []
-            for connection in self.active_connections[usuario_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error enviando a usuario {usuario_id}: {str(e)}")
-                    disconnected.append(connection)
-            
-            # Limpiar conexiones fallidas
-            for conn in disconnected:
-                self.disconnect(conn)
+        self._entregar_local("usuario", usuario_id, message)
+        await self._publicar("usuario", usuario_id, message)
     
     async def send_to_area(self, message: dict, area_id: str):
         """Enviar mensaje a todas las conexiones de un área"""
-        if area_id in self.area_connections:
-            disconnected = []
-            for connection in self.area_connections[area_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error enviando a área {area_id}: {str(e)}")
-                    disconnected.append(connection)
-            
-            # Limpiar conexiones fallidas
-            for conn in disconnected:
-                self.disconnect(conn)
+        self._entregar_local("area", area_id, message)
+        await self._publicar("area", area_id, message)
     
     async def broadcast(self, message: dict):
         """Enviar mensaje a todas las conexiones activas"""
-        all_connections = set()
-        for connections in self.active_connections.values():
-            all_connections.update(connections)
-        
-        disconnected = []
-        for connection in all_connections:
+        self._entregar_local("todos", None, message)
+        await self._publicar("todos", None, message)
+    
+    # ------------------------------------------------------------------
+    # Backplane y presencia
+    # ------------------------------------------------------------------
+    
+    async def iniciar_backplane(self, backplane: Backplane):
+        """Suscribirse al backplane y empezar a publicar la presencia de este worker"""
+        await self.detener_backplane()
+        self.backplane = backplane
+        await backplane.iniciar(self._recibir_sobre)
+        self._tarea_presencia = asyncio.create_task(self._mantener_presencia())
+        logger.info(f"Backplane WebSocket '{backplane.nombre}' iniciado (worker {self.worker_id})")
+    
+    async def detener_backplane(self):
+        """Dejar de recibir mensajes de otros workers y retirar la presencia"""
+        if self.backplane is None:
+            return
+        if self._tarea_presencia:
+            self._tarea_presencia.cancel()
+            try:
+                await self._tarea_presencia
+            except asyncio.CancelledError:
+                pass
+            self._tarea_presencia = None
+        try:
+            await self.backplane.borrar_presencia(self.worker_id)
+            await self.backplane.detener()
+        except Exception as e:
+            logger.error(f"Error deteniendo el backplane: {str(e)}")
+        self.backplane = None
+        self.presencia_cluster = {}
+    
+    def _presencia_local(self) -> Dict[str, Any]:
+        return {
+            "usuarios": {u: len(conns) for u, conns in self.active_connections.items()},
+            "areas": {a: len(conns) for a, conns in self.area_connections.items()},
+            "conexiones": len(self.websocket_to_user)
+        }
+    
+    async def refrescar_presencia(self):
+        """Publicar la presencia propia y leer la del cluster"""
+        if self.backplane is None:
+            return
+        await self.backplane.guardar_presencia(self.worker_id, self._presencia_local(), WS_PRESENCIA_INTERVALO * 3)
+        self.presencia_cluster = await self.backplane.leer_presencias()
+    
+    async def _mantener_presencia(self):
+        # Cada WS_PRESENCIA_INTERVALO, o antes si alguien se conecta o desconecta
+        while True:
+            self._presencia_cambio.clear()
             try:
-                await connection.send_json(message)
+                await self.refrescar_presencia()
             except Exception as e:
-                logger.error(f"Error en broadcast: {str(e)}")
-                disconnected.append(connection)
-        
-        # Limpiar conexiones fallidas
-        for conn in disconnected:
-            self.disconnect(conn)
+                logger.error(f"Error actualizando la presencia WebSocket: {str(e)}")
+            # asyncio.wait y no wait_for: este se traga una cancelación que
+            # llega justo cuando el evento se activa
+            espera = asyncio.ensure_future(self._presencia_cambio.wait())
+            try:
+                await asyncio.wait({espera}, timeout=WS_PRESENCIA_INTERVALO)
+            finally:
+                espera.cancel()
+    
+    def _presencias(self) -> List[Dict[str, Any]]:
+        """La presencia local (siempre al día) más la de los otros workers"""
+        otras = [p for worker, p in self.presencia_cluster.items() if worker != self.worker_id]
+        return [self._presencia_local()] + otras
+    
+    def get_cluster_stats(self) -> dict:
+        """Conexiones de todos los workers según el registro de presencia"""
+        presencias = self._presencias()
+        usuarios, areas = set(), set()
+        for presencia in presencias:
+            usuarios.update(presencia.get("usuarios", {}))
+            areas.update(presencia.get("areas", {}))
+        return {
+            "workers": len(presencias),
+            "usuarios": len(usuarios),
+            "areas": len(areas),
+            "conexiones": sum(p.get("conexiones", 0) for p in presencias)
+        }
+    
+    async def esperar_envios(self):
+        """Esperar a que se vacíen las colas de salida (pruebas y apagado ordenado)"""
+        await asyncio.gather(*(salida.vaciar() for salida in list(self.salidas.values())))
+    
+    def get_fanout_stats(self) -> dict:
+        """Profundidad de las colas, latencia de envío y descartes"""
+        return self.metricas.resumen(salida.profundidad for salida in self.salidas.values())
     
     async def send_notification(
         self,
@@ -162,16 +284,19 @@ class ConnectionManager:
             await self.broadcast(notification)
     
     def get_active_users(self) -> List[str]:
-        """Obtener lista de usuarios conectados"""
-        return list(self.active_connections.keys())
+        """Obtener lista de usuarios conectados (en cualquier worker)"""
+        usuarios: Dict[str, None] = {}
+        for presencia in self._presencias():
+            usuarios.update(dict.fromkeys(presencia.get("usuarios", {})))
+        return list(usuarios)
     
     def get_user_connection_count(self, usuario_id: str) -> int:
-        """Obtener número de conexiones de un usuario"""
-        return len(self.active_connections.get(usuario_id, set()))
+        """Obtener número de conexiones de un usuario (en cualquier worker)"""
+        return sum(p.get("usuarios", {}).get(usuario_id, 0) for p in self._presencias())
     
     def get_area_connection_count(self, area_id: str) -> int:
-        """Obtener número de conexiones en un área"""
-        return len(self.area_connections.get(area_id, set()))
+        """Obtener número de conexiones en un área (en cualquier worker)"""
+        return sum(p.get("areas", {}).get(area_id, 0) for p in self._presencias())
 
 
 # Instancia global del gestor de conexiones
@@ -302,12 +427,26 @@ class WebSocketService:
         logger.info(f"Notificación enviada: documento {numero_expediente} atendido")
     
     async def get_connection_stats(self) -> dict:
-        """Obtener estadísticas de conexiones"""
+        """Obtener estadísticas de conexiones de todo el cluster (y de este worker)"""
+        try:
+            await self.manager.refrescar_presencia()
+        except Exception as e:
+            logger.error(f"Error leyendo la presencia del cluster: {str(e)}")
+        cluster = self.manager.get_cluster_stats()
         return {
-            "total_users_connected": len(self.manager.active_connections),
-            "total_connections": sum(len(conns) for conns in self.manager.active_connections.values()),
-            "areas_with_connections": len(self.manager.area_connections),
-            "active_users": self.manager.get_active_users()
+            "total_users_connected": cluster["usuarios"],
+            "total_connections": cluster["conexiones"],
+            "areas_with_connections": cluster["areas"],
+            "active_users": self.manager.get_active_users(),
+            "workers": cluster["workers"],
+            "backplane": self.manager.backplane.nombre if self.manager.backplane else None,
+            "worker": {
+                "id": self.manager.worker_id,
+                "total_users_connected": len(self.manager.active_connections),
+                "total_connections": len(self.manager.websocket_to_user),
+                "areas_with_connections": len(self.manager.area_connections)
+            },
+            "fanout": self.manager.get_fanout_stats()
         }
 
 
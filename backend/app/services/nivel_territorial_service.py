@@ -2,72 +2,216 @@
 """
 Servicio para análisis de niveles territoriales en rutas
 Identifica el nivel jerárquico de cada localidad en las rutas
+
+La clasificación de cada ruta (LOCAL, INTERDISTRITAL, INTERPROVINCIAL,
+INTERDEPARTAMENTAL) y la jerarquía de su origen, destino e itinerario se
+guardan en el campo `nivelTerritorial` de la ruta al escribirla, así las
+búsquedas y estadísticas son consultas indexadas sobre la colección de rutas.
+`materializar_rutas` recalcula ese campo (backfill).
 """
 
-from typing import List, Dict, Optional, Tuple
+from typing import Any, Callable, List, Dict, Optional
 from datetime import datetime
-import asyncio
+import inspect
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
 
+from ..core.indices import asegurar_indices, registrar_indices
 from ..dependencies.db import get_database
 from ..models.localidad import (
-    NivelTerritorial, 
-    LocalidadEnRuta, 
+    NivelTerritorial,
+    LocalidadEnRuta,
     AnalisisNivelTerritorial,
     FiltroRutasPorNivel,
     EstadisticasNivelTerritorial,
     LocalidadConJerarquia
 )
 
+# Rango de cada nivel: 0 es el menos específico
+RANGO_NIVEL = {
+    NivelTerritorial.DEPARTAMENTO.value: 0,
+    NivelTerritorial.PROVINCIA.value: 1,
+    NivelTerritorial.DISTRITO.value: 2,
+    NivelTerritorial.CIUDAD.value: 2,
+    NivelTerritorial.CENTRO_POBLADO.value: 3,
+    NivelTerritorial.PUEBLO.value: 3,
+    NivelTerritorial.LOCALIDAD.value: 3
+}
+
+CAMPOS_JERARQUIA = ("ubigeo", "departamento", "provincia", "distrito")
+
+PROYECCION_ANALISIS = {
+    "codigoRuta": 1,
+    "nombre": 1,
+    "origen": 1,
+    "destino": 1,
+    "itinerario": 1,
+    "nivelTerritorial": 1
+}
+
+INDICES_RUTAS = [
+    [("estaActivo", ASCENDING), ("nivelTerritorial.clasificacion", ASCENDING)],
+    [("nivelTerritorial.origen.departamento", ASCENDING), ("nivelTerritorial.origen.provincia", ASCENDING)],
+    [("nivelTerritorial.destino.departamento", ASCENDING), ("nivelTerritorial.destino.provincia", ASCENDING)],
+    [("nivelTerritorial.origen.nivel", ASCENDING), ("nivelTerritorial.destino.nivel", ASCENDING)]
+]
+
+registrar_indices("rutas", *(IndexModel(indice) for indice in INDICES_RUTAS))
+
+# Rutas activas sin el campo materializado (null también cubre el campo ausente)
+FILTRO_PENDIENTES = {"estaActivo": True, "nivelTerritorial.clasificacion": None}
+
+TAMANO_LOTE_MATERIALIZACION = 500
+
+
+def determinar_nivel_territorial(localidad: dict) -> NivelTerritorial:
+    """
+    Determina el nivel territorial de una localidad basado en su UBIGEO y datos
+    """
+    ubigeo = localidad.get('ubigeo') or ''
+
+    if len(ubigeo) != 6:
+        return NivelTerritorial.CENTRO_POBLADO  # Por defecto
+
+    # Analizar UBIGEO: DDPPDD (Departamento-Provincia-Distrito)
+    prov_code = ubigeo[2:4]
+    dist_code = ubigeo[4:6]
+
+    # Si el código de distrito es 00, es nivel provincial
+    if dist_code == "00":
+        # Si el código de provincia es 00, es nivel departamental
+        if prov_code == "00":
+            return NivelTerritorial.DEPARTAMENTO
+        else:
+            return NivelTerritorial.PROVINCIA
+    else:
+        # Verificar si es distrito o centro poblado
+        # Si tiene municipalidad distrital, es distrito
+        municipalidad = (localidad.get('municipalidad_centro_poblado') or '').lower()
+        if 'distrital' in municipalidad:
+            return NivelTerritorial.DISTRITO
+        elif 'provincial' in municipalidad:
+            return NivelTerritorial.PROVINCIA
+        else:
+            return NivelTerritorial.CENTRO_POBLADO
+
+
+def _nivel_de(localidad: dict) -> str:
+    """Nivel de una localidad: su tipo si es válido, si no el deducido del UBIGEO"""
+    tipo = localidad.get('tipo')
+    if tipo in RANGO_NIVEL:
+        return tipo
+    return determinar_nivel_territorial(localidad).value
+
+
+def clasificar_ruta_territorial(localidades: List[Dict[str, Any]]) -> str:
+    """
+    Clasifica un conjunto de localidades según los departamentos, provincias
+    y distritos distintos que contiene
+    """
+    for campo, clasificacion in (
+        ("departamento", "INTERDEPARTAMENTAL"),
+        ("provincia", "INTERPROVINCIAL"),
+        ("distrito", "INTERDISTRITAL")
+    ):
+        if len({localidad.get(campo) for localidad in localidades}) > 1:
+            return clasificacion
+    return "LOCAL"
+
+
+def calcular_nivel_territorial(
+    ruta: Dict[str, Any],
+    buscar_localidad: Optional[Callable[[str], Optional[dict]]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Calcula el campo `nivelTerritorial` de una ruta a partir de sus localidades embebidas
+
+    Args:
+        ruta: Documento de la ruta (origen, destino e itinerario embebidos)
+        buscar_localidad: Función opcional id -> localidad para completar la
+            jerarquía de rutas antiguas que no la tienen embebida
+
+    Returns:
+        Subdocumento a guardar, o None si la ruta no tiene origen y destino
+    """
+    def jerarquia(embebida: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(embebida, dict):
+            return None
+        datos = dict(embebida)
+        if buscar_localidad and datos.get('id') and not (datos.get('departamento') and datos.get('tipo')):
+            localidad = buscar_localidad(str(datos['id']))
+            if localidad:
+                for campo in CAMPOS_JERARQUIA + ("tipo",):
+                    if not datos.get(campo):
+                        datos[campo] = localidad.get(campo)
+        resultado = {campo: datos.get(campo) for campo in CAMPOS_JERARQUIA}
+        resultado["nivel"] = _nivel_de(datos)
+        return resultado
+
+    origen = jerarquia(ruta.get('origen'))
+    destino = jerarquia(ruta.get('destino'))
+    if origen is None or destino is None:
+        return None
+
+    itinerario = [jerarquia(parada) for parada in (ruta.get('itinerario') or [])]
+    itinerario = [parada for parada in itinerario if parada is not None]
+    todas = [origen] + itinerario + [destino]
+
+    maximo = min(todas, key=lambda loc: RANGO_NIVEL[loc["nivel"]])  # Menos específico
+    minimo = max(todas, key=lambda loc: RANGO_NIVEL[loc["nivel"]])  # Más específico
+
+    # Origen y destino deciden primero; si coinciden, se mira todo el recorrido
+    clasificacion = clasificar_ruta_territorial([origen, destino])
+    if clasificacion == "LOCAL":
+        clasificacion = clasificar_ruta_territorial(todas)
+
+    por_nivel: Dict[str, int] = {}
+    for loc in todas:
+        por_nivel[loc["nivel"]] = por_nivel.get(loc["nivel"], 0) + 1
+
+    return {
+        "clasificacion": clasificacion,
+        "origen": origen,
+        "destino": destino,
+        "itinerario": itinerario,
+        "niveles": sorted(por_nivel, key=lambda nivel: RANGO_NIVEL[nivel]),
+        "nivelMaximo": maximo["nivel"],
+        "nivelMinimo": minimo["nivel"],
+        "rangoMaximo": RANGO_NIVEL[maximo["nivel"]],
+        "rangoMinimo": RANGO_NIVEL[minimo["nivel"]],
+        "porNivel": por_nivel,
+        "totalLocalidades": len(todas),
+        "fechaCalculo": datetime.utcnow()
+    }
+
+
 class NivelTerritorialService:
     """Servicio para análisis de niveles territoriales"""
-    
+
     def __init__(self):
         self.db = None
-    
+
     async def _get_db(self):
         """Obtener conexión a la base de datos"""
-        if not self.db:
+        if self.db is None:
             self.db = await get_database()
         return self.db
-    
+
     def determinar_nivel_territorial(self, localidad: dict) -> NivelTerritorial:
         """
         Determina el nivel territorial de una localidad basado en su UBIGEO y datos
         """
-        ubigeo = localidad.get('ubigeo', '')
-        
-        if len(ubigeo) != 6:
-            return NivelTerritorial.CENTRO_POBLADO  # Por defecto
-        
-        # Analizar UBIGEO: DDPPDD (Departamento-Provincia-Distrito)
-        dept_code = ubigeo[:2]
-        prov_code = ubigeo[2:4]
-        dist_code = ubigeo[4:6]
-        
-        # Si el código de distrito es 00, es nivel provincial
-        if dist_code == "00":
-            # Si el código de provincia es 00, es nivel departamental
-            if prov_code == "00":
-                return NivelTerritorial.DEPARTAMENTO
-            else:
-                return NivelTerritorial.PROVINCIA
-        else:
-            # Verificar si es distrito o centro poblado
-            # Si tiene municipalidad distrital, es distrito
-            municipalidad = localidad.get('municipalidad_centro_poblado', '').lower()
-            if 'distrital' in municipalidad:
-                return NivelTerritorial.DISTRITO
-            elif 'provincial' in municipalidad:
-                return NivelTerritorial.PROVINCIA
-            else:
-                return NivelTerritorial.CENTRO_POBLADO
-    
+        return determinar_nivel_territorial(localidad)
+
+    async def _asegurar_indices(self, db) -> None:
+        await asegurar_indices(db, "rutas")
+
     async def obtener_localidad_con_nivel(self, localidad_id: str) -> Optional[LocalidadEnRuta]:
         """Obtiene una localidad con su nivel territorial determinado"""
-        
+
         db = await self._get_db()
         localidades_collection = db.localidades
-        
+
         # Buscar por ID o por UBIGEO si es un código
         if len(localidad_id) == 6 and localidad_id.isdigit():
             localidad = await localidades_collection.find_one({"ubigeo": localidad_id})
@@ -77,285 +221,276 @@ class NivelTerritorialService:
                 localidad = await localidades_collection.find_one({"_id": ObjectId(localidad_id)})
             except:
                 localidad = await localidades_collection.find_one({"codigo": localidad_id})
-        
+
         if not localidad:
             return None
-        
-        # Determinar nivel territorial
-        nivel = self.determinar_nivel_territorial(localidad)
-        
+
+        nivel = _nivel_de(localidad)
         return LocalidadEnRuta(
-            localidad_id=str(localidad.get('_id')),
-            ubigeo=localidad.get('ubigeo', ''),
-            nombre=localidad.get('nombre', localidad.get('distrito', '')),
+            id=str(localidad.get('_id')),
+            nombre=localidad.get('nombre') or localidad.get('distrito') or '',
+            tipo=nivel,
             nivel_territorial=nivel,
-            departamento=localidad.get('departamento', ''),
-            provincia=localidad.get('provincia', ''),
-            distrito=localidad.get('distrito', ''),
-            municipalidad_centro_poblado=localidad.get('municipalidad_centro_poblado', ''),
             coordenadas=localidad.get('coordenadas'),
-            tipo_en_ruta="",  # Se asignará según el contexto
-            orden=None,
-            distancia_desde_origen=None,
-            tiempo_estimado=None
+            ubigeo=localidad.get('ubigeo'),
+            departamento=localidad.get('departamento'),
+            provincia=localidad.get('provincia'),
+            distrito=localidad.get('distrito'),
+            municipalidad_centro_poblado=localidad.get('municipalidad_centro_poblado')
+        )
+
+    async def materializar_rutas(
+        self,
+        filtro: Optional[Dict[str, Any]] = None,
+        on_progreso: Optional[Callable[[int, int], Any]] = None
+    ) -> Dict[str, int]:
+        """
+        Recalcular y guardar `nivelTerritorial` en las rutas (backfill)
+
+        Args:
+            filtro: Rutas a procesar (por defecto todas)
+            on_progreso: Callback opcional (procesadas, total), síncrono o async
+
+        Returns:
+            Totales de rutas procesadas, actualizadas y sin origen/destino
+        """
+        from app.services.localidad_alias_index import get_localidad_alias_index
+
+        db = await self._get_db()
+        await self._asegurar_indices(db)
+
+        # La jerarquía que falte en rutas antiguas se toma del índice de localidades
+        indice = get_localidad_alias_index()
+        await indice.asegurar_cargado(db)
+
+        filtro = filtro or {}
+        total = await db.rutas.count_documents(filtro)
+        resumen = {"total": total, "procesadas": 0, "actualizadas": 0, "sin_localidades": 0}
+
+        operaciones = []
+
+        async def escribir():
+            resultado = await db.rutas.bulk_write(operaciones, ordered=False)
+            resumen["actualizadas"] += resultado.modified_count
+            operaciones.clear()
+            if on_progreso:
+                avance = on_progreso(resumen["procesadas"], total)
+                if inspect.isawaitable(avance):
+                    await avance
+
+        async for ruta in db.rutas.find(filtro, {"origen": 1, "destino": 1, "itinerario": 1}):
+            nivel = calcular_nivel_territorial(ruta, indice.por_id)
+            if nivel is None:
+                # Sin origen/destino: se marca para que no se reintente en cada consulta
+                resumen["sin_localidades"] += 1
+                nivel = {"clasificacion": "SIN_LOCALIDADES", "fechaCalculo": datetime.utcnow()}
+            operaciones.append(UpdateOne({"_id": ruta["_id"]}, {"$set": {"nivelTerritorial": nivel}}))
+            resumen["procesadas"] += 1
+
+            if len(operaciones) >= TAMANO_LOTE_MATERIALIZACION:
+                await escribir()
+
+        if operaciones:
+            await escribir()
+
+        return resumen
+
+    async def _materializar_pendientes(self, db) -> None:
+        """Calcular el nivel de las rutas activas guardadas por caminos que no lo materializan"""
+        await self._asegurar_indices(db)
+        if await db.rutas.find_one(FILTRO_PENDIENTES, {"_id": 1}):
+            await self.materializar_rutas(FILTRO_PENDIENTES)
+
+    @staticmethod
+    def _localidad_en_ruta(
+        embebida: Optional[dict],
+        jerarquia: Dict[str, Any],
+        orden: Optional[int] = None
+    ) -> LocalidadEnRuta:
+        embebida = embebida or {}
+        return LocalidadEnRuta(
+            id=str(embebida.get('id') or ''),
+            nombre=embebida.get('nombre') or '',
+            tipo=jerarquia["nivel"],
+            nivel_territorial=jerarquia["nivel"],
+            coordenadas=embebida.get('coordenadas'),
+            ubigeo=jerarquia.get('ubigeo'),
+            departamento=jerarquia.get('departamento'),
+            provincia=jerarquia.get('provincia'),
+            distrito=jerarquia.get('distrito'),
+            orden=orden
         )
-    
+
+    def _analisis_desde_ruta(self, ruta: Dict[str, Any]) -> AnalisisNivelTerritorial:
+        """Armar el análisis a partir del campo materializado, sin más consultas"""
+        nivel = ruta["nivelTerritorial"]
+        paradas = [parada for parada in (ruta.get('itinerario') or []) if isinstance(parada, dict)]
+        itinerario = [
+            self._localidad_en_ruta(parada, jerarquia, parada.get('orden', i + 1))
+            for i, (parada, jerarquia) in enumerate(zip(paradas, nivel.get("itinerario", [])))
+        ]
+
+        return AnalisisNivelTerritorial(
+            ruta_id=str(ruta['_id']),
+            codigo_ruta=ruta.get('codigoRuta') or '',
+            nombre_ruta=ruta.get('nombre') or '',
+            origen=self._localidad_en_ruta(ruta.get('origen'), nivel["origen"], 0),
+            destino=self._localidad_en_ruta(ruta.get('destino'), nivel["destino"]),
+            itinerario=itinerario,
+            niveles_involucrados=nivel["niveles"],
+            nivel_maximo=nivel["nivelMaximo"],
+            nivel_minimo=nivel["nivelMinimo"],
+            total_localidades=nivel["totalLocalidades"],
+            por_nivel=nivel["porNivel"],
+            clasificacion_territorial=nivel["clasificacion"]
+        )
+
     async def analizar_ruta_completa(self, ruta_id: str) -> Optional[AnalisisNivelTerritorial]:
         """Analiza una ruta completa y determina los niveles territoriales involucrados"""
-        
+
         db = await self._get_db()
-        rutas_collection = db.rutas
-        itinerarios_collection = db.itinerarios
-        
-        # Obtener la ruta
+
         from bson import ObjectId
-        ruta = await rutas_collection.find_one({"_id": ObjectId(ruta_id)})
+        ruta = await db.rutas.find_one({"_id": ObjectId(ruta_id)}, PROYECCION_ANALISIS)
         if not ruta:
             return None
-        
-        # Obtener origen
-        origen = await self.obtener_localidad_con_nivel(ruta.get('origenId'))
-        if not origen:
-            return None
-        origen.tipo_en_ruta = "ORIGEN"
-        origen.orden = 0
-        origen.distancia_desde_origen = 0.0
-        
-        # Obtener destino
-        destino = await self.obtener_localidad_con_nivel(ruta.get('destinoId'))
-        if not destino:
+
+        if not (ruta.get("nivelTerritorial") or {}).get("clasificacion"):
+            await self.materializar_rutas({"_id": ruta["_id"]})
+            ruta = await db.rutas.find_one({"_id": ruta["_id"]}, PROYECCION_ANALISIS)
+
+        if ruta["nivelTerritorial"]["clasificacion"] == "SIN_LOCALIDADES":
             return None
-        destino.tipo_en_ruta = "DESTINO"
-        
-        # Obtener itinerario
-        itinerario_localidades = []
-        itinerarios = await itinerarios_collection.find({
-            "rutaId": ruta_id,
-            "estaActivo": True
-        }).sort("orden", 1).to_list(length=None)
-        
-        for i, itinerario in enumerate(itinerarios):
-            localidad = await self.obtener_localidad_con_nivel(itinerario.get('localidadId'))
-            if localidad:
-                localidad.tipo_en_ruta = itinerario.get('tipo', 'ESCALA')
-                localidad.orden = itinerario.get('orden', i + 1)
-                localidad.distancia_desde_origen = itinerario.get('distanciaDesdeOrigen')
-                localidad.tiempo_estimado = itinerario.get('tiempoEstimado')
-                itinerario_localidades.append(localidad)
-        
-        # Analizar niveles involucrados
-        todas_localidades = [origen] + itinerario_localidades + [destino]
-        niveles_involucrados = list(set([loc.nivel_territorial for loc in todas_localidades]))
-        
-        # Determinar nivel máximo y mínimo
-        jerarquia_niveles = [
-            NivelTerritorial.DEPARTAMENTO,
-            NivelTerritorial.PROVINCIA, 
-            NivelTerritorial.DISTRITO,
-            NivelTerritorial.CENTRO_POBLADO
-        ]
-        
-        niveles_indices = [jerarquia_niveles.index(nivel) for nivel in niveles_involucrados]
-        nivel_maximo = jerarquia_niveles[min(niveles_indices)]  # Menos específico
-        nivel_minimo = jerarquia_niveles[max(niveles_indices)]  # Más específico
-        
-        # Contar por nivel
-        por_nivel = {}
-        for nivel in NivelTerritorial:
-            por_nivel[nivel.value] = sum(1 for loc in todas_localidades if loc.nivel_territorial == nivel)
-        
-        # Clasificar la ruta
-        clasificacion = self._clasificar_ruta_territorial(origen, destino, itinerario_localidades)
-        
-        return AnalisisNivelTerritorial(
-            ruta_id=ruta_id,
-            codigo_ruta=ruta.get('codigoRuta', ''),
-            nombre_ruta=ruta.get('nombre', ''),
-            origen=origen,
-            destino=destino,
-            itinerario=itinerario_localidades,
-            niveles_involucrados=niveles_involucrados,
-            nivel_maximo=nivel_maximo,
-            nivel_minimo=nivel_minimo,
-            total_localidades=len(todas_localidades),
-            por_nivel=por_nivel,
-            clasificacion_territorial=clasificacion
-        )
-    
-    def _clasificar_ruta_territorial(self, origen: LocalidadEnRuta, destino: LocalidadEnRuta, 
-                                   itinerario: List[LocalidadEnRuta]) -> str:
-        """Clasifica una ruta según sus niveles territoriales"""
-        
-        # Verificar si cruza departamentos
-        if origen.departamento != destino.departamento:
-            return "INTERDEPARTAMENTAL"
-        
-        # Verificar si cruza provincias
-        if origen.provincia != destino.provincia:
-            return "INTERPROVINCIAL"
-        
-        # Verificar si cruza distritos
-        if origen.distrito != destino.distrito:
-            return "INTERDISTRITAL"
-        
-        # Si hay itinerario, verificar niveles
-        if itinerario:
-            departamentos = set([origen.departamento, destino.departamento] + 
-                              [loc.departamento for loc in itinerario])
-            provincias = set([origen.provincia, destino.provincia] + 
-                           [loc.provincia for loc in itinerario])
-            distritos = set([origen.distrito, destino.distrito] + 
-                          [loc.distrito for loc in itinerario])
-            
-            if len(departamentos) > 1:
-                return "INTERDEPARTAMENTAL"
-            elif len(provincias) > 1:
-                return "INTERPROVINCIAL"
-            elif len(distritos) > 1:
-                return "INTERDISTRITAL"
-        
-        return "LOCAL"
-    
-    async def buscar_rutas_por_nivel(self, filtros: FiltroRutasPorNivel) -> List[AnalisisNivelTerritorial]:
-        """Busca rutas que cumplan con criterios de nivel territorial"""
-        
-        db = await self._get_db()
-        rutas_collection = db.rutas
-        
-        # Construir filtro de MongoDB
-        mongo_filter = {"estaActivo": True}
-        
-        # Obtener todas las rutas activas
-        rutas = await rutas_collection.find(mongo_filter).to_list(length=None)
-        
-        # Analizar cada ruta y filtrar
-        resultados = []
-        for ruta in rutas:
-            analisis = await self.analizar_ruta_completa(str(ruta['_id']))
-            if analisis and self._cumple_filtros_nivel(analisis, filtros):
-                resultados.append(analisis)
-        
-        return resultados
-    
-    def _cumple_filtros_nivel(self, analisis: AnalisisNivelTerritorial, 
-                             filtros: FiltroRutasPorNivel) -> bool:
-        """Verifica si un análisis cumple con los filtros de nivel"""
-        
-        if filtros.nivel_origen and analisis.origen.nivel_territorial != filtros.nivel_origen:
-            return False
-        
-        if filtros.nivel_destino and analisis.destino.nivel_territorial != filtros.nivel_destino:
-            return False
-        
-        if filtros.departamento_origen and analisis.origen.departamento != filtros.departamento_origen:
-            return False
-        
-        if filtros.departamento_destino and analisis.destino.departamento != filtros.departamento_destino:
-            return False
-        
-        if filtros.provincia_origen and analisis.origen.provincia != filtros.provincia_origen:
-            return False
-        
-        if filtros.provincia_destino and analisis.destino.provincia != filtros.provincia_destino:
-            return False
-        
-        if filtros.incluye_nivel and filtros.incluye_nivel not in analisis.niveles_involucrados:
-            return False
-        
-        # Verificar nivel mínimo requerido
+        return self._analisis_desde_ruta(ruta)
+
+    def _filtro_mongo(self, filtros: FiltroRutasPorNivel) -> Dict[str, Any]:
+        """Traducir los filtros de nivel a condiciones sobre el campo materializado"""
+        query: Dict[str, Any] = {
+            "estaActivo": True,
+            "nivelTerritorial.clasificacion": {"$nin": [None, "SIN_LOCALIDADES"]}
+        }
+
+        if filtros.nivel_origen:
+            query["nivelTerritorial.origen.nivel"] = filtros.nivel_origen.value
+        if filtros.nivel_destino:
+            query["nivelTerritorial.destino.nivel"] = filtros.nivel_destino.value
+        if filtros.departamento_origen:
+            query["nivelTerritorial.origen.departamento"] = filtros.departamento_origen
+        if filtros.departamento_destino:
+            query["nivelTerritorial.destino.departamento"] = filtros.departamento_destino
+        if filtros.provincia_origen:
+            query["nivelTerritorial.origen.provincia"] = filtros.provincia_origen
+        if filtros.provincia_destino:
+            query["nivelTerritorial.destino.provincia"] = filtros.provincia_destino
+        if filtros.incluye_nivel:
+            query["nivelTerritorial.niveles"] = filtros.incluye_nivel.value
+
+        # Verificar nivel mínimo requerido: la localidad más específica debe serlo al menos tanto
         if filtros.nivel_minimo_requerido:
-            jerarquia = [NivelTerritorial.DEPARTAMENTO, NivelTerritorial.PROVINCIA, 
-                        NivelTerritorial.DISTRITO, NivelTerritorial.CENTRO_POBLADO]
-            indice_minimo = jerarquia.index(filtros.nivel_minimo_requerido)
-            indice_actual = jerarquia.index(analisis.nivel_minimo)
-            if indice_actual < indice_minimo:
-                return False
-        
-        # Verificar nivel máximo permitido
+            query["nivelTerritorial.rangoMinimo"] = {"$gte": RANGO_NIVEL[filtros.nivel_minimo_requerido.value]}
+
+        # Verificar nivel máximo permitido: la menos específica no puede pasar del permitido
         if filtros.nivel_maximo_permitido:
-            jerarquia = [NivelTerritorial.DEPARTAMENTO, NivelTerritorial.PROVINCIA, 
-                        NivelTerritorial.DISTRITO, NivelTerritorial.CENTRO_POBLADO]
-            indice_maximo = jerarquia.index(filtros.nivel_maximo_permitido)
-            indice_actual = jerarquia.index(analisis.nivel_maximo)
-            if indice_actual > indice_maximo:
-                return False
-        
-        return True
-    
+            query["nivelTerritorial.rangoMaximo"] = {"$lte": RANGO_NIVEL[filtros.nivel_maximo_permitido.value]}
+
+        return query
+
+    async def _buscar(self, query: Dict[str, Any]) -> List[AnalisisNivelTerritorial]:
+        db = await self._get_db()
+        await self._materializar_pendientes(db)
+        rutas = await db.rutas.find(query, PROYECCION_ANALISIS).to_list(length=None)
+        return [self._analisis_desde_ruta(ruta) for ruta in rutas]
+
+    async def buscar_rutas_por_nivel(self, filtros: FiltroRutasPorNivel) -> List[AnalisisNivelTerritorial]:
+        """Busca rutas que cumplan con criterios de nivel territorial"""
+        return await self._buscar(self._filtro_mongo(filtros))
+
+    async def buscar_rutas_por_clasificacion(self, clasificacion: str) -> List[AnalisisNivelTerritorial]:
+        """Rutas activas con una clasificación territorial (INTERPROVINCIAL, LOCAL, ...)"""
+        return await self._buscar({"estaActivo": True, "nivelTerritorial.clasificacion": clasificacion})
+
+    async def buscar_rutas_por_departamento(
+        self,
+        departamento: str,
+        como_origen: bool = True,
+        como_destino: bool = True
+    ) -> List[AnalisisNivelTerritorial]:
+        """Rutas con origen y/o destino en un departamento"""
+        condiciones = []
+        if como_origen:
+            condiciones.append({"nivelTerritorial.origen.departamento": departamento})
+        if como_destino:
+            condiciones.append({"nivelTerritorial.destino.departamento": departamento})
+        if not condiciones:
+            return []
+        return await self._buscar({"estaActivo": True, "$or": condiciones})
+
     async def generar_estadisticas_territoriales(self) -> EstadisticasNivelTerritorial:
         """Genera estadísticas completas de niveles territoriales"""
-        
+
         db = await self._get_db()
-        rutas_collection = db.rutas
-        
-        # Obtener todas las rutas activas
-        rutas = await rutas_collection.find({"estaActivo": True}).to_list(length=None)
-        
-        # Contadores
-        total_rutas = len(rutas)
-        dist_origen = {}
-        dist_destino = {}
-        combinaciones = {}
-        clasificaciones = {}
-        departamentos_origen = {}
-        departamentos_destino = {}
-        provincias_origen = {}
-        provincias_destino = {}
-        
-        # Analizar cada ruta
-        for ruta in rutas:
-            analisis = await self.analizar_ruta_completa(str(ruta['_id']))
-            if not analisis:
-                continue
-            
-            # Distribución por nivel de origen
-            nivel_origen = analisis.origen.nivel_territorial.value
-            dist_origen[nivel_origen] = dist_origen.get(nivel_origen, 0) + 1
-            
-            # Distribución por nivel de destino
-            nivel_destino = analisis.destino.nivel_territorial.value
-            dist_destino[nivel_destino] = dist_destino.get(nivel_destino, 0) + 1
-            
-            # Combinaciones más comunes
-            combinacion = f"{nivel_origen} → {nivel_destino}"
-            combinaciones[combinacion] = combinaciones.get(combinacion, 0) + 1
-            
-            # Clasificaciones territoriales
-            clasificacion = analisis.clasificacion_territorial
-            clasificaciones[clasificacion] = clasificaciones.get(clasificacion, 0) + 1
-            
-            # Departamentos más conectados
-            dept_origen = analisis.origen.departamento
-            dept_destino = analisis.destino.departamento
-            departamentos_origen[dept_origen] = departamentos_origen.get(dept_origen, 0) + 1
-            departamentos_destino[dept_destino] = departamentos_destino.get(dept_destino, 0) + 1
-            
-            # Provincias más conectadas
-            prov_origen = f"{dept_origen} - {analisis.origen.provincia}"
-            prov_destino = f"{dept_destino} - {analisis.destino.provincia}"
-            provincias_origen[prov_origen] = provincias_origen.get(prov_origen, 0) + 1
-            provincias_destino[prov_destino] = provincias_destino.get(prov_destino, 0) + 1
-        
+        await self._materializar_pendientes(db)
+
+        def contar(*campos: str) -> List[Dict[str, Any]]:
+            clave = {campo.replace(".", "_"): f"$nivelTerritorial.{campo}" for campo in campos}
+            return [{"$group": {"_id": clave, "cantidad": {"$sum": 1}}}]
+
+        # Una sola agregación con todos los conteos
+        pipeline = [
+            {"$match": {
+                "estaActivo": True,
+                "nivelTerritorial.clasificacion": {"$nin": [None, "SIN_LOCALIDADES"]}
+            }},
+            {"$facet": {
+                "origen": contar("origen.nivel"),
+                "destino": contar("destino.nivel"),
+                "combinaciones": contar("origen.nivel", "destino.nivel"),
+                "clasificaciones": contar("clasificacion"),
+                "departamentos_origen": contar("origen.departamento"),
+                "departamentos_destino": contar("destino.departamento"),
+                "provincias_origen": contar("origen.departamento", "origen.provincia"),
+                "provincias_destino": contar("destino.departamento", "destino.provincia")
+            }}
+        ]
+        facetas = (await db.rutas.aggregate(pipeline).to_list(length=1) or [{}])[0]
+        total_rutas = await db.rutas.count_documents({"estaActivo": True})
+
+        def conteos(faceta: str, clave: Callable[[dict], Any]) -> Dict[Any, int]:
+            return {clave(item["_id"]): item["cantidad"] for item in facetas.get(faceta, [])}
+
+        dist_origen = conteos("origen", lambda k: k.get("origen_nivel"))
+        dist_destino = conteos("destino", lambda k: k.get("destino_nivel"))
+        clasificaciones = conteos("clasificaciones", lambda k: k.get("clasificacion"))
+        combinaciones = conteos("combinaciones", lambda k: f"{k.get('origen_nivel')} → {k.get('destino_nivel')}")
+        departamentos_origen = conteos("departamentos_origen", lambda k: k.get("origen_departamento"))
+        departamentos_destino = conteos("departamentos_destino", lambda k: k.get("destino_departamento"))
+        provincias_origen = conteos(
+            "provincias_origen", lambda k: f"{k.get('origen_departamento')} - {k.get('origen_provincia')}"
+        )
+        provincias_destino = conteos(
+            "provincias_destino", lambda k: f"{k.get('destino_departamento')} - {k.get('destino_provincia')}"
+        )
+
         # Preparar listas ordenadas
         combinaciones_ordenadas = [
-            {"combinacion": k, "cantidad": v} 
+            {"combinacion": k, "cantidad": v}
             for k, v in sorted(combinaciones.items(), key=lambda x: x[1], reverse=True)
         ][:10]
-        
+
         departamentos_ordenados = [
-            {"departamento": k, "como_origen": departamentos_origen.get(k, 0), 
+            {"departamento": k, "como_origen": departamentos_origen.get(k, 0),
              "como_destino": departamentos_destino.get(k, 0)}
             for k in set(list(departamentos_origen.keys()) + list(departamentos_destino.keys()))
         ]
         departamentos_ordenados.sort(key=lambda x: x["como_origen"] + x["como_destino"], reverse=True)
-        
+
         provincias_ordenadas = [
             {"provincia": k, "como_origen": provincias_origen.get(k, 0),
              "como_destino": provincias_destino.get(k, 0)}
             for k in set(list(provincias_origen.keys()) + list(provincias_destino.keys()))
         ]
         provincias_ordenadas.sort(key=lambda x: x["como_origen"] + x["como_destino"], reverse=True)
-        
+
         return EstadisticasNivelTerritorial(
             total_rutas_analizadas=total_rutas,
             distribucion_por_nivel_origen=dist_origen,
@@ -365,7 +500,7 @@ class NivelTerritorialService:
             departamentos_mas_conectados=departamentos_ordenados[:15],
             provincias_mas_conectadas=provincias_ordenadas[:20]
         )
-    
+
     async def obtener_jerarquia_localidad(self, localidad_id: str) -> Optional[LocalidadConJerarquia]:
         """Obtiene la jerarquía territorial completa de una localidad"""
         
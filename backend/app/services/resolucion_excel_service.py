@@ -4,7 +4,7 @@ Servicio para carga masiva de resoluciones desde archivos Excel
 import pandas as pd
 import re
 from datetime import datetime
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Callable, Awaitable
 from io import BytesIO
 from app.models.resolucion import (
     ResolucionCreate, 
@@ -14,6 +14,9 @@ from app.models.resolucion import (
 )
 from app.dependencies.db import get_database
 
+# Cada cuántas resoluciones se informa el avance en procesar_carga_masiva
+RESOLUCIONES_POR_AVANCE = 50
+
 class ResolucionExcelService:
     def __init__(self):
         self.db = None
@@ -609,8 +612,18 @@ class ResolucionExcelService:
         
         return resultado
     
-    async def procesar_carga_masiva(self, archivo_excel: BytesIO) -> Dict[str, Any]:
-        """Procesar carga masiva de resoluciones desde Excel"""
+    async def procesar_carga_masiva(
+        self,
+        archivo_excel: BytesIO,
+        on_progreso: Optional[Callable[[int, int], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Procesar carga masiva de resoluciones desde Excel
+        
+        Args:
+            archivo_excel: Archivo Excel con las resoluciones
+            on_progreso: Callback async (procesadas, total) cada RESOLUCIONES_POR_AVANCE resoluciones
+        """
         from bson import ObjectId
         from datetime import datetime
         
@@ -637,7 +650,11 @@ class ResolucionExcelService:
         resoluciones_collection = db["resoluciones"]
         empresas_collection = db["empresas"]
         
-        for resolucion_data in resultado_validacion['resoluciones_validas']:
+        resoluciones_validas = resultado_validacion['resoluciones_validas']
+        for indice, resolucion_data in enumerate(resoluciones_validas):
+            if on_progreso and indice % RESOLUCIONES_POR_AVANCE == 0:
+                await on_progreso(indice, len(resoluciones_validas))
+            
             try:
                 # Obtener empresa por RUC
                 empresa = await empresas_collection.find_one({
@@ -5,7 +5,7 @@ Maneja la carga masiva de resoluciones con estado y resoluciones asociadas
 
 import pandas as pd
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 import logging
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
@@ -22,6 +22,9 @@ logger = logging.getLogger(__name__)
 # Configurar zona horaria de Lima
 LIMA_TZ = pytz.timezone('America/Lima')
 
+# Cada cuántas filas se informa el avance en procesar_plantilla_padres
+FILAS_POR_AVANCE = 50
+
 class ResolucionPadresService:
     
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -460,9 +463,15 @@ class ResolucionPadresService:
     async def procesar_plantilla_padres(
         self, 
         df: pd.DataFrame, 
-        usuario_id: str
+        usuario_id: str,
+        on_progreso: Optional[Callable[[int, int], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
-        """Procesar plantilla de resoluciones padres y crear registros"""
+        """
+        Procesar plantilla de resoluciones padres y crear registros
+        
+        Args:
+            on_progreso: Callback async (procesadas, total) cada FILAS_POR_AVANCE filas
+        """
         
         # Normalizar nombres de columnas primero
         df = self._normalizar_nombres_columnas(df)
@@ -476,7 +485,10 @@ class ResolucionPadresService:
         advertencias_procesamiento = []
         filas_omitidas = []
         
-        for idx, row in df.iterrows():
+        for posicion, (idx, row) in enumerate(df.iterrows()):
+            if on_progreso and posicion % FILAS_POR_AVANCE == 0:
+                await on_progreso(posicion, len(df))
+            
             try:
                 fila = idx + 2
                 
@@ -2,6 +2,7 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 import uuid
 
 from app.models.resolucion import (
@@ -18,6 +19,20 @@ from app.utils.exceptions import (
     ResolucionAlreadyExistsException,
     ValidationErrorException
 )
+from app.utils.paginacion_cursor import PaginaCursor, paginar
+from app.core.indices import registrar_consulta, registrar_indices
+
+# Las resoluciones se buscan por UUID `id` o por `_id` (get_resolucion_by_id)
+registrar_indices(
+    "resoluciones",
+    IndexModel([("id", ASCENDING)], sparse=True),
+    IndexModel([("nroResolucion", ASCENDING)], name="nroResolucion_activas", partialFilterExpression={"estaActivo": True}),
+    IndexModel([("estado", ASCENDING), ("estaActivo", ASCENDING)]),
+    IndexModel([("tipoResolucion", ASCENDING), ("estaActivo", ASCENDING)])
+)
+registrar_consulta("resoluciones", "listado_activas", {"estaActivo": True}, [("_id", ASCENDING)])
+registrar_consulta("resoluciones", "numero_unico", {"nroResolucion": "R-0001-2025", "estaActivo": True})
+registrar_consulta("resoluciones", "por_empresa", {"empresaId": "x", "estaActivo": True})
 
 class ResolucionService:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -109,6 +124,21 @@ class ResolucionService:
         
         return [ResolucionInDB(**doc) for doc in docs]
 
+    async def get_resoluciones_pagina(
+        self,
+        filtro: Dict[str, Any],
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        skip: int = 0
+    ) -> PaginaCursor:
+        """Página de resoluciones por cursor `(_id)`; lanza CursorInvalido si el cursor no es válido"""
+        pagina = await paginar(self.collection, filtro, limit, cursor=cursor, skip=skip)
+        for doc in pagina.documentos:
+            if "id" not in doc or not doc.get("id"):
+                doc["id"] = str(doc["_id"])
+        pagina.documentos = [ResolucionInDB(**doc) for doc in pagina.documentos]
+        return pagina
+
     async def get_resoluciones_por_estado(self, estado: str) -> List[ResolucionInDB]:
         cursor = self.collection.find({"estado": estado, "estaActivo": True})
         docs = await cursor.to_list(length=None)
@@ -0,0 +1,269 @@
+"""
+Índice en memoria de combinaciones origen → destino de rutas
+
+Mantiene, por cada par único origen/destino, el conteo y la lista de rutas
+que lo cubren, junto con un índice de n-gramas (1 a 3 caracteres) sobre el
+texto normalizado de la combinación. Las búsquedas del autocompletado se
+resuelven sin consultar MongoDB:
+
+- consultas de hasta 3 caracteres: una sola lectura del índice de n-gramas
+- consultas más largas: intersección de los trigramas y verificación final
+
+El índice se carga la primera vez que se usa y RutaService lo actualiza de
+forma incremental al crear, actualizar o dar de baja rutas. Como cada worker
+tiene su propia copia, se recarga completo cuando supera `max_edad_segundos`.
+"""
+import asyncio
+import logging
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+LONGITUD_NGRAMA = 3
+
+PROYECCION_RUTA = {
+    "codigoRuta": 1,
+    "origen.nombre": 1,
+    "destino.nombre": 1,
+    "origenId": 1,
+    "destinoId": 1,
+    "empresa.id": 1,
+    "empresaId": 1,
+    "resolucion.id": 1,
+    "resolucionId": 1,
+    "estado": 1,
+    "estaActivo": 1
+}
+
+
+def normalizar_texto(texto: str) -> str:
+    """Mayúsculas y sin tildes, para búsquedas insensibles a ambos"""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_tildes.upper().split())
+
+
+class RutaCombinacionesIndex:
+    """Índice de combinaciones origen → destino con búsqueda por n-gramas"""
+
+    def __init__(self, max_edad_segundos: int = 300):
+        """
+        Args:
+            max_edad_segundos: Edad máxima antes de recargar desde MongoDB
+        """
+        self.max_edad_segundos = max_edad_segundos
+        self._combinaciones: Dict[str, Dict[str, Any]] = {}
+        self._ruta_a_clave: Dict[str, str] = {}
+        self._ngramas: Dict[str, Set[str]] = defaultdict(set)
+        self._orden: Optional[List[str]] = None
+        self._cargado_en: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def cargado(self) -> bool:
+        """True si el índice está cargado y no ha vencido"""
+        return (
+            self._cargado_en is not None
+            and time.monotonic() - self._cargado_en < self.max_edad_segundos
+        )
+
+    @staticmethod
+    def _nombre(localidad: Any) -> str:
+        if isinstance(localidad, dict):
+            return (localidad.get("nombre") or "").strip()
+        return str(localidad or "").strip()
+
+    @staticmethod
+    def _ngramas_de(texto: str) -> Set[str]:
+        return {
+            texto[i:i + n]
+            for n in range(1, LONGITUD_NGRAMA + 1)
+            for i in range(len(texto) - n + 1)
+        }
+
+    def _extraer(self, ruta: Dict[str, Any]) -> Optional[Tuple[str, str, str, Dict[str, Any]]]:
+        """Obtener (clave, origen, destino, resumen) de un documento de ruta"""
+        origen = self._nombre(ruta.get("origen") or ruta.get("origenId"))
+        destino = self._nombre(ruta.get("destino") or ruta.get("destinoId"))
+        if not origen or not destino:
+            return None
+
+        resumen = {
+            "id": str(ruta.get("_id", ruta.get("id", ""))),
+            "codigoRuta": ruta.get("codigoRuta", ""),
+            "empresaId": (ruta.get("empresa") or {}).get("id") or ruta.get("empresaId", ""),
+            "resolucionId": (ruta.get("resolucion") or {}).get("id") or ruta.get("resolucionId", ""),
+            "estado": ruta.get("estado", "")
+        }
+        return f"{origen} → {destino}", origen, destino, resumen
+
+    def _quitar_de_combinacion(self, ruta_id: str) -> None:
+        clave = self._ruta_a_clave.pop(ruta_id, None)
+        if clave is None:
+            return
+
+        entrada = self._combinaciones[clave]
+        entrada["rutas"].pop(ruta_id, None)
+        entrada["salida"] = None
+        if entrada["rutas"]:
+            return
+
+        # Última ruta de la combinación: sacarla del índice de n-gramas
+        for ngrama in self._ngramas_de(entrada["texto"]):
+            claves = self._ngramas.get(ngrama)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._ngramas[ngrama]
+        del self._combinaciones[clave]
+        self._orden = None
+
+    def registrar_ruta(self, ruta: Dict[str, Any]) -> None:
+        """
+        Agregar o actualizar una ruta en el índice.
+
+        Acepta el documento de MongoDB (con `_id`) o el dict con `id`.
+        Las rutas inactivas se retiran del índice.
+        """
+        ruta_id = str(ruta.get("_id", ruta.get("id", "")))
+        if not ruta_id:
+            return
+
+        self._quitar_de_combinacion(ruta_id)
+        if not ruta.get("estaActivo", True):
+            return
+
+        extraido = self._extraer(ruta)
+        if extraido is None:
+            return
+        clave, origen, destino, resumen = extraido
+
+        entrada = self._combinaciones.get(clave)
+        if entrada is None:
+            entrada = {
+                "combinacion": clave,
+                "origen": origen,
+                "destino": destino,
+                "texto": normalizar_texto(clave),
+                "rutas": {},
+                "salida": None
+            }
+            self._combinaciones[clave] = entrada
+            self._orden = None
+            for ngrama in self._ngramas_de(entrada["texto"]):
+                self._ngramas[ngrama].add(clave)
+
+        entrada["rutas"][ruta_id] = resumen
+        entrada["salida"] = None
+        self._ruta_a_clave[ruta_id] = clave
+
+    def eliminar_ruta(self, ruta_id: str) -> None:
+        """Retirar una ruta del índice (baja lógica o eliminación)"""
+        self._quitar_de_combinacion(str(ruta_id))
+
+    def invalidar(self) -> None:
+        """Forzar recarga completa en el próximo uso (operaciones masivas)"""
+        self._cargado_en = None
+
+    def reconstruir(self, rutas: List[Dict[str, Any]]) -> None:
+        """Reconstruir el índice completo a partir de documentos de ruta"""
+        self._combinaciones = {}
+        self._ruta_a_clave = {}
+        self._ngramas = defaultdict(set)
+        self._orden = None
+        for ruta in rutas:
+            self.registrar_ruta(ruta)
+        self._cargado_en = time.monotonic()
+
+    async def asegurar_cargado(self, db: AsyncIOMotorDatabase) -> None:
+        """Cargar el índice desde MongoDB si no está cargado o venció"""
+        if self.cargado:
+            return
+
+        async with self._lock:
+            if self.cargado:
+                return
+            inicio = time.perf_counter()
+            rutas = await db["rutas"].find(
+                {"estaActivo": True}, PROYECCION_RUTA
+            ).to_list(length=None)
+            self.reconstruir(rutas)
+            logger.info(
+                f"Índice de combinaciones cargado: {len(self._combinaciones)} combinaciones, "
+                f"{len(self._ruta_a_clave)} rutas en {(time.perf_counter() - inicio) * 1000:.1f} ms"
+            )
+
+    def buscar(self, busqueda: Optional[str] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Buscar combinaciones cuyo texto contenga `busqueda`.
+
+        Args:
+            busqueda: Texto a buscar (sin distinguir mayúsculas ni tildes)
+            limite: Máximo de combinaciones a devolver (autocompletado)
+
+        Returns:
+            Combinaciones ordenadas, cada una con sus rutas y el total
+        """
+        consulta = normalizar_texto(busqueda or "")
+
+        if not consulta:
+            claves = self._combinaciones.keys()
+        elif len(consulta) <= LONGITUD_NGRAMA:
+            claves = self._ngramas.get(consulta, set())
+        else:
+            trigramas = sorted(
+                (self._ngramas.get(consulta[i:i + LONGITUD_NGRAMA], set())
+                 for i in range(len(consulta) - LONGITUD_NGRAMA + 1)),
+                key=len
+            )
+            candidatas = set(trigramas[0])
+            for claves_trigrama in trigramas[1:]:
+                if not candidatas:
+                    break
+                candidatas &= claves_trigrama
+            claves = [c for c in candidatas if consulta in self._combinaciones[c]["texto"]]
+
+        ordenadas = self._ordenar(claves)
+        if limite is not None:
+            ordenadas = ordenadas[:limite]
+        return [self._salida(clave) for clave in ordenadas]
+
+    def _ordenar(self, claves) -> List[str]:
+        """Ordenar claves reutilizando el orden global cuando son muchas"""
+        if self._orden is None:
+            self._orden = sorted(self._combinaciones)
+        if claves is self._combinaciones.keys():
+            return self._orden
+        if len(claves) * 8 < len(self._orden):
+            return sorted(claves)
+        claves = claves if isinstance(claves, set) else set(claves)
+        return [clave for clave in self._orden if clave in claves]
+
+    def _salida(self, clave: str) -> Dict[str, Any]:
+        """Respuesta de una combinación, armada una vez por cambio"""
+        entrada = self._combinaciones[clave]
+        if entrada["salida"] is None:
+            entrada["salida"] = {
+                "combinacion": entrada["combinacion"],
+                "origen": entrada["origen"],
+                "destino": entrada["destino"],
+                "total_rutas": len(entrada["rutas"]),
+                "rutas": list(entrada["rutas"].values())
+            }
+        return entrada["salida"]
+
+
+# Global index instance
+_index_instance: Optional[RutaCombinacionesIndex] = None
+
+def get_combinaciones_index() -> RutaCombinacionesIndex:
+    """Get global combinaciones index instance"""
+    global _index_instance
+    if _index_instance is None:
+        _index_instance = RutaCombinacionesIndex()
+    return _index_instance
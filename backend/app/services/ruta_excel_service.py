@@ -2,14 +2,23 @@
 Servicio para carga masiva de rutas desde archivos Excel
 """
 import pandas as pd
+import numpy as np
+import asyncio
+import csv
+import inspect
+import os
 import re
+import tempfile
 from datetime import datetime
-from typing import List, Dict, Any, Tuple, Optional
-from io import BytesIO
+from typing import List, Dict, Any, Tuple, Optional, AsyncIterator, Callable
+from io import BytesIO, StringIO
+import aiofiles
+from openpyxl import Workbook
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.models.ruta import (
-    RutaCreate, 
     EstadoRuta, 
     TipoRuta, 
     TipoServicio,
@@ -20,6 +29,34 @@ from app.models.ruta import (
     TipoFrecuencia,
     crear_frecuencia_diaria
 )
+from app.services.ruta_combinaciones_index import get_combinaciones_index
+from app.services.localidad_alias_index import get_localidad_alias_index
+from app.services.nivel_territorial_service import calcular_nivel_territorial
+from app.utils.busqueda_normalizada import CAMPO_BUSQUEDA, campos_busqueda, con_campos_busqueda
+
+COLUMNAS_EXPORTACION = [
+    "RUC Empresa", "Razón Social", "Resolución", "Código Ruta", "Nombre",
+    "Origen", "Destino", "Itinerario", "Frecuencia", "Tipo Ruta",
+    "Tipo Servicio", "Estado"
+]
+
+TAMANO_BLOQUE_ARCHIVO = 64 * 1024
+
+# Rutas por bulk_write en la carga masiva
+TAMANO_LOTE_CARGA = int(os.getenv("RUTAS_CARGA_MASIVA_TAMANO_LOTE", "1000"))
+
+PROYECCION_LOCALIDAD = {
+    "nombre": 1, "tipo": 1, "ubigeo": 1, "departamento": 1,
+    "provincia": 1, "distrito": 1, "coordenadas": 1
+}
+
+# Campos de la ruta existente usados para detectar cambios en modo upsert
+PROYECCION_RUTA_EXISTENTE = {
+    "codigoRuta": 1, "empresa.id": 1, "resolucion.id": 1,
+    "origen.nombre": 1, "destino.nombre": 1, "frecuencia.descripcion": 1,
+    "tipoRuta": 1, "tipoServicio": 1, "distancia": 1,
+    "observaciones": 1, "descripcion": 1, "itinerario": 1
+}
 
 class RutaExcelService:
     def __init__(self, db: AsyncIOMotorDatabase = None):
@@ -148,183 +185,8 @@ class RutaExcelService:
         return buffer
     
     async def procesar_carga_masiva(self, archivo_excel: BytesIO) -> Dict[str, Any]:
-        """Procesar carga masiva de rutas desde Excel"""
-        print("🔍 DEBUG PROCESAMIENTO: Iniciando procesamiento de carga masiva")
-        try:
-            # Primero validar el archivo
-            validacion = await self.validar_archivo_excel(archivo_excel)
-            
-            if 'error' in validacion:
-                return validacion
-            
-            if validacion['validos'] == 0:
-                return {
-                    'error': 'No hay rutas válidas para procesar',
-                    'validacion': validacion
-                }
-            
-            # Procesar rutas válidas
-            resultados = {
-                'total_procesadas': 0,
-                'exitosas': 0,
-                'fallidas': 0,
-                'rutas_creadas': [],
-                'errores_procesamiento': [],
-                'validacion': validacion
-            }
-            
-            for ruta_data in validacion['rutas_validas']:
-                print(f"🔍 DEBUG PROCESAMIENTO: Procesando ruta con RUC {ruta_data.get('ruc')} y código {ruta_data.get('codigoRuta')}")
-                try:
-                    # Crear la ruta usando el servicio
-                    ruta_creada = await self._crear_ruta_desde_datos(ruta_data)
-                    
-                    resultados['exitosas'] += 1
-                    resultados['rutas_creadas'].append({
-                        'codigo': ruta_creada.codigoRuta,
-                        'nombre': ruta_creada.nombre,
-                        'id': ruta_creada.id
-                    })
-                    
-                except Exception as e:
-                    resultados['fallidas'] += 1
-                    resultados['errores_procesamiento'].append({
-                        'codigo_ruta': ruta_data.get('codigoRuta', 'N/A'),
-                        'error': str(e)
-                    })
-                
-                resultados['total_procesadas'] += 1
-            
-            return resultados
-            
-        except Exception as e:
-            return {
-                'error': f"Error al procesar carga masiva: {str(e)}",
-                'total_procesadas': 0,
-                'exitosas': 0,
-                'fallidas': 0,
-                'rutas_creadas': [],
-                'errores_procesamiento': []
-            }
-    
-    async def _crear_ruta_desde_datos(self, ruta_data: Dict[str, Any]) -> Any:
-        """Crear una ruta desde los datos procesados del Excel"""
-        try:
-            print(f"🔍 DEBUG: INICIANDO _crear_ruta_desde_datos para RUC {ruta_data['ruc']}")
-            from app.services.ruta_service import RutaService
-            
-            # DEBUG: Logging detallado
-            print(f"🔍 DEBUG: Buscando empresa con RUC: '{ruta_data['ruc']}'")
-            print(f"🔍 DEBUG: Tipo de RUC: {type(ruta_data['ruc'])}")
-            print(f"🔍 DEBUG: Longitud del RUC: {len(ruta_data['ruc'])}")
-            
-            # Buscar empresa por RUC
-            empresa = await self.empresas_collection.find_one({
-                "ruc": ruta_data['ruc'],
-                "estaActivo": True
-            })
-            
-            print(f"🔍 DEBUG: Resultado búsqueda empresa: {empresa is not None}")
-            if empresa:
-                print(f"🔍 DEBUG: Empresa encontrada - ID: {empresa.get('_id')}, RUC: {empresa.get('ruc')}")
-            else:
-                print(f"🔍 DEBUG: Empresa no encontrada")
-            
-            if not empresa:
-                raise Exception(f"Empresa con RUC {ruta_data['ruc']} no encontrada o inactiva")
-            
-            # Buscar resolución por número
-            resolucion = await self.resoluciones_collection.find_one({
-                "nroResolucion": ruta_data['resolucionNormalizada'],
-                "tipoResolucion": "PADRE",
-                "estado": "VIGENTE",
-                "estaActivo": True
-            })
-            
-            print(f"🔍 DEBUG: Resultado búsqueda resolución: {resolucion is not None}")
-            if not resolucion:
-                raise Exception(f"Resolución {ruta_data['resolucionNormalizada']} no encontrada, no es PADRE o no está VIGENTE")
-            
-            # Buscar o crear localidades
-            origen_localidad = await self._buscar_o_crear_localidad(ruta_data['origen'])
-            destino_localidad = await self._buscar_o_crear_localidad(ruta_data['destino'])
-            
-            origen_embebido = LocalidadEmbebida(
-                id=str(origen_localidad["_id"]),
-                nombre=origen_localidad["nombre"]
-            )
-            
-            destino_embebido = LocalidadEmbebida(
-                id=str(destino_localidad["_id"]),
-                nombre=destino_localidad["nombre"]
-            )
-            
-            # Crear empresa embebida
-            print(f"🔍 DEBUG: Creando EmpresaEmbebida...")
-            razon_social_principal = "Sin razón social"
-            if 'razonSocial' in empresa:
-                if isinstance(empresa['razonSocial'], dict):
-                    razon_social_principal = empresa['razonSocial'].get('principal', 'Sin razón social')
-                else:
-                    razon_social_principal = str(empresa['razonSocial'])
-            
-            empresa_embebida = EmpresaEmbebida(
-                id=str(empresa["_id"]),
-                ruc=empresa["ruc"],
-                razonSocial=razon_social_principal
-            )
-            print(f"🔍 DEBUG: EmpresaEmbebida creada exitosamente")
-            
-            resolucion_embebida = ResolucionEmbebida(
-                id=str(resolucion["_id"]),
-                nroResolucion=resolucion["nroResolucion"],
-                tipoResolucion=resolucion["tipoResolucion"],
-                estado=resolucion["estado"]
-            )
-            
-            # Crear frecuencia
-            frecuencia = FrecuenciaServicio(
-                tipo=TipoFrecuencia.DIARIO,
-                cantidad=1,
-                dias=[],
-                descripcion=ruta_data['frecuencia']
-            )
-            
-            # Crear modelo de ruta
-            ruta_create = RutaCreate(
-                codigoRuta=ruta_data['codigoRuta'],
-                nombre=f"{ruta_data['origen']} - {ruta_data['destino']}",  # Nombre descriptivo de la ruta
-                origen=origen_embebido,
-                destino=destino_embebido,
-                itinerario=[],  # Por ahora vacío, se puede mejorar después
-                empresa=empresa_embebida,
-                resolucion=resolucion_embebida,
-                frecuencia=frecuencia,
-                horarios=[],
-                tipoRuta=TipoRuta(ruta_data.get('tipoRuta', 'INTERREGIONAL')),
-                tipoServicio=TipoServicio(ruta_data.get('tipoServicio', 'PASAJEROS')),
-                distancia=ruta_data.get('distancia'),
-                tiempoEstimado=ruta_data.get('tiempoEstimado'),
-                tarifaBase=ruta_data.get('tarifaBase'),
-                capacidadMaxima=ruta_data.get('capacidadMaxima'),
-                restricciones=[],
-                observaciones=ruta_data.get('observaciones'),
-                descripcion=ruta_data['itinerario']  # El itinerario va en descripción
-            )
-            
-            # Usar el servicio de rutas para crear
-            ruta_service = RutaService(self.db)
-            print(f"🔍 DEBUG: Llamando a ruta_service.create_ruta...")
-            resultado = await ruta_service.create_ruta(ruta_create)
-            print(f"🔍 DEBUG: Ruta creada exitosamente con ID: {resultado.id}")
-            return resultado
-            
-        except Exception as e:
-            print(f"❌ ERROR en _crear_ruta_desde_datos: {str(e)}")
-            print(f"❌ ERROR tipo: {type(e)}")
-            import traceback
-            print(f"❌ ERROR traceback: {traceback.format_exc()}")
-            raise e
+        """Procesar carga masiva de rutas desde Excel (solo crear rutas nuevas)"""
+        return await self.procesar_carga_masiva_con_modo(archivo_excel, modo="crear")
     
     def _detectar_tipo_localidad(self, nombre_localidad: str) -> str:
         """
@@ -370,45 +232,66 @@ class RutaExcelService:
         else:
             return "LOCALIDAD"
 
-    async def _buscar_o_crear_localidad(self, nombre_localidad: str) -> Dict[str, Any]:
-        """Buscar localidad existente o crear nueva con departamento PUNO por defecto"""
-        # Primero buscar localidad existente
-        localidad_existente = await self.localidades_collection.find_one({
-            "nombre": {"$regex": f"^{nombre_localidad}$", "$options": "i"},
-            "estaActiva": True
-        })
+    async def _resolver_localidades(self, nombres: set) -> Dict[str, Dict[str, Any]]:
+        """
+        Resolver en lote las localidades por nombre, creando las que falten
+        con departamento PUNO por defecto.
         
-        if localidad_existente:
-            return localidad_existente
-        
-        # Detectar tipo automáticamente basado en el prefijo del nombre
-        tipo_localidad = self._detectar_tipo_localidad(nombre_localidad)
-        print(f"🏘️ TIPO DETECTADO: {nombre_localidad} -> {tipo_localidad}")
-        
-        # Si no existe, crear nueva localidad con departamento PUNO por defecto
-        nueva_localidad = {
-            "_id": ObjectId(),
-            "nombre": nombre_localidad.upper(),
-            "tipo": tipo_localidad,
-            "departamento": "PUNO",
-            "provincia": None,
-            "distrito": None,
-            "ubigeo": None,
-            "coordenadas": {
-                "latitud": None,
-                "longitud": None
-            },
-            "estaActiva": True,
-            "fechaRegistro": datetime.utcnow(),
-            "fechaActualizacion": datetime.utcnow(),
-            "creadoPorCargaMasiva": True,
-            "observaciones": f"Localidad creada automáticamente durante carga masiva de rutas. Tipo detectado: {tipo_localidad}"
-        }
+        La búsqueda no distingue mayúsculas (collation de fuerza 2), igual que
+        la búsqueda por regex anclada que se hacía fila por fila.
+        
+        Returns:
+            Diccionario {NOMBRE EN MAYÚSCULAS: documento de localidad}
+        """
+        nombres = {nombre.strip() for nombre in nombres if nombre and nombre.strip()}
+        if not nombres:
+            return {}
+        
+        localidades: Dict[str, Dict[str, Any]] = {}
+        cursor = self.localidades_collection.find(
+            {"nombre": {"$in": list(nombres)}, "estaActiva": True},
+            PROYECCION_LOCALIDAD,
+            collation={"locale": "es", "strength": 2}
+        )
+        async for localidad in cursor:
+            localidades.setdefault(localidad["nombre"].upper(), localidad)
+        
+        nuevas = []
+        for nombre in sorted(nombres):
+            clave = nombre.upper()
+            if clave in localidades:
+                continue
+            
+            # Detectar tipo automáticamente basado en el prefijo del nombre
+            tipo_localidad = self._detectar_tipo_localidad(nombre)
+            nueva_localidad = {
+                "_id": ObjectId(),
+                "nombre": clave,
+                "tipo": tipo_localidad,
+                "departamento": "PUNO",
+                "provincia": None,
+                "distrito": None,
+                "ubigeo": None,
+                "coordenadas": {
+                    "latitud": None,
+                    "longitud": None
+                },
+                "estaActiva": True,
+                "fechaRegistro": datetime.utcnow(),
+                "fechaActualizacion": datetime.utcnow(),
+                "creadoPorCargaMasiva": True,
+                "observaciones": f"Localidad creada automáticamente durante carga masiva de rutas. Tipo detectado: {tipo_localidad}"
+            }
+            localidades[clave] = nueva_localidad
+            nuevas.append(con_campos_busqueda("localidades", nueva_localidad))
         
-        # Insertar la nueva localidad
-        await self.localidades_collection.insert_one(nueva_localidad)
+        if nuevas:
+            await self.localidades_collection.insert_many(nuevas, ordered=False)
+            get_localidad_alias_index().invalidar()
+            print(f"🏘️ Localidades creadas en carga masiva: {len(nuevas)}")
         
-        return nueva_localidad
+        return localidades
+    
     
     async def validar_archivo_excel(self, archivo_excel: BytesIO) -> Dict[str, Any]:
         """Validar archivo Excel de rutas"""
@@ -492,87 +375,13 @@ class RutaExcelService:
                 'rutas_validas': []
             }
             
-            # ✅ AGREGAR SEGUIMIENTO DE CÓDIGOS POR RESOLUCIÓN
-            codigos_por_resolucion = {}  # {resolucion_normalizada: {codigo_normalizado: fila_num}}
+            # Validación por columnas (sin iterar fila por fila)
+            self._validar_dataframe(df, resultados)
             
-            for index, row in df.iterrows():
-                fila_num = index + 2  # +2 porque Excel empieza en 1 y tiene header
-                
-                print(f"DEBUG: Procesando fila {fila_num}: {dict(row)}")
-                
-                errores_fila = []
-                advertencias_fila = []
-                
-                # Validar fila
-                try:
-                    errores_fila, advertencias_fila = self._validar_fila_ruta(row, fila_num)
-                except Exception as e:
-                    errores_fila = [f"Error en validación: {str(e)}"]
-                
-                # ✅ VALIDAR CÓDIGOS ÚNICOS POR RESOLUCIÓN EN EL EXCEL
-                if not errores_fila:  # Solo si no hay errores básicos
-                    try:
-                        # Obtener datos normalizados
-                        resolucion_raw = str(row.get('Resolución', '')).strip() if pd.notna(row.get('Resolución')) else ''
-                        codigo_raw = str(row.get('Código Ruta', '')).strip() if pd.notna(row.get('Código Ruta')) else ''
-                        
-                        if resolucion_raw and codigo_raw:
-                            resolucion_normalizada = self._normalizar_resolucion(resolucion_raw)
-                            codigo_normalizado = self._normalizar_codigo_ruta(codigo_raw)
-                            
-                            if resolucion_normalizada and codigo_normalizado:
-                                # Verificar si ya existe este código en esta resolución
-                                if resolucion_normalizada not in codigos_por_resolucion:
-                                    codigos_por_resolucion[resolucion_normalizada] = {}
-                                
-                                if codigo_normalizado in codigos_por_resolucion[resolucion_normalizada]:
-                                    fila_anterior = codigos_por_resolucion[resolucion_normalizada][codigo_normalizado]
-                                    errores_fila.append(f"Código de ruta {codigo_normalizado} duplicado en resolución {resolucion_normalizada} (ya usado en fila {fila_anterior})")
-                                else:
-                                    codigos_por_resolucion[resolucion_normalizada][codigo_normalizado] = fila_num
-                    except Exception as e:
-                        advertencias_fila.append(f"No se pudo validar unicidad de código: {str(e)}")
-                
-                if errores_fila:
-                    resultados['invalidos'] += 1
-                    codigo_ruta = str(row.get('Código Ruta', 'N/A')).strip()
-                    resultados['errores'].append({
-                        'fila': fila_num,
-                        'codigo_ruta': codigo_ruta,
-                        'errores': errores_fila
-                    })
-                else:
-                    if advertencias_fila:
-                        resultados['con_advertencias'] += 1
-                        codigo_ruta = str(row.get('Código Ruta', 'N/A')).strip()
-                        resultados['advertencias'].append({
-                            'fila': fila_num,
-                            'codigo_ruta': codigo_ruta,
-                            'advertencias': advertencias_fila
-                        })
-                    
-                    resultados['validos'] += 1
-                    # Convertir fila a modelo de ruta
-                    try:
-                        ruta = self._convertir_fila_a_ruta(row)
-                        resultados['rutas_validas'].append(ruta)
-                    except Exception as e:
-                        print(f"DEBUG: Error al convertir fila {fila_num}: {str(e)}")
-                        resultados['validos'] -= 1
-                        resultados['invalidos'] += 1
-                        codigo_ruta = str(row.get('Código Ruta', 'N/A')).strip()
-                        resultados['errores'].append({
-                            'fila': fila_num,
-                            'codigo_ruta': codigo_ruta,
-                            'errores': [f"Error al procesar ruta: {str(e)}"]
-                        })
-            
-            # ✅ AGREGAR RESUMEN DE CÓDIGOS POR RESOLUCIÓN
-            print(f"DEBUG: Códigos por resolución encontrados: {codigos_por_resolucion}")
-            
-            print(f"DEBUG: Resultados finales: {resultados}")
+            print(f"DEBUG: Resultados finales: {resultados['validos']} válidos, {resultados['invalidos']} inválidos")
             return resultados
             
+            
         except Exception as e:
             print(f"DEBUG: Error general en validación: {str(e)}")
             import traceback
@@ -588,134 +397,6 @@ class RutaExcelService:
                 'rutas_validas': []
             }
     
-    def _validar_fila_ruta(self, row: pd.Series, fila_num: int) -> Tuple[List[str], List[str]]:
-        """Validar una fila de ruta"""
-        errores = []
-        advertencias = []
-        
-        # Verificar si es una fila con guiones (ruta cancelada)
-        es_ruta_cancelada = self._es_fila_con_guiones(row)
-        
-        # Obtener datos básicos
-        ruc = str(row.get('RUC', '')).strip() if pd.notna(row.get('RUC')) else ''
-        resolucion = str(row.get('Resolución', '')).strip() if pd.notna(row.get('Resolución')) else ''
-        
-        # Validar RUC (requerido)
-        if not ruc:
-            errores.append("RUC es requerido")
-        elif not self._validar_formato_ruc(ruc):
-            errores.append(f"Formato de RUC inválido: {ruc}")
-        
-        # Validar Resolución (requerido)
-        if not resolucion:
-            errores.append("Resolución es requerida")
-        
-        # Validar código de ruta (requerido)
-        codigo_ruta = str(row.get('Código Ruta', '')).strip() if pd.notna(row.get('Código Ruta')) else ''
-        if not codigo_ruta:
-            errores.append("Código de ruta es requerido")
-        elif not self._validar_formato_codigo_ruta(codigo_ruta):
-            errores.append(f"Formato de código de ruta inválido: {codigo_ruta} (debe ser numérico de 1-3 dígitos)")
-        
-        if es_ruta_cancelada:
-            # Para rutas canceladas, solo validar campos básicos y marcar como cancelada
-            advertencias.append("Ruta detectada como CANCELADA (contiene guiones)")
-            
-            # Validar que al menos origen o destino no sean guiones
-            origen = str(row.get('Origen', '')).strip() if pd.notna(row.get('Origen')) else ''
-            destino = str(row.get('Destino', '')).strip() if pd.notna(row.get('Destino')) else ''
-            
-            if origen == '-' and destino == '-':
-                errores.append("Al menos origen o destino debe estar especificado (no ambos pueden ser guiones)")
-        else:
-            # Verificar si el estado indica que es una ruta inactiva/cancelada
-            estado_temp = str(row.get('Estado', 'ACTIVA')).strip().upper() if pd.notna(row.get('Estado')) else 'ACTIVA'
-            es_estado_inactivo = estado_temp in ['INACTIVA', 'CANCELADA']
-            
-            if es_estado_inactivo:
-                # Para rutas con estado INACTIVA/CANCELADA, ser más flexible con validaciones
-                advertencias.append(f"Ruta con estado {estado_temp} - validaciones relajadas")
-                
-                # Validar origen (más flexible para rutas inactivas)
-                origen = str(row.get('Origen', '')).strip() if pd.notna(row.get('Origen')) else ''
-                if not origen:
-                    advertencias.append("Origen no especificado para ruta inactiva")
-                
-                # Validar destino (más flexible para rutas inactivas)
-                destino = str(row.get('Destino', '')).strip() if pd.notna(row.get('Destino')) else ''
-                if not destino:
-                    advertencias.append("Destino no especificado para ruta inactiva")
-                elif origen == destino:
-                    advertencias.append("Origen y destino son iguales")
-                
-                # Validar frecuencia (más flexible para rutas inactivas)
-                frecuencia = str(row.get('Frecuencia', '')).strip() if pd.notna(row.get('Frecuencia')) else ''
-                if not frecuencia:
-                    advertencias.append("Frecuencia no especificada para ruta inactiva")
-            else:
-                # Validación normal para rutas activas
-                # Validar origen (requerido)
-                origen = str(row.get('Origen', '')).strip() if pd.notna(row.get('Origen')) else ''
-                if not origen:
-                    errores.append("Origen es requerido")
-                
-                # Validar destino (requerido)
-                destino = str(row.get('Destino', '')).strip() if pd.notna(row.get('Destino')) else ''
-                if not destino:
-                    errores.append("Destino es requerido")
-                elif origen == destino:
-                    advertencias.append("Origen y destino son iguales")
-                
-                # Validar frecuencia (requerido)
-                frecuencia = str(row.get('Frecuencia', '')).strip() if pd.notna(row.get('Frecuencia')) else ''
-                if not frecuencia:
-                    errores.append("Frecuencia es requerida")
-        
-        # Validar itinerario (opcional)
-        itinerario = str(row.get('Itinerario', '')).strip() if pd.notna(row.get('Itinerario')) else ''
-        if not itinerario:
-            if es_ruta_cancelada:
-                advertencias.append("Itinerario no especificado para ruta cancelada, se usará 'RUTA CANCELADA'")
-            else:
-                advertencias.append("Itinerario no especificado, se usará 'SIN ITINERARIO'")
-        
-        # Validar campos opcionales - Solo usar por defecto si está vacío
-        tipo_ruta_raw = str(row.get('Tipo Ruta', '')).strip().upper() if pd.notna(row.get('Tipo Ruta')) else ''
-        tipo_ruta = tipo_ruta_raw if tipo_ruta_raw else 'INTERREGIONAL'  # Solo por defecto si está vacío
-        
-        if tipo_ruta and tipo_ruta not in [e.value for e in TipoRuta]:
-            errores.append(f"Tipo de ruta inválido: {tipo_ruta}. Valores válidos: {', '.join([e.value for e in TipoRuta])}")
-        
-        tipo_servicio = str(row.get('Tipo Servicio', 'PASAJEROS')).strip().upper() if pd.notna(row.get('Tipo Servicio')) else 'PASAJEROS'
-        if tipo_servicio and tipo_servicio not in [e.value for e in TipoServicio]:
-            errores.append(f"Tipo de servicio inválido: {tipo_servicio}. Valores válidos: {', '.join([e.value for e in TipoServicio])}")
-        
-        estado = str(row.get('Estado', 'ACTIVA')).strip().upper() if pd.notna(row.get('Estado')) else 'ACTIVA'
-        # Normalizar CANCELADA a INACTIVA
-        if estado == 'CANCELADA':
-            estado = 'INACTIVA'
-            advertencias.append("Estado 'CANCELADA' normalizado a 'INACTIVA'")
-        
-        if estado and estado not in [e.value for e in EstadoRuta]:
-            errores.append(f"Estado inválido: {estado}. Valores válidos: {', '.join([e.value for e in EstadoRuta])}")
-        
-        # Validar campos numéricos opcionales
-        distancia = row.get('Distancia')
-        if pd.notna(distancia) and distancia != '':
-            try:
-                float(distancia)
-            except:
-                errores.append(f"Distancia debe ser un número: {distancia}")
-        
-        tarifa = row.get('Tarifa Base')
-        if pd.notna(tarifa) and tarifa != '':
-            try:
-                float(tarifa)
-            except:
-                errores.append(f"Tarifa base debe ser un número: {tarifa}")
-        
-        return errores, advertencias
-    
     def _validar_formato_ruc(self, ruc: str) -> bool:
         """Validar formato de RUC: 11 dígitos"""
         return ruc.isdigit() and len(ruc) == 11
@@ -774,33 +455,6 @@ class RutaExcelService:
         # Si no coincide con ningún patrón, devolver tal como está
         return resolucion
     
-    def _es_fila_con_guiones(self, row: pd.Series) -> bool:
-        """Detectar si una fila contiene guiones indicando ruta cancelada"""
-        # Verificar si los campos principales contienen solo guiones
-        origen = str(row.get('Origen', '')).strip() if pd.notna(row.get('Origen')) else ''
-        destino = str(row.get('Destino', '')).strip() if pd.notna(row.get('Destino')) else ''
-        frecuencia = str(row.get('Frecuencia', '')).strip() if pd.notna(row.get('Frecuencia')) else ''
-        
-        # Si origen, destino o frecuencia son solo guiones, es una ruta cancelada
-        return origen == '-' or destino == '-' or frecuencia == '-'
-    
-    def _normalizar_campo_con_guion(self, valor: str, campo_nombre: str) -> str:
-        """Normalizar campos que contienen guiones"""
-        # ✅ PROTECCIÓN CONTRA VALORES NULOS
-        if valor is None:
-            valor = ''
-        else:
-            valor = str(valor).strip() if pd.notna(valor) else ''
-            
-        if valor == '-':
-            if campo_nombre in ['origen', 'destino']:
-                return 'SIN ESPECIFICAR'
-            elif campo_nombre == 'frecuencia':
-                return 'CANCELADA'
-            elif campo_nombre == 'itinerario':
-                return 'RUTA CANCELADA'
-        
-        return valor
     def _validar_formato_codigo_ruta(self, codigo: str) -> bool:
         """Validar formato de código de ruta: debe ser numérico para normalizar a 2 dígitos"""
         # Limpiar el código primero
@@ -844,456 +498,503 @@ class RutaExcelService:
             return f"{numero:02d}"  # Formato con 2 dígitos, rellenando con 0 si es necesario
         return codigo
     
-    def _convertir_fila_a_ruta(self, row: pd.Series) -> Dict[str, Any]:
-        """Convertir fila de Excel a datos de ruta"""
-        
-        # Verificar si es una ruta cancelada
-        es_ruta_cancelada = self._es_fila_con_guiones(row)
-        
-        # Datos básicos - VALIDAR QUE NO ESTÉN VACÍOS
-        ruc_raw = row.get('RUC', '')
-        resolucion_raw = row.get('Resolución', '')
-        codigo_raw = row.get('Código Ruta', '')
-        
-        # Convertir a string y limpiar, manejando números flotantes
-        ruc = str(ruc_raw).strip() if pd.notna(ruc_raw) else ''
-        resolucion = str(resolucion_raw).strip() if pd.notna(resolucion_raw) else ''
-        codigo_ruta = str(codigo_raw).strip() if pd.notna(codigo_raw) else ''
-        
-        # Limpiar valores que pandas convierte a 'nan' string
-        if ruc in ['nan', 'None']:
-            ruc = ''
-        if resolucion in ['nan', 'None']:
-            resolucion = ''
-        if codigo_ruta in ['nan', 'None']:
-            codigo_ruta = ''
-        
-        # ✅ VALIDACIÓN OBLIGATORIA - NO CREAR RUTAS CON DATOS VACÍOS
-        if not ruc:
-            raise ValueError("RUC es obligatorio y no puede estar vacío")
-        if not resolucion:
-            raise ValueError("Resolución es obligatoria y no puede estar vacía")
-        if not codigo_ruta:
-            raise ValueError("Código de ruta es obligatorio y no puede estar vacío")
-        
-        # Normalizar campos que pueden tener guiones
-        origen = self._normalizar_campo_con_guion(row.get('Origen', ''), 'origen')
-        destino = self._normalizar_campo_con_guion(row.get('Destino', ''), 'destino')
-        frecuencia = self._normalizar_campo_con_guion(row.get('Frecuencia', ''), 'frecuencia')
-        
-        # ✅ VALIDAR CAMPOS OBLIGATORIOS ADICIONALES
-        if not origen or origen == 'nan':
-            raise ValueError("Origen es obligatorio y no puede estar vacío")
-        if not destino or destino == 'nan':
-            raise ValueError("Destino es obligatorio y no puede estar vacío")
-        if not frecuencia or frecuencia == 'nan':
-            raise ValueError("Frecuencia es obligatoria y no puede estar vacía")
-        
-        itinerario_excel = self._normalizar_campo_con_guion(row.get('Itinerario', ''), 'itinerario') if pd.notna(row.get('Itinerario')) else ''
-        
-        # Campos opcionales - Solo usar por defecto si están vacíos
-        tipo_ruta_raw = str(row.get('Tipo Ruta', '')).strip().upper() if pd.notna(row.get('Tipo Ruta')) else ''
-        tipo_ruta = tipo_ruta_raw if tipo_ruta_raw else 'INTERREGIONAL'  # Solo por defecto si está vacío
-        
-        tipo_servicio = str(row.get('Tipo Servicio', 'PASAJEROS')).strip().upper() if pd.notna(row.get('Tipo Servicio')) else 'PASAJEROS'
-        estado = str(row.get('Estado', 'ACTIVA')).strip().upper() if pd.notna(row.get('Estado')) else 'ACTIVA'
-        
-        # Si es ruta cancelada, forzar estado a INACTIVA
-        if es_ruta_cancelada:
-            estado = 'INACTIVA'
-        
-        # Normalizar CANCELADA a INACTIVA
-        if estado == 'CANCELADA':
-            estado = 'INACTIVA'
-        
-        tiempo_estimado = str(row.get('Tiempo Estimado', '')).strip() if pd.notna(row.get('Tiempo Estimado')) else None
-        observaciones = str(row.get('Observaciones', '')).strip() if pd.notna(row.get('Observaciones')) else None
-        
-        # Agregar observación para rutas canceladas
-        if es_ruta_cancelada:
-            obs_cancelada = "Ruta cancelada (importada con guiones)"
-            if observaciones:
-                observaciones = f"{obs_cancelada}. {observaciones}"
-            else:
-                observaciones = obs_cancelada
-        
-        # Campos numéricos
-        distancia = None
-        if pd.notna(row.get('Distancia')) and row.get('Distancia') != '':
-            try:
-                distancia = float(row.get('Distancia'))
-            except:
-                pass
-        
-        tarifa_base = None
-        if pd.notna(row.get('Tarifa Base')) and row.get('Tarifa Base') != '':
-            try:
-                tarifa_base = float(row.get('Tarifa Base'))
-            except:
-                pass
-        
-        # Normalizar resolución y código de ruta
-        resolucion_normalizada = self._normalizar_resolucion(resolucion)
-        codigo_normalizado = self._normalizar_codigo_ruta(codigo_ruta)
-        
-        # Crear nombre de ruta - Manejar itinerarios vacíos
-        if es_ruta_cancelada and not itinerario_excel:
-            itinerario = "RUTA CANCELADA"
-        elif itinerario_excel and itinerario_excel.strip():
-            itinerario = itinerario_excel
-        else:
-            # Si itinerario está vacío, usar "SIN ITINERARIO"
-            itinerario = "SIN ITINERARIO"
-        
-        return {
-            'ruc': ruc,
-            'resolucionNormalizada': resolucion_normalizada,
-            'codigoRuta': codigo_normalizado,
-            'origen': origen,
-            'destino': destino,
-            'itinerario': itinerario,
-            'frecuencia': frecuencia,
-            'tipoRuta': tipo_ruta,
-            'tipoServicio': tipo_servicio,
-            'estado': estado,
-            'distancia': distancia,
-            'tiempoEstimado': tiempo_estimado,
-            'tarifaBase': tarifa_base,
-            'observaciones': observaciones,
-            'esCancelada': es_ruta_cancelada
-        }
-        if estado == 'CANCELADA':
-            estado = 'INACTIVA'
+    @staticmethod
+    def _columna_texto(df: pd.DataFrame, columna: str) -> pd.Series:
+        """Columna como texto sin espacios; vacío si no existe o es nula"""
+        if columna not in df.columns:
+            return pd.Series("", index=df.index, dtype=object)
+        serie = df[columna]
+        texto = serie.astype(str).str.strip().astype(object)
+        texto = texto.where(serie.notna(), "")
+        return texto.mask(texto.isin(["nan", "None"]), "")
+    
+    @staticmethod
+    def _sin_decimal_cero(texto: pd.Series) -> pd.Series:
+        """Quitar el '.0' que pandas agrega a enteros leídos como float"""
+        return texto.str.replace(r"^(\d+)\.0$", r"\1", regex=True)
+    
+    @staticmethod
+    def _columna_numerica(df: pd.DataFrame, columna: str) -> Tuple[pd.Series, pd.Series]:
+        """Devolver (valores numéricos, máscara de valores no numéricos)"""
+        if columna not in df.columns:
+            vacia = pd.Series(float("nan"), index=df.index)
+            return vacia, pd.Series(False, index=df.index)
+        serie = df[columna]
+        numeros = pd.to_numeric(serie, errors="coerce")
+        informada = serie.notna() & (serie.astype(str).str.strip() != "")
+        return numeros, informada & numeros.isna()
+    
+    def _validar_dataframe(self, df: pd.DataFrame, resultados: Dict[str, Any]) -> None:
+        """
+        Validar todas las filas del Excel con operaciones por columna.
         
-        tiempo_estimado = str(row.get('Tiempo Estimado', '')).strip() if pd.notna(row.get('Tiempo Estimado')) else None
-        observaciones = str(row.get('Observaciones', '')).strip() if pd.notna(row.get('Observaciones')) else None
+        Aplica las mismas reglas que la validación fila por fila: campos
+        requeridos, formatos, rutas canceladas (con guiones), validaciones
+        relajadas para rutas inactivas y códigos duplicados por resolución.
+        Llena `resultados` con errores, advertencias y rutas válidas.
+        """
+        fila = pd.Series(df.index + 2, index=df.index)  # +2: Excel empieza en 1 y tiene header
+        
+        ruc = self._sin_decimal_cero(self._columna_texto(df, 'RUC'))
+        resolucion = self._columna_texto(df, 'Resolución')
+        codigo = self._sin_decimal_cero(self._columna_texto(df, 'Código Ruta'))
+        origen = self._columna_texto(df, 'Origen')
+        destino = self._columna_texto(df, 'Destino')
+        frecuencia = self._columna_texto(df, 'Frecuencia')
+        itinerario = self._columna_texto(df, 'Itinerario')
+        
+        tipo_ruta = self._columna_texto(df, 'Tipo Ruta').str.upper()
+        tipo_ruta = tipo_ruta.mask(tipo_ruta == "", "INTERREGIONAL")
+        tipo_servicio = self._columna_texto(df, 'Tipo Servicio').str.upper()
+        tipo_servicio = tipo_servicio.mask(tipo_servicio == "", "PASAJEROS")
+        estado = self._columna_texto(df, 'Estado').str.upper()
+        estado = estado.mask(estado == "", "ACTIVA")
+        
+        distancia, distancia_invalida = self._columna_numerica(df, 'Distancia')
+        tarifa, tarifa_invalida = self._columna_numerica(df, 'Tarifa Base')
+        
+        # Rutas canceladas (guiones) e inactivas tienen validaciones relajadas
+        es_cancelada = (origen == '-') | (destino == '-') | (frecuencia == '-')
+        relajada = ~es_cancelada & estado.isin(['INACTIVA', 'CANCELADA'])
+        activa = ~es_cancelada & ~relajada
+        estado_normalizado = estado.mask(estado == 'CANCELADA', 'INACTIVA')
+        
+        tipos_ruta = [e.value for e in TipoRuta]
+        tipos_servicio = [e.value for e in TipoServicio]
+        estados = [e.value for e in EstadoRuta]
+        
+        chequeos_error = [
+            (ruc == "", "RUC es requerido"),
+            ((ruc != "") & ~ruc.str.fullmatch(r"\d{11}"), "Formato de RUC inválido: " + ruc),
+            (resolucion == "", "Resolución es requerida"),
+            (codigo == "", "Código de ruta es requerido"),
+            ((codigo != "") & ~codigo.str.fullmatch(r"\d{1,3}"),
+             "Formato de código de ruta inválido: " + codigo + " (debe ser numérico de 1-3 dígitos)"),
+            (es_cancelada & (origen == '-') & (destino == '-'),
+             "Al menos origen o destino debe estar especificado (no ambos pueden ser guiones)"),
+            (activa & (origen == ""), "Origen es requerido"),
+            (activa & (destino == ""), "Destino es requerido"),
+            (activa & (frecuencia == ""), "Frecuencia es requerida"),
+            (~tipo_ruta.isin(tipos_ruta),
+             "Tipo de ruta inválido: " + tipo_ruta + f". Valores válidos: {', '.join(tipos_ruta)}"),
+            (~tipo_servicio.isin(tipos_servicio),
+             "Tipo de servicio inválido: " + tipo_servicio + f". Valores válidos: {', '.join(tipos_servicio)}"),
+            (~estado_normalizado.isin(estados),
+             "Estado inválido: " + estado_normalizado + f". Valores válidos: {', '.join(estados)}"),
+            (distancia_invalida, "Distancia debe ser un número: " + self._columna_texto(df, 'Distancia')),
+            (tarifa_invalida, "Tarifa base debe ser un número: " + self._columna_texto(df, 'Tarifa Base')),
+        ]
+        chequeos_advertencia = [
+            (es_cancelada, "Ruta detectada como CANCELADA (contiene guiones)"),
+            (relajada, "Ruta con estado " + estado + " - validaciones relajadas"),
+            (relajada & (origen == ""), "Origen no especificado para ruta inactiva"),
+            (relajada & (destino == ""), "Destino no especificado para ruta inactiva"),
+            (~es_cancelada & (destino != "") & (origen == destino), "Origen y destino son iguales"),
+            (relajada & (frecuencia == ""), "Frecuencia no especificada para ruta inactiva"),
+            (es_cancelada & (itinerario == ""),
+             "Itinerario no especificado para ruta cancelada, se usará 'RUTA CANCELADA'"),
+            (~es_cancelada & (itinerario == ""), "Itinerario no especificado, se usará 'SIN ITINERARIO'"),
+            (estado == 'CANCELADA', "Estado 'CANCELADA' normalizado a 'INACTIVA'"),
+        ]
+        
+        errores = self._acumular_mensajes(chequeos_error)
+        sin_errores = ~df.index.isin(list(errores))
+        
+        # Códigos únicos por resolución dentro del Excel (se conserva la primera fila)
+        resolucion_normalizada = resolucion.map({r: self._normalizar_resolucion(r) for r in resolucion.unique()})
+        codigo_normalizado = codigo.map({c: self._normalizar_codigo_ruta(c) for c in codigo.unique()})
+        claves = pd.DataFrame({
+            'resolucion': resolucion_normalizada, 'codigo': codigo_normalizado, 'fila': fila
+        })[sin_errores]
+        primera_fila = claves.groupby(['resolucion', 'codigo'])['fila'].transform('first')
+        duplicada = pd.Series(False, index=df.index)
+        duplicada[claves.index] = claves.duplicated(['resolucion', 'codigo'], keep='first')
+        mensaje_duplicado = pd.Series("", index=df.index, dtype=object)
+        mensaje_duplicado[claves.index] = (
+            "Código de ruta " + claves['codigo'] + " duplicado en resolución " + claves['resolucion']
+            + " (ya usado en fila " + primera_fila.astype(str) + ")"
+        )
         
-        # Agregar observación para rutas canceladas
-        if es_ruta_cancelada:
-            obs_cancelada = "Ruta cancelada (importada con guiones)"
-            if observaciones:
-                observaciones = f"{obs_cancelada}. {observaciones}"
-            else:
-                observaciones = obs_cancelada
+        # Normalizar campos con guiones (rutas canceladas)
+        origen_final = origen.mask(origen == '-', 'SIN ESPECIFICAR')
+        destino_final = destino.mask(destino == '-', 'SIN ESPECIFICAR')
+        frecuencia_final = frecuencia.mask(frecuencia == '-', 'CANCELADA')
+        itinerario_final = itinerario.mask(itinerario == '-', 'RUTA CANCELADA')
+        itinerario_final = itinerario_final.mask(
+            itinerario_final == "", np.where(es_cancelada, 'RUTA CANCELADA', 'SIN ITINERARIO')
+        )
         
-        # Campos numéricos
-        distancia = None
-        if pd.notna(row.get('Distancia')) and row.get('Distancia') != '':
-            try:
-                distancia = float(row.get('Distancia'))
-            except:
-                pass
+        # Campos obligatorios para crear la ruta (también en rutas inactivas)
+        conversion = pd.Series(
+            np.select(
+                [origen_final == "", destino_final == "", frecuencia_final == ""],
+                [
+                    "Error al procesar ruta: Origen es obligatorio y no puede estar vacío",
+                    "Error al procesar ruta: Destino es obligatorio y no puede estar vacío",
+                    "Error al procesar ruta: Frecuencia es obligatoria y no puede estar vacía"
+                ],
+                default=""
+            ),
+            index=df.index
+        )
         
-        tarifa_base = None
-        if pd.notna(row.get('Tarifa Base')) and row.get('Tarifa Base') != '':
-            try:
-                tarifa_base = float(row.get('Tarifa Base'))
-            except:
-                pass
+        for indice, mensajes in self._acumular_mensajes([
+            (duplicada, mensaje_duplicado),
+            (sin_errores & ~duplicada & (conversion != ""), conversion),
+        ]).items():
+            errores.setdefault(indice, []).extend(mensajes)
         
-        # Normalizar resolución y código de ruta
-        resolucion_normalizada = self._normalizar_resolucion(resolucion)
-        codigo_normalizado = self._normalizar_codigo_ruta(codigo_ruta)
+        valida = ~df.index.isin(list(errores))
+        advertencias = self._acumular_mensajes(
+            [(mascara & valida, mensaje) for mascara, mensaje in chequeos_advertencia]
+        )
         
-        # Crear nombre de ruta - Manejar itinerarios vacíos
-        if es_ruta_cancelada and not itinerario_excel:
-            itinerario = "RUTA CANCELADA"
-        elif itinerario_excel and itinerario_excel.strip():
-            itinerario = itinerario_excel
-        else:
-            # Si itinerario está vacío, usar "SIN ITINERARIO"
-            itinerario = "SIN ITINERARIO"
+        observaciones = self._columna_texto(df, 'Observaciones')
+        obs_cancelada = "Ruta cancelada (importada con guiones)"
+        observaciones = observaciones.mask(
+            es_cancelada,
+            np.where(observaciones != "", obs_cancelada + ". " + observaciones, obs_cancelada)
+        )
+        tiempo_estimado = self._columna_texto(df, 'Tiempo Estimado')
         
-        return {
+        rutas = pd.DataFrame({
+            'fila': fila,
             'ruc': ruc,
             'resolucionNormalizada': resolucion_normalizada,
             'codigoRuta': codigo_normalizado,
-            'origen': origen,
-            'destino': destino,
-            'itinerario': itinerario,
-            'frecuencia': frecuencia,
+            'origen': origen_final,
+            'destino': destino_final,
+            'itinerario': itinerario_final,
+            'frecuencia': frecuencia_final,
             'tipoRuta': tipo_ruta,
             'tipoServicio': tipo_servicio,
-            'estado': estado,
+            'estado': estado_normalizado.mask(es_cancelada, 'INACTIVA'),
             'distancia': distancia,
-            'tiempoEstimado': tiempo_estimado,
-            'tarifaBase': tarifa_base,
-            'observaciones': observaciones,
-            'esCancelada': es_ruta_cancelada
-        }
-  
-  # ========================================
-    # MÉTODOS PARA MODO UPSERT
-    # ========================================
+            'tiempoEstimado': tiempo_estimado.mask(tiempo_estimado == "", None),
+            'tarifaBase': tarifa,
+            'observaciones': observaciones.mask(observaciones == "", None),
+            'esCancelada': es_cancelada
+        })[valida].astype(object)
+        rutas = rutas.where(rutas.notna(), None)
+        
+        codigo_original = self._columna_texto(df, 'Código Ruta')
+        codigo_original = codigo_original.mask(codigo_original == "", 'N/A')
+        
+        resultados['invalidos'] = len(errores)
+        resultados['validos'] = len(rutas)
+        resultados['con_advertencias'] = len(advertencias)
+        resultados['errores'] = [
+            {'fila': int(fila[indice]), 'codigo_ruta': codigo_original[indice], 'errores': errores[indice]}
+            for indice in df.index if indice in errores
+        ]
+        resultados['advertencias'] = [
+            {'fila': int(fila[indice]), 'codigo_ruta': codigo_original[indice], 'advertencias': advertencias[indice]}
+            for indice in df.index if indice in advertencias
+        ]
+        resultados['rutas_validas'] = rutas.to_dict('records')
     
-    async def _buscar_ruta_existente(
-        self, 
-        ruc: str, 
-        numero_resolucion: str, 
-        codigo_ruta: str
-    ) -> Optional[Dict]:
+    @staticmethod
+    def _acumular_mensajes(chequeos: List[Tuple[pd.Series, Any]]) -> Dict[Any, List[str]]:
         """
-        Buscar ruta existente por la clave única:
-        RUC + Resolución + Código de Ruta
+        Agrupar mensajes por fila a partir de (máscara, mensaje) en orden.
         
-        Args:
-            ruc: RUC de la empresa
-            numero_resolucion: Número de resolución normalizado
-            codigo_ruta: Código de ruta normalizado
-            
-        Returns:
-            Documento de ruta si existe, None si no existe
+        El mensaje puede ser un texto fijo o una Series con un texto por fila.
         """
-        try:
-            # Buscar empresa por RUC
-            empresa = await self.empresas_collection.find_one({
-                "ruc": ruc,
-                "estaActivo": True
-            })
-            
-            if not empresa:
-                print(f"🔍 UPSERT: Empresa con RUC {ruc} no encontrada")
-                return None
-            
-            # Buscar resolución por número
-            resolucion = await self.resoluciones_collection.find_one({
-                "nroResolucion": numero_resolucion,
-                "tipoResolucion": "PADRE",
-                "estado": "VIGENTE"
-            })
-            
-            if not resolucion:
-                print(f"🔍 UPSERT: Resolución {numero_resolucion} no encontrada")
-                return None
-            
-            # Buscar ruta por código, empresa y resolución
-            ruta = await self.rutas_collection.find_one({
-                "codigoRuta": codigo_ruta,
-                "empresa.id": str(empresa["_id"]),
-                "resolucion.id": str(resolucion["_id"])
-            })
-            
-            if ruta:
-                print(f"✅ UPSERT: Ruta encontrada - Código: {codigo_ruta}, ID: {ruta.get('_id')}")
+        mensajes: Dict[Any, List[str]] = {}
+        for mascara, mensaje in chequeos:
+            seleccion = mascara[mascara.fillna(False).astype(bool)].index
+            if isinstance(mensaje, str):
+                for indice in seleccion:
+                    mensajes.setdefault(indice, []).append(mensaje)
             else:
-                print(f"🔍 UPSERT: Ruta no encontrada - Código: {codigo_ruta}")
-            
-            return ruta
-            
-        except Exception as e:
-            print(f"❌ ERROR en _buscar_ruta_existente: {str(e)}")
-            return None
+                for indice, texto in mensaje[seleccion].items():
+                    mensajes.setdefault(indice, []).append(texto)
+        return mensajes
     
-    async def _upsert_ruta_desde_datos(
-        self, 
-        ruta_data: Dict[str, Any]
-    ) -> Dict[str, Any]:
+    
+    # ========================================
+    # PROCESAMIENTO EN LOTE (CREAR / ACTUALIZAR / UPSERT)
+    # ========================================
+    
+    @staticmethod
+    def _localidad_embebida(localidad: Dict[str, Any]) -> Dict[str, Any]:
+        """Datos de la localidad que se embeben en la ruta"""
+        return LocalidadEmbebida(
+            id=str(localidad["_id"]),
+            nombre=localidad["nombre"],
+            tipo=localidad.get("tipo"),
+            ubigeo=localidad.get("ubigeo"),
+            departamento=localidad.get("departamento"),
+            provincia=localidad.get("provincia"),
+            distrito=localidad.get("distrito"),
+            coordenadas=localidad.get("coordenadas")
+        ).model_dump()
+    
+    @staticmethod
+    def _razon_social_principal(empresa: Dict[str, Any]) -> str:
+        razon_social = empresa.get('razonSocial')
+        if isinstance(razon_social, dict):
+            return razon_social.get('principal', 'Sin razón social')
+        return str(razon_social) if razon_social else "Sin razón social"
+    
+    async def _prefetch_referencias(self, rutas: List[Dict[str, Any]]) -> Dict[str, Dict]:
         """
-        Crear o actualizar ruta según exista o no (UPSERT)
-        
-        Args:
-            ruta_data: Datos de la ruta del Excel
-            
-        Returns:
-            {
-                'accion': 'creada' | 'actualizada',
-                'ruta': Ruta,
-                'cambios': List[str]
-            }
+        Cargar con una consulta $in por colección todo lo que la carga necesita:
+        empresas por RUC, resoluciones por número, localidades por nombre y
+        rutas existentes por (empresa, resolución, código).
         """
-        try:
-            # Buscar ruta existente por clave única
-            ruta_existente = await self._buscar_ruta_existente(
-                ruc=ruta_data['ruc'],
-                numero_resolucion=ruta_data['resolucionNormalizada'],
-                codigo_ruta=ruta_data['codigoRuta']
-            )
-            
-            if ruta_existente:
-                # ACTUALIZAR ruta existente
-                print(f"🔄 UPSERT: Actualizando ruta existente - Código: {ruta_data['codigoRuta']}")
-                
-                # Preparar datos de actualización
-                ruta_update = await self._preparar_datos_actualizacion(
-                    ruta_data, 
-                    ruta_existente
-                )
-                
-                # Actualizar en la base de datos
-                from app.services.ruta_service import RutaService
-                from app.models.ruta import RutaUpdate
-                
-                ruta_service = RutaService(self.db)
-                ruta_actualizada = await ruta_service.update_ruta(
-                    str(ruta_existente["_id"]),
-                    ruta_update
+        rucs = list({ruta['ruc'] for ruta in rutas})
+        numeros = list({ruta['resolucionNormalizada'] for ruta in rutas})
+        
+        empresas = {}
+        async for empresa in self.empresas_collection.find(
+            {"ruc": {"$in": rucs}, "estaActivo": True},
+            {"ruc": 1, "razonSocial": 1}
+        ):
+            empresas.setdefault(empresa["ruc"], empresa)
+        
+        resoluciones = {}
+        async for resolucion in self.resoluciones_collection.find(
+            {
+                "nroResolucion": {"$in": numeros},
+                "tipoResolucion": "PADRE",
+                "estado": "VIGENTE",
+                "estaActivo": True
+            },
+            {"nroResolucion": 1, "tipoResolucion": 1, "estado": 1}
+        ):
+            resoluciones.setdefault(resolucion["nroResolucion"], resolucion)
+        
+        localidades = await self._resolver_localidades(
+            {ruta['origen'] for ruta in rutas} | {ruta['destino'] for ruta in rutas}
+        )
+        
+        existentes = {}
+        resolucion_ids = [str(r["_id"]) for r in resoluciones.values()]
+        if resolucion_ids:
+            async for ruta in self.rutas_collection.find(
+                {
+                    "resolucion.id": {"$in": resolucion_ids},
+                    "codigoRuta": {"$in": list({ruta['codigoRuta'] for ruta in rutas})},
+                    "estaActivo": True
+                },
+                PROYECCION_RUTA_EXISTENTE
+            ):
+                clave = (
+                    (ruta.get("empresa") or {}).get("id"),
+                    (ruta.get("resolucion") or {}).get("id"),
+                    ruta.get("codigoRuta")
                 )
-                
-                # Detectar qué campos cambiaron
-                cambios = self._detectar_cambios(ruta_existente, ruta_update)
-                
-                print(f"✅ UPSERT: Ruta actualizada - Cambios: {len(cambios)}")
-                
-                return {
-                    'accion': 'actualizada',
-                    'ruta': ruta_actualizada,
-                    'cambios': cambios
-                }
-            else:
-                # CREAR ruta nueva
-                print(f"✨ UPSERT: Creando ruta nueva - Código: {ruta_data['codigoRuta']}")
-                
-                ruta_creada = await self._crear_ruta_desde_datos(ruta_data)
-                
-                return {
-                    'accion': 'creada',
-                    'ruta': ruta_creada,
-                    'cambios': []
-                }
-                
-        except Exception as e:
-            print(f"❌ ERROR en _upsert_ruta_desde_datos: {str(e)}")
-            raise e
+                existentes.setdefault(clave, ruta)
+        
+        return {
+            'empresas': empresas,
+            'resoluciones': resoluciones,
+            'localidades': localidades,
+            'existentes': existentes
+        }
     
-    async def _preparar_datos_actualizacion(
+    def _preparar_operacion(
         self,
         ruta_data: Dict[str, Any],
-        ruta_existente: Dict[str, Any]
-    ):
+        modo: str,
+        referencias: Dict[str, Dict]
+    ) -> Dict[str, Any]:
         """
-        Preparar objeto RutaUpdate con los nuevos datos
+        Construir la operación de escritura de una fila válida del Excel.
         
-        Args:
-            ruta_data: Datos nuevos del Excel
-            ruta_existente: Ruta existente en la BD
-            
-        Returns:
-            RutaUpdate con los datos a actualizar
+        Raises:
+            ValueError: Si la fila no puede procesarse en el modo indicado
         """
-        from app.models.ruta import RutaUpdate
-        
-        # Buscar o crear localidades
-        origen_localidad = await self._buscar_o_crear_localidad(ruta_data['origen'])
-        destino_localidad = await self._buscar_o_crear_localidad(ruta_data['destino'])
-        
-        # Crear objetos embebidos
-        origen_embebido = LocalidadEmbebida(
-            id=str(origen_localidad["_id"]),
-            nombre=origen_localidad["nombre"]
-        )
+        empresa = referencias['empresas'].get(ruta_data['ruc'])
+        if not empresa:
+            raise ValueError(f"Empresa con RUC {ruta_data['ruc']} no encontrada o inactiva")
         
-        destino_embebido = LocalidadEmbebida(
-            id=str(destino_localidad["_id"]),
-            nombre=destino_localidad["nombre"]
-        )
+        resolucion = referencias['resoluciones'].get(ruta_data['resolucionNormalizada'])
+        if not resolucion:
+            raise ValueError(
+                f"Resolución {ruta_data['resolucionNormalizada']} no encontrada, no es PADRE o no está VIGENTE"
+            )
         
-        # Crear frecuencia
-        frecuencia = FrecuenciaServicio(
-            tipo=TipoFrecuencia.DIARIO,
-            cantidad=1,
-            dias=[],
-            descripcion=ruta_data['frecuencia']
-        )
+        origen = referencias['localidades'][ruta_data['origen'].strip().upper()]
+        destino = referencias['localidades'][ruta_data['destino'].strip().upper()]
+        if origen["_id"] == destino["_id"]:
+            raise ValueError("El origen y destino no pueden ser la misma localidad")
+        
+        clave = (str(empresa["_id"]), str(resolucion["_id"]), ruta_data['codigoRuta'])
+        existente = referencias['existentes'].get(clave)
+        if existente and modo == "crear":
+            raise ValueError(f"Ya existe una ruta con código {ruta_data['codigoRuta']} en esta resolución")
+        if not existente and modo == "actualizar":
+            raise ValueError(f"No existe una ruta con código {ruta_data['codigoRuta']} en esta resolución")
+        
+        ahora = datetime.utcnow()
+        campos_set = {
+            "nombre": f"{ruta_data['origen']} - {ruta_data['destino']}",
+            "origen": self._localidad_embebida(origen),
+            "destino": self._localidad_embebida(destino),
+            "frecuencia": FrecuenciaServicio(
+                tipo=TipoFrecuencia.DIARIO,
+                cantidad=1,
+                dias=[],
+                descripcion=ruta_data['frecuencia']
+            ).model_dump(),
+            "tipoRuta": ruta_data['tipoRuta'],
+            "tipoServicio": ruta_data['tipoServicio'],
+            "distancia": ruta_data.get('distancia'),
+            "tiempoEstimado": ruta_data.get('tiempoEstimado'),
+            "tarifaBase": ruta_data.get('tarifaBase'),
+            "observaciones": ruta_data.get('observaciones'),
+            "descripcion": ruta_data['itinerario'],  # El itinerario va en descripción
+            "fechaActualizacion": ahora
+        }
+        campos_set["nivelTerritorial"] = calcular_nivel_territorial({
+            **campos_set,
+            "itinerario": (existente or {}).get("itinerario") or []
+        })
+        campos_set[CAMPO_BUSQUEDA] = campos_busqueda("rutas", {**campos_set, "codigoRuta": ruta_data['codigoRuta']})
+        campos_insercion = {
+            "codigoRuta": ruta_data['codigoRuta'],
+            "itinerario": [],
+            "empresa": EmpresaEmbebida(
+                id=str(empresa["_id"]),
+                ruc=empresa["ruc"],
+                razonSocial=self._razon_social_principal(empresa)
+            ).model_dump(),
+            "resolucion": ResolucionEmbebida(
+                id=str(resolucion["_id"]),
+                nroResolucion=resolucion["nroResolucion"],
+                tipoResolucion=resolucion["tipoResolucion"],
+                estado=resolucion["estado"]
+            ).model_dump(),
+            "horarios": [],
+            "capacidadMaxima": None,
+            "restricciones": [],
+            "fechaRegistro": ahora,
+            "estaActivo": True,
+            "estado": ruta_data['estado']
+        }
         
-        # Crear objeto de actualización
-        ruta_update = RutaUpdate(
-            nombre=f"{ruta_data['origen']} - {ruta_data['destino']}",
-            origen=origen_embebido,
-            destino=destino_embebido,
-            frecuencia=frecuencia,
-            tipoRuta=TipoRuta(ruta_data.get('tipoRuta', 'INTERREGIONAL')) if ruta_data.get('tipoRuta') else None,
-            tipoServicio=TipoServicio(ruta_data.get('tipoServicio', 'PASAJEROS')) if ruta_data.get('tipoServicio') else None,
-            distancia=ruta_data.get('distancia'),
-            tiempoEstimado=ruta_data.get('tiempoEstimado'),
-            tarifaBase=ruta_data.get('tarifaBase'),
-            observaciones=ruta_data.get('observaciones'),
-            descripcion=ruta_data.get('itinerario', 'SIN ITINERARIO')
-        )
+        return {
+            'fila': ruta_data.get('fila'),
+            'clave': clave,
+            'existente': existente,
+            'ruta_data': ruta_data,
+            'campos_set': campos_set,
+            'operacion': UpdateOne(
+                {"empresa.id": clave[0], "resolucion.id": clave[1], "codigoRuta": clave[2], "estaActivo": True},
+                {"$set": campos_set, "$setOnInsert": campos_insercion},
+                upsert=True
+            )
+        }
+    
+    async def _escribir_lote(self, lote: List[Dict[str, Any]]) -> Tuple[Dict[int, str], Dict[int, str]]:
+        """
+        Ejecutar un lote con bulk_write no ordenado.
         
-        return ruta_update
+        Returns:
+            ({índice en el lote: id de ruta creada}, {índice en el lote: error})
+        """
+        try:
+            resultado = await self.rutas_collection.bulk_write(
+                [item['operacion'] for item in lote], ordered=False
+            )
+            upserted = {indice: str(_id) for indice, _id in (resultado.upserted_ids or {}).items()}
+            return upserted, {}
+        except BulkWriteError as e:
+            detalles = e.details or {}
+            upserted = {item['index']: str(item['_id']) for item in detalles.get('upserted', [])}
+            errores = {item['index']: item.get('errmsg', 'Error de escritura') for item in detalles.get('writeErrors', [])}
+            return upserted, errores
+    
+    async def _vincular_rutas_creadas(self, creadas: List[Tuple[str, str, str]]) -> None:
+        """Agregar en lote las rutas nuevas a rutasAutorizadasIds de empresas y resoluciones"""
+        por_empresa: Dict[str, List[str]] = {}
+        por_resolucion: Dict[str, List[str]] = {}
+        for ruta_id, empresa_id, resolucion_id in creadas:
+            por_empresa.setdefault(empresa_id, []).append(ruta_id)
+            por_resolucion.setdefault(resolucion_id, []).append(ruta_id)
+        
+        ahora = datetime.utcnow()
+        for coleccion, agrupadas in (
+            (self.empresas_collection, por_empresa),
+            (self.resoluciones_collection, por_resolucion)
+        ):
+            operaciones = [
+                UpdateOne(
+                    {"_id": ObjectId(documento_id)},
+                    {
+                        "$addToSet": {"rutasAutorizadasIds": {"$each": ids}},
+                        "$set": {"fechaActualizacion": ahora}
+                    }
+                )
+                for documento_id, ids in agrupadas.items()
+            ]
+            if operaciones:
+                await coleccion.bulk_write(operaciones, ordered=False)
     
     def _detectar_cambios(
         self,
         ruta_anterior: Dict[str, Any],
-        ruta_nueva
+        campos_nuevos: Dict[str, Any]
     ) -> List[str]:
         """
         Detectar qué campos cambiaron entre la ruta anterior y la nueva
         
         Args:
             ruta_anterior: Ruta existente en la BD
-            ruta_nueva: RutaUpdate con los nuevos datos
+            campos_nuevos: Campos del $set que se aplicará
             
         Returns:
             Lista de descripciones de cambios
         """
         cambios = []
         
-        try:
-            # Comparar origen
-            if ruta_nueva.origen:
-                origen_anterior = ruta_anterior.get('origen', {}).get('nombre', '')
-                if ruta_nueva.origen.nombre != origen_anterior:
-                    cambios.append(f"Origen: {origen_anterior} → {ruta_nueva.origen.nombre}")
-            
-            # Comparar destino
-            if ruta_nueva.destino:
-                destino_anterior = ruta_anterior.get('destino', {}).get('nombre', '')
-                if ruta_nueva.destino.nombre != destino_anterior:
-                    cambios.append(f"Destino: {destino_anterior} → {ruta_nueva.destino.nombre}")
-            
-            # Comparar frecuencia
-            if ruta_nueva.frecuencia:
-                frecuencia_anterior = ruta_anterior.get('frecuencia', {}).get('descripcion', '')
-                if ruta_nueva.frecuencia.descripcion != frecuencia_anterior:
-                    cambios.append(f"Frecuencia: {frecuencia_anterior} → {ruta_nueva.frecuencia.descripcion}")
-            
-            # Comparar tipo de ruta
-            if ruta_nueva.tipoRuta:
-                tipo_anterior = ruta_anterior.get('tipoRuta', '')
-                if str(ruta_nueva.tipoRuta) != tipo_anterior:
-                    cambios.append(f"Tipo: {tipo_anterior} → {ruta_nueva.tipoRuta}")
-            
-            # Comparar tipo de servicio
-            if ruta_nueva.tipoServicio:
-                servicio_anterior = ruta_anterior.get('tipoServicio', '')
-                if str(ruta_nueva.tipoServicio) != servicio_anterior:
-                    cambios.append(f"Servicio: {servicio_anterior} → {ruta_nueva.tipoServicio}")
-            
-            # Comparar distancia
-            if ruta_nueva.distancia is not None:
-                distancia_anterior = ruta_anterior.get('distancia')
-                if distancia_anterior != ruta_nueva.distancia:
-                    cambios.append(f"Distancia: {distancia_anterior} km → {ruta_nueva.distancia} km")
-            
-            # Comparar observaciones
-            if ruta_nueva.observaciones:
-                obs_anterior = ruta_anterior.get('observaciones', '')
-                if ruta_nueva.observaciones != obs_anterior:
-                    cambios.append("Observaciones actualizadas")
-            
-            # Comparar descripción/itinerario
-            if ruta_nueva.descripcion:
-                desc_anterior = ruta_anterior.get('descripcion', '')
-                if ruta_nueva.descripcion != desc_anterior:
-                    cambios.append("Itinerario actualizado")
-            
-        except Exception as e:
-            print(f"⚠️ Error detectando cambios: {str(e)}")
+        for campo, etiqueta in (('origen', 'Origen'), ('destino', 'Destino')):
+            anterior = (ruta_anterior.get(campo) or {}).get('nombre', '')
+            if campos_nuevos[campo]['nombre'] != anterior:
+                cambios.append(f"{etiqueta}: {anterior} → {campos_nuevos[campo]['nombre']}")
+        
+        frecuencia_anterior = (ruta_anterior.get('frecuencia') or {}).get('descripcion', '')
+        if campos_nuevos['frecuencia']['descripcion'] != frecuencia_anterior:
+            cambios.append(f"Frecuencia: {frecuencia_anterior} → {campos_nuevos['frecuencia']['descripcion']}")
+        
+        if campos_nuevos['tipoRuta'] != ruta_anterior.get('tipoRuta', ''):
+            cambios.append(f"Tipo: {ruta_anterior.get('tipoRuta', '')} → {campos_nuevos['tipoRuta']}")
+        
+        if campos_nuevos['tipoServicio'] != ruta_anterior.get('tipoServicio', ''):
+            cambios.append(f"Servicio: {ruta_anterior.get('tipoServicio', '')} → {campos_nuevos['tipoServicio']}")
+        
+        if campos_nuevos['distancia'] is not None and campos_nuevos['distancia'] != ruta_anterior.get('distancia'):
+            cambios.append(f"Distancia: {ruta_anterior.get('distancia')} km → {campos_nuevos['distancia']} km")
+        
+        if campos_nuevos['observaciones'] and campos_nuevos['observaciones'] != ruta_anterior.get('observaciones', ''):
+            cambios.append("Observaciones actualizadas")
+        
+        if campos_nuevos['descripcion'] and campos_nuevos['descripcion'] != ruta_anterior.get('descripcion', ''):
+            cambios.append("Itinerario actualizado")
         
         return cambios
     
     async def procesar_carga_masiva_con_modo(
         self, 
         archivo_excel: BytesIO, 
-        modo: str = "crear"
+        modo: str = "crear",
+        tamano_lote: int = TAMANO_LOTE_CARGA,
+        on_progreso: Optional[Callable[[Dict[str, Any]], Any]] = None
     ) -> Dict[str, Any]:
         """
         Procesar carga masiva de rutas con modo específico
         
+        Las referencias (empresas, resoluciones, localidades y rutas
+        existentes) se cargan una sola vez con consultas $in y las rutas se
+        escriben con bulk_write no ordenado en lotes de `tamano_lote`.
+        
         Args:
             archivo_excel: Archivo Excel con las rutas
             modo: Modo de procesamiento ("crear", "actualizar", "upsert")
+            tamano_lote: Cantidad de rutas por bulk_write
+            on_progreso: Callback (síncrono o async) que recibe el avance de cada lote
             
         Returns:
             Resultados del procesamiento con estadísticas
@@ -1313,7 +1014,7 @@ class RutaExcelService:
                     'validacion': validacion
                 }
             
-            # Procesar rutas válidas
+            rutas_validas = validacion['rutas_validas']
             resultados = {
                 'modo': modo,
                 'total_procesadas': 0,
@@ -1324,56 +1025,84 @@ class RutaExcelService:
                 'rutas_creadas': [],
                 'rutas_actualizadas': [],
                 'errores_procesamiento': [],
+                'progreso': [],
                 'validacion': validacion
             }
             
-            for ruta_data in validacion['rutas_validas']:
-                print(f"🔍 Procesando ruta: RUC {ruta_data.get('ruc')}, Código {ruta_data.get('codigoRuta')}")
-                
+            referencias = await self._prefetch_referencias(rutas_validas)
+            
+            preparadas = []
+            for ruta_data in rutas_validas:
                 try:
-                    if modo == "upsert":
-                        # Modo UPSERT: Crear o actualizar
-                        resultado = await self._upsert_ruta_desde_datos(ruta_data)
-                        
-                        if resultado['accion'] == 'creada':
+                    preparadas.append(self._preparar_operacion(ruta_data, modo, referencias))
+                except ValueError as e:
+                    resultados['fallidas'] += 1
+                    resultados['errores_procesamiento'].append({
+                        'codigo_ruta': ruta_data.get('codigoRuta', 'N/A'),
+                        'error': str(e)
+                    })
+            
+            creadas_para_vincular = []
+            tamano_lote = max(1, tamano_lote)
+            total_lotes = (len(preparadas) + tamano_lote - 1) // tamano_lote
+            
+            try:
+                for numero_lote, inicio in enumerate(range(0, len(preparadas), tamano_lote), start=1):
+                    lote = preparadas[inicio:inicio + tamano_lote]
+                    upserted, errores = await self._escribir_lote(lote)
+                
+                    for indice, item in enumerate(lote):
+                        ruta_data = item['ruta_data']
+                        if indice in errores:
+                            resultados['fallidas'] += 1
+                            resultados['errores_procesamiento'].append({
+                                'codigo_ruta': ruta_data['codigoRuta'],
+                                'error': errores[indice]
+                            })
+                            continue
+                    
+                        resultados['exitosas'] += 1
+                        if indice in upserted:
                             resultados['creadas'] += 1
                             resultados['rutas_creadas'].append({
-                                'codigo': resultado['ruta'].codigoRuta,
-                                'nombre': resultado['ruta'].nombre,
-                                'id': resultado['ruta'].id
+                                'codigo': ruta_data['codigoRuta'],
+                                'nombre': item['campos_set']['nombre'],
+                                'id': upserted[indice]
                             })
+                            creadas_para_vincular.append((upserted[indice], item['clave'][0], item['clave'][1]))
                         else:
+                            existente = item['existente'] or {}
                             resultados['actualizadas'] += 1
                             resultados['rutas_actualizadas'].append({
-                                'codigo': resultado['ruta'].codigoRuta,
-                                'nombre': resultado['ruta'].nombre,
-                                'id': resultado['ruta'].id,
-                                'cambios': resultado['cambios']
+                                'codigo': ruta_data['codigoRuta'],
+                                'nombre': item['campos_set']['nombre'],
+                                'id': str(existente.get('_id', '')),
+                                'cambios': self._detectar_cambios(existente, item['campos_set'])
                             })
-                        
-                        resultados['exitosas'] += 1
-                        
-                    else:
-                        # Modo CREAR (comportamiento original)
-                        ruta_creada = await self._crear_ruta_desde_datos(ruta_data)
-                        
-                        resultados['exitosas'] += 1
-                        resultados['creadas'] += 1
-                        resultados['rutas_creadas'].append({
-                            'codigo': ruta_creada.codigoRuta,
-                            'nombre': ruta_creada.nombre,
-                            'id': ruta_creada.id
-                        })
-                    
-                except Exception as e:
-                    resultados['fallidas'] += 1
-                    resultados['errores_procesamiento'].append({
-                        'codigo_ruta': ruta_data.get('codigoRuta', 'N/A'),
-                        'error': str(e)
-                    })
-                    print(f"❌ ERROR: {str(e)}")
                 
-                resultados['total_procesadas'] += 1
+                    avance = {
+                        'lote': numero_lote,
+                        'total_lotes': total_lotes,
+                        'procesadas': min(inicio + len(lote), len(preparadas)),
+                        'total': len(preparadas),
+                        'creadas': resultados['creadas'],
+                        'actualizadas': resultados['actualizadas'],
+                        'fallidas': resultados['fallidas']
+                    }
+                    resultados['progreso'].append(avance)
+                    print(f"📦 Lote {numero_lote}/{total_lotes}: {avance['procesadas']}/{avance['total']} rutas")
+                    if on_progreso:
+                        retorno = on_progreso(avance)
+                        if inspect.isawaitable(retorno):
+                            await retorno
+            
+            finally:
+                # También si el trabajo se cancela entre lotes: lo ya escrito queda vinculado
+                await self._vincular_rutas_creadas(creadas_para_vincular)
+                if resultados['exitosas']:
+                    get_combinaciones_index().invalidar()
+            
+            resultados['total_procesadas'] = len(rutas_validas)
             
             return resultados
             
@@ -1390,3 +1119,89 @@ class RutaExcelService:
                 'rutas_actualizadas': [],
                 'errores_procesamiento': []
             }
+    
+    
+    # ========================================
+    # EXPORTACIÓN EN STREAMING
+    # ========================================
+
+    @staticmethod
+    def _fila_exportacion(ruta: Dict[str, Any]) -> List[Any]:
+        """Convertir un documento de ruta en una fila de exportación"""
+        def nombre(localidad: Any) -> str:
+            if isinstance(localidad, dict):
+                return localidad.get("nombre", "")
+            return str(localidad or "")
+
+        empresa = ruta.get("empresa") or {}
+        razon_social = empresa.get("razonSocial", "")
+        if isinstance(razon_social, dict):
+            razon_social = razon_social.get("principal", "")
+        itinerario = sorted(ruta.get("itinerario") or [], key=lambda loc: loc.get("orden", 0))
+
+        return [
+            empresa.get("ruc", ""),
+            razon_social,
+            (ruta.get("resolucion") or {}).get("nroResolucion", ""),
+            ruta.get("codigoRuta", ""),
+            ruta.get("nombre", ""),
+            nombre(ruta.get("origen") or ruta.get("origenId")),
+            nombre(ruta.get("destino") or ruta.get("destinoId")),
+            " - ".join(nombre(loc) for loc in itinerario),
+            (ruta.get("frecuencia") or {}).get("descripcion", ""),
+            ruta.get("tipoRuta", ""),
+            ruta.get("tipoServicio", ""),
+            ruta.get("estado", "")
+        ]
+
+    async def exportar_csv_stream(self, cursor, filas_por_bloque: int = 500) -> AsyncIterator[bytes]:
+        """
+        Generar un CSV a partir de un cursor de Motor, por bloques.
+
+        Solo se mantiene en memoria un bloque de filas a la vez.
+        """
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        # BOM para que Excel detecte UTF-8
+        buffer.write("\ufeff")
+        writer.writerow(COLUMNAS_EXPORTACION)
+
+        filas = 0
+        async for ruta in cursor:
+            writer.writerow(self._fila_exportacion(ruta))
+            filas += 1
+            if filas % filas_por_bloque == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    async def exportar_xlsx_stream(self, cursor) -> AsyncIterator[bytes]:
+        """
+        Generar un XLSX a partir de un cursor de Motor.
+
+        Usa un workbook write-only de openpyxl, que vuelca cada fila a disco,
+        y luego envía el archivo generado por bloques. La memoria usada no
+        depende de la cantidad de rutas.
+        """
+        workbook = Workbook(write_only=True)
+        hoja = workbook.create_sheet("Rutas")
+        hoja.append(COLUMNAS_EXPORTACION)
+
+        async for ruta in cursor:
+            hoja.append(self._fila_exportacion(ruta))
+
+        descriptor, ruta_archivo = tempfile.mkstemp(suffix=".xlsx")
+        os.close(descriptor)
+        try:
+            await asyncio.to_thread(workbook.save, ruta_archivo)
+            async with aiofiles.open(ruta_archivo, "rb") as archivo:
+                while True:
+                    bloque = await archivo.read(TAMANO_BLOQUE_ARCHIVO)
+                    if not bloque:
+                        break
+                    yield bloque
+        finally:
+            os.remove(ruta_archivo)
@@ -6,9 +6,33 @@ from datetime import datetime
 from bson import ObjectId
 from fastapi import HTTPException
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
 
 from app.models.ruta import Ruta, RutaCreate, RutaUpdate, EstadoRuta, LocalidadEmbebida, LocalidadItinerario
 from app.services.localidad_service import LocalidadService
+from app.services.ruta_combinaciones_index import get_combinaciones_index
+from app.services.nivel_territorial_service import calcular_nivel_territorial
+from app.utils.paginacion_cursor import CursorInvalido, PaginaCursor, paginar
+from app.utils.busqueda_normalizada import CAMPO_BUSQUEDA, campos_busqueda, con_campos_busqueda, filtro_contiene, indices_busqueda
+from app.core.indices import registrar_consulta, registrar_indices
+
+# Las rutas por empresa o resolución solo se consultan activas (índices parciales)
+registrar_indices(
+    "rutas",
+    IndexModel([("codigoRuta", ASCENDING), ("resolucionId", ASCENDING)], name="codigoRuta_resolucionId_activas",
+               partialFilterExpression={"estaActivo": True}),
+    IndexModel([("resolucion.empresa.id", ASCENDING), ("resolucion.id", ASCENDING)], name="resolucion_empresa_activas",
+               partialFilterExpression={"estaActivo": True}),
+    IndexModel([("resolucion.id", ASCENDING)], name="resolucion_id_activas", partialFilterExpression={"estaActivo": True}),
+    IndexModel([("origenId", ASCENDING), ("destinoId", ASCENDING)]),
+    IndexModel([("empresa.ruc", ASCENDING), ("codigoRuta", ASCENDING)]),
+    *indices_busqueda("codigoRuta")
+)
+registrar_consulta("rutas", "listado_activas", {"estaActivo": True}, [("_id", ASCENDING)])
+registrar_consulta("rutas", "por_empresa", {"resolucion.empresa.id": "x", "estaActivo": True})
+registrar_consulta("rutas", "por_resolucion", {"resolucion.id": "x", "estaActivo": True})
+registrar_consulta("rutas", "codigo_unico", {"codigoRuta": "01", "resolucionId": "x", "estaActivo": True})
+registrar_consulta("rutas", "buscar_nombre", {**filtro_contiene({"nombre": "puno - juliaca"}), "estaActivo": True})
 
 
 class RutaService:
@@ -357,6 +381,7 @@ class RutaService:
             ruta_dict["origen"] = origen_embebido.model_dump()
             ruta_dict["destino"] = destino_embebido.model_dump()
             ruta_dict["itinerario"] = [loc.model_dump() for loc in itinerario_validado]
+            ruta_dict["nivelTerritorial"] = calcular_nivel_territorial(ruta_dict)
             
             print(f"🔍 DEBUG RUTA_SERVICE: ruta_dict empresa después: {ruta_dict.get('empresa')}")
             
@@ -365,6 +390,7 @@ class RutaService:
             ruta_dict["fechaActualizacion"] = datetime.utcnow()
             ruta_dict["estaActivo"] = True
             ruta_dict["estado"] = EstadoRuta.ACTIVA
+            con_campos_busqueda("rutas", ruta_dict)
             
             # 6. Insertar ruta
             print(f"🔍 DEBUG RUTA_SERVICE: Insertando ruta en BD con empresa: {ruta_dict.get('empresa')}")
@@ -396,6 +422,7 @@ class RutaService:
             
             # 9. Obtener y retornar ruta creada
             ruta_creada = await self.rutas_collection.find_one({"_id": result.inserted_id})
+            get_combinaciones_index().registrar_ruta(ruta_creada)
             ruta_creada["id"] = str(ruta_creada.pop("_id"))
             
             return Ruta(**ruta_creada)
@@ -489,14 +516,25 @@ class RutaService:
         estado: Optional[str] = None
     ) -> List[Ruta]:
         """Obtener lista de rutas con filtros opcionales"""
+        pagina = await self.get_rutas_pagina(limit=limit, estado=estado, skip=skip)
+        return pagina.documentos
+
+    async def get_rutas_pagina(
+        self,
+        limit: int = 100,
+        estado: Optional[str] = None,
+        cursor: Optional[str] = None,
+        skip: int = 0
+    ) -> PaginaCursor:
+        """Página de rutas por cursor `(_id)`; lanza CursorInvalido si el cursor no es válido"""
         try:
             query = {"estaActivo": True}
             
             if estado:
                 query["estado"] = estado
             
-            cursor = self.rutas_collection.find(query).skip(skip).limit(limit)
-            rutas = await cursor.to_list(length=limit)
+            pagina = await paginar(self.rutas_collection, query, limit, cursor=cursor, skip=skip)
+            rutas = pagina.documentos
             
             # Convertir a formato esperado
             rutas_convertidas = []
@@ -558,8 +596,11 @@ class RutaService:
                 }
                 rutas_convertidas.append(ruta_dict)
             
-            return rutas_convertidas
+            pagina.documentos = rutas_convertidas
+            return pagina
             
+        except CursorInvalido:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500,
@@ -833,6 +874,7 @@ class RutaService:
             # Preparar actualización
             update_data = ruta_data.model_dump(exclude_unset=True)
             update_data["fechaActualizacion"] = datetime.utcnow()
+            update_data[CAMPO_BUSQUEDA] = campos_busqueda("rutas", {**ruta_actual, **update_data})
             
             # Actualizar ruta
             result = await self.rutas_collection.update_one(
@@ -849,6 +891,14 @@ class RutaService:
             # Retornar ruta actualizada (buscar sin filtro de estaActivo)
             ruta_actualizada = await self.rutas_collection.find_one({"_id": ObjectId(ruta_id)})
             if ruta_actualizada:
+                # Recalcular el nivel territorial si cambiaron las localidades
+                if {"origen", "destino", "itinerario"} & update_data.keys():
+                    ruta_actualizada["nivelTerritorial"] = calcular_nivel_territorial(ruta_actualizada)
+                    await self.rutas_collection.update_one(
+                        {"_id": ruta_actualizada["_id"]},
+                        {"$set": {"nivelTerritorial": ruta_actualizada["nivelTerritorial"]}}
+                    )
+                get_combinaciones_index().registrar_ruta(ruta_actualizada)
                 return await self._convert_ruta_to_model(ruta_actualizada)
             
             return None
@@ -916,6 +966,8 @@ class RutaService:
             )
             
             if result.modified_count > 0:
+                get_combinaciones_index().eliminar_ruta(ruta_id)
+                
                 # Remover de relaciones
                 ruta = await self.rutas_collection.find_one({"_id": ObjectId(ruta_id)})
                 
@@ -956,6 +1008,8 @@ class RutaService:
             )
             
             if resultado.deleted_count > 0:
+                get_combinaciones_index().eliminar_ruta(ruta_id)
+                
                 # Remover de relaciones si existían
                 if ruta and ruta.get("empresaId"):
                     await self.empresas_collection.update_one(
@@ -1080,10 +1134,7 @@ class RutaService:
             
             if filtros.get("estado"):
                 query["estado"] = filtros["estado"]
-            if filtros.get("codigo"):
-                query["codigoRuta"] = {"$regex": filtros["codigo"], "$options": "i"}
-            if filtros.get("nombre"):
-                query["nombre"] = {"$regex": filtros["nombre"], "$options": "i"}
+            query.update(filtro_contiene({"codigoRuta": filtros.get("codigo"), "nombre": filtros.get("nombre")}))
             if filtros.get("origen_id"):
                 query["origenId"] = filtros["origen_id"]
             if filtros.get("destino_id"):
@@ -1101,6 +1152,205 @@ class RutaService:
                 status_code=500,
                 detail=f"Error al obtener rutas con filtros: {str(e)}"
             )
+    
+    def _build_match_origen_destino(self, filtros: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Construir el $match del filtro avanzado.
+        
+        Cada filtro acepta el ID de la localidad o su nombre (ruta embebida),
+        y el campo legacy origenId/destinoId de rutas antiguas.
+        """
+        condiciones: List[Dict[str, Any]] = [{"estaActivo": True}]
+        
+        for campo in ("origen", "destino"):
+            valor = filtros.get(campo)
+            if not valor:
+                continue
+            condiciones.append({"$or": [
+                {f"{campo}.id": valor},
+                {f"{campo}.nombre": valor.strip().upper()},
+                {f"{campo}Id": valor}
+            ]})
+        
+        return condiciones[0] if len(condiciones) == 1 else {"$and": condiciones}
+    
+    def get_cursor_filtro_avanzado(self, filtros: Dict[str, Any], batch_size: int = 500):
+        """
+        Cursor de Motor con las rutas del filtro avanzado, para exportaciones.
+        
+        Proyecta solo los campos que se exportan y ordena por empresa y código,
+        de modo que los documentos se puedan procesar a medida que llegan.
+        """
+        proyeccion = {
+            "codigoRuta": 1, "nombre": 1, "origen.nombre": 1, "destino.nombre": 1,
+            "origenId": 1, "destinoId": 1, "itinerario.nombre": 1, "itinerario.orden": 1,
+            "empresa.ruc": 1, "empresa.razonSocial": 1, "resolucion.nroResolucion": 1,
+            "frecuencia.descripcion": 1, "tipoRuta": 1, "tipoServicio": 1, "estado": 1
+        }
+        return self.rutas_collection.find(
+            self._build_match_origen_destino(filtros), proyeccion
+        ).sort([("empresa.ruc", 1), ("codigoRuta", 1)]).batch_size(batch_size)
+    
+    @staticmethod
+    def _nombre_localidad(localidad: Any) -> str:
+        """Nombre legible de una localidad embebida o de un ID legacy"""
+        if isinstance(localidad, dict):
+            return localidad.get("nombre") or localidad.get("id") or ""
+        return str(localidad or "")
+    
+    async def get_reporte_origen_destino(
+        self,
+        filtros: Dict[str, Any],
+        incluir_empresas: bool = True,
+        incluir_estadisticas: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Reporte origen-destino agrupado por empresa en una sola agregación.
+        
+        Las rutas se agrupan por empresa en el servidor y los datos de cada
+        empresa se resuelven con $lookup (por _id y por el campo legacy id),
+        en lugar de un find_one por empresa. Las estadísticas se calculan en
+        la misma pasada sobre el resultado.
+        """
+        try:
+            ruta_resumen = {
+                "id": "$id",
+                "codigoRuta": "$codigoRuta",
+                "nombre": "$nombre",
+                "origen": "$origen",
+                "destino": "$destino",
+                "estado": "$estado",
+                "resolucionId": "$resolucionId"
+            }
+            pipeline: List[Dict[str, Any]] = [
+                {"$match": self._build_match_origen_destino(filtros)},
+                {"$project": {
+                    "_id": 0,
+                    "id": {"$toString": "$_id"},
+                    "codigoRuta": {"$ifNull": ["$codigoRuta", ""]},
+                    "nombre": {"$ifNull": ["$nombre", ""]},
+                    "origen": {"$ifNull": ["$origen", {"$ifNull": ["$origenId", ""]}]},
+                    "destino": {"$ifNull": ["$destino", {"$ifNull": ["$destinoId", ""]}]},
+                    "estado": {"$ifNull": ["$estado", ""]},
+                    "empresaId": {"$ifNull": ["$empresa.id", {"$ifNull": ["$empresaId", ""]}]},
+                    "resolucionId": {"$ifNull": ["$resolucion.id", {"$ifNull": ["$resolucionId", ""]}]}
+                }}
+            ]
+            
+            if incluir_empresas:
+                empresa_proyeccion = [{"$project": {"id": 1, "ruc": 1, "razonSocial": 1}}]
+                pipeline += [
+                    {"$group": {"_id": "$empresaId", "rutas": {"$push": ruta_resumen}}},
+                    {"$addFields": {"_oid": {"$convert": {
+                        "input": "$_id", "to": "objectId", "onError": None, "onNull": None
+                    }}}},
+                    {"$lookup": {
+                        "from": "empresas",
+                        "localField": "_oid",
+                        "foreignField": "_id",
+                        "pipeline": empresa_proyeccion,
+                        "as": "_por_oid"
+                    }},
+                    {"$lookup": {
+                        "from": "empresas",
+                        "localField": "_id",
+                        "foreignField": "id",
+                        "pipeline": empresa_proyeccion,
+                        "as": "_por_id"
+                    }},
+                    {"$project": {
+                        "rutas": 1,
+                        "empresa": {"$first": {"$concatArrays": ["$_por_oid", "$_por_id"]}}
+                    }},
+                    {"$sort": {"_id": 1}}
+                ]
+            
+            documentos = await self.rutas_collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+            
+            if incluir_empresas:
+                grupos = documentos
+                rutas = [ruta for grupo in grupos for ruta in grupo["rutas"]]
+            else:
+                grupos = []
+                rutas = documentos
+            
+            resultado: Dict[str, Any] = {
+                "filtros_aplicados": {
+                    "origen": filtros.get("origen"),
+                    "destino": filtros.get("destino")
+                },
+                "total_rutas": len(rutas),
+                "rutas": []
+            }
+            
+            if incluir_empresas:
+                resultado["empresas"] = []
+                for grupo in grupos:
+                    empresa_id = grupo["_id"]
+                    if not empresa_id:
+                        continue
+                    
+                    empresa = grupo.get("empresa")
+                    if empresa:
+                        razon_social = empresa.get("razonSocial") or {}
+                        if isinstance(razon_social, dict):
+                            razon_social = razon_social.get("principal", "Sin razón social")
+                        empresa_info = {
+                            "id": str(empresa.get("_id", empresa.get("id", ""))),
+                            "ruc": empresa.get("ruc", ""),
+                            "razonSocial": razon_social
+                        }
+                    else:
+                        empresa_info = {
+                            "id": empresa_id,
+                            "ruc": "No encontrado",
+                            "razonSocial": "Empresa no encontrada"
+                        }
+                    
+                    resultado["empresas"].append({
+                        "empresa": empresa_info,
+                        "total_rutas": len(grupo["rutas"]),
+                        "rutas": grupo["rutas"]
+                    })
+                
+                resultado["total_empresas"] = len(resultado["empresas"])
+            else:
+                resultado["rutas"] = rutas
+            
+            if incluir_estadisticas:
+                origenes_unicos = set()
+                destinos_unicos = set()
+                estados_rutas: Dict[str, int] = {}
+                
+                for ruta in rutas:
+                    origen_ruta = self._nombre_localidad(ruta.get("origen"))
+                    destino_ruta = self._nombre_localidad(ruta.get("destino"))
+                    estado_ruta = ruta.get("estado") or "DESCONOCIDO"
+                    
+                    if origen_ruta:
+                        origenes_unicos.add(origen_ruta)
+                    if destino_ruta:
+                        destinos_unicos.add(destino_ruta)
+                    
+                    estados_rutas[estado_ruta] = estados_rutas.get(estado_ruta, 0) + 1
+                
+                resultado["estadisticas"] = {
+                    "origenes_unicos": sorted(origenes_unicos),
+                    "destinos_unicos": sorted(destinos_unicos),
+                    "total_origenes": len(origenes_unicos),
+                    "total_destinos": len(destinos_unicos),
+                    "estados_rutas": estados_rutas,
+                    "cobertura_geografica": f"{len(origenes_unicos)} orígenes → {len(destinos_unicos)} destinos"
+                }
+            
+            return resultado
+            
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error en filtro avanzado: {str(e)}"
+            )
+
     async def get_origenes_destinos_unicos(self) -> Dict[str, List[str]]:
         """
         Obtener lista única de orígenes y destinos de todas las rutas
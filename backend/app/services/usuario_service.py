@@ -3,8 +3,15 @@ from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 import bcrypt
+from app.core.cache import invalidate_cache
 from app.models.usuario import UsuarioCreate, UsuarioUpdate, UsuarioInDB
 
+USUARIO_AUTH_CACHE_PREFIX = "usuario_auth"
+
+def usuario_auth_cache_key(usuario_id: str, jti: str) -> str:
+    """Clave de caché del usuario autenticado por (usuario, token)"""
+    return f"{USUARIO_AUTH_CACHE_PREFIX}:{usuario_id}:{jti}"
+
 class UsuarioService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
@@ -111,6 +118,7 @@ class UsuarioService:
             )
             
             if result.modified_count:
+                self._invalidar_cache_auth(usuario_id)
                 return await self.get_usuario_by_id(usuario_id)
         
         return None
@@ -121,8 +129,13 @@ class UsuarioService:
             {"_id": ObjectId(usuario_id)},
             {"$set": {"estaActivo": False, "fechaActualizacion": datetime.utcnow()}}
         )
+        self._invalidar_cache_auth(usuario_id)
         return result.modified_count > 0
 
+    def _invalidar_cache_auth(self, usuario_id: str) -> None:
+        """Descartar el usuario cacheado en todos sus tokens (cambio de datos, rol o estado)"""
+        invalidate_cache(usuario_auth_cache_key(usuario_id, "*"))
+
     async def authenticate_usuario(self, dni: str, password: str) -> Optional[UsuarioInDB]:
         """Autenticar usuario con DNI y contraseña"""
         usuario = await self.get_usuario_by_dni(dni)
@@ -1,5 +1,6 @@
 import pandas as pd
-from typing import List, Dict, Optional, Tuple
+import numpy as np
+from typing import List, Dict, Optional, Tuple, Callable, Awaitable
 from datetime import datetime
 import re
 from app.models.vehiculo import (
@@ -9,8 +10,49 @@ from app.models.vehiculo import (
 from app.services.vehiculo_service import VehiculoService
 from app.services.empresa_service import EmpresaService
 from app.services.resolucion_service import ResolucionService
+from app.schemas.vehiculo_solo_schemas import CategoriaVehiculo
 from app.services.ruta_service import RutaService
 
+MAPEO_CATEGORIAS = {
+    'M1': 'M1', 'M2': 'M2', 'M3': 'M3',
+    'AUTOMOVIL': 'M1', 'AUTO': 'M1',
+    'MICROBUS': 'M2', 'MICRO': 'M2',
+    'OMNIBUS': 'M3', 'BUS': 'M3'
+}
+
+TIPOS_COMBUSTIBLE = ['GASOLINA', 'DIESEL', 'GLP', 'GNV', 'ELECTRICO']
+
+MAPEO_COMBUSTIBLES = {
+    'GASOLINA': 'GASOLINA', 'GAS': 'GASOLINA',
+    'DIESEL': 'DIESEL', 'PETROLEO': 'DIESEL',
+    'GLP': 'GLP', 'GAS_LICUADO': 'GLP',
+    'GNV': 'GNV', 'GAS_NATURAL': 'GNV',
+    'ELECTRICO': 'ELECTRICO', 'ELECTRIC': 'ELECTRICO'
+}
+
+MAPEO_SEDES = {
+    'PUNO': 'PUNO', 'JULIACA': 'JULIACA',
+    'AZANGARO': 'AZANGARO', 'YUNGUYO': 'YUNGUYO'
+}
+
+# Rangos válidos de los campos numéricos: {columna: (mínimo, máximo)}
+CAMPOS_NUMERICOS = {
+    'Año Fabricación': (1900, 2030),
+    'Ejes': (1, 10),
+    'Asientos': (1, 100),
+    'Peso Neto (kg)': (100, 50000),
+    'Peso Bruto (kg)': (100, 100000),
+    'Carga Útil (kg)': (50, 50000),
+    'Largo (m)': (1, 30),
+    'Ancho (m)': (0.5, 5),
+    'Alto (m)': (0.5, 5)
+}
+
+CAMPOS_NUMERICOS_REQUERIDOS = ['Año Fabricación', 'Ejes', 'Asientos']
+
+# Cada cuántas filas se informa el avance en procesar_excel
+FILAS_POR_AVANCE = 100
+
 class VehiculoExcelService:
     """Servicio para procesar archivos Excel de vehículos"""
     
@@ -33,6 +75,11 @@ class VehiculoExcelService:
         self.auto_crear_resoluciones = False  # NO auto-crear resoluciones (requieren proceso formal)
         self.auto_crear_rutas = False  # NO auto-crear rutas (requieren autorización)
         
+        # Existencia en BD de placas, RUCs, resoluciones y rutas del último archivo validado
+        self._referencias: Dict[str, Dict[str, str]] = {
+            'placas': {}, 'empresas': {}, 'resoluciones': {}, 'rutas': {}
+        }
+        
         # Mapeo de columnas esperadas en Excel
         self.columnas_requeridas = {
             'placa': 'Placa',
@@ -206,8 +253,18 @@ class VehiculoExcelService:
         # Verificar que tenga 11 dígitos
         return len(ruc_normalizado) == 11 and ruc_normalizado.isdigit()
 
-    async def procesar_excel(self, archivo_path: str) -> VehiculoCargaMasivaResponse:
-        """Procesar archivo Excel y crear vehículos en lote"""
+    async def procesar_excel(
+        self,
+        archivo_path: str,
+        on_progreso: Optional[Callable[[int, int], Awaitable[None]]] = None
+    ) -> VehiculoCargaMasivaResponse:
+        """
+        Procesar archivo Excel y crear vehículos en lote
+        
+        Args:
+            archivo_path: Ruta del archivo Excel
+            on_progreso: Callback async (procesadas, total) cada FILAS_POR_AVANCE filas
+        """
         try:
             # Leer archivo Excel sin interpretar fechas automáticamente
             df = pd.read_excel(archivo_path, dtype=str)
@@ -224,45 +281,39 @@ class VehiculoExcelService:
                     errores_detalle=errores_estructura
                 )
             
-            # Procesar cada fila
+            # Validar todas las filas de una vez
+            validaciones = await self._validar_dataframe(df)
+            
+            # Procesar cada fila válida
             vehiculos_creados = []
             vehiculos_actualizados = []
             errores_detalle = []
             
-            for index, row in df.iterrows():
+            for (index, row), validacion in zip(df.iterrows(), validaciones):
+                if on_progreso and index % FILAS_POR_AVANCE == 0:
+                    await on_progreso(index, len(df))
+                
+                if not validacion.valido:
+                    errores_detalle.append({
+                        'fila': validacion.fila,
+                        'placa': validacion.placa,
+                        'errores': validacion.errores
+                    })
+                    continue
+                
                 try:
-                    # Validar datos de la fila
-                    validacion = await self._validar_fila(index + 2, row)  # +2 porque Excel empieza en 1 y tiene header
-                    
-                    if not validacion.valido:
-                        # Formatear errores con información de columnas
-                        errores_formateados = []
-                        for error in validacion.errores:
-                            if isinstance(error, dict):
-                                errores_formateados.append(f"Columna '{error['columna']}': {error['mensaje']} (valor: '{error['valor']}')")
-                            else:
-                                errores_formateados.append(str(error))
-                        
-                        errores_detalle.append({
-                            'fila': validacion.fila,
-                            'placa': validacion.placa,
-                            'errores': errores_formateados,
-                            'errores_detallados': validacion.errores  # Mantener formato estructurado para frontend
-                        })
-                        continue
-                    
-                    placa = str(row.get('Placa')).strip().upper()
-                    print(f"🔄 Procesando fila {index + 2}: {placa}")
+                    placa = validacion.placa
+                    print(f"🔄 Procesando fila {validacion.fila}: {placa}")
                     
-                    # Verificar si el vehículo ya existe
-                    print(f"🔍 Verificando si existe vehículo con placa: {placa}")
-                    vehiculo_existente = await self.vehiculo_service.get_vehiculo_by_placa(placa)
+                    # Solo se consulta el vehículo completo si la validación lo encontró
+                    vehiculo_existente = None
+                    if placa in self._referencias['placas']:
+                        vehiculo_existente = await self.vehiculo_service.get_vehiculo_by_placa(placa)
                     
                     if vehiculo_existente:
                         # ACTUALIZAR vehículo existente
                         print(f"🔄 Actualizando vehículo existente: {placa} (ID: {vehiculo_existente.id})")
                         vehiculo_update_data = self._convertir_fila_a_vehiculo_update(row, vehiculo_existente)
-                        print(f"📋 Datos de actualización: {vehiculo_update_data.model_dump(exclude_unset=True)}")
                         
                         vehiculo_actualizado = await self.vehiculo_service.update_vehiculo(vehiculo_existente.id, vehiculo_update_data)
                         vehiculos_actualizados.append(vehiculo_actualizado.id)
@@ -271,7 +322,6 @@ class VehiculoExcelService:
                         # CREAR nuevo vehículo
                         print(f"🆕 Creando nuevo vehículo: {placa}")
                         vehiculo_data = await self._convertir_fila_a_vehiculo_create(row)
-                        print(f"📋 Datos del nuevo vehículo: {vehiculo_data.model_dump()}")
                         
                         vehiculo_creado = await self.vehiculo_service.create_vehiculo(vehiculo_data)
                         vehiculos_creados.append(vehiculo_creado.id)
@@ -341,301 +391,243 @@ class VehiculoExcelService:
         
         return errores
 
-    async def _validar_fila(self, fila: int, row: pd.Series) -> VehiculoValidacionExcel:
-        """Validar datos de una fila específica con validaciones flexibles"""
-        errores = []
-        advertencias = []
-        
-        # Normalizar y validar placa
-        placa_raw = row.get('Placa', '')
-        placa_normalizada = self._normalizar_placa(placa_raw)
-        
-        if not placa_normalizada:
-            errores.append({
-                'columna': 'Placa',
-                'valor': placa_raw,
-                'mensaje': "Placa es requerida"
-            })
-        elif not self._validar_formato_placa_flexible(placa_raw):
-            errores.append({
-                'columna': 'Placa',
-                'valor': placa_raw,
-                'mensaje': f"Formato de placa inválido (se esperaba formato ABC-123)"
-            })
-        else:
-            # Verificar si la placa ya existe (usar la normalizada)
-            vehiculo_existente = await self.vehiculo_service.get_vehiculo_by_placa(placa_normalizada)
-            if vehiculo_existente:
-                advertencias.append({
-                    'columna': 'Placa',
-                    'valor': placa_raw,
-                    'mensaje': f"Ya existe un vehículo con placa {placa_normalizada} - se actualizará"
-                })
-        
-        # Normalizar y validar empresa por RUC
-        empresa_ruc_raw = row.get('RUC Empresa', '')
-        empresa_ruc_normalizado = self._normalizar_ruc(empresa_ruc_raw)
-        
-        if not empresa_ruc_normalizado:
-            errores.append({
-                'columna': 'RUC Empresa',
-                'valor': empresa_ruc_raw,
-                'mensaje': "RUC de empresa es requerido"
-            })
-        elif not self._validar_ruc_flexible(empresa_ruc_raw):
-            errores.append({
-                'columna': 'RUC Empresa',
-                'valor': empresa_ruc_raw,
-                'mensaje': f"RUC inválido (se esperaba 11 dígitos, se normalizó a: '{empresa_ruc_normalizado}')"
-            })
-        else:
-            # Buscar empresa con RUC normalizado
-            empresa = self._buscar_empresa_por_ruc(empresa_ruc_normalizado)
-            if not empresa:
-                if self.auto_crear_empresas:
-                    advertencias.append({
-                        'columna': 'RUC Empresa',
-                        'valor': empresa_ruc_raw,
-                        'mensaje': f"Empresa con RUC {empresa_ruc_normalizado} será creada automáticamente"
-                    })
-                else:
-                    errores.append({
-                        'columna': 'RUC Empresa',
-                        'valor': empresa_ruc_raw,
-                        'mensaje': f"No se encontró empresa con RUC {empresa_ruc_normalizado}"
-                    })
-        
-        # Validar categoría (más flexible)
-        categoria_raw = row.get('Categoría', '')
-        categoria_str = str(categoria_raw).strip().upper() if pd.notna(categoria_raw) else ''
-        
-        if not categoria_str:
-            advertencias.append({
-                'columna': 'Categoría',
-                'valor': categoria_raw,
-                'mensaje': "Categoría no especificada, se usará M1 por defecto"
-            })
-        elif categoria_str not in [cat.value for cat in CategoriaVehiculo]:
-            # Intentar mapear categorías comunes
-            mapeo_categorias = {
-                'M1': 'M1', 'M2': 'M2', 'M3': 'M3',
-                'AUTOMOVIL': 'M1', 'AUTO': 'M1',
-                'MICROBUS': 'M2', 'MICRO': 'M2',
-                'OMNIBUS': 'M3', 'BUS': 'M3'
-            }
-            categoria_mapeada = mapeo_categorias.get(categoria_str)
-            if categoria_mapeada:
-                advertencias.append({
-                    'columna': 'Categoría',
-                    'valor': categoria_raw,
-                    'mensaje': f"Categoría '{categoria_str}' mapeada a '{categoria_mapeada}'"
-                })
-            else:
-                errores.append({
-                    'columna': 'Categoría',
-                    'valor': categoria_raw,
-                    'mensaje': f"Categoría inválida (válidas: {[cat.value for cat in CategoriaVehiculo]})"
-                })
-        
-        # Validar tipo de combustible (más flexible)
-        tipo_combustible_raw = row.get('Tipo Combustible', '')
-        tipo_combustible_str = str(tipo_combustible_raw).strip().upper() if pd.notna(tipo_combustible_raw) else ''
-        
-        if not tipo_combustible_str:
-            advertencias.append({
-                'columna': 'Tipo Combustible',
-                'valor': tipo_combustible_raw,
-                'mensaje': "Tipo de combustible no especificado, se usará GASOLINA por defecto"
-            })
-        elif tipo_combustible_str not in ['GASOLINA', 'DIESEL', 'GLP', 'GNV', 'ELECTRICO']:
-            # Intentar mapear tipos comunes
-            mapeo_combustibles = {
-                'GASOLINA': 'GASOLINA', 'GAS': 'GASOLINA',
-                'DIESEL': 'DIESEL', 'PETROLEO': 'DIESEL',
-                'GLP': 'GLP', 'GAS_LICUADO': 'GLP',
-                'GNV': 'GNV', 'GAS_NATURAL': 'GNV',
-                'ELECTRICO': 'ELECTRICO', 'ELECTRIC': 'ELECTRICO'
-            }
-            combustible_mapeado = mapeo_combustibles.get(tipo_combustible_str)
-            if combustible_mapeado:
-                advertencias.append({
-                    'columna': 'Tipo Combustible',
-                    'valor': tipo_combustible_raw,
-                    'mensaje': f"Tipo de combustible '{tipo_combustible_str}' mapeado a '{combustible_mapeado}'"
-                })
-            else:
-                errores.append({
-                    'columna': 'Tipo Combustible',
-                    'valor': tipo_combustible_raw,
-                    'mensaje': f"Tipo de combustible inválido (válidos: GASOLINA, DIESEL, GLP, GNV, ELECTRICO)"
-                })
-        
-        # Validar sede de registro (más flexible)
-        sede_registro_raw = row.get('Sede de Registro', 'PUNO')
-        sede_registro_str = str(sede_registro_raw).strip().upper() if pd.notna(sede_registro_raw) else 'PUNO'
-        
-        if sede_registro_str and sede_registro_str not in [sede.value for sede in SedeRegistro]:
-            # Intentar mapear sedes comunes
-            mapeo_sedes = {
-                'PUNO': 'PUNO', 'JULIACA': 'JULIACA',
-                'AZANGARO': 'AZANGARO', 'YUNGUYO': 'YUNGUYO'
-            }
-            sede_mapeada = mapeo_sedes.get(sede_registro_str)
-            if sede_mapeada:
-                advertencias.append({
-                    'columna': 'Sede de Registro',
-                    'valor': sede_registro_raw,
-                    'mensaje': f"Sede '{sede_registro_str}' mapeada a '{sede_mapeada}'"
-                })
-            else:
-                advertencias.append({
-                    'columna': 'Sede de Registro',
-                    'valor': sede_registro_raw,
-                    'mensaje': f"Sede de registro '{sede_registro_str}' no reconocida, se usará PUNO por defecto"
-                })
-        
-        # Validar campos numéricos con más flexibilidad
-        campos_numericos = {
-            'Año Fabricación': (1900, 2030),
-            'Ejes': (1, 10),
-            'Asientos': (1, 100),
-            'Peso Neto (kg)': (100, 50000),
-            'Peso Bruto (kg)': (100, 100000),
-            'Carga Útil (kg)': (50, 50000),
-            'Largo (m)': (1, 30),
-            'Ancho (m)': (0.5, 5),
-            'Alto (m)': (0.5, 5)
+    # ========================================
+    # VALIDACIÓN POR COLUMNAS
+    # ========================================
+    
+    @staticmethod
+    def _columna(df: pd.DataFrame, columna: str) -> Tuple[pd.Series, pd.Series]:
+        """Devolver (texto sin espacios, máscara de celdas con valor) de una columna"""
+        if columna not in df.columns:
+            return pd.Series('', index=df.index, dtype=object), pd.Series(False, index=df.index)
+        serie = df[columna]
+        presente = serie.notna()
+        texto = serie.astype(str).str.strip().where(presente, '')
+        return texto, presente
+    
+    @staticmethod
+    def _normalizar_placas(texto: pd.Series) -> pd.Series:
+        """Versión por columnas de _normalizar_placa"""
+        return texto.str.upper().str.replace(r'^([A-Z]{2,3})(\d{3,4})$', r'\1-\2', regex=True)
+    
+    @staticmethod
+    def _normalizar_rucs(texto: pd.Series) -> pd.Series:
+        """Versión por columnas de _normalizar_ruc"""
+        ruc = texto.str.replace(r'[^\d]', '', regex=True)
+        
+        # Números flotantes como "20123456789.0"
+        con_punto = texto.str.contains('.', regex=False)
+        if con_punto.any():
+            numeros = pd.to_numeric(texto[con_punto], errors='coerce')
+            numeros = numeros[np.isfinite(numeros)]
+            ruc.loc[numeros.index] = numeros.astype('int64').astype(str)
+        
+        cortos = ruc.str.fullmatch(r'\d{1,10}')
+        return ruc.mask(cortos, ruc.str.zfill(11))
+    
+    @staticmethod
+    def _normalizar_resoluciones(texto: pd.Series) -> pd.Series:
+        """Versión por columnas de _normalizar_numero_resolucion"""
+        numero = texto.str.upper()
+        con_guion = numero.str.extract(r'(\d{4})-(\d{4})')
+        sin_guion = numero.str.extract(r'^(\d{4})(\d{4})$')
+        partes = con_guion.fillna(sin_guion)
+        normalizado = ('R-' + partes[0] + '-' + partes[1]).where(partes[0].notna(), numero)
+        return normalizado.mask(numero.str.fullmatch(r'R-\d{4}-\d{4}'), numero)
+    
+    async def _cargar_referencias(
+        self,
+        placas: pd.Series,
+        rucs: pd.Series,
+        resoluciones: pd.Series,
+        rutas: pd.Series
+    ) -> Dict[str, Dict[str, str]]:
+        """
+        Consultar en la BD, con un $in por columna, qué placas, RUCs,
+        resoluciones y códigos de ruta del archivo ya existen.
+        
+        Returns:
+            {'placas'|'empresas'|'resoluciones'|'rutas': {valor: id}}
+        """
+        consultas = {
+            'placas': (self.vehiculo_service.collection, 'placa', placas),
+            'empresas': (self.empresa_service.collection, 'ruc', rucs),
+            'resoluciones': (self.resolucion_service.collection, 'nroResolucion', resoluciones),
+            'rutas': (self.ruta_service.rutas_collection, 'codigoRuta', rutas)
         }
         
-        for campo, (min_val, max_val) in campos_numericos.items():
-            valor_raw = row.get(campo)
-            if pd.isna(valor_raw) or str(valor_raw).strip() == '':
-                # Solo algunos campos son realmente obligatorios
-                if campo in ['Año Fabricación', 'Ejes', 'Asientos']:
-                    errores.append({
-                        'columna': campo,
-                        'valor': valor_raw,
-                        'mensaje': f"{campo} es requerido"
-                    })
-                else:
-                    advertencias.append({
-                        'columna': campo,
-                        'valor': valor_raw,
-                        'mensaje': f"{campo} no especificado, se usará valor por defecto"
-                    })
-            else:
-                try:
-                    # Limpiar el valor (remover comas, espacios, etc.)
-                    valor_str = str(valor_raw).replace(',', '').replace(' ', '').strip()
-                    valor_num = float(valor_str)
-                    
-                    if valor_num < min_val or valor_num > max_val:
-                        errores.append({
-                            'columna': campo,
-                            'valor': valor_raw,
-                            'mensaje': f"{campo} debe estar entre {min_val} y {max_val}"
-                        })
-                except (ValueError, TypeError):
-                    errores.append({
-                        'columna': campo,
-                        'valor': valor_raw,
-                        'mensaje': f"{campo} debe ser un número válido"
-                    })
+        referencias = {}
+        for nombre, (coleccion, campo, valores) in consultas.items():
+            encontrados = {}
+            unicos = [valor for valor in valores.unique() if valor]
+            if unicos:
+                opciones = {'collation': {'locale': 'es', 'strength': 2}} if campo == 'placa' else {}
+                async for documento in coleccion.find({campo: {'$in': unicos}}, {campo: 1}, **opciones):
+                    clave = str(documento.get(campo, '')).upper() if campo == 'placa' else documento.get(campo)
+                    encontrados.setdefault(clave, str(documento['_id']))
+            referencias[nombre] = encontrados
+        return referencias
+    
+    async def _validar_dataframe(self, df: pd.DataFrame) -> List[VehiculoValidacionExcel]:
+        """
+        Validar todas las filas del Excel con operaciones por columna.
+        
+        Normaliza placas, RUCs y resoluciones, detecta placas duplicadas
+        dentro del archivo y consulta la existencia en la BD con un $in por
+        columna. Los mensajes son los de la validación fila por fila.
+        """
+        fila = pd.Series(df.index + 2, index=df.index)  # +2 porque Excel empieza en 1 y tiene header
+        mensajes: Dict[str, Dict] = {'errores': {}, 'advertencias': {}}
+        
+        def agregar(tipo: str, mascara: pd.Series, columna: str, valor: pd.Series, mensaje) -> None:
+            seleccion = mascara[mascara].index
+            if not len(seleccion):
+                return
+            textos = mensaje[seleccion] if isinstance(mensaje, pd.Series) else pd.Series(mensaje, index=seleccion)
+            for indice, texto in textos.items():
+                mensajes[tipo].setdefault(indice, []).append(
+                    f"Columna '{columna}': {texto} (valor: '{valor[indice]}')"
+                )
         
-        # Validar resoluciones con normalización flexible
-        if pd.notna(row.get('Resolución Primigenia')):
-            resolucion_primigenia_raw = str(row.get('Resolución Primigenia')).strip()
-            resolucion_primigenia_normalizada = self._normalizar_numero_resolucion(resolucion_primigenia_raw)
-            
-            if not self._validar_formato_resolucion_flexible(resolucion_primigenia_raw):
-                errores.append({
-                    'columna': 'Resolución Primigenia',
-                    'valor': resolucion_primigenia_raw,
-                    'mensaje': f"Formato de resolución primigenia inválido (se normalizó a: '{resolucion_primigenia_normalizada}')"
-                })
-            else:
-                if resolucion_primigenia_raw != resolucion_primigenia_normalizada:
-                    advertencias.append({
-                        'columna': 'Resolución Primigenia',
-                        'valor': resolucion_primigenia_raw,
-                        'mensaje': f"Resolución primigenia normalizada a '{resolucion_primigenia_normalizada}'"
-                    })
-                
-                resolucion = self._buscar_resolucion_por_numero(resolucion_primigenia_normalizada)
-                if not resolucion:
-                    if self.auto_crear_resoluciones:
-                        advertencias.append({
-                            'columna': 'Resolución Primigenia',
-                            'valor': resolucion_primigenia_raw,
-                            'mensaje': f"Resolución primigenia {resolucion_primigenia_normalizada} será creada automáticamente"
-                        })
-                    else:
-                        advertencias.append({
-                            'columna': 'Resolución Primigenia',
-                            'valor': resolucion_primigenia_raw,
-                            'mensaje': f"No se encontró resolución primigenia: {resolucion_primigenia_normalizada}"
-                        })
-        
-        if pd.notna(row.get('Resolución Hija')):
-            resolucion_hija_raw = str(row.get('Resolución Hija')).strip()
-            resolucion_hija_normalizada = self._normalizar_numero_resolucion(resolucion_hija_raw)
-            
-            if not self._validar_formato_resolucion_flexible(resolucion_hija_raw):
-                errores.append({
-                    'columna': 'Resolución Hija',
-                    'valor': resolucion_hija_raw,
-                    'mensaje': f"Formato de resolución hija inválido (se normalizó a: '{resolucion_hija_normalizada}')"
-                })
+        placa_raw, _ = self._columna(df, 'Placa')
+        placa = self._normalizar_placas(placa_raw)
+        ruc_raw, _ = self._columna(df, 'RUC Empresa')
+        ruc = self._normalizar_rucs(ruc_raw)
+        primigenia_raw, hay_primigenia = self._columna(df, 'Resolución Primigenia')
+        primigenia = self._normalizar_resoluciones(primigenia_raw)
+        hija_raw, hay_hija = self._columna(df, 'Resolución Hija')
+        hija = self._normalizar_resoluciones(hija_raw)
+        rutas_raw, hay_rutas = self._columna(df, 'Rutas Asignadas')
+        
+        placa_valida = placa.str.fullmatch(r'[A-Z]{2,3}-\d{3,4}')
+        ruc_valido = ruc.str.fullmatch(r'\d{11}')
+        primigenia_valida = hay_primigenia & primigenia.str.fullmatch(r'R-\d{4}-\d{4}')
+        hija_valida = hay_hija & hija.str.fullmatch(r'R-\d{4}-\d{4}')
+        
+        codigos_rutas = rutas_raw[hay_rutas].str.split(',').explode().str.strip()
+        codigos_rutas = codigos_rutas[codigos_rutas.fillna('') != '']
+        
+        referencias = await self._cargar_referencias(
+            placa[placa_valida],
+            ruc[ruc_valido],
+            pd.concat([primigenia[primigenia_valida], hija[hija_valida]]),
+            codigos_rutas
+        )
+        self._referencias = referencias
+        
+        # Placa
+        agregar('errores', placa == '', 'Placa', placa_raw, "Placa es requerida")
+        agregar('errores', (placa != '') & ~placa_valida, 'Placa', placa_raw,
+                "Formato de placa inválido (se esperaba formato ABC-123)")
+        primera_fila = fila[placa_valida].groupby(placa[placa_valida]).transform('first')
+        duplicada = pd.Series(False, index=df.index)
+        duplicada[primera_fila.index] = fila[primera_fila.index] != primera_fila
+        agregar('errores', duplicada, 'Placa', placa_raw,
+                "Placa " + placa + " duplicada en el archivo (ya usada en fila " + primera_fila.astype(str).reindex(df.index, fill_value='') + ")")
+        agregar('advertencias', placa_valida & placa.isin(referencias['placas']), 'Placa', placa_raw,
+                "Ya existe un vehículo con placa " + placa + " - se actualizará")
+        
+        # Empresa por RUC
+        agregar('errores', ruc == '', 'RUC Empresa', ruc_raw, "RUC de empresa es requerido")
+        agregar('errores', (ruc != '') & ~ruc_valido, 'RUC Empresa', ruc_raw,
+                "RUC inválido (se esperaba 11 dígitos, se normalizó a: '" + ruc + "')")
+        empresa_nueva = ruc_valido & ~ruc.isin(referencias['empresas'])
+        if self.auto_crear_empresas:
+            agregar('advertencias', empresa_nueva, 'RUC Empresa', ruc_raw,
+                    "Empresa con RUC " + ruc + " será creada automáticamente")
+        else:
+            agregar('errores', empresa_nueva, 'RUC Empresa', ruc_raw,
+                    "No se encontró empresa con RUC " + ruc)
+        
+        # Categoría y tipo de combustible (con mapeo de nombres comunes)
+        categorias_validas = [cat.value for cat in CategoriaVehiculo]
+        for columna, validos, mapeo, por_defecto, etiqueta, verbo, invalido in (
+            ('Categoría', categorias_validas, MAPEO_CATEGORIAS,
+             "Categoría no especificada, se usará M1 por defecto", "Categoría", "mapeada",
+             f"Categoría inválida (válidas: {categorias_validas})"),
+            ('Tipo Combustible', TIPOS_COMBUSTIBLE, MAPEO_COMBUSTIBLES,
+             "Tipo de combustible no especificado, se usará GASOLINA por defecto", "Tipo de combustible", "mapeado",
+             f"Tipo de combustible inválido (válidos: {', '.join(TIPOS_COMBUSTIBLE)})")
+        ):
+            raw, _ = self._columna(df, columna)
+            valor = raw.str.upper()
+            fuera = (valor != '') & ~valor.isin(validos)
+            mapeado = valor.map(mapeo)
+            agregar('advertencias', valor == '', columna, raw, por_defecto)
+            agregar('advertencias', fuera & mapeado.notna(), columna, raw,
+                    f"{etiqueta} '" + valor + f"' {verbo} a '" + mapeado.fillna('') + "'")
+            agregar('errores', fuera & mapeado.isna(), columna, raw, invalido)
+        
+        # Sede de registro
+        sede_raw, hay_sede = self._columna(df, 'Sede de Registro')
+        sede = sede_raw.str.upper().where(hay_sede, 'PUNO')
+        fuera = (sede != '') & ~sede.isin([s.value for s in SedeRegistro])
+        reconocida = sede.isin(MAPEO_SEDES)
+        agregar('advertencias', fuera & reconocida, 'Sede de Registro', sede_raw,
+                "Sede '" + sede + "' mapeada a '" + sede + "'")
+        agregar('advertencias', fuera & ~reconocida, 'Sede de Registro', sede_raw,
+                "Sede de registro '" + sede + "' no reconocida, se usará PUNO por defecto")
+        
+        # Campos numéricos
+        for campo, (minimo, maximo) in CAMPOS_NUMERICOS.items():
+            raw, presente = self._columna(df, campo)
+            vacio = ~presente | (raw == '')
+            numero = pd.to_numeric(raw.str.replace(',', '', regex=False).str.replace(' ', '', regex=False), errors='coerce')
+            tipo_vacio = 'errores' if campo in CAMPOS_NUMERICOS_REQUERIDOS else 'advertencias'
+            mensaje_vacio = f"{campo} es requerido" if campo in CAMPOS_NUMERICOS_REQUERIDOS else f"{campo} no especificado, se usará valor por defecto"
+            agregar(tipo_vacio, vacio, campo, raw, mensaje_vacio)
+            agregar('errores', ~vacio & numero.isna(), campo, raw, f"{campo} debe ser un número válido")
+            agregar('errores', ~vacio & numero.notna() & ((numero < minimo) | (numero > maximo)), campo, raw,
+                    f"{campo} debe estar entre {minimo} y {maximo}")
+        
+        # Resoluciones
+        for columna, etiqueta, presente, raw, normalizada, valida in (
+            ('Resolución Primigenia', 'primigenia', hay_primigenia, primigenia_raw, primigenia, primigenia_valida),
+            ('Resolución Hija', 'hija', hay_hija, hija_raw, hija, hija_valida)
+        ):
+            agregar('errores', presente & ~valida, columna, raw,
+                    f"Formato de resolución {etiqueta} inválido (se normalizó a: '" + normalizada + "')")
+            agregar('advertencias', valida & (raw != normalizada), columna, raw,
+                    f"Resolución {etiqueta} normalizada a '" + normalizada + "'")
+            no_encontrada = valida & ~normalizada.isin(referencias['resoluciones'])
+            if self.auto_crear_resoluciones:
+                agregar('advertencias', no_encontrada, columna, raw,
+                        f"Resolución {etiqueta} " + normalizada + " será creada automáticamente")
             else:
-                if resolucion_hija_raw != resolucion_hija_normalizada:
-                    advertencias.append({
-                        'columna': 'Resolución Hija',
-                        'valor': resolucion_hija_raw,
-                        'mensaje': f"Resolución hija normalizada a '{resolucion_hija_normalizada}'"
-                    })
-                
-                resolucion = self._buscar_resolucion_por_numero(resolucion_hija_normalizada)
-                if not resolucion:
-                    if self.auto_crear_resoluciones:
-                        advertencias.append({
-                            'columna': 'Resolución Hija',
-                            'valor': resolucion_hija_raw,
-                            'mensaje': f"Resolución hija {resolucion_hija_normalizada} será creada automáticamente"
-                        })
-                    else:
-                        advertencias.append({
-                            'columna': 'Resolución Hija',
-                            'valor': resolucion_hija_raw,
-                            'mensaje': f"No se encontró resolución hija: {resolucion_hija_normalizada}"
-                        })
-            
-            # Validar que si hay resolución hija, debe haber primigenia
-            if not pd.notna(row.get('Resolución Primigenia')):
-                errores.append({
-                    'columna': 'Resolución Hija',
-                    'valor': resolucion_hija_raw,
-                    'mensaje': "Si se especifica una resolución hija, debe especificarse también la resolución primigenia"
-                })
-        
-        # Validar rutas si se proporcionan
-        if pd.notna(row.get('Rutas Asignadas')):
-            rutas_str = str(row.get('Rutas Asignadas')).strip()
-            rutas_codigos = [r.strip() for r in rutas_str.split(',') if r.strip()]
-            for codigo_ruta in rutas_codigos:
-                if not self._buscar_ruta_por_codigo(codigo_ruta):
-                    advertencias.append({
-                        'columna': 'Rutas Asignadas',
-                        'valor': rutas_str,
-                        'mensaje': f"No se encontró ruta con código: {codigo_ruta}"
-                    })
+                agregar('advertencias', no_encontrada, columna, raw,
+                        f"No se encontró resolución {etiqueta}: " + normalizada)
+        agregar('errores', hay_hija & ~hay_primigenia, 'Resolución Hija', hija_raw,
+                "Si se especifica una resolución hija, debe especificarse también la resolución primigenia")
+        
+        # Rutas asignadas
+        faltantes = codigos_rutas[~codigos_rutas.isin(referencias['rutas'])]
+        for indice, codigo in faltantes.items():
+            mensajes['advertencias'].setdefault(indice, []).append(
+                f"Columna 'Rutas Asignadas': No se encontró ruta con código: {codigo} (valor: '{rutas_raw[indice]}')"
+            )
         
-        return VehiculoValidacionExcel(
-            fila=fila,
-            placa=placa_normalizada,  # Usar la placa normalizada
-            valido=len(errores) == 0,
-            errores=errores,
-            advertencias=advertencias
-        )
+        return [
+            VehiculoValidacionExcel(
+                fila=int(fila[indice]),
+                placa=placa[indice],
+                valido=indice not in mensajes['errores'],
+                errores=mensajes['errores'].get(indice, []),
+                advertencias=mensajes['advertencias'].get(indice, [])
+            )
+            for indice in df.index
+        ]
+    
+    def _buscar_empresa_por_ruc(self, ruc: str) -> Optional[str]:
+        """ID de la empresa con ese RUC, según las referencias de la última validación"""
+        return self._referencias['empresas'].get(ruc)
+    
+    def _buscar_resolucion_por_numero(self, numero: str) -> Optional[str]:
+        """ID de la resolución con ese número, según las referencias de la última validación"""
+        return self._referencias['resoluciones'].get(self._normalizar_numero_resolucion(numero))
+    
+    def _buscar_ruta_por_codigo(self, codigo: str) -> Optional[str]:
+        """ID de la ruta con ese código, según las referencias de la última validación"""
+        return self._referencias['rutas'].get(codigo)
 
     async def _convertir_fila_a_vehiculo_create(self, row: pd.Series) -> VehiculoCreate:
         """Convertir fila de Excel a modelo VehiculoCreate usando datos normalizados"""
@@ -662,16 +654,9 @@ class VehiculoExcelService:
         empresa_ruc = self._normalizar_ruc(empresa_ruc_raw)
         
         if empresa_ruc and len(empresa_ruc) == 11:
-            # Intentar encontrar empresa existente con RUC normalizado
-            try:
-                empresas = await self.empresa_service.get_empresas()
-                for empresa in empresas:
-                    if empresa.ruc == empresa_ruc:
-                        empresa_id = empresa.id
-                        print(f"✅ Empresa encontrada: {empresa_id} - RUC: {empresa_ruc}")
-                        break
-            except Exception as e:
-                print(f"⚠️ Error buscando empresa: {e}")
+            empresa_id = self._buscar_empresa_por_ruc(empresa_ruc)
+            if empresa_id:
+                print(f"✅ Empresa encontrada: {empresa_id} - RUC: {empresa_ruc}")
         
         # Si no se encontró empresa, usar la primera disponible
         if not empresa_id:
@@ -804,13 +789,13 @@ class VehiculoExcelService:
         
         # Resolución (solo si se especifica)
         if pd.notna(row.get('Resolución Hija')) and str(row.get('Resolución Hija')).strip():
-            resolucion_hija = self._buscar_resolucion_por_numero(str(row.get('Resolución Hija')).strip())
-            if resolucion_hija:
-                update_data['resolucionId'] = resolucion_hija.id
+            resolucion_hija_id = self._buscar_resolucion_por_numero(str(row.get('Resolución Hija')).strip())
+            if resolucion_hija_id:
+                update_data['resolucionId'] = resolucion_hija_id
         elif pd.notna(row.get('Resolución Primigenia')) and str(row.get('Resolución Primigenia')).strip():
-            resolucion_primigenia = self._buscar_resolucion_por_numero(str(row.get('Resolución Primigenia')).strip())
-            if resolucion_primigenia:
-                update_data['resolucionId'] = resolucion_primigenia.id
+            resolucion_primigenia_id = self._buscar_resolucion_por_numero(str(row.get('Resolución Primigenia')).strip())
+            if resolucion_primigenia_id:
+                update_data['resolucionId'] = resolucion_primigenia_id
         
         # Rutas (solo si se especifican)
         if pd.notna(row.get('Rutas Asignadas')) and str(row.get('Rutas Asignadas')).strip():
@@ -818,9 +803,9 @@ class VehiculoExcelService:
             rutas_codigos = [r.strip() for r in rutas_str.split(',') if r.strip()]
             rutas_asignadas = []
             for codigo_ruta in rutas_codigos:
-                ruta = self._buscar_ruta_por_codigo(codigo_ruta)
-                if ruta:
-                    rutas_asignadas.append(ruta.id)
+                ruta_id = self._buscar_ruta_por_codigo(codigo_ruta)
+                if ruta_id:
+                    rutas_asignadas.append(ruta_id)
             if rutas_asignadas:
                 update_data['rutasAsignadasIds'] = rutas_asignadas
         
@@ -1067,7 +1052,7 @@ class VehiculoExcelService:
     async def validar_excel_preview(self, archivo_path: str) -> List[VehiculoValidacionExcel]:
         """Validar Excel y mostrar preview de errores sin procesar"""
         try:
-            df = pd.read_excel(archivo_path)
+            df = pd.read_excel(archivo_path, dtype=str)
             
             # Validar estructura
             errores_estructura = self._validar_estructura_excel(df)
@@ -1080,14 +1065,8 @@ class VehiculoExcelService:
                     advertencias=[]
                 )]
             
-            # Validar cada fila (máximo 100 para preview)
-            validaciones = []
-            max_filas = min(len(df), 100)
-            
-            for index in range(max_filas):
-                row = df.iloc[index]
-                validacion = await self._validar_fila(index + 2, row)
-                validaciones.append(validacion)
+            # Validar todo el archivo (duplicados incluidos) y mostrar máximo 100 filas
+            validaciones = (await self._validar_dataframe(df))[:100]
             
             return validaciones
             
@@ -5,9 +5,21 @@ from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
 
 from app.models.vehiculo import VehiculoCreate, VehiculoUpdate, VehiculoInDB
 from app.utils.exceptions import VehiculoNotFoundException, VehiculoAlreadyExistsException
+from app.utils.paginacion_cursor import PaginaCursor, paginar
+from app.core.indices import registrar_consulta, registrar_indices
+
+registrar_indices(
+    "vehiculos",
+    IndexModel([("id", ASCENDING)], sparse=True),
+    IndexModel([("placa", ASCENDING)])
+)
+registrar_consulta("vehiculos", "listado_activos", {"estaActivo": {"$ne": False}}, [("_id", ASCENDING)])
+registrar_consulta("vehiculos", "por_empresa", {"estaActivo": {"$ne": False}, "empresaActualId": "x"}, [("_id", ASCENDING)])
+registrar_consulta("vehiculos", "por_placa", {"placa": "ABC-123"})
 
 
 class VehiculoService:
@@ -117,7 +129,18 @@ class VehiculoService:
         incluir_inactivos: bool = False
     ) -> List[VehiculoInDB]:
         """Obtener lista de vehículos con filtros opcionales"""
-        
+        pagina = await self.get_vehiculos_pagina(
+            limit=limit, empresa_id=empresa_id, estado=estado, skip=skip, incluir_inactivos=incluir_inactivos
+        )
+        return pagina.documentos
+
+    def filtro_vehiculos(
+        self,
+        empresa_id: Optional[str] = None,
+        estado: Optional[str] = None,
+        incluir_inactivos: bool = False
+    ) -> dict:
+        """Filtro de MongoDB de los listados de vehículos"""
         query = {}
         
         # Por defecto, solo mostrar vehículos activos (no eliminados lógicamente)
@@ -131,14 +154,27 @@ class VehiculoService:
         if estado:
             query["estado"] = estado
         
-        cursor = self.collection.find(query).skip(skip).limit(limit)
-        vehiculos = []
+        return query
+
+    async def get_vehiculos_pagina(
+        self,
+        limit: int = 100,
+        empresa_id: Optional[str] = None,
+        estado: Optional[str] = None,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        incluir_inactivos: bool = False
+    ) -> PaginaCursor:
+        """Página de vehículos por cursor `(_id)`; lanza CursorInvalido si el cursor no es válido"""
+        query = self.filtro_vehiculos(empresa_id, estado, incluir_inactivos)
+        pagina = await paginar(self.collection, query, limit, cursor=cursor, skip=skip)
         
-        async for vehiculo in cursor:
+        vehiculos = []
+        for vehiculo in pagina.documentos:
             vehiculo["id"] = str(vehiculo.pop("_id"))
             vehiculos.append(VehiculoInDB(**vehiculo))
-        
-        return vehiculos
+        pagina.documentos = vehiculos
+        return pagina
     
     async def get_vehiculos_activos(self) -> List[VehiculoInDB]:
         """Obtener todos los vehículos activos"""
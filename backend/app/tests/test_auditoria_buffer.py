@@ -0,0 +1,108 @@
+"""
+Tests del escritor de auditoría por lotes
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.services.mesa_partes.auditoria_buffer import CacheConfiguracion, EscritorAuditoria, json_seguro
+
+
+class _Destino:
+    def __init__(self, falla=False):
+        self.lotes = []
+        self.alertas = []
+        self.falla = falla
+
+    async def escribir(self, lote):
+        if self.falla:
+            raise RuntimeError("base de datos caída")
+        self.lotes.append(lote)
+        return [e for e in lote if e.get("registrar", True)]
+
+    async def al_escribir(self, escritos):
+        self.alertas.append([e["n"] for e in escritos])
+
+
+@pytest.mark.asyncio
+async def test_agrupa_eventos_por_tamano_y_evalua_alertas_de_lo_escrito():
+    destino = _Destino()
+    escritor = EscritorAuditoria(destino.escribir, destino.al_escribir, lote=3, intervalo=5)
+    for n in range(7):
+        assert escritor.registrar({"n": n, "registrar": n != 4})
+
+    await asyncio.wait_for(escritor.detener(), 1)
+
+    assert [[e["n"] for e in lote] for lote in destino.lotes] == [[0, 1, 2], [3, 4, 5], [6]]
+    assert destino.alertas == [[0, 1, 2], [3, 5], [6]]
+    stats = escritor.get_estadisticas()
+    assert stats["escritos"] == 6 and stats["filtrados"] == 1 and stats["lotes"] == 3
+
+
+@pytest.mark.asyncio
+async def test_escribe_lote_incompleto_al_vencer_el_intervalo():
+    destino = _Destino()
+    escritor = EscritorAuditoria(destino.escribir, lote=100, intervalo=0.02)
+    escritor.registrar({"n": 1})
+    await asyncio.sleep(0)
+    escritor.registrar({"n": 2})
+
+    await asyncio.sleep(0.1)
+    assert [[e["n"] for e in lote] for lote in destino.lotes] == [[1, 2]]
+    await escritor.detener()
+
+
+@pytest.mark.asyncio
+async def test_cola_llena_descarta_y_error_de_escritura_no_detiene_al_escritor():
+    destino = _Destino(falla=True)
+    escritor = EscritorAuditoria(destino.escribir, maximo=2, lote=10, intervalo=0)
+    resultados = [escritor.registrar({"n": n}) for n in range(3)]
+    assert resultados == [True, True, False]
+
+    await asyncio.wait_for(escritor.vaciar(), 1)
+    destino.falla = False
+    escritor.registrar({"n": 3})
+    await asyncio.wait_for(escritor.detener(), 1)
+
+    stats = escritor.get_estadisticas()
+    assert stats["descartados"] == 1 and stats["errores_escritura"] == 2 and stats["escritos"] == 1
+
+
+@pytest.mark.asyncio
+async def test_evento_invalido_no_hace_perder_al_resto_del_lote():
+    guardados = []
+
+    async def escribir(lote):
+        # Como una columna JSON: todo el insert falla si un valor no se serializa
+        filas = [json.dumps(e) for e in lote]
+        guardados.extend(filas)
+        return lote
+
+    escritor = EscritorAuditoria(escribir, lote=10, intervalo=5)
+    escritor.registrar({"n": 1})
+    escritor.registrar({"n": 2, "datos_nuevos": {"fecha": datetime(2024, 5, 1)}})
+    escritor.registrar({"n": 3})
+    await asyncio.wait_for(escritor.detener(), 1)
+
+    assert [json.loads(f)["n"] for f in guardados] == [1, 3]
+    stats = escritor.get_estadisticas()
+    assert stats["escritos"] == 2 and stats["errores_escritura"] == 1 and stats["filtrados"] == 0
+
+
+def test_json_seguro_convierte_lo_que_la_columna_json_no_acepta():
+    id_evento = uuid.uuid4()
+    datos = json_seguro({"fecha": datetime(2024, 5, 1, 8), "id": id_evento, "lista": (1, 2)})
+    assert datos == {"fecha": "2024-05-01 08:00:00", "id": str(id_evento), "lista": [1, 2]}
+    assert json_seguro(None) is None
+
+
+def test_cache_de_configuracion_recarga_al_vencer_o_invalidar():
+    cargas = []
+    cache = CacheConfiguracion(ttl=60)
+    cargar = lambda: cargas.append(1) or len(cargas)
+    assert cache.obtener(cargar) == 1 and cache.obtener(cargar) == 1
+    cache.invalidar()
+    assert cache.obtener(cargar) == 2
@@ -0,0 +1,134 @@
+"""
+Tests de la caché de usuarios autenticados (get_current_user)
+"""
+import hashlib
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+
+from app.config.settings import settings
+from app.core import cache as cache_module
+from app.core.cache import CacheService, MemoryCache
+from app.dependencies import auth
+from app.models.usuario import UsuarioUpdate
+from app.services.usuario_service import UsuarioService, usuario_auth_cache_key
+
+
+class _Resultado:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class _Coleccion:
+    def __init__(self, documentos):
+        self.documentos = {d["_id"]: d for d in documentos}
+        self.lecturas = 0
+
+    async def find_one(self, filtro):
+        self.lecturas += 1
+        documento = self.documentos.get(filtro["_id"])
+        return dict(documento) if documento else None
+
+    async def update_one(self, filtro, cambios):
+        documento = self.documentos.get(filtro["_id"])
+        if documento is None:
+            return _Resultado(0)
+        documento.update(cambios["$set"])
+        return _Resultado(1)
+
+
+class _DB:
+    def __init__(self, usuarios):
+        self.usuarios = usuarios
+
+
+def _usuario(usuario_id):
+    return {
+        "_id": usuario_id,
+        "dni": "12345678",
+        "nombres": "Ana",
+        "apellidos": "Quispe",
+        "email": "ana@example.com",
+        "password_hash": "x",
+        "rol_id": "usuario",
+        "estaActivo": True,
+        "fechaCreacion": datetime(2024, 1, 1)
+    }
+
+
+@pytest.fixture
+def entorno(monkeypatch):
+    monkeypatch.setattr(cache_module, "REDIS_URL", "")
+    monkeypatch.setattr(cache_module, "_cache_instance", CacheService(memory=MemoryCache()))
+    usuario_id = ObjectId()
+    coleccion = _Coleccion([_usuario(usuario_id)])
+    db = _DB(coleccion)
+
+    async def get_database():
+        return db
+
+    monkeypatch.setattr(auth, "get_database", get_database)
+    return str(usuario_id), coleccion, db
+
+
+def _credenciales(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+@pytest.mark.asyncio
+async def test_acierto_no_consulta_la_base(entorno):
+    usuario_id, coleccion, _ = entorno
+    token = auth.create_access_token({"sub": usuario_id})
+
+    primero = await auth.get_current_user(_credenciales(token))
+    segundo = await auth.get_current_user(_credenciales(token))
+
+    assert primero.id == segundo.id == usuario_id
+    assert coleccion.lecturas == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cambio", ["update", "soft_delete"])
+async def test_desactivar_invalida_todos_los_tokens_del_usuario(entorno, cambio):
+    usuario_id, coleccion, db = entorno
+    tokens = [auth.create_access_token({"sub": usuario_id}) for _ in range(2)]
+    for token in tokens:
+        await auth.get_current_active_user(await auth.get_current_user(_credenciales(token)))
+    assert coleccion.lecturas == 2
+
+    servicio = UsuarioService(db)
+    if cambio == "update":
+        await servicio.update_usuario(usuario_id, UsuarioUpdate(estaActivo=False))
+    else:
+        await servicio.soft_delete_usuario(usuario_id)
+    lecturas = coleccion.lecturas
+
+    for token in tokens:
+        usuario = await auth.get_current_user(_credenciales(token))
+        assert usuario.estaActivo is False
+        with pytest.raises(HTTPException) as error:
+            await auth.get_current_active_user(usuario)
+        assert error.value.status_code == 400
+    assert coleccion.lecturas == lecturas + 2
+
+
+@pytest.mark.asyncio
+async def test_token_sin_jti_se_cachea_por_su_firma(entorno):
+    usuario_id, coleccion, _ = entorno
+    expira = datetime.utcnow() + timedelta(minutes=5)
+    token = jwt.encode({"sub": usuario_id, "exp": expira}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    otro = jwt.encode({"sub": usuario_id, "exp": expira + timedelta(seconds=1)}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+    await auth.get_current_user(_credenciales(token))
+    await auth.get_current_user(_credenciales(token))
+    assert coleccion.lecturas == 1
+
+    clave = usuario_auth_cache_key(usuario_id, hashlib.sha256(token.encode()).hexdigest()[:32])
+    assert cache_module.get_cache().get(clave).id == usuario_id
+
+    await auth.get_current_user(_credenciales(otro))
+    assert coleccion.lecturas == 2
@@ -0,0 +1,112 @@
+"""
+Tests de los campos de búsqueda normalizados
+"""
+import re
+
+import pytest
+
+from app.utils import busqueda_normalizada
+from app.utils.busqueda_normalizada import (
+    CAMPO_BUSQUEDA, CAMPO_NGRAMAS, VERSION_BUSQUEDA, campos_busqueda, filtro_contiene, filtro_exacto,
+    filtro_prefijo, sincronizar_campos_busqueda
+)
+
+
+def _cumple(documento, filtro):
+    """Evaluar los operadores que generan los filtros de búsqueda"""
+    for ruta, condicion in filtro.items():
+        valor = documento
+        for parte in ruta.split("."):
+            valor = (valor or {}).get(parte)
+        if isinstance(condicion, dict) and "$all" in condicion:
+            if not set(condicion["$all"]) <= set(valor or []):
+                return False
+        elif isinstance(condicion, dict) and "$regex" in condicion:
+            if valor is None or not re.search(condicion["$regex"], valor):
+                return False
+        elif isinstance(condicion, dict) and "$ne" in condicion:
+            if valor == condicion["$ne"]:
+                return False
+        elif valor != condicion:
+            return False
+    return True
+
+
+def test_campos_normalizados_y_ngramas_por_campo():
+    busqueda = campos_busqueda("empresas", {"ruc": "20123", "razonSocial": {"principal": "Transportes  Ñandú"}})
+    assert busqueda["v"] == VERSION_BUSQUEDA
+    assert busqueda["razonSocial_principal"] == "TRANSPORTES NANDU"
+    assert "razonSocial_principal:NDU" in busqueda["ngramas"]
+    assert "ruc:201" in busqueda["ngramas"]
+    assert campos_busqueda("rutas", {"codigoRuta": "01"}) == {"v": VERSION_BUSQUEDA, "codigoRuta": "01", "nombre": "", "ngramas": []}
+
+
+def test_filtros_sin_mayusculas_ni_tildes():
+    documento = {CAMPO_BUSQUEDA: campos_busqueda("localidades", {"nombre": "San Román", "provincia": "Puno"})}
+
+    assert _cumple(documento, filtro_exacto("nombre", "san roman"))
+    assert _cumple(documento, filtro_prefijo("nombre", "SAN R"))
+    assert not _cumple(documento, filtro_prefijo("nombre", "roman"))
+    assert _cumple(documento, filtro_contiene({"nombre": "román", "provincia": "pu", "departamento": None}))
+    assert not _cumple(documento, filtro_contiene({"nombre": "an ro", "provincia": "cusco"}))
+
+    # todos los trigramas presentes pero no contiguos: los descarta la verificación
+    documento = {CAMPO_BUSQUEDA: campos_busqueda("localidades", {"nombre": "ABCX BCD"})}
+    filtro = filtro_contiene({"nombre": "abcd"})
+    assert _cumple(documento, {CAMPO_NGRAMAS: filtro[CAMPO_NGRAMAS]})
+    assert not _cumple(documento, filtro)
+
+
+def test_filtro_contiene_usa_trigramas_y_escapa_la_consulta():
+    filtro = filtro_contiene({"nombre": "c.p. ilave", "ubigeo": "21"})
+    assert filtro[CAMPO_NGRAMAS]["$all"][:2] == ["nombre:C.P", "nombre:.P."]
+    assert filtro["_busqueda.nombre"] == {"$regex": re.escape("C.P. ILAVE")}
+    # menos de 3 caracteres: prefijo
+    assert filtro["_busqueda.ubigeo"] == {"$regex": "^21"}
+    assert filtro_contiene({"nombre": "  ", "provincia": None}) == {}
+
+
+class _Cursor:
+    def __init__(self, documentos):
+        self.documentos = documentos
+
+    def __aiter__(self):
+        self._iter = iter(self.documentos)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _Coleccion:
+    def __init__(self, documentos):
+        self.documentos = {d["_id"]: d for d in documentos}
+        self.lotes = 0
+
+    def find(self, filtro, proyeccion=None):
+        return _Cursor([dict(d) for d in self.documentos.values() if _cumple(d, filtro)])
+
+    async def bulk_write(self, operaciones, ordered=True):
+        self.lotes += 1
+        for operacion in operaciones:
+            self.documentos[operacion._filter["_id"]].update(operacion._doc["$set"])
+
+
+@pytest.mark.asyncio
+async def test_sincronizar_completa_solo_los_que_faltan(monkeypatch):
+    monkeypatch.setattr(busqueda_normalizada, "BUSQUEDA_LOTE_SINCRONIZACION", 2)
+    rutas = _Coleccion([
+        {"_id": 1, "codigoRuta": "01", "nombre": "Puno - Juliaca"},
+        {"_id": 2, "codigoRuta": "02", "nombre": "Puno - Ilave", CAMPO_BUSQUEDA: {"v": VERSION_BUSQUEDA - 1}},
+        {"_id": 3, "codigoRuta": "03", "nombre": "Juli", CAMPO_BUSQUEDA: campos_busqueda("rutas", {"codigoRuta": "03", "nombre": "Juli"})},
+    ])
+    db = {"rutas": rutas}
+
+    assert await sincronizar_campos_busqueda(db, ["rutas"]) == {"rutas": 2}
+    assert rutas.documentos[1][CAMPO_BUSQUEDA]["nombre"] == "PUNO - JULIACA"
+    assert await sincronizar_campos_busqueda(db, ["rutas"]) == {"rutas": 0}
+    assert await sincronizar_campos_busqueda(db, ["rutas"], todos=True) == {"rutas": 3}
+    assert rutas.lotes == 3
@@ -0,0 +1,70 @@
+"""
+Tests de la caché en dos niveles (L1 en memoria, L2 Redis opcional)
+"""
+import time
+
+from app.core import cache as cache_module
+from app.core.cache import CacheService, MemoryCache
+
+
+def _cache(monkeypatch, **kwargs):
+    monkeypatch.setattr(cache_module, "REDIS_URL", "")
+    return CacheService(memory=MemoryCache(**kwargs))
+
+
+def test_funciona_sin_redis(monkeypatch):
+    """Sin Redis la caché sigue activa con el nivel en memoria"""
+    cache = _cache(monkeypatch)
+    assert cache.enabled and not cache.redis_enabled
+    assert cache.set("documento:1", {"id": 1})
+    assert cache.get("documento:1") == {"id": 1}
+    assert cache.exists("documento:1")
+
+
+def test_ttl_y_expulsion_lru(monkeypatch):
+    """Las entradas vencen por TTL y se expulsa la menos usada al superar el límite"""
+    cache = _cache(monkeypatch, max_entries=2)
+    cache.set("a:1", 1, ttl=0.05)
+    time.sleep(0.06)
+    assert cache.get("a:1") is None
+
+    cache.set("a:1", 1)
+    cache.set("a:2", 2)
+    cache.get("a:1")
+    cache.set("a:3", 3)
+    assert cache.get("a:2") is None
+    assert cache.get("a:1") == 1 and cache.get("a:3") == 3
+    assert cache.memory.evictions == 1
+
+
+def test_expulsion_por_tamano():
+    """El nivel en memoria respeta el máximo de bytes"""
+    memoria = MemoryCache(max_bytes=10)
+    memoria.set("a", b"12345", 60)
+    memoria.set("b", b"12345", 60)
+    memoria.set("c", b"12345", 60)
+    assert memoria.get("a") is None
+    assert memoria.bytes == 10
+    assert not memoria.set("grande", b"x" * 11, 60)
+
+
+def test_invalidacion_por_patron(monkeypatch):
+    """delete_pattern usa el mismo glob que Redis"""
+    cache = _cache(monkeypatch)
+    cache.set("documentos:list:1", 1)
+    cache.set("documentos:list:2", 2)
+    cache.set("documentos:stats:1", 3)
+    assert cache.delete_pattern("documentos:list:*") == 2
+    assert cache.get("documentos:list:1") is None
+    assert cache.get("documentos:stats:1") == 3
+
+
+def test_estadisticas_por_namespace(monkeypatch):
+    """Aciertos y fallos se cuentan por el primer segmento de la clave"""
+    cache = _cache(monkeypatch)
+    cache.set("reportes:x", 1)
+    cache.get("reportes:x")
+    cache.get("reportes:y")
+    stats = cache.get_stats()["namespaces"]["reportes"]
+    assert stats["hits_l1"] == 1 and stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
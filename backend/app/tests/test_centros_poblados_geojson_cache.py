@@ -0,0 +1,73 @@
+"""
+Tests de la FeatureCollection pre-serializada de centros poblados
+"""
+import gzip
+import json
+
+import numpy as np
+
+from app.services.centros_poblados_geojson_cache import CentrosPobladosGeojsonCache, celdas_grilla
+
+
+def _centro(i, provincia, distrito, lon, lat, activa=True, poblacion=100):
+    return {
+        "_id": f"cp{i}", "nombre": f"CP {i}", "provincia": provincia, "distrito": distrito,
+        "coordenadas": {"latitud": lat, "longitud": lon}, "estaActiva": activa, "poblacion": poblacion
+    }
+
+
+def _cache():
+    cache = CentrosPobladosGeojsonCache()
+    cache.reconstruir([
+        _centro(1, "PUNO", "PUNO", -70.02, -15.84),
+        _centro(2, "PUNO", "PUNO", -70.0201, -15.8401),
+        _centro(3, "PUNO", "ACORA", -69.79, -15.97, activa=False),
+        _centro(4, "SAN ROMÁN", "JULIACA", -70.13, -15.50),
+        _centro(5, "SAN ROMÁN", "JULIACA", None, None)
+    ], version=1)
+    return cache
+
+
+def _contenido(respuesta):
+    return json.loads(gzip.decompress(respuesta["gzip"]))
+
+
+def test_coleccion_filtra_por_nombre_completo_sin_tildes():
+    cache = _cache()
+    todas = _contenido(cache.coleccion(activos_solo=False))
+    assert todas["metadata"]["total"] == 4
+    assert {f["id"] for f in todas["features"]} == {"cp1", "cp2", "cp3", "cp4"}
+
+    assert [f["id"] for f in _contenido(cache.coleccion("san roman"))["features"]] == ["cp4"]
+    assert [f["id"] for f in _contenido(cache.coleccion("PUNO", "acora", activos_solo=False))["features"]] == ["cp3"]
+    assert _contenido(cache.coleccion("PUNO", "acora"))["features"] == []
+    # Ya no es una búsqueda por subcadena
+    assert _contenido(cache.coleccion("PUN"))["features"] == []
+
+
+def test_coleccion_se_cachea_hasta_reconstruir():
+    cache = _cache()
+    primera = cache.coleccion("PUNO")
+    assert cache.coleccion("PUNO") is primera
+    cache.reconstruir([_centro(9, "PUNO", "PUNO", -70.0, -15.8)], version=2)
+    assert cache.coleccion("PUNO")["etag"] != primera["etag"]
+
+
+def test_cluster_agrupa_puntos_cercanos():
+    cache = _cache()
+    agrupada = _contenido(cache.coleccion(zoom=8))
+    assert agrupada["metadata"]["total"] == 3
+    grupos = [f for f in agrupada["features"] if f["properties"].get("cluster")]
+    assert len(grupos) == 1
+    assert grupos[0]["properties"]["cantidad"] == 2
+    assert grupos[0]["properties"]["poblacion"] == 200
+    # El punto aislado se devuelve tal cual
+    assert any(f["id"] == "cp4" for f in agrupada["features"])
+
+    # Con zoom alto los dos puntos de Puno quedan en celdas distintas
+    assert len(_contenido(cache.coleccion(zoom=20))["features"]) == 3
+
+
+def test_celdas_grilla():
+    celdas = celdas_grilla(np.array([-70.02, -70.0201, -69.0]), np.array([-15.84, -15.8401, -15.0]), 10)
+    assert celdas[0] == celdas[1] != celdas[2]
@@ -0,0 +1,121 @@
+"""
+Tests del middleware de compresión de respuestas
+"""
+import gzip
+import uuid
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.compression_middleware import (
+    CompressionMiddleware, compresion, elegir_codificacion, get_metricas_compresion,
+    reiniciar_metricas_compresion, respuesta_precomprimida
+)
+
+brotli = pytest.importorskip("brotli")
+
+GRANDE = {"features": [{"nombre": f"Centro poblado {i}", "ubigeo": f"{i:010d}"} for i in range(500)]}
+
+
+def _cliente(**opciones) -> TestClient:
+    clave_precomprimida = uuid.uuid4().hex
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, **opciones)
+
+    @app.get("/grande")
+    async def grande():
+        return GRANDE
+
+    @app.get("/chico")
+    async def chico():
+        return {"ok": True}
+
+    @app.get("/sin-comprimir")
+    @compresion(activa=False)
+    async def sin_comprimir():
+        return GRANDE
+
+    @app.get("/chico-comprimido")
+    @compresion(minimo=0)
+    async def chico_comprimido():
+        return {"ok": True}
+
+    @app.get("/binario")
+    async def binario():
+        return Response(content=b"\x00" * 50000, media_type="application/octet-stream")
+
+    @app.get("/flujo")
+    async def flujo():
+        async def bloques():
+            for i in range(100):
+                yield f'{{"linea": {i}, "texto": "{"x" * 100}"}}\n'.encode()
+        return StreamingResponse(bloques(), media_type="text/plain")
+
+    @app.get("/precomprimida")
+    async def precomprimida(request: Request):
+        return respuesta_precomprimida(request, clave_precomprimida, lambda: b'{"a":"' + b"b" * 5000 + b'"}')
+
+    return TestClient(app)
+
+
+def test_elegir_codificacion():
+    assert elegir_codificacion("gzip, deflate, br") == "br"
+    assert elegir_codificacion("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert elegir_codificacion("br;q=0, gzip") == "gzip"
+    assert elegir_codificacion("identity") is None
+    assert elegir_codificacion("") is None
+
+
+def test_comprime_respuestas_grandes_segun_accept_encoding():
+    cliente = _cliente(minimo=1024)
+    respuesta = cliente.get("/grande", headers={"Accept-Encoding": "br"})
+    assert respuesta.headers["content-encoding"] == "br"
+    assert "accept-encoding" in respuesta.headers["vary"].lower()
+
+    respuesta = cliente.get("/grande", headers={"Accept-Encoding": "gzip"})
+    assert respuesta.headers["content-encoding"] == "gzip"
+    assert respuesta.json() == GRANDE
+
+    assert "content-encoding" not in cliente.get("/grande", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_respeta_minimo_tipo_y_configuracion_por_ruta():
+    cliente = _cliente(minimo=1024)
+    cabeceras = {"Accept-Encoding": "gzip"}
+    assert "content-encoding" not in cliente.get("/chico", headers=cabeceras).headers
+    assert "content-encoding" not in cliente.get("/binario", headers=cabeceras).headers
+    assert "content-encoding" not in cliente.get("/sin-comprimir", headers=cabeceras).headers
+    assert cliente.get("/chico-comprimido", headers=cabeceras).headers["content-encoding"] == "gzip"
+
+    # Solo las rutas marcadas con @compresion() si no se comprime por defecto
+    cliente = _cliente(minimo=1024, por_defecto=False)
+    assert "content-encoding" not in cliente.get("/grande", headers=cabeceras).headers
+    assert cliente.get("/chico-comprimido", headers=cabeceras).headers["content-encoding"] == "gzip"
+
+    cliente = _cliente(minimo=1024, excluir=["/grande"])
+    assert "content-encoding" not in cliente.get("/grande", headers=cabeceras).headers
+
+
+def test_comprime_respuestas_por_streaming():
+    cliente = _cliente(minimo=1024)
+    with cliente.stream("GET", "/flujo", headers={"Accept-Encoding": "gzip"}) as respuesta:
+        assert respuesta.headers["content-encoding"] == "gzip"
+        crudo = b"".join(respuesta.iter_raw())
+    assert gzip.decompress(crudo).count(b"\n") == 100
+
+
+def test_precomprimida_se_reutiliza_y_cuenta_metricas():
+    reiniciar_metricas_compresion()
+    cliente = _cliente()
+    for _ in range(3):
+        respuesta = cliente.get("/precomprimida", headers={"Accept-Encoding": "br"})
+        assert respuesta.headers["content-encoding"] == "br"
+    with cliente.stream("GET", "/precomprimida", headers={"Accept-Encoding": "br"}) as respuesta:
+        assert brotli.decompress(b"".join(respuesta.iter_raw())).startswith(b'{"a":"bbb')
+
+    metricas = get_metricas_compresion()
+    assert metricas["precomprimidas_misses"] == 1
+    assert metricas["precomprimidas_hits"] == 3
+    assert metricas["bytes_enviados"] < metricas["bytes_originales"]
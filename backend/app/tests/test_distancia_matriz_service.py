@@ -0,0 +1,94 @@
+"""
+Tests de la matriz de distancias entre localidades
+"""
+import threading
+
+import numpy as np
+import pytest
+
+from app.services import distancia_matriz_service
+from app.services.distancia_matriz_service import DistanciaMatrizService
+from app.utils.geo import haversine_km
+
+
+def _servicio():
+    servicio = DistanciaMatrizService(tamano_lru=2)
+    servicio.reconstruir([
+        {"_id": "puno", "coordenadas": {"latitud": -15.8402, "longitud": -70.0219}},
+        {"_id": "juliaca", "id": "JUL_001", "coordenadas": {"latitud": -15.5000, "longitud": -70.1333}},
+        {"_id": "ilave", "coordenadas": {"latitud": -16.0866, "longitud": -69.6386}},
+        {"_id": "sin_coordenadas", "coordenadas": None},
+    ])
+    return servicio
+
+
+def test_matriz_coincide_con_haversine_por_par():
+    resultado = _servicio().matriz(["puno", "juliaca", "ilave"])
+    matriz = resultado["matriz_km"]
+    assert matriz.shape == (3, 3)
+    assert np.allclose(np.diag(matriz), 0)
+    assert np.allclose(matriz, matriz.T)
+    assert np.isclose(matriz[0, 1], haversine_km(-15.8402, -70.0219, -15.5000, -70.1333))
+
+
+def test_faltantes_y_alias_de_id():
+    resultado = _servicio().matriz(["JUL_001", "sin_coordenadas", "desconocida", "puno"])
+    assert resultado["ids"] == ["JUL_001", "puno"]
+    assert resultado["faltantes"] == ["sin_coordenadas", "desconocida"]
+    assert resultado["matriz_km"].shape == (2, 2)
+
+
+def test_itinerario_acumulado_salta_paradas_sin_coordenadas():
+    resultado = _servicio().itinerario(["juliaca", "sin_coordenadas", "puno", "ilave"])
+    assert resultado["faltantes"] == ["sin_coordenadas"]
+    assert len(resultado["tramos_km"]) == 2
+    assert np.isclose(resultado["total_km"], resultado["tramos_km"].sum())
+    assert resultado["acumulada_km"][0] == 0
+
+
+def test_lru_acotado():
+    servicio = _servicio()
+    for ids in (["puno"], ["juliaca"], ["ilave"]):
+        servicio.matriz(ids)
+    assert len(servicio._lru) == 2
+
+
+def test_lru_acotado_por_bytes_y_sin_resultados_grandes():
+    servicio = _servicio()
+    # Matriz 1x1: 8 bytes; 3x3: 72 bytes
+    servicio.max_bytes, servicio.max_bytes_resultado, servicio.tamano_lru = 20, 50, 100
+    servicio.matriz(["puno", "juliaca", "ilave"])
+    assert len(servicio._lru) == 0
+
+    for ids in (["puno"], ["juliaca"], ["ilave"]):
+        servicio.matriz(ids)
+    assert [clave[1] for clave in servicio._lru] == [("juliaca",), ("ilave",)]
+    assert servicio._bytes == 16
+
+
+@pytest.mark.asyncio
+async def test_matriz_lista_grande_se_calcula_en_un_hilo(monkeypatch):
+    servicio = _servicio()
+    hilos = []
+    matriz = servicio.matriz
+
+    def matriz_registrando(ids):
+        hilos.append(threading.current_thread())
+        return matriz(ids)
+
+    monkeypatch.setattr(servicio, "matriz", matriz_registrando)
+    monkeypatch.setattr(distancia_matriz_service, "DISTANCIAS_MATRIZ_EN_HILO", 2)
+
+    pequena = await servicio.matriz_lista(["puno", "juliaca"])
+    grande = await servicio.matriz_lista(["puno", "juliaca", "ilave"])
+    assert hilos[0] is threading.main_thread() and hilos[1] is not threading.main_thread()
+    assert pequena["matriz_km"][0][0] == 0.0 and isinstance(grande["matriz_km"], list)
+    assert grande["matriz_km"][0][1] == round(float(matriz(["puno", "juliaca"])["matriz_km"][0, 1]), 3)
+
+
+def test_ids_recorrido_ordena_itinerario():
+    ruta = {
+        "origen": {"id": "a"}, "destino": {"id": "d"},
+        "itinerario": [{"id": "c", "orden": 2}, {"id": "b", "orden": 1}]
+    }
+    assert DistanciaMatrizService.ids_recorrido(ruta) == ["a", "b", "c", "d"]
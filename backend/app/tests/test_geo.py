@@ -0,0 +1,26 @@
+"""
+Tests de las utilidades geográficas
+"""
+from app.models.localidad import Coordenadas
+from app.utils.geo import haversine_km, punto_geojson
+
+
+def test_punto_geojson_usa_longitud_latitud():
+    assert punto_geojson({"latitud": -15.84, "longitud": -70.02}) == {
+        "type": "Point", "coordinates": [-70.02, -15.84]
+    }
+    assert punto_geojson(Coordenadas(latitud=-15.5, longitud=-70.13))["coordinates"] == [-70.13, -15.5]
+
+
+def test_punto_geojson_descarta_coordenadas_invalidas():
+    assert punto_geojson(None) is None
+    assert punto_geojson({"latitud": None, "longitud": -70.0}) is None
+    assert punto_geojson({"latitud": 95, "longitud": -70.0}) is None
+    assert punto_geojson({"latitud": "x", "longitud": -70.0}) is None
+
+
+def test_haversine_puno_juliaca():
+    # Puno - Juliaca: unos 35 km en línea recta
+    distancia = haversine_km(-15.8402, -70.0219, -15.5000, -70.1333)
+    assert 35 < distancia < 40
+    assert haversine_km(-15.0, -70.0, -15.0, -70.0) == 0
@@ -0,0 +1,81 @@
+"""
+Tests de la lectura en streaming y el mapeo de features GeoJSON
+"""
+import io
+import json
+
+import pytest
+
+from app.services.geojson_import_service import (
+    clave_localidad, filtro_localidad, geometria_desde_feature, localidad_desde_feature
+)
+from app.utils.geojson_stream import iterar_features
+
+
+def _coleccion(features, **extra):
+    return {"type": "FeatureCollection", **extra, "features": features}
+
+
+def _feature(propiedades, coordenadas=(-70.02, -15.84)):
+    return {"type": "Feature", "properties": propiedades, "geometry": {"type": "Point", "coordinates": list(coordenadas)}}
+
+
+@pytest.mark.parametrize("tamano_bloque", [1, 7, 64 * 1024])
+def test_iterar_features_por_bloques(tamano_bloque):
+    features = [_feature({"NOMB_CCPP": f"Centro Ñuñoa {i}", "POBTOTAL": 12345 + i}) for i in range(50)]
+    contenido = json.dumps(_coleccion(features, crs={"type": "name"}, name="cp"), ensure_ascii=False, indent=1)
+    # BOM de UTF-8, como lo escriben algunos exportadores
+    archivo = io.BytesIO(b"\xef\xbb\xbf" + contenido.encode("utf-8"))
+
+    assert list(iterar_features(archivo, tamano_bloque)) == features
+
+
+def test_iterar_features_coleccion_vacia_o_sin_features():
+    assert list(iterar_features(io.BytesIO(b'{"type": "FeatureCollection", "features": []}'))) == []
+    assert list(iterar_features(io.BytesIO(b'{"type": "FeatureCollection"}'))) == []
+
+
+def test_iterar_features_rechaza_otro_tipo_o_archivo_truncado():
+    with pytest.raises(ValueError):
+        list(iterar_features(io.BytesIO(b'{"type": "Feature", "features": []}')))
+    with pytest.raises(ValueError):
+        list(iterar_features(io.BytesIO(b'{"type": "FeatureCollection", "features": [{"a": 1}, {"b"'), 4))
+
+
+def test_localidad_desde_feature_detecta_tipo_y_ubigeo():
+    provincia = localidad_desde_feature(_feature({"IDPROV": "2101", "NOMBPROV": "PUNO"}))
+    assert provincia["tipo"] == "PROVINCIA" and provincia["ubigeo"] == "2101"
+    assert provincia["location"] == {"type": "Point", "coordinates": [-70.02, -15.84]}
+
+    distrito = localidad_desde_feature(_feature({"UBIGEO": "210101", "DISTRITO": "PUNO", "PROVINCIA": "PUNO"}))
+    assert (distrito["tipo"], distrito["ubigeo"], distrito["distrito"]) == ("DISTRITO", "210101", "PUNO")
+
+    centro = localidad_desde_feature(_feature({"IDCCPP": "2101010001", "NOMB_CCPP": " Chimu ", "NOMB_DISTR": "PUNO"}))
+    assert (centro["tipo"], centro["nombre"], centro["distrito"]) == ("CENTRO_POBLADO", "Chimu", "PUNO")
+
+
+def test_localidad_desde_feature_sin_tipo_o_sin_nombre():
+    with pytest.raises(ValueError):
+        localidad_desde_feature(_feature({"nombre": "X"}))
+    assert localidad_desde_feature(_feature({"nombre": "X"}), "centro_poblado")["tipo"] == "CENTRO_POBLADO"
+    assert localidad_desde_feature(_feature({"IDCCPP": "2101010001", "NOMB_CCPP": ""})) is None
+
+
+def test_clave_y_filtro_de_localidad_coinciden():
+    con_ubigeo = {"nombre": "PUNO", "tipo": "DISTRITO", "ubigeo": "210101"}
+    assert filtro_localidad(con_ubigeo) == {"ubigeo": "210101", "tipo": "DISTRITO"}
+    # Lo leído de MongoDB y lo importado generan la misma clave
+    assert clave_localidad(con_ubigeo) == clave_localidad({"_id": 1, **con_ubigeo, "provincia": "PUNO"})
+
+    sin_ubigeo = {"nombre": "Chimu", "tipo": "CENTRO_POBLADO", "provincia": "PUNO"}
+    assert filtro_localidad(sin_ubigeo) == {"nombre": "Chimu", "tipo": "CENTRO_POBLADO", "provincia": "PUNO", "distrito": None}
+    assert clave_localidad(sin_ubigeo) != clave_localidad({**sin_ubigeo, "distrito": "PUNO"})
+
+
+def test_geometria_desde_feature():
+    poligono = {"type": "Polygon", "coordinates": [[[-70, -15], [-69, -15], [-69, -16], [-70, -15]]]}
+    geometria = geometria_desde_feature({"properties": {"IDPROV": "2101"}, "geometry": poligono})
+    assert (geometria["tipo"], geometria["ubigeo"], geometria["geometry"]) == ("PROVINCIA", "2101", poligono)
+    assert geometria_desde_feature({"properties": {"UBIGEO": ""}, "geometry": poligono}, "DISTRITO") is None
+    with pytest.raises(ValueError):
+        geometria_desde_feature({"properties": {"IDCCPP": "1"}, "geometry": poligono})
@@ -0,0 +1,135 @@
+"""
+Tests del índice de teselas de geometrías simplificadas
+"""
+import math
+import threading
+
+import pytest
+
+from app.services.geometria_tiles_index import (
+    NIVELES_ZOOM,
+    GeometriaTilesIndex,
+    limites_tesela,
+    nivel_para_zoom,
+    simplificar_linea,
+    simplificar_geometria
+)
+
+
+def _cuadrado(oeste, sur, lado, pasos=50):
+    """Cuadrado con muchos vértices colineales en cada lado"""
+    puntos = []
+    for esquina in range(4):
+        for i in range(pasos):
+            t = lado * i / pasos
+            puntos.append([
+                (oeste + t, sur), (oeste + lado, sur + t),
+                (oeste + lado - t, sur + lado), (oeste, sur + lado - t)
+            ][esquina])
+    puntos.append(puntos[0])
+    return {"type": "Polygon", "coordinates": [[list(p) for p in puntos]]}
+
+
+def _indice():
+    indice = GeometriaTilesIndex()
+    indice.reconstruir(
+        [
+            {"_id": "g1", "localidad_id": "l1", "tipo": "DISTRITO", "ubigeo": "210101", "geometry": _cuadrado(-70.1, -15.9, 0.2)},
+            {"_id": "g2", "localidad_id": "l2", "tipo": "DISTRITO", "ubigeo": "211101", "geometry": _cuadrado(-70.2, -15.6, 0.2)},
+            {"_id": "g3", "localidad_id": "l3", "tipo": "PROVINCIA", "ubigeo": "210100", "geometry": _cuadrado(-70.5, -16.5, 1.0)},
+            {"_id": "g4", "localidad_id": "inexistente", "tipo": "DISTRITO", "geometry": _cuadrado(0, 0, 1)},
+        ],
+        [
+            {"_id": "l1", "nombre": "PUNO", "provincia": "PUNO", "departamento": "PUNO"},
+            {"_id": "l2", "nombre": "JULIACA", "provincia": "SAN ROMAN", "departamento": "PUNO"},
+            {"_id": "l3", "nombre": "PUNO", "provincia": "PUNO", "departamento": "PUNO"},
+        ]
+    )
+    return indice
+
+
+def test_simplificar_linea_quita_vertices_colineales():
+    puntos = [[0, 0], [1, 0.0001], [2, 0], [3, 5], [4, 0]]
+    assert simplificar_linea(puntos, 0.01) == [[0, 0], [2, 0], [3, 5], [4, 0]]
+
+
+def test_simplificar_geometria_conserva_esquinas_y_descarta_subpixel():
+    cuadrado = _cuadrado(-70.1, -15.9, 0.2)
+    simplificado = simplificar_geometria(cuadrado, 0.001, 4)
+    assert len(simplificado["coordinates"][0]) == 5
+    assert simplificar_geometria(_cuadrado(-70.1, -15.9, 0.00001), 0.001, 4) is None
+
+
+def test_limites_tesela_y_niveles():
+    assert limites_tesela(0, 0, 0)[0] == -180.0
+    assert math.isclose(limites_tesela(1, 1, 1)[3], 0.0, abs_tol=1e-9)
+    assert nivel_para_zoom(2) == 4
+    assert nivel_para_zoom(9) == 8
+    assert nivel_para_zoom(18) == 14
+
+
+def test_features_unen_propiedades_de_localidad():
+    features = _indice().features("DISTRITO")
+    assert [f["properties"]["nombre"] for f in features] == ["PUNO", "JULIACA"]
+    assert _indice().features("DISTRITO", provincia="SAN ROMAN")[0]["properties"]["id"] == "g2"
+
+
+def test_tesela_solo_incluye_lo_que_toca():
+    indice = _indice()
+    # Tesela z10 que contiene Puno (-70.0, -15.8) pero no Juliaca
+    z = 10
+    n = 2 ** z
+    x = int((-70.0 + 180) / 360 * n)
+    lat = math.radians(-15.8)
+    y = int((1 - math.log(math.tan(lat) + 1 / math.cos(lat)) / math.pi) / 2 * n)
+    features = indice.features("DISTRITO", zoom=z, caja=limites_tesela(z, x, y))
+    assert [f["properties"]["id"] for f in features] == ["g1"]
+    assert len(features[0]["geometry"]["coordinates"][0]) == 5
+
+
+def test_etag_cambia_con_el_contenido():
+    indice = _indice()
+    etag = indice.etag("tesela", 1, features=indice.features("DISTRITO"))
+    assert etag == _indice().etag("tesela", 1, features=indice.features("DISTRITO"))
+    assert etag != indice.etag("tesela", 2, features=indice.features("DISTRITO"))
+    assert etag != indice.etag("tesela", 1, features=indice.features("PROVINCIA"))
+
+
+class _Cursor:
+    def __init__(self, documentos):
+        self.documentos = documentos
+
+    async def to_list(self, length=None):
+        return list(self.documentos)
+
+
+class _Coleccion:
+    def __init__(self, documentos):
+        self.documentos = documentos
+
+    def find(self, filtro, proyeccion=None):
+        return _Cursor(self.documentos)
+
+
+@pytest.mark.asyncio
+async def test_carga_simplifica_todos_los_niveles_fuera_del_event_loop(monkeypatch):
+    db = {
+        "geometrias": _Coleccion([
+            {"_id": "g1", "localidad_id": "64b000000000000000000001", "tipo": "DISTRITO", "geometry": _cuadrado(-70.1, -15.9, 0.2)}
+        ]),
+        "localidades": _Coleccion([{"_id": "64b000000000000000000001", "nombre": "PUNO"}])
+    }
+    hilos = []
+    indice = GeometriaTilesIndex()
+    construir = indice._construir
+
+    def construir_registrando(*args):
+        hilos.append(threading.current_thread())
+        return construir(*args)
+
+    monkeypatch.setattr(indice, "_construir", construir_registrando)
+    await indice.asegurar_cargado(db)
+
+    assert hilos and hilos[0] is not threading.main_thread()
+    assert sorted(indice._simplificadas) == [("DISTRITO", nivel) for nivel in NIVELES_ZOOM]
+    assert len(indice.features("DISTRITO", zoom=10)[0]["geometry"]["coordinates"][0]) == 5
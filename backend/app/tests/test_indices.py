@@ -0,0 +1,113 @@
+"""
+Tests del registro central de índices
+"""
+import pytest
+from pymongo import ASCENDING, IndexModel, TEXT
+from pymongo.errors import OperationFailure
+
+from app.core import indices
+from app.core.indices import (
+    COLLATION_SIN_MAYUSCULAS, asegurar_indices, firma_indice, registrar_indices, sincronizar_indices
+)
+
+
+class _Cursor:
+    def __init__(self, documentos):
+        self.documentos = documentos
+
+    async def to_list(self, length=None):
+        return list(self.documentos)
+
+
+class _Coleccion:
+    def __init__(self, existentes=None, existe=True):
+        self.existentes = [{"name": "_id_", "key": {"_id": 1}}] + (existentes or [])
+        self.existe = existe
+        self.creados = []
+        self.borrados = []
+
+    def list_indexes(self):
+        if not self.existe:
+            raise OperationFailure("ns does not exist", code=26)
+        return _Cursor(self.existentes)
+
+    async def create_indexes(self, modelos):
+        for modelo in modelos:
+            self.creados.append(modelo.document["name"])
+            self.existentes.append(modelo.document)
+
+    async def drop_index(self, nombre):
+        self.borrados.append(nombre)
+        self.existentes = [i for i in self.existentes if i["name"] != nombre]
+
+
+class _DB(dict):
+    def __missing__(self, nombre):
+        self[nombre] = _Coleccion(existe=False)
+        return self[nombre]
+
+
+@pytest.fixture(autouse=True)
+def registro_vacio(monkeypatch):
+    monkeypatch.setattr(indices, "_indices", {})
+    monkeypatch.setattr(indices, "_consultas", {})
+    monkeypatch.setattr(indices, "_sincronizadas", set())
+    monkeypatch.setattr(indices, "cargar_declaraciones", lambda: None)
+
+
+def test_firma_reconoce_indices_de_texto_y_collation_existentes():
+    texto = IndexModel([("nombre", TEXT), ("descripcion", TEXT)])
+    existente = {"name": "otro", "key": {"_fts": "text", "_ftsx": 1}, "weights": {"descripcion": 1, "nombre": 1}}
+    assert firma_indice(texto.document) == firma_indice(existente)
+
+    ci = IndexModel([("alias", ASCENDING)], name="alias_ci", collation=COLLATION_SIN_MAYUSCULAS)
+    existente = {"name": "alias_ci", "key": {"alias": 1},
+                 "collation": {"locale": "es", "strength": 2, "caseLevel": False, "alternate": "non-ignorable"}}
+    assert firma_indice(ci.document) == firma_indice(existente)
+    assert firma_indice(ci.document) != firma_indice({"name": "alias_1", "key": {"alias": 1}})
+
+
+@pytest.mark.asyncio
+async def test_sincronizar_crea_faltantes_e_informa_conflictos_y_sobrantes():
+    registrar_indices(
+        "rutas",
+        IndexModel([("codigoRuta", ASCENDING)]),
+        IndexModel([("resolucion.id", ASCENDING)], name="resolucion_id_activas", partialFilterExpression={"estaActivo": True}),
+        IndexModel([("nombre", ASCENDING)], name="nombre_ci", collation=COLLATION_SIN_MAYUSCULAS)
+    )
+    db = _DB(rutas=_Coleccion([
+        {"name": "codigo", "key": {"codigoRuta": 1}},
+        {"name": "resolucion_id_activas", "key": {"resolucion.id": 1}},
+        {"name": "viejo_1", "key": {"viejo": 1}}
+    ]))
+
+    verificacion = await sincronizar_indices(db, solo_verificar=True)
+    assert verificacion["rutas"]["existentes"] == ["codigo"]
+    assert verificacion["rutas"]["faltantes"] == ["nombre_ci"]
+    assert verificacion["rutas"]["conflictos"] == ["resolucion_id_activas"]
+    assert db["rutas"].creados == []
+
+    resultado = await sincronizar_indices(db)
+    assert resultado["rutas"]["creados"] == ["nombre_ci"]
+    assert resultado["rutas"]["conflictos"] == ["resolucion_id_activas"]
+    assert resultado["rutas"]["sobrantes"] == ["viejo_1"]
+    assert db["rutas"].borrados == []
+
+    resultado = await sincronizar_indices(db, reemplazar_conflictos=True, eliminar_sobrantes=True)
+    assert resultado["rutas"]["creados"] == ["resolucion_id_activas"]
+    assert db["rutas"].borrados == ["resolucion_id_activas", "viejo_1"]
+
+
+@pytest.mark.asyncio
+async def test_asegurar_indices_una_vez_por_proceso_y_coleccion_nueva():
+    registrar_indices("jobs", IndexModel([("fechaFin", ASCENDING)], expireAfterSeconds=60))
+    db = _DB()
+    await asegurar_indices(db, "jobs")
+    await asegurar_indices(db, "jobs")
+    assert db["jobs"].creados == ["fechaFin_1"]
+
+
+def test_resumen_plan_detecta_recorrido_completo():
+    plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "placa_1"}}
+    assert indices._resumen_plan(plan) == {"etapas": ["FETCH", "IXSCAN"], "indices": ["placa_1"], "recorre_coleccion": False}
+    assert indices._resumen_plan({"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}})["recorre_coleccion"]
@@ -0,0 +1,193 @@
+"""
+Tests del ejecutor de trabajos en segundo plano
+"""
+import asyncio
+import copy
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.job_runner import JobRunner, JobStatus
+
+
+def _coincide(documento, filtro):
+    for campo, condicion in filtro.items():
+        valor = documento.get(campo)
+        if not isinstance(condicion, dict):
+            if valor != condicion:
+                return False
+        elif "$in" in condicion and valor not in condicion["$in"]:
+            return False
+        elif "$nin" in condicion and valor in condicion["$nin"]:
+            return False
+        elif "$lt" in condicion and not (valor is not None and valor < condicion["$lt"]):
+            return False
+    return True
+
+
+def _aplicar(documento, cambios):
+    for ruta, valor in cambios.get("$set", {}).items():
+        destino = documento
+        *padres, campo = ruta.split(".")
+        for padre in padres:
+            destino = destino[padre]
+        destino[campo] = valor
+
+
+class _Coleccion:
+    def __init__(self):
+        self.documentos = {}
+
+    async def insert_one(self, documento):
+        self.documentos[documento["_id"]] = copy.deepcopy(documento)
+
+    async def find_one(self, filtro):
+        return next((copy.deepcopy(d) for d in self.documentos.values() if _coincide(d, filtro)), None)
+
+    async def find_one_and_update(self, filtro, cambios, projection=None, return_document=False):
+        for documento in self.documentos.values():
+            if _coincide(documento, filtro):
+                anterior = copy.deepcopy(documento)
+                _aplicar(documento, cambios)
+                return copy.deepcopy(documento) if return_document else anterior
+        return None
+
+    async def update_one(self, filtro, cambios):
+        return await self.update_many(filtro, cambios, limite=1)
+
+    async def update_many(self, filtro, cambios, limite=None):
+        modificados = 0
+        for documento in self.documentos.values():
+            if _coincide(documento, filtro) and (limite is None or modificados < limite):
+                _aplicar(documento, cambios)
+                modificados += 1
+        return SimpleNamespace(matched_count=modificados, modified_count=modificados)
+
+
+async def _sin_indices():
+    pass
+
+
+def _runner(**opciones):
+    runner = JobRunner({"jobs": _Coleccion()}, **opciones)
+    runner._asegurar_indices = _sin_indices
+    return runner
+
+
+async def _esperar(runner, job_id, *estados):
+    for _ in range(200):
+        job = await runner.get_job(job_id)
+        if job["status"] in estados:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"El trabajo quedó en {job['status']}")
+
+
+@pytest.mark.asyncio
+async def test_trabajo_pasa_por_running_y_completed():
+    runner = _runner()
+    continuar = asyncio.Event()
+
+    async def trabajo(contexto):
+        await contexto.progreso(1, total=2, mensaje="mitad")
+        await continuar.wait()
+        return {"creados": 2}
+
+    job_id = await runner.enqueue("prueba", trabajo)
+    job = await _esperar(runner, job_id, JobStatus.RUNNING)
+    assert job["progress"]["porcentaje"] == 50.0 and job["fechaInicio"] is not None
+
+    continuar.set()
+    job = await _esperar(runner, job_id, JobStatus.COMPLETED)
+    assert job["result"] == {"creados": 2} and job["fechaFin"] is not None
+
+
+@pytest.mark.asyncio
+async def test_cancelar_trabajo_pendiente_no_lo_inicia():
+    runner = _runner(limites={"prueba": 1})
+    continuar = asyncio.Event()
+    iniciados = []
+
+    async def trabajo(contexto):
+        iniciados.append(contexto.job_id)
+        await continuar.wait()
+
+    primero = await runner.enqueue("prueba", trabajo)
+    segundo = await runner.enqueue("prueba", trabajo)
+    await _esperar(runner, primero, JobStatus.RUNNING)
+
+    assert await runner.cancel(segundo)
+    continuar.set()
+    await _esperar(runner, primero, JobStatus.COMPLETED)
+    await _esperar(runner, segundo, JobStatus.CANCELLED)
+    assert iniciados == [primero]
+    assert not await runner.cancel(segundo)
+
+
+@pytest.mark.asyncio
+async def test_cancelacion_en_el_punto_de_control_de_progreso():
+    runner = _runner()
+    continuar = asyncio.Event()
+    pasos = []
+
+    async def trabajo(contexto):
+        await continuar.wait()
+        for paso in range(100):
+            await contexto.progreso(paso)
+            pasos.append(paso)
+
+    job_id = await runner.enqueue("prueba", trabajo)
+    await _esperar(runner, job_id, JobStatus.RUNNING)
+    # Pedido desde otro worker: solo se marca en la base de datos
+    runner.collection.documentos[job_id]["cancelRequested"] = True
+    continuar.set()
+
+    await _esperar(runner, job_id, JobStatus.CANCELLED)
+    assert pasos == []
+
+
+@pytest.mark.asyncio
+async def test_concurrencia_limitada_por_tipo():
+    runner = _runner(limites={"lento": 2})
+    en_curso = {"actual": 0, "maximo": 0}
+
+    async def trabajo(contexto):
+        en_curso["actual"] += 1
+        en_curso["maximo"] = max(en_curso["maximo"], en_curso["actual"])
+        await asyncio.sleep(0.02)
+        en_curso["actual"] -= 1
+
+    ids = [await runner.enqueue("lento", trabajo) for _ in range(5)]
+    for job_id in ids:
+        await _esperar(runner, job_id, JobStatus.COMPLETED)
+    assert en_curso["maximo"] == 2
+
+
+@pytest.mark.asyncio
+async def test_trabajos_de_un_worker_caido_se_marcan_fallidos():
+    runner = _runner(heartbeat=0.01, lease=60)
+    vencido = datetime.utcnow() - timedelta(seconds=120)
+    for job_id, status in (("huerfano", JobStatus.RUNNING), ("pendiente", JobStatus.PENDING), ("listo", JobStatus.COMPLETED)):
+        await runner.collection.insert_one({"_id": job_id, "status": status, "fechaActualizacion": vencido})
+
+    continuar = asyncio.Event()
+
+    async def trabajo(contexto):
+        await continuar.wait()
+
+    # Un trabajo propio sin progreso reciente mantiene su lease por el latido
+    propio = await runner.enqueue("prueba", trabajo)
+    await _esperar(runner, propio, JobStatus.RUNNING)
+    runner.collection.documentos[propio]["fechaActualizacion"] = vencido
+    await asyncio.sleep(0.05)
+
+    assert await runner.reclamar_huerfanos() == 2
+    estados = {job_id: d["status"] for job_id, d in runner.collection.documentos.items()}
+    assert estados == {
+        "huerfano": JobStatus.FAILED, "pendiente": JobStatus.FAILED,
+        "listo": JobStatus.COMPLETED, propio: JobStatus.RUNNING
+    }
+    assert runner.collection.documentos["huerfano"]["fechaFin"] is not None
+    continuar.set()
+    await _esperar(runner, propio, JobStatus.COMPLETED)
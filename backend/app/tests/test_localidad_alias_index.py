@@ -0,0 +1,61 @@
+"""
+Tests del índice en memoria de nombres y alias de localidades
+"""
+from app.services.localidad_alias_index import LocalidadAliasIndex, normalizar_nombre
+
+
+def _localidad(localidad_id, nombre, tipo="CENTRO_POBLADO", **extra):
+    localidad = {"_id": localidad_id, "nombre": nombre, "tipo": tipo, "estaActiva": True}
+    localidad.update(extra)
+    return localidad
+
+
+def _indice():
+    indice = LocalidadAliasIndex()
+    indice.reconstruir(
+        [
+            _localidad("1", "JULIACA", "PROVINCIA"),
+            _localidad("2", "JULIACA", "DISTRITO"),
+            _localidad("3", "C.P. CHUCARIPO"),
+            _localidad("4", "AZÁNGARO", "DISTRITO"),
+            _localidad("5", "ILAVE", estaActiva=False),
+        ],
+        [{"_id": "a1", "alias": "Juli", "localidad_id": "2"}]
+    )
+    return indice
+
+
+def test_normalizar_nombre():
+    """Sin tildes, en mayúsculas y sin prefijo de centro poblado"""
+    assert normalizar_nombre("c.p.  Chucaripo") == "CHUCARIPO"
+    assert normalizar_nombre("CP Chucaripo") == "CHUCARIPO"
+    assert normalizar_nombre("Azángaro") == "AZANGARO"
+    assert normalizar_nombre("CPACHA") == "CPACHA"
+
+
+def test_prefiere_la_localidad_mas_especifica():
+    """Con nombres repetidos gana CENTRO_POBLADO > DISTRITO > PROVINCIA"""
+    assert _indice().buscar_localidad("juliaca")["_id"] == "2"
+    assert _indice().buscar_localidad("juliaca", tipo="PROVINCIA")["_id"] == "1"
+
+
+def test_ignora_tildes_y_prefijo():
+    indice = _indice()
+    assert indice.buscar_localidad("Chucaripo")["_id"] == "3"
+    assert indice.buscar_localidad("azangaro")["_id"] == "4"
+
+
+def test_alias_e_inactivas():
+    """Los alias apuntan a la localidad oficial; las inactivas no se resuelven por nombre"""
+    indice = _indice()
+    alias, localidad = indice.buscar_alias("JULI")
+    assert alias["alias"] == "Juli" and localidad["_id"] == "2"
+    assert indice.buscar_localidad("ilave") is None
+    assert indice.por_id("5")["nombre"] == "ILAVE"
+
+
+def test_invalidar_fuerza_recarga():
+    indice = _indice()
+    assert indice.cargado
+    indice.invalidar()
+    assert not indice.cargado
@@ -0,0 +1,61 @@
+"""
+Tests del cálculo del nivel territorial materializado en las rutas
+"""
+from app.services.nivel_territorial_service import calcular_nivel_territorial, clasificar_ruta_territorial
+
+
+def _loc(localidad_id, tipo, departamento="PUNO", provincia="PUNO", distrito="PUNO", ubigeo=None):
+    return {
+        "id": localidad_id, "nombre": localidad_id, "tipo": tipo,
+        "departamento": departamento, "provincia": provincia, "distrito": distrito, "ubigeo": ubigeo
+    }
+
+
+def test_clasificacion_por_origen_y_destino():
+    """El departamento distinto manda sobre provincia y distrito"""
+    ruta = {
+        "origen": _loc("1", "PROVINCIA"),
+        "destino": _loc("2", "DISTRITO", departamento="AREQUIPA", provincia="AREQUIPA", distrito="AREQUIPA")
+    }
+    nivel = calcular_nivel_territorial(ruta)
+    assert nivel["clasificacion"] == "INTERDEPARTAMENTAL"
+    assert nivel["origen"]["nivel"] == "PROVINCIA"
+    assert nivel["nivelMaximo"] == "PROVINCIA"
+    assert nivel["nivelMinimo"] == "DISTRITO"
+
+
+def test_itinerario_cuenta_si_origen_y_destino_coinciden():
+    """Una ruta de ida y vuelta al mismo distrito deja de ser local si pasa por otra provincia"""
+    ruta = {
+        "origen": _loc("1", "DISTRITO"),
+        "destino": _loc("1", "DISTRITO"),
+        "itinerario": [_loc("3", "CENTRO_POBLADO", provincia="SAN ROMAN", distrito="JULIACA")]
+    }
+    nivel = calcular_nivel_territorial(ruta)
+    assert nivel["clasificacion"] == "INTERPROVINCIAL"
+    assert nivel["totalLocalidades"] == 3
+    assert nivel["niveles"] == ["DISTRITO", "CENTRO_POBLADO"]
+    assert nivel["porNivel"] == {"DISTRITO": 2, "CENTRO_POBLADO": 1}
+
+
+def test_completa_jerarquia_desde_localidades():
+    """Las rutas antiguas sin jerarquía embebida la toman de la función de búsqueda"""
+    localidades = {"9": _loc("9", "DISTRITO", provincia="CHUCUITO", distrito="JULI")}
+    ruta = {"origen": {"id": "9", "nombre": "JULI"}, "destino": _loc("1", "DISTRITO")}
+    nivel = calcular_nivel_territorial(ruta, localidades.get)
+    assert nivel["origen"]["provincia"] == "CHUCUITO"
+    assert nivel["clasificacion"] == "INTERPROVINCIAL"
+
+
+def test_tipo_desconocido_usa_ubigeo():
+    """Sin tipo válido el nivel se deduce del UBIGEO"""
+    ruta = {"origen": _loc("1", None, ubigeo="210100"), "destino": _loc("2", None, ubigeo="210000")}
+    nivel = calcular_nivel_territorial(ruta)
+    assert nivel["origen"]["nivel"] == "PROVINCIA"
+    assert nivel["destino"]["nivel"] == "DEPARTAMENTO"
+    assert nivel["clasificacion"] == "LOCAL"
+
+
+def test_sin_origen_o_destino():
+    assert calcular_nivel_territorial({"origen": _loc("1", "DISTRITO")}) is None
+    assert clasificar_ruta_territorial([_loc("1", "DISTRITO"), _loc("2", "DISTRITO", distrito="CHUCUITO")]) == "INTERDISTRITAL"
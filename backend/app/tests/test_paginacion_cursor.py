@@ -0,0 +1,135 @@
+"""
+Tests de la paginación por cursor (keyset)
+"""
+import pytest
+from bson import ObjectId
+
+from app.utils import paginacion_cursor
+from app.utils.paginacion_cursor import (
+    CursorInvalido, codificar_cursor, contar_estimado, decodificar_cursor, paginar
+)
+
+
+def _cumple(documento, filtro):
+    for campo, condicion in filtro.items():
+        if campo == "$or":
+            if not any(_cumple(documento, f) for f in condicion):
+                return False
+        elif campo == "$and":
+            if not all(_cumple(documento, f) for f in condicion):
+                return False
+        elif isinstance(condicion, dict):
+            valor = documento.get(campo)
+            for operador, referencia in condicion.items():
+                if operador == "$ne" and valor == referencia:
+                    return False
+                if operador in ("$gt", "$lt") and (valor is None or referencia is None):
+                    return False
+                if operador == "$gt" and not valor > referencia:
+                    return False
+                if operador == "$lt" and not valor < referencia:
+                    return False
+        elif documento.get(campo) != condicion:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, documentos):
+        self.documentos = documentos
+
+    def sort(self, orden):
+        for campo, direccion in reversed(orden):
+            # null primero, como en MongoDB
+            self.documentos.sort(
+                key=lambda d: (d.get(campo) is not None, d.get(campo) or ""), reverse=direccion < 0
+            )
+        return self
+
+    def skip(self, n):
+        self.documentos = self.documentos[n:]
+        return self
+
+    def limit(self, n):
+        self.documentos = self.documentos[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return [dict(d) for d in self.documentos]
+
+
+class _Coleccion:
+    name = "localidades"
+
+    def __init__(self, documentos):
+        self.documentos = documentos
+        self.conteos = 0
+
+    def find(self, filtro, proyeccion=None):
+        return _Cursor([d for d in self.documentos if _cumple(d, filtro)])
+
+    async def count_documents(self, filtro):
+        self.conteos += 1
+        return len([d for d in self.documentos if _cumple(d, filtro)])
+
+    async def estimated_document_count(self):
+        return len(self.documentos)
+
+
+@pytest.fixture
+def coleccion(monkeypatch):
+    monkeypatch.setattr(paginacion_cursor, "_conteos", {})
+    nombres = ["ACORA", "PUNO", "ACORA", None, "ILAVE", "PUNO", "PUNO", None, "CHUCUITO"]
+    return _Coleccion([
+        {"_id": ObjectId(f"{i:024x}"), "nombre": nombre, "estaActiva": i % 2 == 0}
+        for i, nombre in enumerate(nombres)
+    ])
+
+
+def test_cursor_es_opaco_y_valida_el_orden():
+    _id = ObjectId()
+    cursor = codificar_cursor("nombre", "PUNO", _id)
+    assert "PUNO" not in cursor
+    assert decodificar_cursor(cursor, "nombre") == ("PUNO", _id)
+    with pytest.raises(CursorInvalido):
+        decodificar_cursor(cursor, "_id")
+    with pytest.raises(CursorInvalido):
+        decodificar_cursor("no-es-un-cursor", "nombre")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("descendente", [False, True])
+async def test_recorre_todas_las_paginas_sin_repetir(coleccion, descendente):
+    completo = await paginar(coleccion, {}, None, campo_orden="nombre", descendente=descendente)
+    esperado = [d["_id"] for d in completo.documentos]
+
+    vistos, cursor = [], None
+    while True:
+        pagina = await paginar(coleccion, {}, 2, cursor=cursor, campo_orden="nombre", descendente=descendente)
+        vistos.extend(d["_id"] for d in pagina.documentos)
+        if not pagina.hay_mas:
+            break
+        cursor = pagina.siguiente_cursor
+    assert vistos == esperado
+    assert len(vistos) == len(coleccion.documentos)
+
+
+@pytest.mark.asyncio
+async def test_paginar_con_filtro_y_por_id(coleccion):
+    primera = await paginar(coleccion, {"estaActiva": True}, 3)
+    segunda = await paginar(coleccion, {"estaActiva": True}, 3, cursor=primera.siguiente_cursor)
+    ids = [d["_id"] for d in primera.documentos + segunda.documentos]
+    assert ids == [d["_id"] for d in coleccion.documentos if d["estaActiva"]]
+    assert not segunda.hay_mas
+
+
+@pytest.mark.asyncio
+async def test_contar_estimado_reutiliza_el_conteo(coleccion):
+    assert await contar_estimado(coleccion) == 9
+    assert await contar_estimado(coleccion, {"estaActiva": True}) == 5
+    assert await contar_estimado(coleccion, {"estaActiva": True}) == 5
+    assert coleccion.conteos == 1
+
+    pagina = await paginar(coleccion, {"estaActiva": True}, 2, contar=True)
+    assert pagina.total == 5
+    assert coleccion.conteos == 1
@@ -0,0 +1,95 @@
+"""
+Tests de las respuestas JSON rápidas de listados
+"""
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from bson import ObjectId
+
+from app.models.empresa import EstadoEmpresa
+from app.utils import respuesta_rapida
+from app.utils.respuesta_rapida import RespuestaJSONRapida, documento_lista, listar_documentos, serializar_json
+
+
+class _Cursor:
+    def __init__(self, documentos):
+        self.documentos = documentos
+        self.saltados = 0
+        self.limite = None
+
+    def sort(self, orden):
+        return self
+
+    def skip(self, n):
+        self.saltados = n
+        return self
+
+    def limit(self, n):
+        self.limite = n
+        return self
+
+    async def to_list(self, length=None):
+        return self.documentos[self.saltados:][:self.limite]
+
+
+class _Coleccion:
+    name = "pruebas_respuesta_rapida"
+
+    def __init__(self, documentos):
+        self.documentos = documentos
+        self.llamadas = []
+
+    def find(self, filtro, proyeccion):
+        self.llamadas.append((filtro, proyeccion))
+        return _Cursor(self.documentos)
+
+
+DOCUMENTO = {
+    "_id": ObjectId("65a1b2c3d4e5f60718293a4b"),
+    "estado": EstadoEmpresa.AUTORIZADA,
+    "monto": Decimal("12.50"),
+    "fechaRegistro": datetime(2024, 3, 1, 8, 30),
+    "razonSocial": {"principal": "TRANSPORTES ÑAÑA"}
+}
+ESPERADO = {
+    "_id": "65a1b2c3d4e5f60718293a4b",
+    "estado": "AUTORIZADA",
+    "monto": 12.5,
+    "fechaRegistro": "2024-03-01T08:30:00",
+    "razonSocial": {"principal": "TRANSPORTES ÑAÑA"}
+}
+
+
+@pytest.mark.parametrize("con_orjson", [True, False])
+def test_serializar_json_tipos_de_mongo(monkeypatch, con_orjson):
+    if not con_orjson:
+        monkeypatch.setattr(respuesta_rapida, "orjson", None)
+    elif respuesta_rapida.orjson is None:
+        pytest.skip("orjson no instalado")
+    assert json.loads(serializar_json([DOCUMENTO])) == [ESPERADO]
+    with pytest.raises(TypeError):
+        serializar_json({"x": object()})
+
+
+def test_respuesta_json_rapida():
+    respuesta = RespuestaJSONRapida({"a": ObjectId("65a1b2c3d4e5f60718293a4b")})
+    assert respuesta.media_type == "application/json"
+    assert json.loads(respuesta.body) == {"a": "65a1b2c3d4e5f60718293a4b"}
+
+
+def test_documento_lista_conserva_id_propio():
+    assert documento_lista({"_id": ObjectId("65a1b2c3d4e5f60718293a4b")}) == {"id": "65a1b2c3d4e5f60718293a4b"}
+    assert documento_lista({"_id": ObjectId(), "id": "res-1"}) == {"id": "res-1"}
+
+
+@pytest.mark.asyncio
+async def test_listar_documentos_usa_la_proyeccion_de_la_vista():
+    coleccion = _Coleccion([{"_id": i, "placa": f"V{i}"} for i in range(5)])
+    pagina = await listar_documentos(coleccion, {"estaActivo": True}, "vehiculos", skip=1, limit=2)
+    assert pagina.documentos == [{"id": "1", "placa": "V1"}, {"id": "2", "placa": "V2"}]
+    assert pagina.hay_mas
+    filtro, proyeccion = coleccion.llamadas[0]
+    assert filtro == {"estaActivo": True}
+    assert "placa" in proyeccion and "historialIds" not in proyeccion
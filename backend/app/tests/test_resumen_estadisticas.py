@@ -0,0 +1,75 @@
+"""
+Tests de los agregados diarios de Mesa de Partes
+"""
+from datetime import date, datetime
+
+from app.services.mesa_partes.resumen_estadisticas import (
+    Deltas, aporte_atencion, aporte_documento, estadisticas_documentos, metricas_atenciones
+)
+
+
+def test_cambio_de_estado_mueve_el_documento_entre_filas():
+    recepcion = datetime(2024, 5, 2, 15, 30)
+    antes = aporte_documento(recepcion, "a1", "RECIBIDO", "NORMAL", datetime(2024, 5, 9, 12))
+    despues = aporte_documento(recepcion, "a1", "ATENDIDO", "NORMAL", datetime(2024, 5, 9, 12))
+    assert antes[0] == (date(2024, 5, 2), "a1", "RECIBIDO", "NORMAL", date(2024, 5, 9))
+
+    deltas = Deltas()
+    deltas.mover(None, antes)
+    deltas.mover(antes, despues)
+    assert dict(deltas) == {despues[0]: {"cantidad": 1}}
+
+
+def test_cambios_que_se_anulan_no_escriben_nada():
+    aporte = aporte_documento(datetime(2024, 5, 2), None, "RECIBIDO", "ALTA", None)
+    assert aporte[0][1] == ""
+
+    deltas = Deltas()
+    deltas.mover(aporte, None)
+    deltas.mover(None, aporte)
+    assert not deltas and list(deltas) == []
+
+
+def test_atencion_solo_cuenta_derivaciones_atendidas():
+    derivada = datetime(2024, 5, 2, 8)
+    assert aporte_atencion("PENDIENTE", derivada, None, None, "a1") is None
+
+    clave, contadores = aporte_atencion("ATENDIDO", derivada, datetime(2024, 5, 3, 8), datetime(2024, 5, 3, 12), "a1")
+    assert clave == (date(2024, 5, 3), "a1")
+    assert contadores == {"atendidas": 1, "horas_atencion": 24.0, "con_limite": 1, "a_tiempo": 1}
+
+    _, sin_limite = aporte_atencion("ATENDIDO", derivada, datetime(2024, 5, 3, 8), None, "a1")
+    assert sin_limite["con_limite"] == 0 and sin_limite["a_tiempo"] == 0
+
+
+def test_estadisticas_vencidos_y_proximos_por_dia():
+    hoy = date(2024, 5, 10)
+    filas = [
+        (date(2024, 5, 1), "RECIBIDO", "NORMAL", date(2024, 5, 9), 2),   # vencidos
+        (date(2024, 5, 1), "ATENDIDO", "NORMAL", date(2024, 5, 9), 4),   # cerrados
+        (date(2024, 5, 2), "EN_PROCESO", "ALTA", date(2024, 5, 10), 1),  # vence hoy: próximo
+        (date(2024, 5, 2), "EN_PROCESO", "ALTA", date(2024, 5, 20), 3),
+        (date(2024, 5, 2), "RECIBIDO", "ALTA", None, 0),
+    ]
+    stats = estadisticas_documentos(filas, hoy)
+
+    assert stats["resumen"] == {"total_documentos": 10, "documentos_vencidos": 2, "documentos_proximos_vencer": 1}
+    assert stats["distribucion_estado"] == [
+        {"estado": "ATENDIDO", "cantidad": 4},
+        {"estado": "EN_PROCESO", "cantidad": 4},
+        {"estado": "RECIBIDO", "cantidad": 2},
+    ]
+    assert stats["tendencia_diaria"] == [
+        {"fecha": "2024-05-01", "cantidad": 6},
+        {"fecha": "2024-05-02", "cantidad": 4},
+    ]
+
+
+def test_metricas_de_atencion_por_area():
+    metricas = metricas_atenciones([("a1", 3, 30.0, 2, 1), ("a2", 1, 2.0, 0, 0)])
+    assert metricas == {
+        "tiempo_promedio_atencion_horas": 8.0,
+        "tasa_cumplimiento_porcentaje": 50.0,
+        "area_mas_productiva": {"nombre": "a1", "documentos_atendidos": 3},
+    }
+    assert metricas_atenciones([])["area_mas_productiva"] == {"nombre": None, "documentos_atendidos": 0}
@@ -0,0 +1,154 @@
+"""
+Tests de los listeners que mantienen las tablas de resumen al hacer flush
+
+Los modelos de Mesa de Partes usan tipos de PostgreSQL; aquí se siguen
+modelos reducidos con las mismas columnas sobre SQLite en memoria.
+"""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import Column, Date, DateTime, Float, Integer, String, create_engine, event, select
+from sqlalchemy.orm import Session, declarative_base
+
+from app.services.mesa_partes.resumen_estadisticas import aporte_atencion, aporte_documento
+from app.services.mesa_partes.resumen_sincronizacion import seguir_cambios
+
+Base = declarative_base()
+
+
+class Documento(Base):
+    __tablename__ = "documentos"
+
+    id = Column(Integer, primary_key=True)
+    fecha_recepcion = Column(DateTime)
+    area_actual_id = Column(String)
+    estado = Column(String)
+    prioridad = Column(String)
+    fecha_limite = Column(DateTime)
+
+
+class Derivacion(Base):
+    __tablename__ = "derivaciones"
+
+    id = Column(Integer, primary_key=True)
+    estado = Column(String)
+    fecha_derivacion = Column(DateTime)
+    fecha_atencion = Column(DateTime)
+    fecha_limite_atencion = Column(DateTime)
+    area_destino_id = Column(String)
+
+
+class ResumenDocumentos(Base):
+    __tablename__ = "resumen_diario_documentos"
+
+    id = Column(Integer, primary_key=True)
+    fecha = Column(Date, nullable=False)
+    area_id = Column(String, nullable=False)
+    estado = Column(String, nullable=False)
+    prioridad = Column(String, nullable=False)
+    fecha_limite = Column(Date)
+    cantidad = Column(Integer, nullable=False, default=0)
+
+
+class ResumenAtenciones(Base):
+    __tablename__ = "resumen_diario_atenciones"
+
+    id = Column(Integer, primary_key=True)
+    fecha = Column(Date, nullable=False)
+    area_id = Column(String, nullable=False)
+    atendidas = Column(Integer, nullable=False, default=0)
+    horas_atencion = Column(Float, nullable=False, default=0.0)
+    con_limite = Column(Integer, nullable=False, default=0)
+    a_tiempo = Column(Integer, nullable=False, default=0)
+
+
+class _Sesion(Session):
+    pass
+
+
+seguir_cambios(_Sesion, {
+    Documento: (
+        ("fecha_recepcion", "area_actual_id", "estado", "prioridad", "fecha_limite"),
+        aporte_documento,
+        ResumenDocumentos.__table__,
+        ("fecha", "area_id", "estado", "prioridad", "fecha_limite")
+    ),
+    Derivacion: (
+        ("estado", "fecha_derivacion", "fecha_atencion", "fecha_limite_atencion", "area_destino_id"),
+        aporte_atencion,
+        ResumenAtenciones.__table__,
+        ("fecha", "area_id")
+    ),
+})
+
+
+@pytest.fixture
+def sesion():
+    engine = create_engine("sqlite://")
+
+    # pysqlite no emite BEGIN por sí mismo; sin esto los savepoints no funcionan
+    @event.listens_for(engine, "connect")
+    def _sin_autobegin(conexion_dbapi, _):
+        conexion_dbapi.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(conexion):
+        conexion.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(engine)
+    with _Sesion(engine) as sesion:
+        yield sesion
+    engine.dispose()
+
+
+def _documentos(sesion):
+    filas = sesion.execute(select(
+        ResumenDocumentos.fecha, ResumenDocumentos.area_id, ResumenDocumentos.estado, ResumenDocumentos.cantidad
+    ))
+    return {tuple(fila[:3]): fila[3] for fila in filas}
+
+
+def _atenciones(sesion):
+    filas = sesion.execute(select(
+        ResumenAtenciones.fecha, ResumenAtenciones.area_id, ResumenAtenciones.atendidas,
+        ResumenAtenciones.horas_atencion, ResumenAtenciones.con_limite, ResumenAtenciones.a_tiempo
+    ))
+    return {tuple(fila[:2]): tuple(fila[2:]) for fila in filas}
+
+
+def test_insercion_cambio_de_estado_y_borrado_mantienen_el_resumen(sesion):
+    recepcion = datetime(2024, 5, 2, 9)
+    documentos = [
+        Documento(fecha_recepcion=recepcion, area_actual_id="a1", estado="RECIBIDO", prioridad="NORMAL")
+        for _ in range(2)
+    ]
+    derivacion = Derivacion(
+        estado="PENDIENTE", fecha_derivacion=recepcion, fecha_limite_atencion=datetime(2024, 5, 4),
+        area_destino_id="a2"
+    )
+    sesion.add_all([*documentos, derivacion])
+    sesion.commit()
+    assert _documentos(sesion) == {(date(2024, 5, 2), "a1", "RECIBIDO"): 2}
+    assert _atenciones(sesion) == {}
+
+    documentos[0].estado = "ATENDIDO"
+    documentos[1].area_actual_id = "a2"
+    derivacion.estado = "ATENDIDO"
+    derivacion.fecha_atencion = datetime(2024, 5, 3, 9)
+    sesion.commit()
+    assert _documentos(sesion) == {
+        (date(2024, 5, 2), "a1", "RECIBIDO"): 0,
+        (date(2024, 5, 2), "a1", "ATENDIDO"): 1,
+        (date(2024, 5, 2), "a2", "RECIBIDO"): 1,
+    }
+    assert _atenciones(sesion) == {(date(2024, 5, 3), "a2"): (1, 24.0, 1, 1)}
+
+    # Un cambio que no toca los campos del aporte no escribe nada
+    documentos[0].prioridad = "NORMAL"
+    sesion.commit()
+
+    for obj in (*documentos, derivacion):
+        sesion.delete(obj)
+    sesion.commit()
+    assert set(_documentos(sesion).values()) == {0}
+    assert _atenciones(sesion) == {(date(2024, 5, 3), "a2"): (0, 0.0, 0, 0)}
@@ -0,0 +1,85 @@
+"""
+Tests del índice en memoria de combinaciones origen → destino
+"""
+from app.services.ruta_combinaciones_index import RutaCombinacionesIndex
+
+
+def _ruta(ruta_id, origen, destino, **extra):
+    ruta = {
+        "_id": ruta_id,
+        "codigoRuta": ruta_id,
+        "origen": {"id": f"{origen}_ID", "nombre": origen},
+        "destino": {"id": f"{destino}_ID", "nombre": destino},
+        "empresa": {"id": "E1"},
+        "resolucion": {"id": "R1"},
+        "estado": "ACTIVA",
+        "estaActivo": True
+    }
+    ruta.update(extra)
+    return ruta
+
+
+def _indice():
+    indice = RutaCombinacionesIndex()
+    indice.reconstruir([
+        _ruta("1", "PUNO", "JULIACA"),
+        _ruta("2", "PUNO", "JULIACA"),
+        _ruta("3", "YUNGUYO", "PUNO"),
+        _ruta("4", "AZÁNGARO", "JULIACA"),
+    ])
+    return indice
+
+
+def test_agrupa_rutas_por_combinacion():
+    """Cada par origen/destino aparece una vez con sus rutas"""
+    resultado = _indice().buscar()
+    assert [c["combinacion"] for c in resultado] == [
+        "AZÁNGARO → JULIACA", "PUNO → JULIACA", "YUNGUYO → PUNO"
+    ]
+    puno_juliaca = resultado[1]
+    assert puno_juliaca["total_rutas"] == 2
+    assert {r["id"] for r in puno_juliaca["rutas"]} == {"1", "2"}
+
+
+def test_busqueda_corta_y_larga():
+    """Búsquedas por n-grama y por intersección de trigramas"""
+    indice = _indice()
+    assert {c["combinacion"] for c in indice.buscar("pu")} == {"PUNO → JULIACA", "YUNGUYO → PUNO"}
+    assert [c["combinacion"] for c in indice.buscar("yunguyo")] == ["YUNGUYO → PUNO"]
+    assert [c["combinacion"] for c in indice.buscar("o → jul")] == ["AZÁNGARO → JULIACA", "PUNO → JULIACA"]
+    assert indice.buscar("cusco") == []
+
+
+def test_busqueda_sin_tildes():
+    """La búsqueda ignora mayúsculas y tildes"""
+    assert [c["combinacion"] for c in _indice().buscar("azangaro")] == ["AZÁNGARO → JULIACA"]
+
+
+def test_actualizacion_incremental():
+    """Crear, mover y dar de baja rutas actualiza el índice sin recargar"""
+    indice = _indice()
+
+    indice.registrar_ruta(_ruta("5", "ILAVE", "PUNO"))
+    assert [c["combinacion"] for c in indice.buscar("ilave")] == ["ILAVE → PUNO"]
+
+    # Cambiar el destino mueve la ruta de combinación
+    indice.registrar_ruta(_ruta("3", "YUNGUYO", "JULIACA"))
+    assert indice.buscar("yunguyo → puno") == []
+    assert indice.buscar("yunguyo → juliaca")[0]["total_rutas"] == 1
+
+    # Una ruta inactiva se retira del índice
+    indice.registrar_ruta(_ruta("5", "ILAVE", "PUNO", estaActivo=False))
+    assert indice.buscar("ilave") == []
+
+    indice.eliminar_ruta("1")
+    assert indice.buscar("puno → juliaca")[0]["total_rutas"] == 1
+    indice.eliminar_ruta("2")
+    assert indice.buscar("puno → juliaca") == []
+
+
+def test_invalidar_fuerza_recarga():
+    """invalidar() marca el índice como no cargado"""
+    indice = _indice()
+    assert indice.cargado
+    indice.invalidar()
+    assert not indice.cargado
@@ -0,0 +1,132 @@
+"""
+Tests de la cola de salida de webhooks
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.mesa_partes.webhook_cola import (
+    AlmacenMemoria, ColaWebhooks, EstadoEntrega, calcular_espera, generar_firma
+)
+
+
+def _cola(manejador, **opciones):
+    cliente = httpx.AsyncClient(transport=httpx.MockTransport(manejador))
+    return ColaWebhooks(AlmacenMemoria(), cliente=cliente, espera_base=0, **opciones)
+
+
+def test_espera_exponencial_con_jitter_acotada():
+    assert all(0 <= calcular_espera(3, base=2, maximo=300) <= 16 for _ in range(50))
+    assert all(calcular_espera(20, base=2, maximo=300) <= 300 for _ in range(50))
+
+
+@pytest.mark.asyncio
+async def test_reintenta_errores_5xx_con_el_mismo_cuerpo_firmado():
+    recibidos = []
+
+    async def manejador(request):
+        recibidos.append(request)
+        return httpx.Response(503 if len(recibidos) == 1 else 200)
+
+    cola = _cola(manejador)
+    entrega_id = await cola.encolar("i1", "documento.creado", "https://destino/hook", {"n": 1}, secreto="s3")
+    await cola.vaciar()
+
+    entrega = await cola.almacen.obtener(entrega_id)
+    assert entrega["estado"] == EstadoEntrega.ENTREGADO and entrega["intentos"] == 2
+    assert [r.headers["X-Webhook-Intento"] for r in recibidos] == ["1", "2"]
+    assert {r.headers["X-Webhook-Id"] for r in recibidos} == {entrega_id}
+    cuerpo = recibidos[1].content.decode()
+    assert recibidos[1].headers["X-Webhook-Signature"] == f"sha256={generar_firma(cuerpo, 's3')}"
+    assert cola.metricas.reintentos == 1 and cola.metricas.entregados == 1
+
+
+@pytest.mark.asyncio
+async def test_error_4xx_va_al_dead_letter_y_puede_reintentarse():
+    respuestas = iter([400, 200])
+    cola = _cola(lambda request: httpx.Response(next(respuestas)))
+    entrega_id = await cola.encolar("i1", "documento.creado", "https://destino/hook", {"n": 1})
+    await cola.vaciar()
+
+    assert [e["_id"] for e in await cola.listar_fallidas()] == [entrega_id]
+    assert cola.metricas.fallidos == 1
+
+    assert await cola.reintentar_fallida(entrega_id)
+    await cola.vaciar()
+    assert (await cola.almacen.obtener(entrega_id))["estado"] == EstadoEntrega.ENTREGADO
+
+
+@pytest.mark.asyncio
+async def test_circuito_abierto_detiene_solo_a_la_integracion_caida():
+    def manejador(request):
+        return httpx.Response(500 if request.url.host == "caida" else 200)
+
+    cola = _cola(manejador, circuito_fallos=2, max_intentos=1)
+    for n in range(3):
+        await cola.encolar("caida", "e", "https://caida/hook", {"n": n})
+    sana = await cola.encolar("sana", "e", "https://sana/hook", {"n": 0})
+    await cola.vaciar()
+
+    assert cola.estado_circuitos() == {"caida": "abierto"}
+    assert (await cola.almacen.obtener(sana))["estado"] == EstadoEntrega.ENTREGADO
+    stats = await cola.get_estadisticas()
+    assert stats["por_estado"] == {EstadoEntrega.FALLIDO: 2, EstadoEntrega.PENDIENTE: 1, EstadoEntrega.ENTREGADO: 1}
+    assert stats["circuitos_abiertos"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrencia_limitada_por_integracion():
+    en_curso = {"actual": 0, "maximo": 0}
+
+    async def manejador(request):
+        en_curso["actual"] += 1
+        en_curso["maximo"] = max(en_curso["maximo"], en_curso["actual"])
+        await asyncio.sleep(0.01)
+        en_curso["actual"] -= 1
+        return httpx.Response(200)
+
+    cola = _cola(manejador, concurrencia_por_integracion=2)
+    for n in range(6):
+        await cola.encolar("i1", "e", "https://destino/hook", {"n": n})
+    await cola.vaciar()
+
+    assert en_curso["maximo"] == 2
+    assert cola.metricas.entregados == 6
+
+
+@pytest.mark.asyncio
+async def test_al_finalizar_informa_entregas_y_dead_letter_no_los_reintentos():
+    informados = []
+
+    async def al_finalizar(integracion_id, exito):
+        informados.append((integracion_id, exito))
+
+    respuestas = iter([503, 200, 200, 400])
+    cola = _cola(lambda request: httpx.Response(next(respuestas)), al_finalizar=al_finalizar)
+    await cola.encolar("i1", "e", "https://destino/hook", {"n": 1})
+    await cola.vaciar()
+    await cola.encolar("i1", "e", "https://destino/hook", {"n": 2})
+    await cola.vaciar()
+    await cola.encolar("i1", "e", "https://destino/hook", {"n": 3})
+    await cola.vaciar()
+
+    # El 503 se reintenta (sin informar); el segundo éxito no cambia el estado
+    assert informados == [("i1", True), ("i1", False)]
+
+
+@pytest.mark.asyncio
+async def test_url_mal_formada_va_al_dead_letter_sin_reintentos():
+    informados = []
+
+    async def al_finalizar(integracion_id, exito):
+        informados.append((integracion_id, exito))
+
+    cola = ColaWebhooks(AlmacenMemoria(), cliente=httpx.AsyncClient(), espera_base=0, al_finalizar=al_finalizar)
+    entrega_id = await cola.encolar("i1", "e", "http://[::1", {"n": 1})
+    await asyncio.wait_for(cola.vaciar(), 2)
+
+    entrega = await cola.almacen.obtener(entrega_id)
+    assert entrega["estado"] == EstadoEntrega.FALLIDO and entrega["intentos"] == 1
+    assert "InvalidURL" in entrega["ultimoError"]
+    assert informados == [("i1", False)]
@@ -0,0 +1,81 @@
+"""
+Tests del backplane WebSocket entre workers
+"""
+import json
+
+import pytest
+import pytest_asyncio
+
+from app.services.mesa_partes.websocket_backplane import BackplaneMemoria, BusMemoria
+from app.services.mesa_partes.websocket_service import ConnectionManager, WebSocketService
+
+
+class _WebSocket:
+    def __init__(self):
+        self.recibidos = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, texto):
+        self.recibidos.append(json.loads(texto))
+
+    def notificaciones(self):
+        return [m["notification_type"] for m in self.recibidos if m.get("type") == "notification"]
+
+
+@pytest_asyncio.fixture
+async def workers():
+    bus = BusMemoria()
+    a, b = ConnectionManager(worker_id="a"), ConnectionManager(worker_id="b")
+    await a.iniciar_backplane(BackplaneMemoria(bus))
+    await b.iniciar_backplane(BackplaneMemoria(bus))
+    yield a, b
+    for manager in (a, b):
+        for websocket in list(manager.salidas):
+            manager.disconnect(websocket)
+        await manager.detener_backplane()
+
+
+@pytest.mark.asyncio
+async def test_notificacion_llega_a_usuarios_de_otro_worker(workers):
+    a, b = workers
+    en_a, en_b, otra_area = _WebSocket(), _WebSocket(), _WebSocket()
+    await a.connect(en_a, "u1", "mesa")
+    await b.connect(en_b, "u2", "mesa")
+    await b.connect(otra_area, "u3", "legal")
+
+    servicio = WebSocketService()
+    servicio.manager = a
+    await servicio.notify_documento_derivado("d1", "EXP-1", "mesa", "u9")
+    await a.send_notification("aviso", "t", "m", usuario_id="u3")
+    await a.esperar_envios()
+    await b.esperar_envios()
+
+    assert en_a.notificaciones() == ["documento_derivado"]
+    assert en_b.notificaciones() == ["documento_derivado"]
+    assert otra_area.notificaciones() == ["aviso"]
+
+
+@pytest.mark.asyncio
+async def test_presencia_del_cluster(workers):
+    a, b = workers
+    await a.connect(_WebSocket(), "u1", "mesa")
+    await b.connect(_WebSocket(), "u1", "mesa")
+    await b.connect(_WebSocket(), "u2", "legal")
+    await b.refrescar_presencia()
+    await a.refrescar_presencia()
+
+    assert sorted(a.get_active_users()) == ["u1", "u2"]
+    assert a.get_user_connection_count("u1") == 2
+    assert a.get_area_connection_count("legal") == 1
+
+    servicio = WebSocketService()
+    servicio.manager = a
+    stats = await servicio.get_connection_stats()
+    assert stats["workers"] == 2 and stats["total_connections"] == 3
+    assert stats["worker"] == {"id": "a", "total_users_connected": 1, "total_connections": 1, "areas_with_connections": 1}
+
+    await b.detener_backplane()
+    await a.refrescar_presencia()
+    assert a.get_active_users() == ["u1"]
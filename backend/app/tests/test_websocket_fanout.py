@@ -0,0 +1,100 @@
+"""
+Tests del envío concurrente del ConnectionManager
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.services.mesa_partes.websocket_fanout import ColaSalida, MetricasFanout, PoliticaColaLlena
+from app.services.mesa_partes.websocket_service import ConnectionManager
+
+
+class _WebSocket:
+    def __init__(self, demora=0.0, falla=False):
+        self.demora = demora
+        self.falla = falla
+        self.recibidos = []
+        self.cerrado_con = None
+        self.liberar = asyncio.Event()
+        if not demora:
+            self.liberar.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, texto):
+        if self.falla:
+            raise RuntimeError("conexión perdida")
+        await self.liberar.wait()
+        self.recibidos.append(json.loads(texto))
+
+    async def close(self, code=1000):
+        self.cerrado_con = code
+
+
+@pytest.mark.asyncio
+async def test_un_cliente_lento_no_retrasa_a_los_demas():
+    manager = ConnectionManager()
+    rapido, lento, roto = _WebSocket(), _WebSocket(demora=1), _WebSocket(falla=True)
+    await manager.connect(rapido, "u1", "area-1")
+    await manager.connect(lento, "u2", "area-1")
+    await manager.connect(roto, "u3", "area-1")
+
+    await manager.send_to_area({"type": "notification", "n": 1}, "area-1")
+    await manager.salidas[rapido].vaciar()
+
+    assert [m.get("n") for m in rapido.recibidos] == [None, 1]
+    assert lento.recibidos == []
+    # la bienvenida del lento está en vuelo; la notificación, en su cola
+    assert manager.get_fanout_stats()["mensajes_en_cola"] == 1
+    assert roto not in manager.salidas and "u3" not in manager.get_active_users()
+
+    lento.liberar.set()
+    await manager.esperar_envios()
+    assert [m.get("n") for m in lento.recibidos] == [None, 1]
+    stats = manager.get_fanout_stats()
+    assert stats["enviados"] == 4 and stats["errores_envio"] == 1 and stats["mensajes_en_cola"] == 0
+
+    manager.disconnect(rapido)
+    manager.disconnect(lento)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("politica, esperado", [
+    (PoliticaColaLlena.DESCARTAR_ANTIGUO, [2, 3]),
+    (PoliticaColaLlena.DESCARTAR_NUEVO, [1, 2]),
+])
+async def test_cola_llena_descarta_segun_politica(politica, esperado):
+    websocket, metricas = _WebSocket(demora=1), MetricasFanout()
+    salida = ColaSalida(websocket, lambda ws: None, metricas, maximo=2, politica=politica)
+    await asyncio.sleep(0)  # la tarea toma el primer mensaje y queda esperando
+    salida.encolar(json.dumps({"n": 0}))
+    await asyncio.sleep(0)
+    for n in (1, 2, 3):
+        salida.encolar(json.dumps({"n": n}))
+
+    websocket.liberar.set()
+    await salida.vaciar()
+    assert [m["n"] for m in websocket.recibidos] == [0] + esperado
+    assert metricas.descartados == 1
+    salida.cerrar()
+
+
+@pytest.mark.asyncio
+async def test_cola_llena_desconecta_al_consumidor_lento():
+    manager = ConnectionManager()
+    websocket = _WebSocket(demora=1)
+    await manager.connect(websocket, "u1")
+    manager.salidas[websocket].cerrar()
+    manager.salidas[websocket] = ColaSalida(websocket, manager.disconnect, manager.metricas, maximo=1,
+                                            politica=PoliticaColaLlena.DESCONECTAR)
+    await asyncio.sleep(0)
+    await manager.broadcast({"n": 1})
+    await manager.broadcast({"n": 2})
+    await manager.broadcast({"n": 3})
+    await asyncio.sleep(0)
+
+    assert manager.get_active_users() == []
+    assert manager.metricas.desconectados_lentos == 1
+    assert websocket.cerrado_con == 1013
@@ -0,0 +1,211 @@
+"""
+Campos de búsqueda normalizados para filtrar sin `$regex` insensible
+
+Un filtro `{"$regex": x, "$options": "i"}` no puede usar índices: MongoDB
+recorre la colección completa y la latencia crece con ella. Por eso cada
+documento de las colecciones de CAMPOS_BUSQUEDA guarda en `_busqueda` una
+copia de sus campos de texto normalizada (mayúsculas y sin tildes, con
+`normalizar_texto`) y en `_busqueda.ngramas` los trigramas de esos campos,
+prefijados con el campo (`nombre:PUN`). Con eso:
+
+- exacto: igualdad sobre el campo normalizado
+- prefijo: `$regex` anclado y sin opciones sobre el campo normalizado, que
+  MongoDB resuelve como un rango del índice
+- contiene: `$all` con los trigramas de la consulta sobre el índice multikey
+  de `ngramas`; el `$regex` sobre el campo normalizado solo verifica los
+  candidatos. Las consultas de menos de 3 caracteres se resuelven como
+  prefijo.
+
+Los servicios calculan `_busqueda` al escribir (`con_campos_busqueda`) y
+`sincronizar_campos_busqueda` completa los documentos escritos por otros
+caminos o con una versión anterior: al iniciar la app y con
+`python scripts/sincronizar_busqueda.py`.
+"""
+import logging
+import os
+import re
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from app.services.ruta_combinaciones_index import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+CAMPO_BUSQUEDA = "_busqueda"
+CAMPO_NGRAMAS = f"{CAMPO_BUSQUEDA}.ngramas"
+LONGITUD_NGRAMA = 3
+
+# Subir al cambiar los campos o la normalización: los documentos con otra
+# versión se recalculan en la siguiente sincronización
+VERSION_BUSQUEDA = 1
+
+BUSQUEDA_SINCRONIZAR_AL_INICIAR = os.getenv("BUSQUEDA_SINCRONIZAR_AL_INICIAR", "true").lower() in ("1", "true", "si", "yes")
+BUSQUEDA_LOTE_SINCRONIZACION = int(os.getenv("BUSQUEDA_LOTE_SINCRONIZACION", "500"))
+
+# Campos buscables de cada colección (rutas con punto para subdocumentos)
+CAMPOS_BUSQUEDA: Dict[str, Tuple[str, ...]] = {
+    "empresas": ("ruc", "razonSocial.principal"),
+    "rutas": ("codigoRuta", "nombre"),
+    "localidades": ("nombre", "departamento", "provincia", "distrito", "ubigeo"),
+}
+
+
+def clave_busqueda(campo: str) -> str:
+    """Clave del campo dentro de `_busqueda` (`razonSocial.principal` → `razonSocial_principal`)"""
+    return campo.replace(".", "_")
+
+
+def campo_normalizado(campo: str) -> str:
+    """Ruta del campo normalizado, para filtros e índices"""
+    return f"{CAMPO_BUSQUEDA}.{clave_busqueda(campo)}"
+
+
+def _valor(documento: Any, campo: str) -> Any:
+    for parte in campo.split("."):
+        if not isinstance(documento, Mapping):
+            return None
+        documento = documento.get(parte)
+    return documento
+
+
+def ngramas(campo: str, texto: str) -> List[str]:
+    """Trigramas de un texto ya normalizado, prefijados con la clave del campo"""
+    clave = clave_busqueda(campo)
+    return [f"{clave}:{texto[i:i + LONGITUD_NGRAMA]}" for i in range(len(texto) - LONGITUD_NGRAMA + 1)]
+
+
+def campos_busqueda(coleccion: str, documento: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Subdocumento `_busqueda` de un documento de `coleccion`
+
+    El documento debe traer todos los campos buscables (en actualizaciones
+    parciales, combinar antes el documento guardado con los cambios).
+    """
+    busqueda: Dict[str, Any] = {"v": VERSION_BUSQUEDA}
+    tokens = set()
+    for campo in CAMPOS_BUSQUEDA[coleccion]:
+        valor = _valor(documento, campo)
+        texto = normalizar_texto(str(valor)) if valor is not None else ""
+        busqueda[clave_busqueda(campo)] = texto
+        tokens.update(ngramas(campo, texto))
+    busqueda["ngramas"] = sorted(tokens)
+    return busqueda
+
+
+def con_campos_busqueda(coleccion: str, documento: Dict[str, Any]) -> Dict[str, Any]:
+    """Agregar `_busqueda` al documento (se modifica y se devuelve)"""
+    documento[CAMPO_BUSQUEDA] = campos_busqueda(coleccion, documento)
+    return documento
+
+
+def indices_busqueda(*campos_ordenables: str) -> List[IndexModel]:
+    """
+    Índices para registrar con `registrar_indices`
+
+    Siempre el multikey de `ngramas`; además uno por cada campo que se
+    busca por igualdad o prefijo (consultas cortas).
+    """
+    indices = [IndexModel([(CAMPO_NGRAMAS, ASCENDING)], name="busqueda_ngramas")]
+    for campo in campos_ordenables:
+        indices.append(IndexModel([(campo_normalizado(campo), ASCENDING)], name=f"busqueda_{clave_busqueda(campo)}"))
+    return indices
+
+
+# ----------------------------------------------------------------------
+# Filtros
+# ----------------------------------------------------------------------
+
+def filtro_exacto(campo: str, valor: Optional[str]) -> Dict[str, Any]:
+    """Igualdad sin distinguir mayúsculas ni tildes; {} si el valor está vacío"""
+    texto = normalizar_texto(valor or "")
+    return {campo_normalizado(campo): texto} if texto else {}
+
+
+def filtro_prefijo(campo: str, valor: Optional[str]) -> Dict[str, Any]:
+    """Empieza con `valor`, sin distinguir mayúsculas ni tildes; {} si está vacío"""
+    texto = normalizar_texto(valor or "")
+    return {campo_normalizado(campo): {"$regex": f"^{re.escape(texto)}"}} if texto else {}
+
+
+def filtro_contiene(criterios: Mapping[str, Optional[str]]) -> Dict[str, Any]:
+    """
+    Cada campo de `criterios` contiene su valor, sin distinguir mayúsculas ni tildes
+
+    Los trigramas de todos los criterios van en un solo `$all`, que es lo
+    que acota los candidatos con el índice. Los criterios vacíos se ignoran
+    y los de menos de 3 caracteres se filtran como prefijo.
+    """
+    filtro: Dict[str, Any] = {}
+    tokens: List[str] = []
+    for campo, valor in criterios.items():
+        texto = normalizar_texto(valor or "")
+        if not texto:
+            continue
+        if len(texto) < LONGITUD_NGRAMA:
+            filtro.update(filtro_prefijo(campo, texto))
+            continue
+        tokens.extend(ngramas(campo, texto))
+        filtro[campo_normalizado(campo)] = {"$regex": re.escape(texto)}
+    if tokens:
+        filtro[CAMPO_NGRAMAS] = {"$all": list(dict.fromkeys(tokens))}
+    return filtro
+
+
+# ----------------------------------------------------------------------
+# Sincronización
+# ----------------------------------------------------------------------
+
+async def refrescar_campos_busqueda(db: Any, coleccion: str, filtro: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Recalcular `_busqueda` de los documentos de `coleccion` que cumplan `filtro`
+
+    Para las escrituras que no pasan por los servicios (importaciones,
+    routers con acceso directo). Devuelve la cantidad de documentos escritos.
+    """
+    proyeccion = {campo: 1 for campo in CAMPOS_BUSQUEDA[coleccion]}
+    operaciones: List[UpdateOne] = []
+    total = 0
+    async for documento in db[coleccion].find(filtro or {}, proyeccion):
+        operaciones.append(UpdateOne(
+            {"_id": documento["_id"]},
+            {"$set": {CAMPO_BUSQUEDA: campos_busqueda(coleccion, documento)}}
+        ))
+        if len(operaciones) >= BUSQUEDA_LOTE_SINCRONIZACION:
+            await db[coleccion].bulk_write(operaciones, ordered=False)
+            total += len(operaciones)
+            operaciones = []
+    if operaciones:
+        await db[coleccion].bulk_write(operaciones, ordered=False)
+        total += len(operaciones)
+    return total
+
+
+async def sincronizar_campos_busqueda(
+    db: Any,
+    colecciones: Optional[Iterable[str]] = None,
+    todos: bool = False
+) -> Dict[str, int]:
+    """
+    Completar `_busqueda` donde falta o es de otra versión (todos=True: recalcular todo)
+
+    Returns:
+        {colección: documentos escritos}
+    """
+    filtro = {} if todos else {f"{CAMPO_BUSQUEDA}.v": {"$ne": VERSION_BUSQUEDA}}
+    return {
+        coleccion: await refrescar_campos_busqueda(db, coleccion, filtro)
+        for coleccion in (colecciones or CAMPOS_BUSQUEDA)
+    }
+
+
+async def sincronizar_busqueda_al_iniciar(db: Any) -> None:
+    """Sincronización de arranque: solo registra el resultado en el log"""
+    try:
+        resultado = await sincronizar_campos_busqueda(db)
+    except Exception as e:
+        logger.error(f"❌ Error sincronizando campos de búsqueda al iniciar: {e}")
+        return
+    escritos = {coleccion: n for coleccion, n in resultado.items() if n}
+    if escritos:
+        logger.info(f"✅ Campos de búsqueda calculados: {escritos}")
@@ -0,0 +1,74 @@
+"""
+Utilidades geográficas compartidas
+
+Las localidades guardan sus coordenadas en `coordenadas` ({latitud, longitud})
+y, para las consultas geoespaciales, una copia como punto GeoJSON en
+`location` indexada con 2dsphere.
+"""
+import math
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+RADIO_TIERRA_KM = 6371.0
+
+
+def punto_geojson(coordenadas: Any) -> Optional[Dict[str, Any]]:
+    """
+    Punto GeoJSON ([longitud, latitud]) a partir de `coordenadas`
+
+    Acepta un dict {latitud, longitud} o un objeto con esos atributos; devuelve
+    None si falta alguna o está fuera de rango.
+    """
+    if coordenadas is None:
+        return None
+    if isinstance(coordenadas, dict):
+        latitud, longitud = coordenadas.get("latitud"), coordenadas.get("longitud")
+    else:
+        latitud, longitud = getattr(coordenadas, "latitud", None), getattr(coordenadas, "longitud", None)
+    try:
+        latitud, longitud = float(latitud), float(longitud)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitud <= 90 and -180 <= longitud <= 180):
+        return None
+    return {"type": "Point", "coordinates": [longitud, latitud]}
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia en km sobre la esfera terrestre"""
+    lat1_rad, lat2_rad = math.radians(lat1), math.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
+    return RADIO_TIERRA_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def matriz_haversine_km(
+    lat1: np.ndarray,
+    lon1: np.ndarray,
+    lat2: Optional[np.ndarray] = None,
+    lon2: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Matriz de distancias (km) entre dos conjuntos de puntos en grados
+
+    Sin el segundo conjunto calcula la matriz cuadrada del primero contra sí
+    mismo. Se calcula por broadcasting: filas = primer conjunto, columnas =
+    segundo; para conjuntos grandes conviene pedir bloques de filas.
+    """
+    if lat2 is None or lon2 is None:
+        lat2, lon2 = lat1, lon1
+    fi1 = np.radians(np.asarray(lat1, dtype=np.float64))[:, None]
+    fi2 = np.radians(np.asarray(lat2, dtype=np.float64))[None, :]
+    dlon = np.radians(np.asarray(lon2, dtype=np.float64))[None, :] - np.radians(np.asarray(lon1, dtype=np.float64))[:, None]
+    a = np.sin((fi2 - fi1) / 2) ** 2 + np.cos(fi1) * np.cos(fi2) * np.sin(dlon / 2) ** 2
+    return RADIO_TIERRA_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def tramos_haversine_km(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Distancias (km) entre cada punto y el siguiente de un recorrido"""
+    fi = np.radians(np.asarray(lat, dtype=np.float64))
+    lam = np.radians(np.asarray(lon, dtype=np.float64))
+    a = np.sin(np.diff(fi) / 2) ** 2 + np.cos(fi[:-1]) * np.cos(fi[1:]) * np.sin(np.diff(lam) / 2) ** 2
+    return RADIO_TIERRA_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
@@ -0,0 +1,116 @@
+"""
+Lectura incremental de FeatureCollection GeoJSON
+
+`iterar_features` recorre el arreglo `features` de un archivo sin cargarlo
+completo: lee bloques, decodifica cada feature con `json.JSONDecoder.raw_decode`
+y descarta lo ya leído, así la memoria depende del tamaño de la feature más
+grande y no del archivo. Las demás claves de primer nivel (`type`, `crs`,
+`name`...) se leen y se ignoran, salvo `type`, que debe ser FeatureCollection.
+"""
+import codecs
+import json
+from typing import Any, BinaryIO, Dict, Iterator
+
+TAMANO_BLOQUE = 64 * 1024
+
+_ESPACIOS = " \t\r\n"
+
+
+class _Lector:
+    """Buffer de texto sobre un archivo binario UTF-8 que se rellena a demanda"""
+
+    def __init__(self, archivo: BinaryIO, tamano_bloque: int):
+        self.archivo = archivo
+        self.tamano_bloque = tamano_bloque
+        self.texto = codecs.getincrementaldecoder("utf-8-sig")()
+        self.json = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.fin = False
+
+    def _leer(self) -> bool:
+        """Agregar un bloque al buffer; crece con lo pendiente para que una feature enorme no se re-decodifique cada 64 KB"""
+        if self.fin:
+            return False
+        pendiente = self.buffer[self.pos:]
+        bloque = self.archivo.read(max(self.tamano_bloque, len(pendiente)))
+        if not bloque:
+            self.fin = True
+            self.buffer = pendiente + self.texto.decode(b"", final=True)
+        else:
+            self.buffer = pendiente + self.texto.decode(bloque)
+        self.pos = 0
+        return True
+
+    def caracter(self) -> str:
+        """Siguiente carácter que no es espacio ('' al final del archivo), sin consumirlo"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _ESPACIOS:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._leer():
+                return self.buffer[self.pos] if self.pos < len(self.buffer) else ""
+
+    def consumir(self, esperado: str) -> None:
+        encontrado = self.caracter()
+        if encontrado != esperado:
+            raise ValueError(f"GeoJSON inválido: se esperaba '{esperado}' y se encontró '{encontrado or 'fin de archivo'}'")
+        self.pos += 1
+
+    def valor(self) -> Any:
+        """Decodificar el siguiente valor JSON completo"""
+        self.caracter()
+        while True:
+            try:
+                valor, fin = self.json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._leer():
+                    raise
+                continue
+            # Un número al final del buffer podría seguir en el próximo bloque
+            if fin == len(self.buffer) and not self.fin and self._leer():
+                continue
+            self.pos = fin
+            return valor
+
+
+def iterar_features(archivo: BinaryIO, tamano_bloque: int = TAMANO_BLOQUE) -> Iterator[Dict[str, Any]]:
+    """
+    Features de un FeatureCollection, una por una
+
+    Args:
+        archivo: Archivo abierto en modo binario
+        tamano_bloque: Bytes leídos por bloque
+
+    Raises:
+        ValueError: Si el archivo no es un FeatureCollection bien formado
+    """
+    lector = _Lector(archivo, tamano_bloque)
+    lector.consumir("{")
+    while True:
+        caracter = lector.caracter()
+        if caracter == "}":
+            return
+        if caracter == ",":
+            lector.pos += 1
+            continue
+
+        clave = lector.valor()
+        lector.consumir(":")
+        if clave != "features":
+            valor = lector.valor()
+            if clave == "type" and valor != "FeatureCollection":
+                raise ValueError("El archivo debe ser un FeatureCollection")
+            continue
+
+        lector.consumir("[")
+        while True:
+            caracter = lector.caracter()
+            if caracter == "]":
+                lector.pos += 1
+                break
+            if caracter == ",":
+                lector.pos += 1
+                continue
+            if caracter == "":
+                raise ValueError("GeoJSON inválido: arreglo features sin cerrar")
+            yield lector.valor()
@@ -0,0 +1,217 @@
+"""
+Paginación por cursor (keyset) para los listados
+
+Con `skip/limit` MongoDB recorre y descarta todos los documentos anteriores
+a la página pedida, así que cada página es más lenta que la anterior. Aquí
+los listados se ordenan por `(campo_orden, _id)` y la página siguiente se
+pide "después del último par visto", lo que con un índice compuesto sobre
+el filtro y ese par cuesta lo mismo en la página 1 que en la 1000.
+
+El cursor que recibe el cliente es opaco: el par `(valor, _id)` del último
+documento y el campo de orden, en JSON extendido de BSON y base64url. Los
+endpoints lo devuelven en la cabecera `X-Siguiente-Cursor` (o en el cuerpo,
+si su respuesta ya es un objeto) y lo aceptan en el parámetro `cursor`.
+Los índices que respaldan cada orden se declaran en el registro central
+(app.core.indices).
+
+`skip` sigue funcionando por compatibilidad, pero solo conviene para
+saltos cortos.
+"""
+import base64
+import binascii
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+from bson.errors import InvalidBSON
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from app.core.indices import registrar_indices
+
+# Segundos que se reutiliza un conteo de documentos con filtro
+PAGINACION_CONTEO_TTL = int(os.getenv("PAGINACION_CONTEO_TTL", "60"))
+
+CABECERA_SIGUIENTE_CURSOR = "X-Siguiente-Cursor"
+CABECERA_TOTAL_ESTIMADO = "X-Total-Estimado"
+
+# Índices compuestos que respaldan los listados paginados: el filtro de
+# igualdad primero y después el par de orden `(campo, _id)`
+INDICES_CURSOR: Dict[str, List[List[Tuple[str, int]]]] = {
+    "empresas": [
+        [("estaActivo", ASCENDING), ("_id", ASCENDING)],
+        [("estaActivo", ASCENDING), ("estado", ASCENDING), ("_id", ASCENDING)]
+    ],
+    "vehiculos": [
+        [("estaActivo", ASCENDING), ("_id", ASCENDING)],
+        [("empresaActualId", ASCENDING), ("_id", ASCENDING)],
+        [("estado", ASCENDING), ("_id", ASCENDING)]
+    ],
+    "rutas": [
+        [("estaActivo", ASCENDING), ("_id", ASCENDING)],
+        [("estaActivo", ASCENDING), ("estado", ASCENDING), ("_id", ASCENDING)]
+    ],
+    "resoluciones": [
+        [("estaActivo", ASCENDING), ("_id", ASCENDING)],
+        [("empresaId", ASCENDING), ("_id", ASCENDING)]
+    ],
+    "localidades": [
+        [("nombre", ASCENDING), ("_id", ASCENDING)],
+        [("tipo", ASCENDING), ("nombre", ASCENDING), ("_id", ASCENDING)],
+        [("estaActiva", ASCENDING), ("nombre", ASCENDING), ("_id", ASCENDING)]
+    ]
+}
+
+for _coleccion, _indices in INDICES_CURSOR.items():
+    registrar_indices(_coleccion, *(IndexModel(indice) for indice in _indices))
+
+# Conteos con filtro: clave -> (momento, total)
+_conteos: Dict[str, Tuple[float, int]] = {}
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no es válido para el listado pedido"""
+
+
+@dataclass
+class PaginaCursor:
+    """Una página de un listado por cursor"""
+    documentos: List[Any]
+    siguiente_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+    @property
+    def hay_mas(self) -> bool:
+        return self.siguiente_cursor is not None
+
+
+def codificar_cursor(campo_orden: str, valor: Any, _id: Any) -> str:
+    """Token opaco con el último par `(valor, _id)` de una página"""
+    crudo = json_util.dumps({"o": campo_orden, "v": valor, "id": _id}).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str, campo_orden: str) -> Tuple[Any, Any]:
+    """
+    Par `(valor, _id)` de un cursor
+
+    Lanza CursorInvalido si el token no es válido o se generó para otro orden.
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json_util.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (binascii.Error, UnicodeDecodeError, ValueError, InvalidBSON) as e:
+        raise CursorInvalido("Cursor de paginación inválido") from e
+    if not isinstance(datos, dict) or "id" not in datos or datos.get("o") != campo_orden:
+        raise CursorInvalido("Cursor de paginación inválido para este listado")
+    return datos.get("v"), datos["id"]
+
+
+def filtro_cursor(campo_orden: str, valor: Any, _id: Any, descendente: bool = False) -> Dict[str, Any]:
+    """Condición "después de `(valor, _id)`" en el orden `(campo_orden, _id)`"""
+    operador = "$lt" if descendente else "$gt"
+    if campo_orden == "_id":
+        return {"_id": {operador: _id}}
+    if valor is None:
+        # null va antes que cualquier valor en el orden de MongoDB
+        siguientes = {campo_orden: None, "_id": {operador: _id}}
+        if descendente:
+            return siguientes
+        return {"$or": [{campo_orden: {"$ne": None}}, siguientes]}
+    condiciones = [
+        {campo_orden: {operador: valor}},
+        {campo_orden: valor, "_id": {operador: _id}}
+    ]
+    if descendente:
+        # `$lt` no alcanza a los null, que en orden descendente van al final
+        condiciones.append({campo_orden: None})
+    return {"$or": condiciones}
+
+
+def _valor_campo(documento: Dict[str, Any], campo: str) -> Any:
+    valor: Any = documento
+    for parte in campo.split("."):
+        if not isinstance(valor, dict):
+            return None
+        valor = valor.get(parte)
+    return valor
+
+
+async def contar_estimado(coleccion: Any, filtro: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Total aproximado de documentos para mostrar junto a un listado
+
+    Sin filtro usa los metadatos de la colección (no recorre documentos);
+    con filtro reutiliza el conteo durante PAGINACION_CONTEO_TTL segundos en
+    lugar de contar de nuevo en cada página.
+    """
+    if not filtro:
+        return await coleccion.estimated_document_count()
+
+    clave = f"{getattr(coleccion, 'name', '')}:{json_util.dumps(filtro, sort_keys=True)}"
+    ahora = time.monotonic()
+    guardado = _conteos.get(clave)
+    if guardado and ahora - guardado[0] < PAGINACION_CONTEO_TTL:
+        return guardado[1]
+
+    total = await coleccion.count_documents(filtro)
+    if len(_conteos) > 1000:
+        _conteos.clear()
+    _conteos[clave] = (ahora, total)
+    return total
+
+
+async def paginar(
+    coleccion: Any,
+    filtro: Optional[Dict[str, Any]] = None,
+    limite: Optional[int] = 100,
+    cursor: Optional[str] = None,
+    campo_orden: str = "_id",
+    descendente: bool = False,
+    proyeccion: Optional[Dict[str, Any]] = None,
+    skip: int = 0,
+    contar: bool = False
+) -> PaginaCursor:
+    """
+    Página de documentos ordenados por `(campo_orden, _id)`
+
+    Se piden `limite + 1` documentos para saber si hay una página siguiente
+    sin contar. Con `contar=True` se agrega el total estimado del filtro.
+    Lanza CursorInvalido si el cursor no es válido.
+    """
+    filtro = dict(filtro or {})
+    consulta = filtro
+    if cursor:
+        valor, _id = decodificar_cursor(cursor, campo_orden)
+        despues = filtro_cursor(campo_orden, valor, _id, descendente)
+        consulta = {"$and": [filtro, despues]} if filtro else despues
+
+    if proyeccion is not None and campo_orden != "_id" and all(v for v in proyeccion.values()):
+        proyeccion = {**proyeccion, campo_orden: 1}
+
+    direccion = DESCENDING if descendente else ASCENDING
+    orden = [("_id", direccion)] if campo_orden == "_id" else [(campo_orden, direccion), ("_id", direccion)]
+    resultado = coleccion.find(consulta, proyeccion).sort(orden)
+    if skip:
+        resultado = resultado.skip(skip)
+    if limite:
+        resultado = resultado.limit(limite + 1)
+    documentos = await resultado.to_list(length=limite + 1 if limite else None)
+
+    siguiente = None
+    if limite and len(documentos) > limite:
+        documentos = documentos[:limite]
+        ultimo = documentos[-1]
+        siguiente = codificar_cursor(campo_orden, _valor_campo(ultimo, campo_orden), ultimo["_id"])
+
+    total = await contar_estimado(coleccion, filtro) if contar else None
+    return PaginaCursor(documentos=documentos, siguiente_cursor=siguiente, total=total)
+
+
+def cabeceras_paginacion(response: Any, pagina: PaginaCursor) -> None:
+    """Publicar el cursor siguiente (y el total, si se calculó) en las cabeceras"""
+    if pagina.siguiente_cursor:
+        response.headers[CABECERA_SIGUIENTE_CURSOR] = pagina.siguiente_cursor
+    if pagina.total is not None:
+        response.headers[CABECERA_TOTAL_ESTIMADO] = str(pagina.total)
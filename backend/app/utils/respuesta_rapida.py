@@ -0,0 +1,152 @@
+"""
+Respuestas JSON rápidas para listados
+
+Los listados completos construyen un modelo Pydantic por documento y FastAPI
+los vuelve a validar con `response_model`; con miles de filas eso domina el
+CPU. Con `ligero=true` los endpoints de listado leen de MongoDB solo los
+campos de su vista de lista (`PROYECCIONES_LISTA`) y devuelven los
+documentos tal cual con `RespuestaJSONRapida`, serializada con orjson.
+
+Sin orjson instalado se usa `json` de la biblioteca estándar (más lento,
+mismo resultado).
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from starlette.responses import Response
+
+from app.utils.paginacion_cursor import PaginaCursor, paginar
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Campos de cada vista de lista (lo que muestran las tablas del frontend)
+PROYECCIONES_LISTA: Dict[str, Dict[str, int]] = {
+    "empresas": {
+        "ruc": 1,
+        "razonSocial": 1,
+        "direccionFiscal": 1,
+        "estado": 1,
+        "tiposServicio": 1,
+        "estaActivo": 1,
+        "representanteLegal.nombres": 1,
+        "representanteLegal.apellidos": 1,
+        "representanteLegal.dni": 1,
+        "emailContacto": 1,
+        "telefonoContacto": 1,
+        "scoreRiesgo": 1,
+        "fechaRegistro": 1,
+        "fechaActualizacion": 1
+    },
+    "vehiculos": {
+        "placa": 1,
+        "vehiculoDataId": 1,
+        "empresaActualId": 1,
+        "resolucionId": 1,
+        "tipoServicio": 1,
+        "rutasAsignadasIds": 1,
+        "estado": 1,
+        "estaActivo": 1,
+        "sedeRegistro": 1,
+        "numeroTuc": 1,
+        "fechaRegistro": 1,
+        "fechaActualizacion": 1
+    },
+    "rutas": {
+        "codigoRuta": 1,
+        "nombre": 1,
+        "origen.id": 1,
+        "origen.nombre": 1,
+        "destino.id": 1,
+        "destino.nombre": 1,
+        "empresa.id": 1,
+        "empresa.ruc": 1,
+        "empresa.razonSocial": 1,
+        "resolucion.id": 1,
+        "resolucion.nroResolucion": 1,
+        "resolucion.estado": 1,
+        "frecuencia.descripcion": 1,
+        "tipoRuta": 1,
+        "tipoServicio": 1,
+        "nivelTerritorial": 1,
+        "distancia": 1,
+        "estado": 1,
+        "estaActivo": 1,
+        "fechaRegistro": 1,
+        "fechaActualizacion": 1
+    },
+    "resoluciones": {
+        "id": 1,
+        "nroResolucion": 1,
+        "fechaEmision": 1,
+        "fechaVigenciaInicio": 1,
+        "fechaVigenciaFin": 1,
+        "tipoResolucion": 1,
+        "tipoTramite": 1,
+        "resolucionPadreId": 1,
+        "empresaId": 1,
+        "estado": 1,
+        "estaActivo": 1,
+        "fechaRegistro": 1,
+        "fechaActualizacion": 1
+    }
+}
+
+
+def _convertir(valor: Any) -> Any:
+    """Tipos que orjson/json no serializan por sí solos"""
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, Enum):
+        return valor.value
+    if isinstance(valor, (set, frozenset)):
+        return list(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def serializar_json(contenido: Any) -> bytes:
+    """JSON compacto en UTF-8 (orjson si está disponible)"""
+    if orjson is not None:
+        return orjson.dumps(contenido, default=_convertir, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(contenido, default=_convertir, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RespuestaJSONRapida(Response):
+    """Respuesta JSON sin validación Pydantic: serializa dicts de MongoDB directamente"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return serializar_json(content)
+
+
+def documento_lista(documento: Dict[str, Any]) -> Dict[str, Any]:
+    """`_id` de MongoDB como `id` (se conserva un `id` propio si el documento lo tiene)"""
+    _id = documento.pop("_id", None)
+    if not documento.get("id") and _id is not None:
+        documento["id"] = str(_id)
+    return documento
+
+
+async def listar_documentos(
+    coleccion: Any,
+    filtro: Dict[str, Any],
+    vista: str,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> PaginaCursor:
+    """Página de una colección con la proyección de su vista de lista"""
+    pagina = await paginar(coleccion, filtro, limit, cursor=cursor, proyeccion=PROYECCIONES_LISTA[vista], skip=skip)
+    pagina.documentos = [documento_lista(documento) for documento in pagina.documentos]
+    return pagina
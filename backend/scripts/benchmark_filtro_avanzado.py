@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark del filtro avanzado origen-destino de rutas.
+
+Compara la implementación anterior (un find_one por empresa, con intento por
+ObjectId y luego por campo id) contra la agregación con $lookup de
+RutaService.get_reporte_origen_destino.
+
+Usa una base de datos temporal que se elimina al terminar:
+
+    python scripts/benchmark_filtro_avanzado.py --rutas 10000 --empresas 500
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.services.ruta_service import RutaService
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("BENCHMARK_DATABASE_NAME", "drtc_benchmark_filtro_avanzado")
+
+LOCALIDADES = ["PUNO", "JULIACA", "YUNGUYO", "ILAVE", "AZANGARO", "AYAVIRI", "LAMPA", "HUANCANE", "JULI", "MOHO"]
+
+
+async def poblar(db, total_rutas: int, total_empresas: int) -> None:
+    """Crear empresas y rutas sintéticas"""
+    empresas = [
+        {
+            "_id": ObjectId(),
+            "ruc": f"20{i:09d}",
+            "razonSocial": {"principal": f"EMPRESA DE TRANSPORTES {i}"},
+            "estaActivo": True
+        }
+        for i in range(total_empresas)
+    ]
+    await db.empresas.insert_many(empresas)
+
+    rutas = []
+    for i in range(total_rutas):
+        empresa = random.choice(empresas)
+        origen, destino = random.sample(LOCALIDADES, 2)
+        rutas.append({
+            "codigoRuta": f"{i % 99 + 1:02d}",
+            "nombre": f"{origen} - {destino}",
+            "origen": {"id": f"{origen}_001", "nombre": origen},
+            "destino": {"id": f"{destino}_001", "nombre": destino},
+            "empresa": {"id": str(empresa["_id"]), "ruc": empresa["ruc"], "razonSocial": empresa["razonSocial"]["principal"]},
+            "resolucion": {"id": str(ObjectId()), "nroResolucion": f"R-{i}", "tipoResolucion": "PADRE", "estado": "VIGENTE"},
+            "estado": "ACTIVA",
+            "estaActivo": True,
+            "fechaRegistro": datetime.utcnow()
+        })
+    await db.rutas.insert_many(rutas)
+
+
+async def filtro_anterior(db, filtros: dict) -> dict:
+    """Implementación anterior: rutas en memoria y un find_one por empresa"""
+    rutas = await db.rutas.find(RutaService(db)._build_match_origen_destino(filtros)).to_list(length=None)
+    empresas_info = {}
+    rutas_por_empresa = {}
+
+    for ruta in rutas:
+        empresa_id = ruta.get("empresa", {}).get("id")
+        if not empresa_id:
+            continue
+        if empresa_id not in empresas_info:
+            empresa = None
+            if ObjectId.is_valid(empresa_id):
+                empresa = await db.empresas.find_one({"_id": ObjectId(empresa_id)})
+            if not empresa:
+                empresa = await db.empresas.find_one({"id": empresa_id})
+            empresas_info[empresa_id] = empresa
+        rutas_por_empresa.setdefault(empresa_id, []).append(ruta)
+
+    return {"total_rutas": len(rutas), "total_empresas": len(rutas_por_empresa)}
+
+
+async def medir(nombre: str, funcion, repeticiones: int) -> float:
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = await funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    mejor = min(tiempos)
+    print(f"{nombre:<28} {mejor * 1000:>10.1f} ms  "
+          f"(rutas={resultado['total_rutas']}, empresas={resultado['total_empresas']})")
+    return mejor
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rutas", type=int, default=10000)
+    parser.add_argument("--empresas", type=int, default=500)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+    await client.drop_database(DATABASE_NAME)
+
+    try:
+        print(f"Poblando {args.rutas} rutas y {args.empresas} empresas en '{DATABASE_NAME}'...")
+        await poblar(db, args.rutas, args.empresas)
+        service = RutaService(db)
+
+        for filtros in ({}, {"origen": "PUNO"}):
+            print(f"\nFiltros: {filtros or 'ninguno'}")
+            anterior = await medir("find_one por empresa", lambda: filtro_anterior(db, filtros), args.repeticiones)
+            nuevo = await medir("agregación con $lookup", lambda: service.get_reporte_origen_destino(filtros), args.repeticiones)
+            print(f"{'mejora':<28} {anterior / nuevo:>10.1f}x")
+    finally:
+        await client.drop_database(DATABASE_NAME)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los listados: response_model vs. respuesta ligera (orjson).
+
+Compara, para GET /empresas y GET /vehiculos, el camino actual (un modelo
+Pydantic por documento más la validación/serialización de `response_model`)
+contra `ligero=true` (proyección de la vista de lista y RespuestaJSONRapida).
+Usa documentos sintéticos en memoria y una app FastAPI mínima con los mismos
+conversores de los routers, así mide solo la construcción y serialización
+de la respuesta, sin MongoDB:
+
+    python scripts/benchmark_listados_json.py --documentos 5000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.empresa import EmpresaResponse
+from app.models.vehiculo import VehiculoInDB, VehiculoResponse
+from app.routers.empresas_router import create_empresa_response
+from app.routers.vehiculos_router import vehiculo_to_response
+from app.utils.respuesta_rapida import PROYECCIONES_LISTA, RespuestaJSONRapida, documento_lista, orjson
+
+
+def _empresa(i: int) -> dict:
+    ahora = datetime(2024, 1, 1) + timedelta(minutes=i)
+    return {
+        "_id": ObjectId(),
+        "ruc": f"20{i:09d}",
+        "razonSocial": {"principal": f"EMPRESA DE TRANSPORTES {i} S.A.C.", "sunat": None, "minimo": None},
+        "direccionFiscal": f"Jr. Lima {i}, Puno",
+        "estado": "AUTORIZADA",
+        "tiposServicio": ["PASAJEROS"],
+        "estaActivo": True,
+        "representanteLegal": {"dni": f"{i:08d}", "nombres": "JUAN", "apellidos": "PEREZ QUISPE"},
+        "emailContacto": f"empresa{i}@correo.pe",
+        "telefonoContacto": "951000000",
+        "vehiculosHabilitadosIds": [str(ObjectId()) for _ in range(10)],
+        "rutasAutorizadasIds": [str(ObjectId()) for _ in range(5)],
+        "historialEstados": [
+            {"estadoAnterior": "EN_TRAMITE", "estadoNuevo": "AUTORIZADA", "fechaCambio": ahora,
+             "usuarioId": "admin", "motivo": "Aprobación"}
+        ],
+        "fechaRegistro": ahora,
+        "fechaActualizacion": ahora
+    }
+
+
+def _vehiculo(i: int) -> dict:
+    ahora = datetime(2024, 1, 1) + timedelta(minutes=i)
+    return {
+        "_id": ObjectId(),
+        "placa": f"V{i:05d}",
+        "vehiculoDataId": str(ObjectId()),
+        "empresaActualId": str(ObjectId()),
+        "resolucionId": str(ObjectId()),
+        "tipoServicio": "PASAJEROS",
+        "rutasAsignadasIds": [str(ObjectId()) for _ in range(3)],
+        "estado": "ACTIVO",
+        "estaActivo": True,
+        "sedeRegistro": "PUNO",
+        "numeroTuc": f"T-{i}",
+        "documentosIds": [str(ObjectId()) for _ in range(4)],
+        "historialIds": [str(ObjectId()) for _ in range(4)],
+        "fechaRegistro": ahora,
+        "fechaActualizacion": ahora
+    }
+
+
+def _proyectar(documento: dict, vista: str) -> dict:
+    """Lo que devuelve MongoDB con la proyección de la vista"""
+    resultado = {"_id": documento["_id"]}
+    for campo in PROYECCIONES_LISTA[vista]:
+        raiz, _, sub = campo.partition(".")
+        if raiz not in documento:
+            continue
+        if sub:
+            if isinstance(documento[raiz], dict) and sub in documento[raiz]:
+                resultado.setdefault(raiz, {})[sub] = documento[raiz][sub]
+        else:
+            resultado[raiz] = documento[raiz]
+    return resultado
+
+
+def crear_app(empresas: List[dict], vehiculos: List[dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/empresas", response_model=List[EmpresaResponse])
+    async def empresas_modelo():
+        respuestas = []
+        for doc in empresas:
+            doc = dict(doc)
+            doc["id"] = str(doc.pop("_id"))
+            respuestas.append(create_empresa_response(doc))
+        return respuestas
+
+    @app.get("/empresas/ligero")
+    async def empresas_ligero():
+        return RespuestaJSONRapida([documento_lista(_proyectar(doc, "empresas")) for doc in empresas])
+
+    @app.get("/vehiculos", response_model=List[VehiculoResponse])
+    async def vehiculos_modelo():
+        resultado = []
+        for doc in vehiculos:
+            doc = dict(doc)
+            doc["id"] = str(doc.pop("_id"))
+            resultado.append(vehiculo_to_response(VehiculoInDB(**doc)))
+        return resultado
+
+    @app.get("/vehiculos/ligero")
+    async def vehiculos_ligero():
+        return RespuestaJSONRapida([documento_lista(_proyectar(doc, "vehiculos")) for doc in vehiculos])
+
+    return app
+
+
+def medir(cliente: TestClient, ruta: str, repeticiones: int) -> tuple:
+    tiempos = []
+    tamano = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        respuesta = cliente.get(ruta)
+        tiempos.append(time.perf_counter() - inicio)
+        respuesta.raise_for_status()
+        tamano = len(respuesta.content)
+    return statistics.median(tiempos) * 1000, tamano
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=5000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    empresas = [_empresa(i) for i in range(args.documentos)]
+    vehiculos = [_vehiculo(i) for i in range(args.documentos)]
+    cliente = TestClient(crear_app(empresas, vehiculos))
+
+    print(f"{args.documentos} documentos, mediana de {args.repeticiones} peticiones "
+          f"(serializador: {'orjson' if orjson else 'json'})")
+    for recurso in ("empresas", "vehiculos"):
+        t_modelo, b_modelo = medir(cliente, f"/{recurso}", args.repeticiones)
+        t_ligero, b_ligero = medir(cliente, f"/{recurso}/ligero", args.repeticiones)
+        print(f"  {recurso:10s} response_model: {t_modelo:8.1f} ms {b_modelo / 1024:8.0f} KB")
+        print(f"  {'':10s} ligero:         {t_ligero:8.1f} ms {b_ligero / 1024:8.0f} KB  ({t_modelo / t_ligero:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
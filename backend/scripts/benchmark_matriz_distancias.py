@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la matriz de distancias entre localidades.
+
+Compara el bucle por par (haversine en Python, como el antiguo
+LocalidadService._calcular_distancia_haversine) contra DistanciaMatrizService
+(broadcasting con NumPy) sobre puntos sintéticos dentro de Puno, del orden
+de los ~10k centros poblados. No usa MongoDB:
+
+    python scripts/benchmark_matriz_distancias.py --localidades 10000
+
+El bucle por par se mide sobre `--filas-muestra` filas y se extrapola a la
+matriz completa; la versión vectorizada calcula la matriz completa por
+bloques de `--bloque` filas para no reservar N² valores a la vez.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.distancia_matriz_service import DistanciaMatrizService
+from app.utils.geo import haversine_km, matriz_haversine_km
+
+# Rectángulo aproximado del departamento de Puno
+LATITUD = (-17.3, -13.0)
+LONGITUD = (-71.1, -68.8)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--localidades", type=int, default=10000)
+    parser.add_argument("--filas-muestra", type=int, default=100)
+    parser.add_argument("--bloque", type=int, default=1000)
+    parser.add_argument("--itinerario", type=int, default=30, help="Paradas por itinerario")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.localidades
+    lat = rng.uniform(*LATITUD, n)
+    lon = rng.uniform(*LONGITUD, n)
+    ids = [f"cp{i}" for i in range(n)]
+
+    servicio = DistanciaMatrizService()
+    servicio.reconstruir([
+        {"_id": ids[i], "coordenadas": {"latitud": lat[i], "longitud": lon[i]}} for i in range(n)
+    ])
+
+    # 1. Bucle por par sobre una muestra de filas
+    filas = min(args.filas_muestra, n)
+    inicio = time.perf_counter()
+    muestra = [[haversine_km(lat[i], lon[i], lat[j], lon[j]) for j in range(n)] for i in range(filas)]
+    t_bucle = (time.perf_counter() - inicio) * n / filas
+
+    # 2. Matriz completa vectorizada, por bloques de filas
+    inicio = time.perf_counter()
+    suma = 0.0
+    for desde in range(0, n, args.bloque):
+        bloque = matriz_haversine_km(lat[desde:desde + args.bloque], lon[desde:desde + args.bloque], lat, lon)
+        suma += float(bloque.sum())
+    t_vector = time.perf_counter() - inicio
+
+    diferencia = np.abs(matriz_haversine_km(lat[:filas], lon[:filas], lat, lon) - np.array(muestra)).max()
+
+    # 3. Itinerarios a través del servicio: 200 recorridos distintos pedidos 5 veces cada uno
+    recorridos = [list(rng.choice(ids, args.itinerario, replace=False)) for _ in range(200)]
+    inicio = time.perf_counter()
+    for recorrido in recorridos:
+        servicio.itinerario(recorrido)
+    t_itinerarios = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for _ in range(4):
+        for recorrido in recorridos:
+            servicio.itinerario(recorrido)
+    t_itinerarios_lru = (time.perf_counter() - inicio) / 4
+
+    print(f"Matriz {n}x{n} ({n * n:,} distancias)")
+    print(f"  bucle por par (extrapolado de {filas} filas): {t_bucle:8.2f} s")
+    print(f"  NumPy por bloques de {args.bloque} filas:      {t_vector:8.2f} s  ({t_bucle / t_vector:.0f}x)")
+    print(f"  diferencia máxima: {diferencia:.2e} km")
+    print(f"200 itinerarios de {args.itinerario} paradas")
+    print(f"  primera vez: {t_itinerarios * 1000:.1f} ms, repetidos (LRU): {t_itinerarios_lru * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
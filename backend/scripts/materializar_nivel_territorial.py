@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Backfill del campo nivelTerritorial en las rutas.
+
+Calcula la clasificación territorial (LOCAL, INTERDISTRITAL, INTERPROVINCIAL,
+INTERDEPARTAMENTAL) y la jerarquía de origen, destino e itinerario de cada
+ruta, y crea los índices que usan los endpoints /nivel-territorial/rutas-*:
+
+    python scripts/materializar_nivel_territorial.py            # todas las rutas
+    python scripts/materializar_nivel_territorial.py --pendientes
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config.settings import settings
+from app.services.nivel_territorial_service import NivelTerritorialService, FILTRO_PENDIENTES
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pendientes", action="store_true", help="Solo rutas activas sin nivel calculado")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    service = NivelTerritorialService()
+    service.db = client[settings.DATABASE_NAME]
+
+    def progreso(procesadas: int, total: int) -> None:
+        print(f"  {procesadas}/{total} rutas")
+
+    try:
+        inicio = time.perf_counter()
+        resumen = await service.materializar_rutas(
+            FILTRO_PENDIENTES if args.pendientes else None, on_progreso=progreso
+        )
+        print(
+            f"✅ {resumen['procesadas']} rutas procesadas, {resumen['actualizadas']} actualizadas, "
+            f"{resumen['sin_localidades']} sin origen/destino en {time.perf_counter() - inicio:.1f} s"
+        )
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
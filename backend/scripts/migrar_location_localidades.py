@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Migración de ubicaciones GeoJSON para consultas geoespaciales.
+
+Copia `coordenadas` a `location` (punto GeoJSON) en todas las localidades,
+quita `location` donde las coordenadas faltan o no son válidas, y crea los
+índices 2dsphere de `localidades.location` y `geometrias.geometry` que usan
+/localidades/cercanas, /localidades/en-radio y /localidades/en-punto:
+
+    python scripts/migrar_location_localidades.py
+
+Es idempotente; conviene volver a ejecutarla después de importaciones que
+escriban directamente en la colección.
+"""
+
+import asyncio
+import os
+import sys
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import GEOSPHERE
+from pymongo.errors import OperationFailure
+
+from app.config.settings import settings
+from app.services.localidad_service import LocalidadService
+
+
+async def main() -> None:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+    service = LocalidadService(db)
+
+    try:
+        resumen = await service.sincronizar_ubicaciones()
+        print(
+            f"✅ {resumen['con_ubicacion']} localidades con location, "
+            f"{resumen['sin_ubicacion']} sin coordenadas válidas (location eliminado)"
+        )
+
+        await db.localidades.create_index([("location", GEOSPHERE)])
+        print("✅ Índice 2dsphere en localidades.location")
+
+        try:
+            await db.geometrias.create_index([("geometry", GEOSPHERE)])
+            print("✅ Índice 2dsphere en geometrias.geometry")
+        except OperationFailure as e:
+            # MongoDB indica el _id de la geometría inválida en el mensaje
+            print(f"❌ No se pudo indexar geometrias.geometry: {e}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
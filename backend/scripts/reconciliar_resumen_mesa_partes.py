@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Recalcular las tablas de resumen diario de Mesa de Partes
+(resumen_diario_documentos y resumen_diario_atenciones, ver
+app.services.mesa_partes.resumen_estadisticas) desde los documentos y
+derivaciones.
+
+Las filas se mantienen solas al guardar por el ORM y la reconciliación
+nocturna corrige los últimos días; este script sirve para la carga inicial
+o tras cambiar datos por fuera de la aplicación:
+
+    python scripts/reconciliar_resumen_mesa_partes.py                  # últimos 45 días
+    python scripts/reconciliar_resumen_mesa_partes.py --dias 365
+    python scripts/reconciliar_resumen_mesa_partes.py --desde 2024-01-01 --hasta 2024-12-31
+"""
+
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.mesa_partes.database import SessionLocal
+from app.services.mesa_partes.resumen_service import RESUMEN_DIAS_RECONCILIACION, ResumenService
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dias", type=int, default=RESUMEN_DIAS_RECONCILIACION, help="Días hacia atrás desde hoy")
+    parser.add_argument("--desde", type=date.fromisoformat, help="Primer día (AAAA-MM-DD); reemplaza a --dias")
+    parser.add_argument("--hasta", type=date.fromisoformat, help="Último día (AAAA-MM-DD), por defecto hoy")
+    args = parser.parse_args()
+
+    hasta = args.hasta or datetime.utcnow().date()
+    desde = args.desde or hasta - timedelta(days=args.dias)
+
+    db = SessionLocal()
+    try:
+        resultado = ResumenService(db).reconciliar(desde, hasta)
+    finally:
+        db.close()
+
+    print(f"Resumen recalculado del {desde.isoformat()} al {hasta.isoformat()}")
+    for tabla, filas in resultado.items():
+        print(f"{tabla}: {filas} filas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Calcular los campos de búsqueda normalizados (`_busqueda`, ver
+app.utils.busqueda_normalizada) de empresas, rutas y localidades.
+
+La app completa al iniciar los documentos que no los tienen; este script
+sirve para la primera migración o para recalcular todo tras cambiar datos
+por fuera de la aplicación:
+
+    python scripts/sincronizar_busqueda.py                      # solo los que faltan
+    python scripts/sincronizar_busqueda.py --todos              # recalcular todo
+    python scripts/sincronizar_busqueda.py --coleccion rutas --todos
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config.settings import settings
+from app.utils.busqueda_normalizada import CAMPOS_BUSQUEDA, sincronizar_campos_busqueda
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--coleccion", action="append", choices=sorted(CAMPOS_BUSQUEDA), help="Solo esta colección (se puede repetir)")
+    parser.add_argument("--todos", action="store_true", help="Recalcular todos los documentos, no solo los que faltan")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    try:
+        resultado = await sincronizar_campos_busqueda(client[settings.DATABASE_NAME], args.coleccion, todos=args.todos)
+    finally:
+        client.close()
+
+    for coleccion, escritos in resultado.items():
+        print(f"{coleccion}: {escritos} documentos actualizados")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
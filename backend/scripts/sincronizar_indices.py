@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Sincronizar los índices declarados por los servicios (app.core.indices).
+
+Pensado para correr en cada despliegue; crea los índices que falten y
+muestra los que están en conflicto o sobran:
+
+    python scripts/sincronizar_indices.py                 # crear los faltantes
+    python scripts/sincronizar_indices.py --verificar     # solo informar
+    python scripts/sincronizar_indices.py --reporte       # uso y planes de consulta
+    python scripts/sincronizar_indices.py --coleccion rutas --reemplazar-conflictos
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config.settings import settings
+from app.core.indices import reporte_indices, sincronizar_indices
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--coleccion", action="append", help="Solo esta colección (se puede repetir)")
+    parser.add_argument("--verificar", action="store_true", help="No crear nada; salir con código 1 si faltan índices")
+    parser.add_argument("--reemplazar-conflictos", action="store_true", help="Recrear los índices cuyo nombre existe con otra definición")
+    parser.add_argument("--eliminar-sobrantes", action="store_true", help="Borrar los índices que no están declarados")
+    parser.add_argument("--reporte", action="store_true", help="Índices sin uso ($indexStats) y planes de las consultas representativas")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+    try:
+        if args.reporte:
+            print(json.dumps(await reporte_indices(db, args.coleccion), indent=2, default=str, ensure_ascii=False))
+            return 0
+
+        resultado = await sincronizar_indices(
+            db,
+            args.coleccion,
+            reemplazar_conflictos=args.reemplazar_conflictos,
+            eliminar_sobrantes=args.eliminar_sobrantes,
+            solo_verificar=args.verificar
+        )
+    finally:
+        client.close()
+
+    pendientes = False
+    for nombre, r in resultado.items():
+        print(f"{nombre}: {len(r['existentes'])} existentes, {len(r['creados'])} creados")
+        for clave in ("creados", "faltantes", "conflictos", "sobrantes", "errores"):
+            if r[clave]:
+                print(f"  {clave}: {', '.join(r[clave])}")
+        pendientes = pendientes or bool(r["faltantes"] or r["conflictos"] or r["errores"])
+    return 1 if pendientes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))